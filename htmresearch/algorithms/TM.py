@@ -207,6 +207,7 @@ class TM(ConsolePrinterMixin):
       'segmentUpdates',
       '_internalStats',
       '_stats',
+      '_lookaheadBuffers',
       ]
 
   #############################################################################
@@ -223,6 +224,10 @@ class TM(ConsolePrinterMixin):
 
     self.sequenceSignatures = []
 
+    # Scratch predicted states and confidences for predict(), allocated on
+    # the first call
+    self._lookaheadBuffers = None
+
     # Allocate and reset all stats
     self.resetStats()
 
@@ -924,16 +929,19 @@ class TM(ConsolePrinterMixin):
   def predict(self, nSteps):
     """
     This function gives the future predictions for <nSteps> timesteps starting
-    from the current TP state. The TP is returned to its original state at the
-    end before returning.
+    from the current TP state. The TP state is not modified.
+
+    Loop for nSteps
+      a) Set the predicted cells as the next step's active cells. This step
+         in learn and infer methods use input here to correct the predictions.
+         We don't use any input here.
+      b) Turn-on with lateral support from these active cells
 
-    1) We save the TP state.
-    2) Loop for nSteps
-          a) Turn-on with lateral support from the current active cells
-          b) Set the predicted cells as the next step's active cells. This step
-             in learn and infer methods use input here to correct the predictions.
-             We don't use any input here.
-    3) Revert back the TP state to the time before prediction
+    The connected synapses of every segment are gathered into flat arrays once
+    per call, and each step computes the activity of every segment from them
+    at once. The predicted states and confidences of the future steps go to
+    scratch buffers that are reused across calls, so the TP state never has
+    to be saved and restored.
 
     Parameters:
     --------------------------------------------
@@ -945,49 +953,97 @@ class TM(ConsolePrinterMixin):
 
     """
 
-    # Save the TP dynamic state, we will use to revert back in the end
-    pristineTPDynamicState = self._getTPDynamicState()
-
     assert (nSteps>0)
 
     # multiStepColumnPredictions holds all the future prediction.
     multiStepColumnPredictions = numpy.zeros((nSteps, self.numberOfCols),
                                              dtype="float32")
 
-    # This is a (nSteps-1)+half loop. Phase 2 in both learn and infer methods
-    # already predicts for timestep (t+1). We use that prediction for free and save
-    # the half-a-loop of work.
-
-    step = 0
-    while True:
+    # Phase 2 in both learn and infer methods already predicts for timestep
+    # (t+1). We use that prediction for free.
+    multiStepColumnPredictions[0,:] = self.topDownCompute()
+
+    if nSteps == 1:
+      return multiStepColumnPredictions
+
+    if self._lookaheadBuffers is None:
+      stateShape = (self.numberOfCols, self.cellsPerColumn)
+      self._lookaheadBuffers = (numpy.zeros(stateShape, dtype="int8"),
+                                numpy.zeros(stateShape, dtype="int8"),
+                                numpy.zeros(stateShape, dtype="float32"))
+    predictedState, nextPredictedState, confidence = self._lookaheadBuffers
+
+    (segments, segmentCells,
+     synapseCols, synapseIdxs, synapseSegments) = self._getConnectedSynapses()
+
+    # Duty cycles are only computed for segments that become active
+    dutyCycles = numpy.full(len(segments), numpy.nan)
+
+    # The predicted state of each step is the active state of the next one.
+    # The live predicted state is only read.
+    activeState = self.predictedState['t']
+    for step in xrange(1, nSteps):
+
+      # sum(connected synapses) >= activationThreshold?
+      overlaps = numpy.bincount(
+        synapseSegments[activeState[synapseCols, synapseIdxs] != 0],
+        minlength=len(segments))
+      activeSegments = numpy.flatnonzero(overlaps >= self.activationThreshold)
+
+      missing = activeSegments[numpy.isnan(dutyCycles[activeSegments])]
+      if len(missing) > 0:
+        dutyCycles[missing] = self._getReadOnlyDutyCycles(
+          [segments[j] for j in missing])
+
+      # A cell's confidence is the max duty cycle of its active segments
+      predictedState.fill(0)
+      predictedState.reshape(-1)[segmentCells[activeSegments]] = 1
+      confidence.fill(0.0)
+      numpy.maximum.at(confidence.reshape(-1), segmentCells[activeSegments],
+                       dutyCycles[activeSegments])
+      multiStepColumnPredictions[step,:] = self.columnConfidences(confidence)
+
+      activeState = predictedState
+      predictedState, nextPredictedState = nextPredictedState, predictedState
 
-      # We get the prediction for the columns in the next time step from
-      # the topDownCompute method. It internally uses confidences.
-      multiStepColumnPredictions[step,:] = self.topDownCompute()
-
-      # Cleanest way in python to handle one and half loops
-      if step == nSteps-1:
-        break
-      step += 1
-
-      # Copy t-1 into t
-      self.activeState['t-1'][:,:] = self.activeState['t'][:,:]
-      self.predictedState['t-1'][:,:] = self.predictedState['t'][:,:]
-      self.confidence['t-1'][:,:] = self.confidence['t'][:,:]
+    return multiStepColumnPredictions
 
-      # Predicted state at "t-1" becomes the active state at "t"
-      self.activeState['t'][:,:] = self.predictedState['t-1'][:,:]
+  #############################################################################
+  def _getConnectedSynapses(self):
+    """
+    Gather the connected synapses of every segment into flat arrays.
 
-      # Predicted state and confidence are set in phase2.
-      self.predictedState['t'].fill(0)
-      self.confidence['t'].fill(0.0)
-      self.computePhase2(doLearn=False)
+    Parameters:
+    --------------------------------------------
+    retval:       (segments, segmentCells, synapseCols, synapseIdxs,
+                  synapseSegments): the list of every segment, the flat cell
+                  index (c * cellsPerColumn + i) of each segment, and for each
+                  connected synapse its source column, source cell index and
+                  position in the segment list.
+    """
+    segments, segmentCells, synapses, segmentLengths = [], [], [], []
+    for c in xrange(self.numberOfCols):
+      for i in xrange(self.cellsPerColumn):
+        for s in self.cells[c][i]:
+          segments.append(s)
+          segmentCells.append(c * self.cellsPerColumn + i)
+          synapses.extend(s.syns)
+          segmentLengths.append(len(s.syns))
 
-    # Revert the dynamic state to the saved state
-    self._setTPDynamicState(pristineTPDynamicState)
+    synapses = numpy.array(synapses, dtype="float64").reshape((-1, 3))
+    synapseSegments = numpy.repeat(numpy.arange(len(segments)), segmentLengths)
+    connected = synapses[:, 2] >= self.connectedPerm
 
+    return (segments, numpy.array(segmentCells, dtype="int64"),
+            synapses[connected, 0].astype("int64"),
+            synapses[connected, 1].astype("int64"),
+            synapseSegments[connected])
 
-    return multiStepColumnPredictions
+  #############################################################################
+  def _getReadOnlyDutyCycles(self, segments):
+    """ Return the current duty cycle of each segment without updating it. """
+    return numpy.array([s.dutyCycle(readOnly=True) for s in segments],
+                       dtype="float64")
 
   #############################################################################
   def _getTPDynamicStateVariableNames(self,):
@@ -1035,9 +1091,9 @@ class TM(ConsolePrinterMixin):
   #############################################################################
   def computePhase2(self, doLearn=False):
     """
-    This is the phase 2 of learning, inference and multistep prediction. During
-    this phase, all the cell with lateral support have their predictedState
-    turned on and the firing segments are queued up for updates.
+    This is the phase 2 of learning and inference. During this phase, all the
+    cell with lateral support have their predictedState turned on and the
+    firing segments are queued up for updates.
 
     Parameters:
     --------------------------------------------
@@ -1067,8 +1123,7 @@ class TM(ConsolePrinterMixin):
             maxConfidence = max(maxConfidence, s.dutyCycle(readOnly=True))
 
             if doLearn:
-              s.totalActivations += 1    # increment activationFrequency
-              s.lastActiveIteration = self.iterationIdx
+              self._recordSegmentActivation(s)
               # mark this segment for learning
               activeUpdate = self.getSegmentActiveSynapses(c,i,s,'t')
               activeUpdate.phase1Flag = False
@@ -1078,6 +1133,12 @@ class TM(ConsolePrinterMixin):
         #  as the cell's confidence.
         self.confidence['t'][c,i] = maxConfidence
 
+  #############################################################################
+  def _recordSegmentActivation(self, s):
+    """Count an activation of segment s at the current iteration."""
+    s.totalActivations += 1    # increment activationFrequency
+    s.lastActiveIteration = self.iterationIdx
+
 
   def compute(self, bottomUpInput, enableLearn, computeInfOutput=None):
     """Computes output for both learning and inference. In both cases, the
@@ -1232,17 +1293,6 @@ class TM(ConsolePrinterMixin):
     self.confidence['t-1'][:,:] = self.confidence['t'][:,:]
     self.confidence['t'].fill(0.0)
 
-    # Update segment duty cycles if we are crossing a "tier"
-    # We determine if it's time to update the segment duty cycles. Since the
-    # duty cycle calculation is a moving average based on a tiered alpha, it is
-    # important that we update all segments on each tier boundary
-    if self.lrnIterationIdx in Segment.dutyCycleTiers:
-      for c, i in product(xrange(self.numberOfCols),
-                                    xrange(self.cellsPerColumn)):
-        for segment in self.cells[c][i]:
-          segment.dutyCycle()
-
-
     # Phase 1: compute current state for each cell
     # For each column (winning in the SP):
     # - if the bottom up input was predicted by one of the sequence
@@ -1285,8 +1335,7 @@ class TM(ConsolePrinterMixin):
         i,s = self.getBestMatchingCell(c,self.activeState['t-1'])
 
         if s is not None:
-          s.totalActivations += 1      # activationFrequency
-          s.lastActiveIteration = self.iterationIdx
+          self._recordSegmentActivation(s)
         else:
           # if best matching cell does not exist, then get least used cell
           i = self.getLeastUsedCell(c)
@@ -1329,32 +1378,7 @@ class TM(ConsolePrinterMixin):
     # it can be called in adaptSegments, in the case where we
     # do global decay only episodically.
     if self.globalDecay > 0.0 and ((self.iterationIdx % self.maxAge) == 0):
-      for c, i in product(xrange(self.numberOfCols), xrange(self.cellsPerColumn)):
-
-        segsToDel = [] # collect and remove outside the loop
-        for segment in self.cells[c][i]:
-          age = self.iterationIdx - segment[0][self.kSegLastActiveIteration]
-          if age <= self.maxAge:
-            continue
-
-          #print "Decrementing seg age %d:" % (age), c, i, segment
-          synsToDel = [] # collect and remove outside the loop
-          for synapse in segment.syns: # skip sequenceSegment flag
-
-            synapse[2] = synapse[2] - self.globalDecay # decrease permanence
-
-            if synapse[2] <= 0:
-              synsToDel.append(synapse) # add to list to delete
-
-          if len(synsToDel) == len(segment.syns): # 1 for sequenceSegment flag
-            segsToDel.append(segment) # will remove the whole segment
-          elif len(synsToDel) > 0:
-            for syn in synsToDel: # remove some synapses on segment
-              segment.syns.remove(syn)
-
-        for seg in segsToDel: # remove some segments of this cell
-          self.cleanUpdatesList(c,i,seg)
-          self.cells[c][i].remove(seg)
+      self._applyGlobalDecay()
 
 
     # Update the prediction score stats
@@ -1374,6 +1398,39 @@ class TM(ConsolePrinterMixin):
 
     return self.computeOutput()
 
+  #############################################################################
+  def _applyGlobalDecay(self):
+    """ Decrease the permanence of every synapse on segments that have not been
+    active for more than maxAge iterations by globalDecay. Synapses that reach
+    0 are removed, and segments that lose all of their synapses are removed.
+    """
+    for c, i in product(xrange(self.numberOfCols), xrange(self.cellsPerColumn)):
+
+      segsToDel = [] # collect and remove outside the loop
+      for segment in self.cells[c][i]:
+        age = self.iterationIdx - segment.lastActiveIteration
+        if age <= self.maxAge:
+          continue
+
+        #print "Decrementing seg age %d:" % (age), c, i, segment
+        synsToDel = [] # collect and remove outside the loop
+        for synapse in segment.syns: # skip sequenceSegment flag
+
+          synapse[2] = synapse[2] - self.globalDecay # decrease permanence
+
+          if synapse[2] <= 0:
+            synsToDel.append(synapse) # add to list to delete
+
+        if len(synsToDel) == len(segment.syns): # 1 for sequenceSegment flag
+          segsToDel.append(segment) # will remove the whole segment
+        elif len(synsToDel) > 0:
+          for syn in synsToDel: # remove some synapses on segment
+            segment.syns.remove(syn)
+
+      for seg in segsToDel: # remove some segments of this cell
+        self.cleanUpdatesList(c,i,seg)
+        self.cells[c][i].remove(seg)
+
   #############################################################################
   def columnConfidences(self, cellConfidences=None):
     """ Compute the column confidences given the cell confidences. If
@@ -1789,7 +1846,7 @@ class TM(ConsolePrinterMixin):
       cands = [syn for syn in zip(tmpCandidates[0], tmpCandidates[1])]
     else:
       # We exclude any synapse that is already in this segment.
-      synapsesAlreadyInSegment = set((syn[0], syn[1]) for syn in s.syns)
+      synapsesAlreadyInSegment = self._getSynapseSources(s)
       cands = [syn for syn in zip(tmpCandidates[0], tmpCandidates[1]) \
                if (syn[0], syn[1]) not in synapsesAlreadyInSegment]
 
@@ -1804,6 +1861,13 @@ class TM(ConsolePrinterMixin):
     self._random.getUInt32Sample(indices, tmp, True)
     return [cands[j] for j in tmp]
 
+  #############################################################################
+  def _getSynapseSources(self, s):
+    """Return the set of (column index, cell index) pairs that segment s has
+    synapses from.
+    """
+    return set((syn[0], syn[1]) for syn in s.syns)
+
   #############################################################################
   def getBestMatchingCell(self, c, activeState):
     """Find weakly activated cell in column. Returns index and segment of most
@@ -2033,7 +2097,10 @@ class TM(ConsolePrinterMixin):
           print "Reinforcing segment for cell[%d,%d]" %(c,i),
           segment.printSegment()
 
-        # Update frequency and positiveActivations
+        # Update frequency and positiveActivations. The duty cycle is brought
+        # up to date first, since catching up from the first tier uses
+        # positiveActivations.
+        segment.dutyCycle()
         segment.positiveActivations += 1       # positiveActivations += 1
         segment.dutyCycle(active=True)
 
@@ -2165,7 +2232,7 @@ class TM(ConsolePrinterMixin):
 
             # Get active synapse statistics if requested
             if collectActiveData:
-              if self.isSegmentActive(seg, self.infActiveState['t']):
+              if self.isSegmentActive(seg, self.activeState['t']):
                 nActiveSegs += 1
               for syn in seg.syns:
                 if self.activeState['t'][syn[0]][syn[1]] == 1:
@@ -2248,9 +2315,7 @@ class Segment(object):
     providing good predictions.
 
     **NOTE:** This method relies on different schemes to compute the duty cycle
-    based on how much history we have. In order to support this tiered
-    approach **IT MUST BE CALLED ON EVERY SEGMENT AT EACH DUTY CYCLE TIER**
-    (@ref dutyCycleTiers).
+    based on how much history we have (@ref dutyCycleTiers).
 
     When we don't have a lot of history yet (first tier), we simply return
     number of positive activations / total number of iterations
@@ -2270,19 +2335,23 @@ class Segment(object):
         dc[t] = (1-alpha)^(t-lastT) * dc[lastT]
 
     We use the alphas and tiers as defined in @ref dutyCycleAlphas and
-    @ref dutyCycleTiers.
+    @ref dutyCycleTiers. When the last update is from an earlier tier, the
+    decay is applied one tier at a time, up to each tier boundary with that
+    tier's alpha. This gives the same value as updating every segment on each
+    tier boundary, without having to sweep all of them.
     """
+    iterationIdx = self.tp.lrnIterationIdx
+
     # For tier #0, compute it from total number of positive activations seen
-    if self.tp.lrnIterationIdx <= self.dutyCycleTiers[1]:
-      dutyCycle = float(self.positiveActivations) \
-                                    / self.tp.lrnIterationIdx
+    if iterationIdx <= self.dutyCycleTiers[1]:
+      dutyCycle = float(self.positiveActivations) / iterationIdx
       if not readOnly:
-        self._lastPosDutyCycleIteration = self.tp.lrnIterationIdx
+        self._lastPosDutyCycleIteration = iterationIdx
         self._lastPosDutyCycle = dutyCycle
       return dutyCycle
 
     # How old is our update?
-    age = self.tp.lrnIterationIdx - self._lastPosDutyCycleIteration
+    age = iterationIdx - self._lastPosDutyCycleIteration
 
     # If it's already up to date, we can returned our cached value.
     if age == 0 and not active:
@@ -2290,18 +2359,32 @@ class Segment(object):
 
     # Figure out which alpha we're using
     for tierIdx in range(len(self.dutyCycleTiers)-1, 0, -1):
-      if self.tp.lrnIterationIdx > self.dutyCycleTiers[tierIdx]:
+      if iterationIdx > self.dutyCycleTiers[tierIdx]:
         alpha = self.dutyCycleAlphas[tierIdx]
         break
 
+    # Catch up with the tier boundaries crossed since the last update
+    lastIterationIdx = self._lastPosDutyCycleIteration
+    dutyCycle = self._lastPosDutyCycle
+    if lastIterationIdx < self.dutyCycleTiers[tierIdx]:
+      if lastIterationIdx < self.dutyCycleTiers[1]:
+        lastIterationIdx = self.dutyCycleTiers[1]
+        dutyCycle = float(self.positiveActivations) / lastIterationIdx
+      for boundaryIdx in range(2, tierIdx + 1):
+        boundary = self.dutyCycleTiers[boundaryIdx]
+        if lastIterationIdx < boundary:
+          dutyCycle = (pow(1.0-self.dutyCycleAlphas[boundaryIdx-1],
+                           boundary - lastIterationIdx) * dutyCycle)
+          lastIterationIdx = boundary
+
     # Update duty cycle
-    dutyCycle = pow(1.0-alpha, age) * self._lastPosDutyCycle
+    dutyCycle = pow(1.0-alpha, iterationIdx - lastIterationIdx) * dutyCycle
     if active:
       dutyCycle += alpha
 
     # Update cached values if not read-only
     if not readOnly:
-      self._lastPosDutyCycleIteration = self.tp.lrnIterationIdx
+      self._lastPosDutyCycleIteration = iterationIdx
       self._lastPosDutyCycle = dutyCycle
 
     return dutyCycle
@@ -2452,3 +2535,657 @@ class Segment(object):
           reached0 = True
 
     return reached0
+
+################################################################################
+################################################################################
+
+
+class ArrayTM(TM):
+  """
+  A TM that stores its segments and synapses in flat numpy arrays instead of
+  Segment objects. It has the same API as TM and learns and infers the same
+  way.
+
+  Segments are identified by integers. self.cells[c][i] is the list of
+  segment ids on cell (c,i) in creation order, and segment updates refer to
+  segments by id. getSegmentOnCell returns a Segment holding a copy of the
+  segment's state.
+
+  Per segment, the arrays hold the owner cell, the start, length and capacity
+  of its synapses, and the fields of a Segment (77 bytes in all). Per synapse,
+  they hold the presynaptic column (int32) and cell index (uint16), the
+  permanence (float32) and the owner segment (int32): 14 bytes, compared to
+  about 150 bytes for a synapse list in a Segment. A segment's synapses are
+  contiguous. A segment that outgrows its capacity moves to the end of the
+  synapse arrays with twice the capacity, and the arrays are compacted when
+  more than half of them is unused.
+
+  Phase 2 computes the activity of every segment in one numpy pass, and the
+  best matching cell and segment searches compute the activity of every
+  segment in the column (or cell) in one pass.
+  """
+
+  # Name and dtype of each per-segment array
+  _SEGMENT_FIELDS = (("_segCell", "int32"),
+                     ("_segSynStart", "int64"),
+                     ("_segSynLen", "int32"),
+                     ("_segSynCapacity", "int32"),
+                     ("_segID", "int64"),
+                     ("_segIsSequenceSeg", "bool"),
+                     ("_segLastActiveIteration", "int64"),
+                     ("_segPositiveActivations", "int64"),
+                     ("_segTotalActivations", "int64"),
+                     ("_segLastPosDutyCycle", "float64"),
+                     ("_segLastPosDutyCycleIteration", "int64"))
+
+  # Name and dtype of each per-synapse array
+  _SYNAPSE_FIELDS = (("_synCol", "int32"),
+                     ("_synIdx", "uint16"),
+                     ("_synPerm", "float32"),
+                     ("_synSegment", "int32"))
+
+
+  def __init__(self, *args, **kwargs):
+    super(ArrayTM, self).__init__(*args, **kwargs)
+
+    for name, dtype in self._SEGMENT_FIELDS + self._SYNAPSE_FIELDS:
+      setattr(self, name, numpy.zeros(0, dtype=dtype))
+
+    # Segment ids in use or freed are below _numSegments, synapses below
+    # _synEnd. Free synapse slots have owner segment -1.
+    self._numSegments = 0
+    self._freeSegments = []
+    self._synEnd = 0
+
+
+  def __getstate__(self):
+    self._compactSynapses()
+    state = super(ArrayTM, self).__getstate__()
+    for name, _ in self._SEGMENT_FIELDS:
+      state[name] = state[name][:self._numSegments].copy()
+    for name, _ in self._SYNAPSE_FIELDS:
+      state[name] = state[name][:self._synEnd].copy()
+    return state
+
+
+  ################################################################################
+  # Storage
+  ################################################################################
+
+  def _createSegment(self, c, i, isSequenceSeg=False):
+    """Create an empty segment on cell (c,i) and return its id."""
+    if len(self._freeSegments) > 0:
+      segment = self._freeSegments.pop()
+    else:
+      segment = self._numSegments
+      self._numSegments += 1
+      if segment >= len(self._segCell):
+        capacity = max(2 * len(self._segCell), 16)
+        for name, dtype in self._SEGMENT_FIELDS:
+          grown = numpy.zeros(capacity, dtype=dtype)
+          grown[:segment] = getattr(self, name)[:segment]
+          setattr(self, name, grown)
+
+    self._segCell[segment] = c * self.cellsPerColumn + i
+    self._segSynStart[segment] = 0
+    self._segSynLen[segment] = 0
+    self._segSynCapacity[segment] = 0
+
+    # Same initial values as a Segment
+    self._segID[segment] = self.segID
+    self.segID += 1
+    self._segIsSequenceSeg[segment] = isSequenceSeg
+    self._segLastActiveIteration[segment] = self.lrnIterationIdx
+    self._segPositiveActivations[segment] = 1
+    self._segTotalActivations[segment] = 1
+    self._segLastPosDutyCycle[segment] = 1.0 / self.lrnIterationIdx
+    self._segLastPosDutyCycleIteration[segment] = self.lrnIterationIdx
+
+    self.cells[c][i].append(segment)
+    return segment
+
+
+  def _destroySegment(self, c, i, segment):
+    """Remove a segment from cell (c,i) and free its synapses."""
+    start = self._segSynStart[segment]
+    self._synSegment[start:start + self._segSynCapacity[segment]] = -1
+    self._segCell[segment] = -1
+    self._segSynLen[segment] = 0
+    self._segSynCapacity[segment] = 0
+    self.cells[c][i].remove(segment)
+    self._freeSegments.append(segment)
+
+
+  def _getSynapseRange(self, segment):
+    start = self._segSynStart[segment]
+    return start, start + self._segSynLen[segment]
+
+
+  def _getSynapseIndices(self, segments):
+    """
+    Return the index of every synapse of the segments and the position in
+    segments of each synapse's segment.
+    """
+    lengths = self._segSynLen[segments].astype("int64")
+    owners = numpy.repeat(numpy.arange(len(segments)), lengths)
+    indices = (numpy.arange(lengths.sum()) +
+               numpy.repeat(self._segSynStart[segments] -
+                            (numpy.cumsum(lengths) - lengths), lengths))
+    return indices, owners
+
+
+  def _allocateSynapses(self, capacity):
+    """Reserve capacity synapse slots at the end of the synapse arrays and
+    return the first one. This can compact the synapse arrays."""
+    if self._synEnd + capacity > len(self._synPerm):
+      live = self._segCell[:self._numSegments] >= 0
+      numUsed = self._segSynLen[:self._numSegments][live].sum()
+      if self._synEnd - numUsed > self._synEnd / 2:
+        self._compactSynapses()
+
+    if self._synEnd + capacity > len(self._synPerm):
+      size = max(2 * len(self._synPerm), self._synEnd + capacity)
+      for name, dtype in self._SYNAPSE_FIELDS:
+        grown = numpy.zeros(size, dtype=dtype)
+        grown[:self._synEnd] = getattr(self, name)[:self._synEnd]
+        setattr(self, name, grown)
+      self._synSegment[self._synEnd:] = -1
+
+    start = self._synEnd
+    self._synEnd += capacity
+    return start
+
+
+  def _compactSynapses(self):
+    """Move every segment's synapses to the front of the synapse arrays, in
+    order, leaving no unused slots."""
+    segments = numpy.flatnonzero(self._segCell[:self._numSegments] >= 0)
+    segments = segments[numpy.argsort(self._segSynStart[segments],
+                                      kind="mergesort")]
+    indices, _ = self._getSynapseIndices(segments)
+
+    for name, _ in self._SYNAPSE_FIELDS:
+      array = getattr(self, name)
+      array[:len(indices)] = array[indices]
+    self._synSegment[len(indices):] = -1
+
+    lengths = self._segSynLen[segments].astype("int64")
+    self._segSynStart[segments] = numpy.cumsum(lengths) - lengths
+    self._segSynCapacity[segments] = lengths
+    self._synEnd = len(indices)
+
+
+  def _addSynapses(self, segment, columns, cellIdxs, perm):
+    """Append synapses to a segment, moving it if it is out of capacity."""
+    numNew = len(columns)
+    if numNew == 0:
+      return
+
+    length = self._segSynLen[segment]
+    capacity = self._segSynCapacity[segment]
+    if length + numNew > capacity:
+      newCapacity = max(2 * capacity, length + numNew)
+      # Allocating can compact the synapse arrays, which moves the segment
+      newStart = self._allocateSynapses(newCapacity)
+      start = self._segSynStart[segment]
+      capacity = self._segSynCapacity[segment]
+      for name, _ in self._SYNAPSE_FIELDS:
+        array = getattr(self, name)
+        array[newStart:newStart + length] = array[start:start + length]
+      self._synSegment[start:start + capacity] = -1
+      self._segSynStart[segment] = newStart
+      self._segSynCapacity[segment] = newCapacity
+
+    first = self._segSynStart[segment] + length
+    self._synCol[first:first + numNew] = columns
+    self._synIdx[first:first + numNew] = cellIdxs
+    self._synPerm[first:first + numNew] = perm
+    self._synSegment[first:first + numNew] = segment
+    self._segSynLen[segment] = length + numNew
+
+
+  def _removeSynapses(self, segment, toRemove):
+    """Remove the segment's synapses where toRemove (a boolean array with one
+    entry per synapse) is True, keeping the order of the others."""
+    start, end = self._getSynapseRange(segment)
+    keep = ~toRemove
+    numKept = keep.sum()
+    for name, _ in self._SYNAPSE_FIELDS:
+      array = getattr(self, name)
+      array[start:start + numKept] = array[start:end][keep]
+    self._synSegment[start + numKept:end] = -1
+    self._segSynLen[segment] = numKept
+
+
+  def _getSegment(self, segment):
+    """Return a Segment holding a copy of the segment's state."""
+    s = Segment.__new__(Segment)
+    s.tp = self
+    s.segID = int(self._segID[segment])
+    s.isSequenceSeg = bool(self._segIsSequenceSeg[segment])
+    s.lastActiveIteration = int(self._segLastActiveIteration[segment])
+    s.positiveActivations = int(self._segPositiveActivations[segment])
+    s.totalActivations = int(self._segTotalActivations[segment])
+    s._lastPosDutyCycle = float(self._segLastPosDutyCycle[segment])
+    s._lastPosDutyCycleIteration = int(
+      self._segLastPosDutyCycleIteration[segment])
+    start, end = self._getSynapseRange(segment)
+    s.syns = [[int(col), int(idx), perm] for col, idx, perm in
+              zip(self._synCol[start:end], self._synIdx[start:end],
+                  self._synPerm[start:end])]
+    return s
+
+
+  def _getSegmentActivity(self, segments, activeState,
+                          connectedSynapsesOnly=False):
+    """Return the number of active synapses on each segment."""
+    indices, owners = self._getSynapseIndices(segments)
+    active = activeState[self._synCol[indices], self._synIdx[indices]] != 0
+    if connectedSynapsesOnly:
+      active &= self._synPerm[indices] >= self.connectedPerm
+    return numpy.bincount(owners[active], minlength=len(segments))
+
+
+  def _getDutyCycles(self, segments, active=False, readOnly=False):
+    """Vectorized Segment.dutyCycle for an array of segments."""
+    if len(segments) == 0:
+      return numpy.zeros(0, dtype="float64")
+
+    tiers = Segment.dutyCycleTiers
+    if self.lrnIterationIdx <= tiers[1]:
+      dutyCycles = (self._segPositiveActivations[segments] /
+                    float(self.lrnIterationIdx))
+    else:
+      for tierIdx in range(len(tiers)-1, 0, -1):
+        if self.lrnIterationIdx > tiers[tierIdx]:
+          alpha = Segment.dutyCycleAlphas[tierIdx]
+          break
+
+      lastIterations = self._segLastPosDutyCycleIteration[segments]
+      dutyCycles = self._segLastPosDutyCycle[segments]
+
+      # Catch up with the tier boundaries crossed since the last update
+      if lastIterations.min() < tiers[tierIdx]:
+        fromFirstTier = lastIterations < tiers[1]
+        dutyCycles[fromFirstTier] = (
+          self._segPositiveActivations[segments[fromFirstTier]] /
+          float(tiers[1]))
+        lastIterations[fromFirstTier] = tiers[1]
+        for boundaryIdx in range(2, tierIdx + 1):
+          boundary = tiers[boundaryIdx]
+          crossing = lastIterations < boundary
+          dutyCycles[crossing] = (
+            numpy.power(1.0 - Segment.dutyCycleAlphas[boundaryIdx-1],
+                        boundary - lastIterations[crossing]) *
+            dutyCycles[crossing])
+          lastIterations[crossing] = boundary
+
+      dutyCycles = (numpy.power(1.0 - alpha,
+                                self.lrnIterationIdx - lastIterations) *
+                    dutyCycles)
+      if active:
+        dutyCycles += alpha
+
+    if not readOnly:
+      self._segLastPosDutyCycleIteration[segments] = self.lrnIterationIdx
+      self._segLastPosDutyCycle[segments] = dutyCycles
+
+    return dutyCycles
+
+
+  ################################################################################
+  # TM methods that access segments
+  ################################################################################
+
+  def printCell(self, c, i, onlyActiveSegments=False):
+
+    if len(self.cells[c][i]) > 0:
+      print "Column", c, "Cell", i, ":",
+      print len(self.cells[c][i]), "segment(s)"
+      for j,s in enumerate(self.cells[c][i]):
+        isActive = self.isSegmentActive(s, self.activeState['t'])
+        if not onlyActiveSegments or isActive:
+          isActiveStr = "*" if isActive else " "
+          print "  %sSeg #%-3d" % (isActiveStr, j),
+          self._getSegment(s).printSegment()
+
+
+  def getSegmentOnCell(self, c, i, segIdx):
+    """Return a Segment holding a copy of the state of the segment on cell
+    (c,i) with index segIdx.
+    """
+    return self._getSegment(self.cells[c][i][segIdx])
+
+
+  def computePhase2(self, doLearn=False):
+    """
+    Phase 2 computed for every segment at once. See TM.computePhase2.
+    """
+    activeState = self.activeState['t']
+    end = self._synEnd
+    owners = self._synSegment[:end]
+    connected = ((owners >= 0) &
+                 (activeState[self._synCol[:end], self._synIdx[:end]] != 0) &
+                 (self._synPerm[:end] >= self.connectedPerm))
+    overlaps = numpy.bincount(owners[connected], minlength=self._numSegments)
+    isActive = ((overlaps >= self.activationThreshold) &
+                (self._segCell[:self._numSegments] >= 0))
+    activeSegments = numpy.flatnonzero(isActive)
+    cells = self._segCell[activeSegments]
+
+    self.predictedState['t'].reshape(-1)[cells] = 1
+
+    # Each cell's confidence is the max duty cycle of its active segments
+    confidence = self.confidence['t'].reshape(-1)
+    confidence.fill(0)
+    numpy.maximum.at(confidence, cells,
+                     self._getDutyCycles(activeSegments, readOnly=True))
+
+    if doLearn and len(activeSegments) > 0:
+      self._segTotalActivations[activeSegments] += 1
+      self._segLastActiveIteration[activeSegments] = self.iterationIdx
+
+      # Queue the updates in the same order as TM
+      for cell in numpy.unique(cells):
+        c, i = divmod(int(cell), self.cellsPerColumn)
+        for s in self.cells[c][i]:
+          if isActive[s]:
+            activeUpdate = self.getSegmentActiveSynapses(c,i,s,'t')
+            activeUpdate.phase1Flag = False
+            self.addToSegmentUpdates(c, i, activeUpdate)
+
+
+  def _getConnectedSynapses(self):
+    segments = numpy.flatnonzero(self._segCell[:self._numSegments] >= 0)
+    indices, owners = self._getSynapseIndices(segments)
+    connected = self._synPerm[indices] >= self.connectedPerm
+    indices = indices[connected]
+    return (segments, self._segCell[segments], self._synCol[indices],
+            self._synIdx[indices], owners[connected])
+
+
+  def _getReadOnlyDutyCycles(self, segments):
+    return self._getDutyCycles(numpy.asarray(segments, dtype="int64"),
+                               readOnly=True)
+
+
+  def _recordSegmentActivation(self, s):
+    self._segTotalActivations[s] += 1
+    self._segLastActiveIteration[s] = self.iterationIdx
+
+
+  def _applyGlobalDecay(self):
+    numSegments = self._numSegments
+    decaying = ((self._segCell[:numSegments] >= 0) &
+                (self.iterationIdx - self._segLastActiveIteration[:numSegments]
+                 > self.maxAge))
+    if not decaying.any():
+      return
+
+    owners = self._synSegment[:self._synEnd]
+    synapses = numpy.flatnonzero(
+      (owners >= 0) & decaying[numpy.maximum(owners, 0)])
+    self._synPerm[synapses] -= self.globalDecay
+
+    dead = synapses[self._synPerm[synapses] <= 0]
+    numDead = numpy.bincount(owners[dead], minlength=numSegments)
+    for segment in numpy.flatnonzero(numDead).tolist():
+      c, i = divmod(int(self._segCell[segment]), self.cellsPerColumn)
+      if numDead[segment] == self._segSynLen[segment]:
+        self.cleanUpdatesList(c, i, segment)
+        self._destroySegment(c, i, segment)
+      else:
+        start, end = self._getSynapseRange(segment)
+        self._removeSynapses(segment, self._synPerm[start:end] <= 0)
+
+
+  def trimSegmentsInCell(self, colIdx, cellIdx, segList, minPermanence,
+              minNumSyns):
+    """ See TM.trimSegmentsInCell. segList is a list of segment ids. """
+
+    # Fill in defaults
+    if minPermanence is None:
+      minPermanence = self.connectedPerm
+    if minNumSyns is None:
+      minNumSyns = self.activationThreshold
+
+    # Loop through all segments
+    nSegsRemoved, nSynsRemoved = 0, 0
+    segsToDel = [] # collect and remove segments outside the loop
+    for segment in segList:
+      if self._segCell[segment] < 0 or segment in segsToDel:
+        continue
+
+      start, end = self._getSynapseRange(segment)
+      synsToDel = self._synPerm[start:end] < minPermanence
+      numToDel = int(synsToDel.sum())
+
+      if numToDel == end - start:
+        segsToDel.append(segment) # will remove the whole segment
+      else:
+        if numToDel > 0:
+          self._removeSynapses(segment, synsToDel)
+          nSynsRemoved += numToDel
+        if end - start - numToDel < minNumSyns:
+          segsToDel.append(segment)
+
+    # Remove segments that don't have enough synapses and also take them
+    # out of the segment update list, if they are in there
+    nSegsRemoved += len(segsToDel)
+    for seg in segsToDel: # remove some segments of this cell
+      self.cleanUpdatesList(colIdx, cellIdx, seg)
+      nSynsRemoved += int(self._segSynLen[seg])
+      self._destroySegment(colIdx, cellIdx, seg)
+
+    return nSegsRemoved, nSynsRemoved
+
+
+  def getSegmentActivityLevel(self, seg, activeState, connectedSynapsesOnly =False):
+    return int(self._getSegmentActivity(numpy.array([seg]), activeState,
+                                        connectedSynapsesOnly)[0])
+
+
+  def isSegmentActive(self, seg, activeState):
+    return (self.getSegmentActivityLevel(seg, activeState, True) >=
+            self.activationThreshold)
+
+
+  def getSegmentActiveSynapses(self, c,i,s, timeStep, newSynapses =False):
+    """ See TM.getSegmentActiveSynapses. s is a segment id or None. """
+
+    activeSynapses = []
+    activeState = self.activeState[timeStep]
+
+    if s is not None: # s can be None, if adding a new segment
+      start, end = self._getSynapseRange(s)
+      activeSynapses = numpy.flatnonzero(
+        activeState[self._synCol[start:end], self._synIdx[start:end]]).tolist()
+
+    if newSynapses: # add a few more synapses
+
+      nSynapsesToAdd = self.newSynapseCount - len(activeSynapses)
+
+      # Here we add *pairs* (colIdx, cellIdx) to activeSynapses
+      activeSynapses += self.chooseCellsToLearnFrom(c,i,s, nSynapsesToAdd, timeStep)
+
+    return TM.SegmentUpdate(c, i, s, activeSynapses)
+
+
+  def getActiveSegment(self, c, i, timeStep):
+    """ See TM.getActiveSegment. Returns a segment id or None. """
+    segments = numpy.array(self.cells[c][i], dtype="int64")
+    activity = self._getSegmentActivity(segments, self.activeState[timeStep],
+                                        connectedSynapsesOnly=True)
+    return self._getLastBest(segments, activity, self.activationThreshold)
+
+
+  def _getLastBest(self, segments, activity, threshold):
+    """Return the last of the segments with the highest activity, or None if
+    that activity is below threshold."""
+    if len(segments) == 0 or activity.max() < threshold:
+      return None
+    which = len(activity) - 1 - numpy.argmax(activity[::-1] == activity.max())
+    return int(segments[which])
+
+
+  def _getSynapseSources(self, s):
+    start, end = self._getSynapseRange(s)
+    return set(zip(self._synCol[start:end].tolist(),
+                   self._synIdx[start:end].tolist()))
+
+
+  def getBestMatchingCell(self, c, activeState):
+    """See TM.getBestMatchingCell. Every segment in the column is evaluated in
+    one pass. Returns the cell index and segment id, or (None, None).
+    """
+    cellSegments = self.cells[c]
+    segments = numpy.array([s for segs in cellSegments for s in segs],
+                           dtype="int64")
+    if len(segments) == 0:
+      return (None, None)
+    cellOfSegment = numpy.repeat(numpy.arange(self.cellsPerColumn),
+                                 [len(segs) for segs in cellSegments])
+    activity = self._getSegmentActivity(segments, activeState,
+                                        connectedSynapsesOnly=False)
+
+    # The best cell is the last one with the highest segment activity, and its
+    # segment is the first one with that activity
+    maxSegActivity = numpy.full(self.cellsPerColumn, -1, dtype="int64")
+    numpy.maximum.at(maxSegActivity, cellOfSegment, activity)
+    bestActivityInCol = maxSegActivity.max()
+    if bestActivityInCol < self.minThreshold:
+      return (None, None)
+    bestCellInCol = (self.cellsPerColumn - 1 -
+                     numpy.argmax(maxSegActivity[::-1] == bestActivityInCol))
+    bestSegment = segments[numpy.argmax((cellOfSegment == bestCellInCol) &
+                                        (activity == bestActivityInCol))]
+
+    if self.verbosity >= 6:
+      print "Best Matching Cell In Col: ", bestCellInCol
+    return int(bestCellInCol), int(bestSegment)
+
+
+  def getBestMatchingSegment(self, c, i, activeState):
+    """ See TM.getBestMatchingSegment. Returns a segment id or None. """
+    segments = numpy.array(self.cells[c][i], dtype="int64")
+    activity = self._getSegmentActivity(segments, activeState,
+                                        connectedSynapsesOnly=False)
+    return self._getLastBest(segments, activity, self.minThreshold)
+
+
+  def adaptSegment(self, segUpdate, positiveReinforcement):
+    """ See TM.adaptSegment. segUpdate.segment is a segment id or None. """
+
+    trimSegment = False
+    c, i, segment = segUpdate.columnIdx, segUpdate.cellIdx, segUpdate.segment
+    activeSynapses = segUpdate.activeSynapses
+    synToUpdate = set([syn for syn in activeSynapses if type(syn) == int])
+
+    if segment is not None: # modify an existing segment
+      start, end = self._getSynapseRange(segment)
+      isActive = numpy.zeros(end - start, dtype="bool")
+      isActive[[syn for syn in synToUpdate if syn < end - start]] = True
+      perms = self._synPerm[start:end]
+
+      if positiveReinforcement:
+
+        if self.verbosity >= 4:
+          print "Reinforcing segment for cell[%d,%d]" %(c,i),
+          self._getSegment(segment).printSegment()
+
+        # Catch up from the first tier before counting this activation
+        if (self._segLastPosDutyCycleIteration[segment] <
+            Segment.dutyCycleTiers[1]):
+          self._getDutyCycles(numpy.array([segment]))
+        self._segPositiveActivations[segment] += 1
+        self._getDutyCycles(numpy.array([segment]), active=True)
+
+        # Decrement synapses that are not active, increment active synapses
+        perms[~isActive] -= self.permanenceDec
+        reachedZero = ~isActive & (perms <= 0)
+        trimSegment = reachedZero.any()
+        perms[reachedZero] = 0
+
+        perms[isActive] += self.permanenceInc
+        perms[isActive & (perms > self.permanenceMax)] = self.permanenceMax
+
+        # Finally, create new synapses if needed
+        synsToAdd = [syn for syn in activeSynapses if type(syn) != int]
+        self._addSynapses(segment, [syn[0] for syn in synsToAdd],
+                          [syn[1] for syn in synsToAdd], self.initialPerm)
+
+        if self.verbosity >= 4:
+          print "            after",
+          self._getSegment(segment).printSegment()
+
+      else: # positiveReinforcement is False
+
+        if self.verbosity >= 4:
+          print "Negatively Reinforcing segment for cell[%d,%d]" % (c,i),
+          self._getSegment(segment).printSegment()
+
+        self._getDutyCycles(numpy.array([segment]), active=True)
+
+        # We decrement all the "active" that were passed in
+        perms[isActive] -= self.permanenceDec
+        reachedZero = isActive & (perms <= 0)
+        trimSegment = reachedZero.any()
+        perms[reachedZero] = 0
+
+        if self.verbosity >= 4:
+          print "            after",
+          self._getSegment(segment).printSegment()
+
+    else: # segment is None: create a new segment
+
+      newSegment = self._createSegment(c, i, segUpdate.sequenceSegment)
+      self._addSynapses(newSegment, [syn[0] for syn in activeSynapses],
+                        [syn[1] for syn in activeSynapses], self.initialPerm)
+
+      if self.verbosity >= 3:
+        print "New segment for cell[%d,%d]" %(c,i),
+        self._getSegment(newSegment).printSegment()
+
+    return trimSegment
+
+
+  def getSegmentInfo(self, collectActiveData = False):
+    """ See TM.getSegmentInfo. """
+
+    segments = numpy.flatnonzero(self._segCell[:self._numSegments] >= 0)
+    indices, owners = self._getSynapseIndices(segments)
+    lengths = self._segSynLen[segments]
+
+    def distribution(values):
+      values, counts = numpy.unique(values, return_counts=True)
+      return dict(zip(values.tolist(), counts.tolist()))
+
+    nSegments = len(segments)
+    nSynapses = len(indices)
+    distSegSizes = distribution(lengths)
+    distNSegsPerCell = distribution(
+      [len(segs) for cellSegments in self.cells for segs in cellSegments
+       if len(segs) > 0])
+    distPermValues = distribution(
+      (self._synPerm[indices].astype("float64") * 10).astype("int64"))
+
+    numAgeBuckets = 20
+    distAges = []
+    ageBucketSize = int((self.lrnIterationIdx+20) / 20)
+    for i in range(numAgeBuckets):
+      distAges.append(['%d-%d' % (i*ageBucketSize, (i+1)*ageBucketSize-1), 0])
+    ages = self.lrnIterationIdx - self._segLastActiveIteration[segments]
+    for ageBucket, count in distribution(ages // ageBucketSize).iteritems():
+      distAges[ageBucket][1] += count
+
+    nActiveSegs, nActiveSynapses = 0, 0
+    if collectActiveData:
+      activeState = self.activeState['t']
+      nActiveSegs = int((self._getSegmentActivity(
+        segments, activeState, connectedSynapsesOnly=True) >=
+                         self.activationThreshold).sum())
+      nActiveSynapses = int((activeState[self._synCol[indices],
+                                         self._synIdx[indices]] == 1).sum())
+
+    return (nSegments, nSynapses, nActiveSegs, nActiveSynapses,
+            distSegSizes, distNSegsPerCell, distPermValues, distAges)
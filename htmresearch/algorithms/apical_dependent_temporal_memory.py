@@ -24,7 +24,8 @@
 import numpy as np
 
 from htmresearch.support import numpy_helpers as np2
-from nupic.bindings.math import Random, SparseMatrixConnections
+from htmresearch.algorithms.csr_connections import (createConnections,
+                                                     createRandom)
 
 
 
@@ -63,7 +64,8 @@ class ApicalDependentTemporalMemory(object):
                basalPredictedSegmentDecrement=0.0,
                apicalPredictedSegmentDecrement=0.0,
                maxSynapsesPerSegment=-1,
-               seed=42):
+               seed=42,
+               connectionsImplementation="cpp"):
     """
     @param columnCount (int)
     The number of minicolumns
@@ -117,6 +119,10 @@ class ApicalDependentTemporalMemory(object):
 
     @param seed (int)
     Seed for the random number generator.
+
+    @param connectionsImplementation (str)
+    "cpp" to store synapses in nupic's SparseMatrixConnections, "numpy" to use
+    the pure NumPy CSRConnections.
     """
 
     self.columnCount = columnCount
@@ -132,13 +138,15 @@ class ApicalDependentTemporalMemory(object):
     self.activationThreshold = activationThreshold
     self.reducedBasalThreshold = reducedBasalThreshold
     self.maxSynapsesPerSegment = maxSynapsesPerSegment
-    self.basalConnections = SparseMatrixConnections(columnCount*cellsPerColumn,
-                                                    basalInputSize)
+    self.basalConnections = createConnections(columnCount*cellsPerColumn,
+                                              basalInputSize,
+                                              connectionsImplementation)
     self.disableApicalDependence = False
 
-    self.apicalConnections = SparseMatrixConnections(columnCount*cellsPerColumn,
-                                                     apicalInputSize)
-    self.rng = Random(seed)
+    self.apicalConnections = createConnections(columnCount*cellsPerColumn,
+                                               apicalInputSize,
+                                               connectionsImplementation)
+    self.rng = createRandom(seed, connectionsImplementation)
     self.activeCells = np.empty(0, dtype="uint32")
     self.winnerCells = np.empty(0, dtype="uint32")
     self.predictedCells = np.empty(0, dtype="uint32")
@@ -982,7 +990,8 @@ class ApicalDependentSequenceMemory(ApicalDependentTemporalMemory):
                basalPredictedSegmentDecrement=0.0,
                apicalPredictedSegmentDecrement=0.0,
                maxSynapsesPerSegment=-1,
-               seed=42):
+               seed=42,
+               connectionsImplementation="cpp"):
     params = {
       "columnCount": columnCount,
       "basalInputSize": columnCount * cellsPerColumn,
@@ -1000,6 +1009,7 @@ class ApicalDependentSequenceMemory(ApicalDependentTemporalMemory):
       "apicalPredictedSegmentDecrement": apicalPredictedSegmentDecrement,
       "maxSynapsesPerSegment": maxSynapsesPerSegment,
       "seed": seed,
+      "connectionsImplementation": connectionsImplementation,
     }
 
     super(ApicalDependentSequenceMemory, self).__init__(**params)
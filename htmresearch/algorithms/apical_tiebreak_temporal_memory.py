@@ -22,9 +22,11 @@
 """An implementation of TemporalMemory"""
 
 import numpy as np
+import scipy.sparse
 
 from htmresearch.support import numpy_helpers as np2
-from nupic.bindings.math import Random, SparseMatrixConnections
+from htmresearch.algorithms.csr_connections import (createConnections,
+                                                     createRandom)
 
 
 
@@ -68,7 +70,8 @@ class ApicalTiebreakTemporalMemory(object):
                basalPredictedSegmentDecrement=0.0,
                apicalPredictedSegmentDecrement=0.0,
                maxSynapsesPerSegment=-1,
-               seed=42):
+               seed=42,
+               connectionsImplementation="cpp"):
     """
     @param columnCount (int)
     The number of minicolumns
@@ -122,6 +125,10 @@ class ApicalTiebreakTemporalMemory(object):
 
     @param seed (int)
     Seed for the random number generator.
+
+    @param connectionsImplementation (str)
+    "cpp" to store synapses in nupic's SparseMatrixConnections, "numpy" to use
+    the pure NumPy CSRConnections.
     """
 
     self.columnCount = columnCount
@@ -138,11 +145,13 @@ class ApicalTiebreakTemporalMemory(object):
     self.activationThreshold = activationThreshold
     self.maxSynapsesPerSegment = maxSynapsesPerSegment
 
-    self.basalConnections = SparseMatrixConnections(columnCount*cellsPerColumn,
-                                                    basalInputSize)
-    self.apicalConnections = SparseMatrixConnections(columnCount*cellsPerColumn,
-                                                     apicalInputSize)
-    self.rng = Random(seed)
+    self.basalConnections = createConnections(columnCount*cellsPerColumn,
+                                              basalInputSize,
+                                              connectionsImplementation)
+    self.apicalConnections = createConnections(columnCount*cellsPerColumn,
+                                               apicalInputSize,
+                                               connectionsImplementation)
+    self.rng = createRandom(seed, connectionsImplementation)
     self.activeCells = np.empty(0, dtype="uint32")
     self.winnerCells = np.empty(0, dtype="uint32")
     self.predictedCells = np.empty(0, dtype="uint32")
@@ -157,6 +166,11 @@ class ApicalTiebreakTemporalMemory(object):
     self.useApicalTiebreak=True
     self.useApicalModulationBasalThreshold=True
 
+    # Snapshot of the connected synapses, used by the batched inference methods.
+    # It's discarded whenever learning might change the connections, or when
+    # the connected permanence changes.
+    self._connectedMatrices = None
+
 
   def reset(self):
     """
@@ -277,6 +291,8 @@ class ApicalTiebreakTemporalMemory(object):
 
     # Learn
     if learn:
+      self._connectedMatrices = None
+
       # Learn on existing segments
       for learningSegments in (learningActiveBasalSegments,
                                learningMatchingBasalSegments):
@@ -761,6 +777,234 @@ class ApicalTiebreakTemporalMemory(object):
     return candidateCells[onePerColumnFilter]
 
 
+  def depolarizeCellsBatch(self, basalInputs, apicalInputs):
+    """
+    Calculate predictions for many independent streams in one pass. This is the
+    batched, inference-only equivalent of calling 'depolarizeCells' with
+    learn=False once per stream. It doesn't modify the TM's state.
+
+    The overlaps of every segment with every stream are computed with one
+    sparse matrix product over a snapshot of the connected synapses. The
+    snapshot is reused until the TM learns again or its connected permanence
+    changes.
+
+    @param basalInputs (list of numpy arrays, or 2D numpy array)
+    The active basal input bits of each stream
+
+    @param apicalInputs (list of numpy arrays, or 2D numpy array)
+    The active apical input bits of each stream
+
+    @return (list of numpy arrays)
+    The predicted cells of each stream, sorted
+    """
+    numStreams = len(basalInputs)
+    if len(apicalInputs) != numStreams:
+      raise ValueError("Got basal input for %d streams and apical input for %d "
+                       "streams" % (numStreams, len(apicalInputs)))
+
+    if self._connectedMatrices is None:
+      self._connectedMatrices = (
+        self._getConnectedMatrix(self.basalConnections,
+                                 self.connectedPermanence),
+        self._getConnectedMatrix(self.apicalConnections,
+                                 self.connectedPermanence))
+    basalMatrix, apicalMatrix = self._connectedMatrices
+
+    # Throughout the batch, cells are identified by
+    #   stream * numberOfCells() + cell
+    # so that each stream behaves like a separate slice of one large layer.
+    cellCount = self.numberOfCells()
+
+    apicalStreams, activeApicalSegments = self._calculateSegmentActivityBatch(
+      apicalMatrix, apicalInputs, self.activationThreshold)
+    cellsForApicalSegments = (
+      apicalStreams * cellCount +
+      self.apicalConnections.mapSegmentsToCells(activeApicalSegments))
+
+    (basalStreams,
+     activeBasalSegments,
+     basalOverlaps) = self._calculateSegmentActivityBatch(
+       basalMatrix, basalInputs,
+       min(self.activationThreshold, self.reducedBasalThreshold),
+       returnOverlaps=True)
+    cellsForBasalSegments = (
+      basalStreams * cellCount +
+      self.basalConnections.mapSegmentsToCells(activeBasalSegments))
+
+    # Active apical segments lower the activation threshold for basal segments.
+    if (self.useApicalModulationBasalThreshold and
+        self.reducedBasalThreshold != self.activationThreshold):
+      activeMask = ((basalOverlaps >= self.activationThreshold) |
+                    np.in1d(cellsForBasalSegments, cellsForApicalSegments))
+    else:
+      activeMask = basalOverlaps >= self.activationThreshold
+    cellsForBasalSegments = cellsForBasalSegments[activeMask]
+
+    if self.useApicalTiebreak:
+      fullyDepolarizedCells = np.intersect1d(cellsForBasalSegments,
+                                             cellsForApicalSegments)
+      partlyDepolarizedCells = np.setdiff1d(cellsForBasalSegments,
+                                            fullyDepolarizedCells)
+      inhibitedMask = np.in1d(partlyDepolarizedCells // self.cellsPerColumn,
+                              fullyDepolarizedCells // self.cellsPerColumn)
+      predictedCells = np.union1d(fullyDepolarizedCells,
+                                  partlyDepolarizedCells[~inhibitedMask])
+    else:
+      predictedCells = np.unique(cellsForBasalSegments)
+
+    return self._splitByStream(predictedCells, cellCount, numStreams)
+
+
+  def activateCellsBatch(self, activeColumns, predictedCells):
+    """
+    Activate cells for many independent streams in one pass. This is the
+    batched, inference-only equivalent of calling 'activateCells' with
+    learn=False once per stream. It doesn't modify the TM's state.
+
+    @param activeColumns (list of numpy arrays, or 2D numpy array)
+    The active columns of each stream
+
+    @param predictedCells (list of numpy arrays)
+    The predicted cells of each stream, e.g. from 'depolarizeCellsBatch'
+
+    @return (tuple)
+    - activeCells (list of numpy arrays)
+      The active cells of each stream, sorted
+
+    - predictedActiveCells (list of numpy arrays)
+      The active cells of each stream that were correctly predicted, sorted
+    """
+    numStreams = len(activeColumns)
+    if len(predictedCells) != numStreams:
+      raise ValueError("Got active columns for %d streams and predicted cells "
+                       "for %d streams" % (numStreams, len(predictedCells)))
+
+    cellCount = self.numberOfCells()
+    allActiveColumns = self._concatenateByStream(activeColumns,
+                                                 self.columnCount)
+    allPredictedCells = self._concatenateByStream(predictedCells, cellCount)
+
+    (correctPredictedCells,
+     burstingColumns) = np2.setCompare(
+       allPredictedCells, allActiveColumns,
+       allPredictedCells // self.cellsPerColumn, rightMinusLeft=True)
+    activeCells = np.union1d(
+      correctPredictedCells,
+      np2.getAllCellsInColumns(burstingColumns, self.cellsPerColumn))
+
+    return (self._splitByStream(activeCells, cellCount, numStreams),
+            self._splitByStream(np.unique(correctPredictedCells), cellCount,
+                                numStreams))
+
+
+  @staticmethod
+  def _getConnectedMatrix(connections, connectedPermanence):
+    """
+    Copy the connected synapses into a scipy CSR matrix with one row per
+    segment and one column per presynaptic cell.
+
+    @param connections (SparseMatrixConnections)
+    @param connectedPermanence (float)
+
+    @return (scipy.sparse.csr_matrix)
+    """
+    matrix = connections.matrix
+    numSegments = matrix.nRows()
+
+    presynapticCellsBySegment = []
+    counts = np.zeros(numSegments, dtype="int64")
+    for segment in xrange(numSegments):
+      presynapticCells, permanences = matrix.rowNonZeros(segment)
+      connected = np.asarray(presynapticCells)[
+        np.asarray(permanences) >= connectedPermanence]
+      presynapticCellsBySegment.append(connected)
+      counts[segment] = len(connected)
+
+    indptr = np.zeros(numSegments + 1, dtype="int64")
+    np.cumsum(counts, out=indptr[1:])
+    if numSegments > 0:
+      indices = np.concatenate(presynapticCellsBySegment)
+    else:
+      indices = np.empty(0, dtype="int64")
+
+    return scipy.sparse.csr_matrix(
+      (np.ones(len(indices), dtype="int32"), indices, indptr),
+      shape=(numSegments, matrix.nCols()))
+
+
+  @staticmethod
+  def _calculateSegmentActivityBatch(matrix, activeInputs, threshold,
+                                     returnOverlaps=False):
+    """
+    Calculate the number of active connected synapses on each segment for each
+    stream, and return the (stream, segment) pairs that reach the threshold.
+
+    @param matrix (scipy.sparse.csr_matrix)
+    Connected synapses, from _getConnectedMatrix
+
+    @param activeInputs (list of numpy arrays)
+    The active input bits of each stream
+
+    @return (tuple)
+    - streams (numpy array)
+    - segments (numpy array)
+    - overlaps (numpy array), only if returnOverlaps is True
+    """
+    lengths = np.array([len(inputs) for inputs in activeInputs], dtype="int64")
+    indptr = np.zeros(len(activeInputs) + 1, dtype="int64")
+    np.cumsum(lengths, out=indptr[1:])
+    if lengths.sum() > 0:
+      indices = np.concatenate([np.asarray(inputs, dtype="int64")
+                                for inputs in activeInputs])
+    else:
+      indices = np.empty(0, dtype="int64")
+
+    # One column per stream.
+    inputMatrix = scipy.sparse.csc_matrix(
+      (np.ones(len(indices), dtype="int32"), indices, indptr),
+      shape=(matrix.shape[1], len(activeInputs)))
+
+    overlaps = (matrix * inputMatrix).tocoo()
+    aboveThreshold = overlaps.data >= threshold
+
+    streams = overlaps.col[aboveThreshold].astype("int64")
+    segments = overlaps.row[aboveThreshold].astype("uint32")
+
+    if returnOverlaps:
+      return streams, segments, overlaps.data[aboveThreshold]
+    else:
+      return streams, segments
+
+
+  @staticmethod
+  def _concatenateByStream(arrays, size):
+    """
+    Concatenate per-stream arrays, offsetting each stream's values by
+    stream * size.
+    """
+    lengths = [len(a) for a in arrays]
+    if sum(lengths) == 0:
+      return np.empty(0, dtype="int64")
+
+    offsets = np.repeat(np.arange(len(arrays), dtype="int64") * size, lengths)
+    return np.concatenate([np.asarray(a, dtype="int64")
+                           for a in arrays]) + offsets
+
+
+  @staticmethod
+  def _splitByStream(values, size, numStreams):
+    """
+    Inverse of _concatenateByStream. The values must be sorted.
+    """
+    if numStreams == 0:
+      return []
+
+    boundaries = np.searchsorted(values,
+                                 np.arange(1, numStreams, dtype="int64") * size)
+    return [(chunk - stream*size).astype("uint32")
+            for stream, chunk in enumerate(np.split(values, boundaries))]
+
+
   def getActiveCells(self):
     """
     @return (numpy array)
@@ -985,6 +1229,7 @@ class ApicalTiebreakTemporalMemory(object):
     @param connectedPermanence (float) The connected permanence.
     """
     self.connectedPermanence = connectedPermanence
+    self._connectedMatrices = None
 
 
   def getUseApicalTieBreak(self):
@@ -1073,6 +1318,38 @@ class ApicalTiebreakPairMemory(ApicalTiebreakTemporalMemory):
                        basalGrowthCandidates, apicalGrowthCandidates, learn)
 
 
+  def computeBatch(self, activeColumns, basalInputs, apicalInputs=None):
+    """
+    Perform one inference timestep for many independent streams in one pass.
+    Equivalent to calling 'compute' with learn=False once per stream on copies
+    of this TM, but without touching this TM's state.
+
+    @param activeColumns (list of numpy arrays, or 2D numpy array)
+    The active columns of each stream
+
+    @param basalInputs (list of numpy arrays, or 2D numpy array)
+    The active basal input bits of each stream
+
+    @param apicalInputs (list of numpy arrays, 2D numpy array, or None)
+    The active apical input bits of each stream. If None, there's no apical
+    input.
+
+    @return (tuple)
+    - activeCells (list of numpy arrays)
+      The active cells of each stream
+
+    - predictedCells (list of numpy arrays)
+      The cells that were predicted in each stream
+    """
+    if apicalInputs is None:
+      apicalInputs = [()] * len(basalInputs)
+
+    predictedCells = self.depolarizeCellsBatch(basalInputs, apicalInputs)
+    activeCells, _ = self.activateCellsBatch(activeColumns, predictedCells)
+
+    return activeCells, predictedCells
+
+
   def getPredictedCells(self):
     """
     @return (numpy array)
@@ -1123,7 +1400,8 @@ class ApicalTiebreakSequenceMemory(ApicalTiebreakTemporalMemory):
                basalPredictedSegmentDecrement=0.0,
                apicalPredictedSegmentDecrement=0.0,
                maxSynapsesPerSegment=-1,
-               seed=42):
+               seed=42,
+               connectionsImplementation="cpp"):
     params = {
       "columnCount": columnCount,
       "basalInputSize": columnCount * cellsPerColumn,
@@ -1141,6 +1419,7 @@ class ApicalTiebreakSequenceMemory(ApicalTiebreakTemporalMemory):
       "apicalPredictedSegmentDecrement": apicalPredictedSegmentDecrement,
       "maxSynapsesPerSegment": maxSynapsesPerSegment,
       "seed": seed,
+      "connectionsImplementation": connectionsImplementation,
     }
 
     super(ApicalTiebreakSequenceMemory, self).__init__(**params)
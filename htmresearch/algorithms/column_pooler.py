@@ -189,6 +189,9 @@ class ColumnPooler(object):
 
     self.useInertia=True
 
+    # Scratch space for _computeInferenceMode, reused on every time step.
+    self._numActiveSegmentsByCell = numpy.empty(cellCount, dtype="int")
+
 
   def compute(self, feedforwardInput=(), lateralInputs=(),
               feedforwardGrowthCandidates=None, learn=True,
@@ -249,6 +252,56 @@ class ColumnPooler(object):
                                   feedforwardGrowthCandidates)
 
 
+  def learnBatch(self, objects):
+    """
+    Learn a list of objects in a single call, without a compute() round-trip
+    per sensation.
+
+    This is equivalent to calling compute(..., learn=True) on every sensation
+    of an object, followed by reset(), for each object in turn. The resulting
+    permanences and the random number sequence are identical. The pooler is
+    reset when this method returns.
+
+    Parameters:
+    ----------------------------
+    @param  objects (list)
+            For each object, a list of sensations. Each sensation is a tuple
+            (feedforwardInput, lateralInputs, feedforwardGrowthCandidates), as
+            they would be passed to compute(). feedforwardGrowthCandidates may
+            be None.
+
+    @return (list of numpy arrays)
+            The SDR learned for each object
+    """
+    if self.onlineLearning:
+      raise ValueError("learnBatch only supports offline learning")
+
+    representations = []
+
+    for sensations in objects:
+      self.reset()
+
+      for (feedforwardInput, lateralInputs,
+           feedforwardGrowthCandidates) in sensations:
+        feedforwardInput = numpy.asarray(feedforwardInput, dtype="uint32")
+        lateralInputs = [numpy.asarray(lateralInput, dtype="uint32")
+                         for lateralInput in lateralInputs]
+        if feedforwardGrowthCandidates is None:
+          feedforwardGrowthCandidates = feedforwardInput
+        else:
+          feedforwardGrowthCandidates = numpy.asarray(
+            feedforwardGrowthCandidates, dtype="uint32")
+
+        self._computeLearningMode(feedforwardInput, lateralInputs,
+                                  feedforwardGrowthCandidates)
+
+      representations.append(self.activeCells)
+
+    self.reset()
+
+    return representations
+
+
   def _computeLearningMode(self, feedforwardInput, lateralInputs,
                                  feedforwardGrowthCandidates):
     """
@@ -345,7 +398,8 @@ class ColumnPooler(object):
       overlaps >= self.minThresholdProximal)[0]
 
     # Calculate the number of active segments on each cell
-    numActiveSegmentsByCell = numpy.zeros(self.cellCount, dtype="int")
+    numActiveSegmentsByCell = self._numActiveSegmentsByCell
+    numActiveSegmentsByCell.fill(0)
     overlaps = self.internalDistalPermanences.rightVecSumAtNZGteThresholdSparse(
       prevActiveCells, self.connectedPermanenceDistal)
     numActiveSegmentsByCell[overlaps >= self.activationThresholdDistal] += 1
@@ -354,24 +408,17 @@ class ColumnPooler(object):
         lateralInput, self.connectedPermanenceDistal)
       numActiveSegmentsByCell[overlaps >= self.activationThresholdDistal] += 1
 
-    chosenCells = []
-
     # First, activate the FF-supported cells that have the highest number of
-    # lateral active segments (as long as it's not 0)
-    if len(feedforwardSupportedCells) == 0:
-      pass
-    else:
-      numActiveSegsForFFSuppCells = numActiveSegmentsByCell[
-        feedforwardSupportedCells]
-
-      # This loop will select the FF-supported AND laterally-active cells, in
-      # order of descending lateral activation, until we exceed the sdrSize
-      # quorum - but will exclude cells with 0 lateral active segments.
-      ttop = numpy.max(numActiveSegsForFFSuppCells)
-      while ttop > 0 and len(chosenCells) < self.sdrSize:
-        chosenCells = numpy.union1d(chosenCells,
-                    feedforwardSupportedCells[numActiveSegsForFFSuppCells >= ttop])
-        ttop -= 1
+    # lateral active segments (as long as it's not 0). Cells are selected in
+    # groups of equal lateral activation, in descending order, until we reach
+    # the sdrSize quorum.
+    numActiveSegsForFFSuppCells = numActiveSegmentsByCell[
+      feedforwardSupportedCells]
+    laterallyActive = numActiveSegsForFFSuppCells > 0
+    candidates = feedforwardSupportedCells[laterallyActive]
+    chosenCells = candidates[
+      _selectTopGroups(numActiveSegsForFFSuppCells[laterallyActive],
+                       self.sdrSize)]
 
     # If we haven't filled the sdrSize quorum, add in inertial cells.
     if len(chosenCells) < self.sdrSize:
@@ -384,21 +431,18 @@ class ColumnPooler(object):
           # segments (this really helps).  We then activate them in order of
           # descending lateral activation.
           sortIndices = numpy.argsort(numActiveSegsForPrevCells)[::-1]
-          prevCells = prevCells[sortIndices]
-          numActiveSegsForPrevCells = numActiveSegsForPrevCells[sortIndices]
 
           # We use inertiaFactor to limit the number of previously-active cells
           # which can become active, forcing decay even if we are below quota.
-          prevCells = prevCells[:inertialCap]
-          numActiveSegsForPrevCells = numActiveSegsForPrevCells[:inertialCap]
+          sortIndices = sortIndices[:inertialCap]
+          prevCells = prevCells[sortIndices]
+          numActiveSegsForPrevCells = numActiveSegsForPrevCells[sortIndices]
 
           # Activate groups of previously active cells by order of their lateral
           # support until we either meet quota or run out of cells.
-          ttop = numpy.max(numActiveSegsForPrevCells)
-          while ttop >= 0 and len(chosenCells) < self.sdrSize:
-            chosenCells = numpy.union1d(chosenCells,
-                        prevCells[numActiveSegsForPrevCells >= ttop])
-            ttop -= 1
+          selected = _selectTopGroups(numActiveSegsForPrevCells,
+                                      self.sdrSize - len(chosenCells))
+          chosenCells = numpy.append(chosenCells, prevCells[selected])
 
     # If we haven't filled the sdrSize quorum, add cells that have feedforward
     # support and no lateral support.
@@ -632,8 +676,12 @@ class ColumnPooler(object):
       maxNewByCell = numpy.empty(len(activeCells), dtype="int32")
       numpy.subtract(sampleSize, existingSynapseCounts, out=maxNewByCell)
 
-      permanences.setRandomZerosOnOuter(
-        activeCells, growthCandidateInput, maxNewByCell, initialPermanence, rng)
+      # Growing zero synapses doesn't touch the matrix or the rng, so skip the
+      # call when no cell has room for new synapses.
+      if len(growthCandidateInput) > 0 and numpy.any(maxNewByCell > 0):
+        permanences.setRandomZerosOnOuter(
+          activeCells, growthCandidateInput, maxNewByCell, initialPermanence,
+          rng)
 
 
 #
@@ -669,6 +717,26 @@ def _sample(rng, arr, k):
   return selected
 
 
+def _selectTopGroups(values, k):
+  """
+  Select the elements with the highest values, one group of equal values at a
+  time, until at least k elements are selected. Equivalent to lowering a
+  threshold from max(values) one step at a time until at least k values are
+  above it.
+
+  @param values (numpy array)
+  @param k (int)
+
+  @return (numpy array)
+  A boolean mask of the selected elements
+  """
+  if len(values) <= k:
+    return numpy.ones(len(values), dtype="bool")
+
+  kthLargest = numpy.partition(values, len(values) - k)[len(values) - k]
+  return values >= kthLargest
+
+
 def _countWhereGreaterEqualInRows(sparseMatrix, rows, threshold):
   """
   Like countWhereGreaterOrEqual, but for an arbitrary selection of rows, and
@@ -0,0 +1,671 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+A pure NumPy implementation of nupic.bindings.math.SparseMatrixConnections.
+"""
+
+import numpy as np
+
+
+# Synapses with a permanence at or below this value are destroyed. This mimics
+# the way nupic's SparseMatrix drops near-zero values.
+EPSILON = 0.000001
+
+
+
+class CSRConnections(object):
+  """
+  A drop-in replacement for nupic's SparseMatrixConnections that doesn't depend
+  on nupic.bindings.
+
+  Synapses are stored in compressed sparse row (CSR) layout, one row per
+  segment, in three contiguous arrays: presynaptic cell, permanence (float32)
+  and owning segment. Each segment owns a contiguous slice of these arrays,
+  sorted by presynaptic cell. The slice may have spare capacity at its end so
+  that new synapses can usually be grown in place. When a segment outgrows its
+  slice it's moved to the end of the arrays, and the abandoned space is
+  reclaimed the next time the arrays need to grow.
+
+  Unused slots point at the nonexistent presynaptic cell 'numInputs', so they
+  never match any input.
+  """
+
+  def __init__(self, numCells, numInputs):
+    """
+    @param numCells (int)
+    The number of cells that can own segments
+
+    @param numInputs (int)
+    The number of presynaptic cells
+    """
+    self.numCells = numCells
+    self.numInputs = numInputs
+
+    # Segments
+    self._numSegments = 0
+    self._segmentCells = np.empty(0, dtype="uint32")
+    self._segmentStarts = np.empty(0, dtype="int64")
+    self._segmentLengths = np.empty(0, dtype="int32")
+    self._segmentCapacities = np.empty(0, dtype="int32")
+    self._segmentCountsByCell = np.zeros(numCells, dtype="int32")
+
+    # Synapses
+    self._synapsesEnd = 0
+    self._abandonedSlots = 0
+    self._presynapticCells = np.empty(0, dtype="uint32")
+    self._permanences = np.empty(0, dtype="float32")
+    self._synapseSegments = np.empty(0, dtype="uint32")
+
+    self.matrix = CSRMatrixView(self)
+
+
+  def nCells(self):
+    return self.numCells
+
+
+  def nSegments(self):
+    return self._numSegments
+
+
+  def createSegments(self, cells):
+    """
+    Create a segment on each of the specified cells.
+
+    @param cells (numpy array)
+    The cells that should get new segments, one segment per entry
+
+    @return (numpy array)
+    The new segments
+    """
+    cells = np.asarray(cells, dtype="uint32")
+
+    firstSegment = self._numSegments
+    self._reserveSegments(len(cells))
+    newSegments = np.arange(firstSegment, firstSegment + len(cells),
+                            dtype="uint32")
+
+    self._segmentCells[newSegments] = cells
+    self._segmentStarts[newSegments] = self._synapsesEnd
+    self._segmentLengths[newSegments] = 0
+    self._segmentCapacities[newSegments] = 0
+    self._numSegments += len(cells)
+
+    np.add.at(self._segmentCountsByCell, cells, 1)
+
+    return newSegments
+
+
+  def computeActivity(self, activeInput, permanenceThreshold=None):
+    """
+    Calculate the number of active synapses on each segment.
+
+    @param activeInput (numpy array)
+    The active presynaptic cells
+
+    @param permanenceThreshold (float or None)
+    If specified, only count synapses with at least this permanence.
+
+    @return (numpy array)
+    The number of active synapses on each segment
+    """
+    end = self._synapsesEnd
+
+    activeSynapses = self._getInputMask(activeInput)[
+      self._presynapticCells[:end]]
+    if permanenceThreshold is not None:
+      activeSynapses &= self._permanences[:end] >= permanenceThreshold
+
+    return np.bincount(self._synapseSegments[:end][activeSynapses],
+                       minlength=self._numSegments).astype("int32")
+
+
+  def adjustSynapses(self, segments, activeInput, activePermanenceDelta,
+                     inactivePermanenceDelta):
+    """
+    On each segment, adjust the permanence of every synapse to an active input
+    by activePermanenceDelta and the permanence of every other synapse by
+    inactivePermanenceDelta. Synapses whose permanence reaches zero are
+    destroyed.
+
+    @param segments (numpy array)
+    @param activeInput (numpy array)
+    @param activePermanenceDelta (float)
+    @param inactivePermanenceDelta (float)
+    """
+    slots, _ = self._getSegmentSlots(segments)
+    activeSynapses = self._getInputMask(activeInput)[
+      self._presynapticCells[slots]]
+
+    self._permanences[slots] += np.where(activeSynapses,
+                                         np.float32(activePermanenceDelta),
+                                         np.float32(inactivePermanenceDelta))
+    self._clipPermanences(slots)
+
+
+  def adjustActiveSynapses(self, segments, activeInput, permanenceDelta):
+    """
+    On each segment, adjust the permanence of every synapse to an active input.
+
+    @param segments (numpy array)
+    @param activeInput (numpy array)
+    @param permanenceDelta (float)
+    """
+    slots, _ = self._getSegmentSlots(segments)
+    slots = slots[self._getInputMask(activeInput)[
+      self._presynapticCells[slots]]]
+
+    self._permanences[slots] += np.float32(permanenceDelta)
+    self._clipPermanences(slots)
+
+
+  def adjustInactiveSynapses(self, segments, activeInput, permanenceDelta):
+    """
+    On each segment, adjust the permanence of every synapse to an inactive
+    input.
+
+    @param segments (numpy array)
+    @param activeInput (numpy array)
+    @param permanenceDelta (float)
+    """
+    slots, _ = self._getSegmentSlots(segments)
+    slots = slots[~self._getInputMask(activeInput)[
+      self._presynapticCells[slots]]]
+
+    self._permanences[slots] += np.float32(permanenceDelta)
+    self._clipPermanences(slots)
+
+
+  def growSynapses(self, segments, activeInput, initialPermanence):
+    """
+    On each segment, grow a synapse to every active input that it isn't
+    already connected to.
+
+    @param segments (numpy array)
+    @param activeInput (numpy array)
+    @param initialPermanence (float)
+    """
+    segments = np.asarray(segments, dtype="uint32")
+    activeInput = np.asarray(activeInput, dtype="uint32")
+
+    pairSegments = np.repeat(segments, len(activeInput))
+    pairInputs = np.tile(activeInput, len(segments))
+    isNew = self._findSynapses(pairSegments, pairInputs) == -1
+
+    self._addSynapses(pairSegments[isNew], pairInputs[isNew],
+                      np.float32(initialPermanence))
+
+
+  def growSynapsesToSample(self, segments, activeInput, sampleSize,
+                           initialPermanence, rng):
+    """
+    On each segment, grow synapses to a random subset of the active inputs that
+    it isn't already connected to.
+
+    @param segments (numpy array)
+    @param activeInput (numpy array)
+
+    @param sampleSize (int or numpy array)
+    The maximum number of synapses to grow on each segment. Either a single
+    number or one number per segment.
+
+    @param initialPermanence (float)
+
+    @param rng (Random or NumpyRandom)
+    Anything with an 'initializeReal32Array' method
+    """
+    segments = np.asarray(segments, dtype="uint32")
+    activeInput = np.asarray(activeInput, dtype="uint32")
+    maxNew = np.empty(len(segments), dtype="int64")
+    maxNew[:] = sampleSize
+
+    pairGroups = np.repeat(np.arange(len(segments)), len(activeInput))
+    pairInputs = np.tile(activeInput, len(segments))
+    isNew = self._findSynapses(segments[pairGroups], pairInputs) == -1
+    pairGroups = pairGroups[isNew]
+    pairInputs = pairInputs[isNew]
+
+    if len(pairGroups) == 0:
+      return
+
+    # Give each candidate synapse a random key, then keep the "maxNew" smallest
+    # keys of each segment.
+    keys = np.empty(len(pairGroups), dtype="float32")
+    rng.initializeReal32Array(keys)
+    order = np.lexsort((keys, pairGroups))
+    sortedGroups = pairGroups[order]
+    rankInGroup = (np.arange(len(sortedGroups)) -
+                   np.searchsorted(sortedGroups, sortedGroups))
+    chosen = order[rankInGroup < maxNew[sortedGroups]]
+
+    self._addSynapses(segments[pairGroups[chosen]], pairInputs[chosen],
+                      np.float32(initialPermanence))
+
+
+  def setPermanences(self, segments, presynapticCells, permanences):
+    """
+    Set the permanence of a specific set of synapses, creating any synapses
+    that don't exist. Setting a permanence to zero destroys the synapse.
+
+    @param segments (numpy array)
+    @param presynapticCells (numpy array)
+    One presynaptic cell for each segment
+
+    @param permanences (float or numpy array)
+    """
+    segments = np.asarray(segments, dtype="uint32")
+    presynapticCells = np.asarray(presynapticCells, dtype="uint32")
+    values = np.empty(len(segments), dtype="float32")
+    values[:] = permanences
+
+    slots = self._findSynapses(segments, presynapticCells)
+    exists = slots != -1
+    self._permanences[slots[exists]] = values[exists]
+    self._clipPermanences(slots[exists])
+
+    # If a new synapse is listed multiple times, the last one wins.
+    keys = (segments[~exists].astype("int64") * (self.numInputs + 1) +
+            presynapticCells[~exists])
+    _, lastIndices = np.unique(keys[::-1], return_index=True)
+    newIndices = np.flatnonzero(~exists)[::-1][lastIndices]
+    newIndices = newIndices[values[newIndices] > EPSILON]
+
+    self._addSynapses(segments[newIndices], presynapticCells[newIndices],
+                      np.minimum(values[newIndices], 1.0))
+
+
+  def mapSegmentsToCells(self, segments):
+    """
+    @param segments (numpy array)
+    @return (numpy array) The cell for each segment
+    """
+    return self._segmentCells[np.asarray(segments, dtype="int64")]
+
+
+  def mapSegmentsToSynapseCounts(self, segments):
+    """
+    @param segments (numpy array)
+    @return (numpy array) The number of synapses on each segment
+    """
+    return self._segmentLengths[np.asarray(segments, dtype="int64")]
+
+
+  def getSegmentCounts(self, cells):
+    """
+    @param cells (numpy array)
+    @return (numpy array) The number of segments on each cell
+    """
+    return self._segmentCountsByCell[np.asarray(cells, dtype="int64")]
+
+
+  def filterSegmentsByCell(self, segments, cells):
+    """
+    @param segments (numpy array)
+    @param cells (numpy array)
+
+    @return (numpy array)
+    The segments that are on one of the specified cells, sorted by cell
+    """
+    segments = np.asarray(segments, dtype="uint32")
+    segments = segments[np.in1d(self._segmentCells[segments], cells)]
+    self.sortSegmentsByCell(segments)
+    return segments
+
+
+  def sortSegmentsByCell(self, segments):
+    """
+    Sort the segments in-place by cell. Segments on the same cell keep their
+    order.
+
+    @param segments (numpy array)
+    """
+    segments[:] = segments[np.argsort(self._segmentCells[segments],
+                                      kind="mergesort")]
+
+
+  def getSynapses(self, segment):
+    """
+    @param segment (int)
+
+    @return (tuple)
+    - presynapticCells (numpy array), sorted
+    - permanences (numpy array)
+    """
+    start = self._segmentStarts[segment]
+    end = start + self._segmentLengths[segment]
+    return (self._presynapticCells[start:end].copy(),
+            self._permanences[start:end].copy())
+
+
+  def _getInputMask(self, activeInput):
+    """
+    @return (numpy array)
+    A boolean mask over the presynaptic cells, with an extra False entry for
+    the unused-slot marker.
+    """
+    mask = np.zeros(self.numInputs + 1, dtype="bool")
+    mask[np.asarray(activeInput, dtype="int64")] = True
+    return mask
+
+
+  def _getSegmentSlots(self, segments, lengths=None):
+    """
+    Get the synapse slots of each segment.
+
+    @param segments (numpy array)
+
+    @param lengths (numpy array or None)
+    The number of slots to get for each segment. Defaults to the number of
+    synapses.
+
+    @return (tuple)
+    - slots (numpy array)
+    - groups (numpy array)
+      For each slot, the index of its segment within 'segments'
+    """
+    segments = np.asarray(segments, dtype="int64")
+    if lengths is None:
+      lengths = self._segmentLengths[segments]
+
+    groups = np.repeat(np.arange(len(segments)), lengths)
+    groupStarts = np.cumsum(lengths) - lengths
+    slots = (self._segmentStarts[segments][groups] +
+             np.arange(len(groups)) - groupStarts[groups])
+    return slots, groups
+
+
+  def _findSynapses(self, segments, presynapticCells):
+    """
+    @return (numpy array)
+    The slot of the synapse for each (segment, presynaptic cell) pair, or -1 if
+    there's no such synapse.
+    """
+    if len(segments) == 0:
+      return np.empty(0, dtype="int64")
+
+    targetSegments = np.unique(segments)
+    slots, groups = self._getSegmentSlots(targetSegments)
+
+    # Segments are sorted and each segment's synapses are sorted, so these
+    # keys are sorted.
+    keyBase = self.numInputs + 1
+    existingKeys = (targetSegments[groups].astype("int64") * keyBase +
+                    self._presynapticCells[slots])
+    keys = (np.asarray(segments, dtype="int64") * keyBase +
+            np.asarray(presynapticCells, dtype="int64"))
+
+    positions = np.searchsorted(existingKeys, keys)
+    found = positions < len(existingKeys)
+    found[found] = existingKeys[positions[found]] == keys[found]
+
+    result = np.full(len(keys), -1, dtype="int64")
+    result[found] = slots[positions[found]]
+    return result
+
+
+  def _clipPermanences(self, slots):
+    """
+    Clip the permanences to [0, 1] and destroy the synapses that reached zero.
+    """
+    permanences = np.clip(self._permanences[slots], 0.0, 1.0)
+    self._permanences[slots] = permanences
+
+    destroyed = permanences <= EPSILON
+    if destroyed.any():
+      self._destroySynapses(slots[destroyed])
+
+
+  def _destroySynapses(self, slots):
+    self._presynapticCells[slots] = self.numInputs
+
+    targetSegments = np.unique(self._synapseSegments[slots])
+    oldSlots, groups = self._getSegmentSlots(targetSegments)
+    keep = self._presynapticCells[oldSlots] != self.numInputs
+
+    self._writeSegments(targetSegments,
+                        np.bincount(groups[keep],
+                                    minlength=len(targetSegments)),
+                        self._presynapticCells[oldSlots[keep]],
+                        self._permanences[oldSlots[keep]])
+
+
+  def _addSynapses(self, segments, presynapticCells, permanences):
+    """
+    Add new synapses. The caller is responsible for making sure that they don't
+    already exist.
+    """
+    if len(segments) == 0:
+      return
+
+    newPermanences = np.empty(len(segments), dtype="float32")
+    newPermanences[:] = permanences
+
+    targetSegments, newGroups = np.unique(segments, return_inverse=True)
+    oldSlots, oldGroups = self._getSegmentSlots(targetSegments)
+
+    groups = np.concatenate((oldGroups, newGroups))
+    allPresynapticCells = np.concatenate((self._presynapticCells[oldSlots],
+                                          presynapticCells))
+    allPermanences = np.concatenate((self._permanences[oldSlots],
+                                     newPermanences))
+
+    order = np.lexsort((allPresynapticCells, groups))
+    self._writeSegments(targetSegments,
+                        np.bincount(groups, minlength=len(targetSegments)),
+                        allPresynapticCells[order], allPermanences[order])
+
+
+  def _writeSegments(self, segments, counts, presynapticCells, permanences):
+    """
+    Replace the synapses of each segment.
+
+    @param segments (numpy array)
+    Unique segments
+
+    @param counts (numpy array)
+    The new number of synapses of each segment
+
+    @param presynapticCells (numpy array)
+    @param permanences (numpy array)
+    The new synapses, grouped by segment in the same order as 'segments' and
+    sorted by presynaptic cell within each segment.
+    """
+    capacities = self._segmentCapacities[segments]
+    tooSmall = counts > capacities
+
+    if tooSmall.any():
+      newCapacities = np.maximum(counts[tooSmall], 2*capacities[tooSmall])
+      self._reserveSlots(newCapacities.sum())
+
+    # Clear the old synapses.
+    oldSlots, _ = self._getSegmentSlots(segments)
+    self._presynapticCells[oldSlots] = self.numInputs
+    self._permanences[oldSlots] = 0
+
+    # Move segments that don't fit to the end.
+    if tooSmall.any():
+      movedSegments = segments[tooSmall]
+      self._abandonedSlots += capacities[tooSmall].sum()
+
+      newStarts = self._synapsesEnd + np.cumsum(newCapacities) - newCapacities
+      self._segmentStarts[movedSegments] = newStarts
+      self._segmentCapacities[movedSegments] = newCapacities
+      self._synapsesEnd += newCapacities.sum()
+
+      slots, groups = self._getSegmentSlots(movedSegments, newCapacities)
+      self._synapseSegments[slots] = movedSegments[groups]
+
+    slots, _ = self._getSegmentSlots(segments, counts)
+    self._presynapticCells[slots] = presynapticCells
+    self._permanences[slots] = permanences
+    self._segmentLengths[segments] = counts
+
+
+  def _reserveSlots(self, numSlots):
+    """
+    Make sure there's room for 'numSlots' more slots at the end of the synapse
+    arrays, compacting or growing them if necessary.
+    """
+    if self._synapsesEnd + numSlots <= len(self._presynapticCells):
+      return
+
+    if self._abandonedSlots > self._synapsesEnd // 2:
+      self._compact()
+
+    required = self._synapsesEnd + numSlots
+    if required > len(self._presynapticCells):
+      size = max(required, 2*len(self._presynapticCells))
+      self._presynapticCells = self._resized(self._presynapticCells, size,
+                                             self.numInputs)
+      self._permanences = self._resized(self._permanences, size, 0)
+      self._synapseSegments = self._resized(self._synapseSegments, size, 0)
+
+
+  def _compact(self):
+    """
+    Remove the slots abandoned by moved segments. Every segment keeps its
+    capacity.
+    """
+    segments = np.arange(self._numSegments)
+    capacities = self._segmentCapacities[:self._numSegments]
+    oldSlots, groups = self._getSegmentSlots(segments, capacities)
+    end = len(oldSlots)
+
+    self._presynapticCells[:end] = self._presynapticCells[oldSlots]
+    self._permanences[:end] = self._permanences[oldSlots]
+    self._synapseSegments[:end] = groups
+    self._presynapticCells[end:] = self.numInputs
+    self._permanences[end:] = 0
+
+    self._segmentStarts[:self._numSegments] = np.cumsum(capacities) - capacities
+    self._synapsesEnd = end
+    self._abandonedSlots = 0
+
+
+  def _reserveSegments(self, numSegments):
+    required = self._numSegments + numSegments
+    if required > len(self._segmentCells):
+      size = max(required, 2*len(self._segmentCells))
+      self._segmentCells = self._resized(self._segmentCells, size, 0)
+      self._segmentStarts = self._resized(self._segmentStarts, size, 0)
+      self._segmentLengths = self._resized(self._segmentLengths, size, 0)
+      self._segmentCapacities = self._resized(self._segmentCapacities, size, 0)
+
+
+  @staticmethod
+  def _resized(array, size, fillValue):
+    resized = np.full(size, fillValue, dtype=array.dtype)
+    resized[:len(array)] = array
+    return resized
+
+
+
+class CSRMatrixView(object):
+  """
+  The subset of nupic's SparseMatrix interface that callers use via
+  'connections.matrix', implemented on top of a CSRConnections.
+  """
+
+  def __init__(self, connections):
+    self.connections = connections
+
+
+  def nRows(self):
+    return self.connections.nSegments()
+
+
+  def nCols(self):
+    return self.connections.numInputs
+
+
+  def nNonZeros(self):
+    return int(self.connections.mapSegmentsToSynapseCounts(
+      np.arange(self.connections.nSegments())).sum())
+
+
+  def rowNonZeros(self, row):
+    return self.connections.getSynapses(row)
+
+
+  def getRow(self, row):
+    presynapticCells, permanences = self.connections.getSynapses(row)
+    dense = np.zeros(self.nCols(), dtype="float32")
+    dense[presynapticCells] = permanences
+    return dense
+
+
+  def setElements(self, rows, cols, values):
+    self.connections.setPermanences(rows, cols, values)
+
+
+
+class NumpyRandom(object):
+  """
+  A stand-in for nupic.bindings.math.Random, backed by numpy. It implements the
+  methods that the algorithms in this package use.
+  """
+
+  def __init__(self, seed=42):
+    self.randomState = np.random.RandomState(seed)
+
+
+  def initializeReal32Array(self, array):
+    array[:] = self.randomState.random_sample(len(array))
+
+
+  def getReal64(self):
+    return self.randomState.random_sample()
+
+
+
+def createConnections(cellCount, inputSize, implementation="cpp"):
+  """
+  Create a connections instance.
+
+  @param implementation (str)
+  "cpp" for nupic's SparseMatrixConnections, "numpy" for CSRConnections
+  """
+  if implementation == "cpp":
+    from nupic.bindings.math import SparseMatrixConnections
+    return SparseMatrixConnections(cellCount, inputSize)
+  elif implementation == "numpy":
+    return CSRConnections(cellCount, inputSize)
+  else:
+    raise ValueError("Unknown connections implementation: %s" %
+                     (implementation,))
+
+
+def createRandom(seed, implementation="cpp"):
+  """
+  Create a random number generator to go along with the connections created by
+  createConnections.
+
+  @param implementation (str)
+  "cpp" for nupic's Random, "numpy" for NumpyRandom
+  """
+  if implementation == "cpp":
+    from nupic.bindings.math import Random
+    return Random(seed)
+  elif implementation == "numpy":
+    return NumpyRandom(seed)
+  else:
+    raise ValueError("Unknown connections implementation: %s" %
+                     (implementation,))
@@ -30,7 +30,25 @@ def divide(a, b):
   return a/b
 
 
+def _divide(a, b):
+  """
+  Elementwise version of divide(): 0 wherever the numerator is 0.
+  """
+  a, b = np.broadcast_arrays(a, b)
+  result = np.zeros(a.shape, dtype="float")
+  nonzero = a != 0
+  result[nonzero] = a[nonzero] / b[nonzero]
+  return result
+
+
 class HMM(object):
+    """
+    Discrete hidden Markov model trained with Baum-Welch.
+
+    The forward and backward passes are scaled so that each step's
+    probabilities sum to 1, so long sequences don't underflow. Every step works
+    on all states, and on all the sequences of a batch, at once.
+    """
     def __init__(self, numCats, numStates, criterion=0.0001, verbosity=0):
       self.A = None # {a_ij} = P(X_t = j | X_t-1 = i)
       self.B = None # {b_ij} = P(Y_t = i | X_t = j)
@@ -41,129 +59,148 @@ class HMM(object):
       self.verbosity = verbosity
       self.criterion = criterion
 
+      # P(X_t = i | Y_1..Y_t) after every input passed to predict_next_inputs,
+      # or None if it must be recomputed from self.observations
+      self._filteredState = None
+
     def reset(self):
       self.observations = []
+      self._filteredState = None
 
     def _initializeTrial(self, observations):
       self.observations = observations
       self.T = len(observations)
       self.seenValues = set(self.observations)
-      self.alpha = np.zeros((self.numStates,self.T), dtype="float") # {a_it} = P(Y_1 = y_1, ..., Y_t=y_t, X_t=i | theta)
-      self.beta = np.zeros((self.numStates,self.T), dtype="float") # {b_it} = P(Y_t+1 = y_t+1, ..., Y_T=y_T | X_t=i, theta)
-      self.gamma = np.zeros((self.numStates,self.T), dtype="float") # {g_it} = P(X_t = i | Y, theta)
-      self.eps = np.zeros((self.numStates,self.numStates,self.T), dtype="float") # {eps_ijt} = P(X_t = i, Xt+1 = j | Y, theta)
+      self._filteredState = None
 
       if self.verbosity > 0:
         print "observations: ", observations
 
-    def _forward(self):
-      y1 = self.observations[0]
-
-      for i in range(self.numStates):
-        self.alpha[i,0] = self.pi[i]
-        self.alpha[i,0] *= self.B[i,y1]
-
-
-      for t in range(1, self.T):
-        yt = self.observations[t]
-
-        for j in range(0, self.numStates):
-          sumAlphaT1 = 0.0
-
-          for i in range(0, self.numStates):
-            sumAlphaT1 += self.alpha[i,t-1]*self.A[i,j]
-
-          self.alpha[j,t] = self.B[j, yt]*sumAlphaT1
+    def _forward(self, observations, lengths):
+      """
+      Scaled forward pass over a batch of sequences.
+
+      @param observations (numpy array) N x T, each row padded past its length
+      @param lengths (numpy array) The length of each sequence
+
+      @return (tuple) alpha, N x T x numStates, where
+              {a_nti} = P(X_t = i | Y_1..Y_t) for sequence n, and the scale
+              factors, N x T, where {c_nt} = P(Y_t | Y_1..Y_t-1)
+      """
+      numSequences, T = observations.shape
+      emission = self.B.T[observations]
+      valid = np.arange(T) < lengths[:, np.newaxis]
+      alpha = np.zeros((numSequences, T, self.numStates), dtype="float")
+      scale = np.ones((numSequences, T), dtype="float")
+
+      for t in range(T):
+        if t == 0:
+          alphaT = self.pi * emission[:, 0]
+        else:
+          alphaT = emission[:, t] * alpha[:, t-1].dot(self.A)
+
+        # Impossible observations leave alpha at 0 from then on
+        scaleT = alphaT.sum(axis=1)
+        scaleT[scaleT == 0] = 1.0
+        alpha[:, t] = alphaT / scaleT[:, np.newaxis]
+        scale[valid[:, t], t] = scaleT[valid[:, t]]
+
+      alpha *= valid[:, :, np.newaxis]
 
       if self.verbosity > 0:
-        print "alpha: ", self.alpha
-
-
-    def _backward(self):
-      for i in range(self.numStates):
-        self.beta[i,self.T-1] = 1.0
+        print "alpha: ", alpha
 
-      for t in range(self.T-1, 0, -1):
-        yt = self.observations[t]
+      return alpha, scale
 
-        for i in range(self.numStates):
-          newBetaiT1 = 0.0
+    def _backward(self, observations, lengths, scale):
+      """
+      Scaled backward pass over a batch of sequences, using the scale factors
+      of the forward pass.
 
-          for j in range(0, self.numStates):
-            newBetaiT1 += self.beta[j,t]*self.A[i,j]*self.B[j,yt]
+      @return (numpy array) beta, N x T x numStates, where
+              {b_nti} = P(Y_t+1..Y_T | X_t = i) / P(Y_t+1..Y_T | Y_1..Y_t)
+      """
+      numSequences, T = observations.shape
+      emission = self.B.T[observations]
+      valid = np.arange(T) < lengths[:, np.newaxis]
+      beta = np.zeros((numSequences, T, self.numStates), dtype="float")
+      beta[np.arange(numSequences), lengths - 1] = 1.0
 
-          self.beta[i,t-1] = newBetaiT1
+      for t in range(T-1, 0, -1):
+        betaT = ((emission[:, t] * beta[:, t]).dot(self.A.T) /
+                 scale[:, t, np.newaxis])
+        beta[:, t-1] = np.where(valid[:, t, np.newaxis], betaT, beta[:, t-1])
 
       if self.verbosity > 0:
-        print "beta: ", self.beta
-
-    def _update(self):
-      # updating gamma
-      for t in range(self.T):
-        denom = 0.0
-        for i in range(self.numStates):
-          denom += self.alpha[i,t]*self.beta[i,t]
-
-        for i in range(self.numStates):
-          self.gamma[i,t] = divide(self.alpha[i,t]*self.beta[i,t], denom)
-
-      # updating eps
-      for t in range(self.T-1):
-        for i in range(self.numStates):
-          denom = sum([self.alpha[j,t]*self.beta[j,t] for j in range(self.numStates)])
-          yt1 = self.observations[t+1]
-          for j in range(self.numStates):
-            self.eps[i,j,t] = divide(self.alpha[i,t]*self.A[i,j]*self.beta[j,t+1]*self.B[j,yt1], denom)
+        print "beta: ", beta
+
+      return beta
+
+    def _update(self, observations, lengths, alpha, beta, scale):
+      """
+      Re-estimate pi, A and B from the expected state and transition counts
+      of every sequence of the batch. B is only updated for the observed
+      values.
+      """
+      numSequences, T = observations.shape
+      valid = np.arange(T) < lengths[:, np.newaxis]
+
+      # {g_nti} = P(X_t = i | Y, theta)
+      gamma = alpha * beta
+      gamma = _divide(gamma, gamma.sum(axis=2)[:, :, np.newaxis])
+
+      # {eps_ntij} = P(X_t = i, Xt+1 = j | Y, theta)
+      #            = A[i,j] * alpha[n,t,i] / denom[n,t]
+      #                     * B[j,y_t+1] * beta[n,t+1,j]
+      # summed over every transition of every sequence
+      hasNext = valid[:, 1:, np.newaxis]
+      denom = ((alpha[:, :-1] * beta[:, :-1]).sum(axis=2) * scale[:, 1:])
+      denom[denom == 0] = np.inf
+      before = _divide(alpha[:, :-1], denom[:, :, np.newaxis]) * hasNext
+      after = self.B.T[observations[:, 1:]] * beta[:, 1:]
+      epsSum = self.A * before.reshape(-1, self.numStates).T.dot(
+        after.reshape(-1, self.numStates))
+      gammaSum = (gamma[:, :-1] * hasNext).sum(axis=(0, 1))
 
       if self.verbosity > 0:
-        print "gamma: ", self.gamma
-        print "eps: ", self.eps
+        print "gamma: ", gamma
+        print "eps: ", epsSum
 
-      # updating A
-      denoms = np.zeros(self.numStates, dtype="float")
-      for i in range(self.numStates):
-        self.pi[i] = self.gamma[i, 0]
-        for t in range(self.T-1):
-          denoms[i] += self.gamma[i,t]
-
-      for i in range(self.numStates):
-        for j in range(self.numStates):
-          numer = 0.0
-          for t in range(self.T-1):
-            numer += self.eps[i,j,t]
-
-          self.A[i,j] = divide(numer, denoms[i])
+      # updating pi and A
+      self.pi = gamma[:, 0].mean(axis=0)
+      self.A = _divide(epsSum, gammaSum[:, np.newaxis])
 
       if self.verbosity > 0:
         print "A: ", self.A
 
-
       # updating B
+      validObservations = observations[valid]
+      validGamma = gamma[valid]
+      seenValues = np.unique(validObservations)
+      B = np.array(self.B, dtype="float")
       for i in range(self.numStates):
-        for v in self.seenValues:
-          numer = 0.0
-          denom = 0.0
-          for t in range(self.T):
-            denom += self.gamma[i,t]
-            if self.observations[t] == v:
-              numer += self.gamma[i,t]
-          self.B[i,v] = divide(numer, denom)
+        numer = np.bincount(validObservations, weights=validGamma[:, i],
+                            minlength=self.numCats)
+        B[i, seenValues] = _divide(numer[seenValues], validGamma[:, i].sum())
+      self.B = B
 
       if self.verbosity > 0:
         print "B: ", self.B
 
-
-    def train(self, observations):
-      self._initializeTrial(observations)
+    def _train(self, sequences):
+      lengths = np.array([len(sequence) for sequence in sequences])
+      observations = np.zeros((len(sequences), lengths.max()), dtype="int64")
+      for n, sequence in enumerate(sequences):
+        observations[n, :lengths[n]] = sequence
 
       while True:
         startA = copy(self.A)
         startB = copy(self.B)
         startpi = copy(self.pi)
 
-        self._forward()
-        self._backward()
-        self._update()
+        alpha, scale = self._forward(observations, lengths)
+        beta = self._backward(observations, lengths, scale)
+        self._update(observations, lengths, alpha, beta, scale)
 
         done = True
 
@@ -177,32 +214,63 @@ class HMM(object):
         if done:
           break
 
+    def train(self, observations):
+      self._initializeTrial(observations)
+      self._train([observations])
+
+    def trainBatch(self, sequences):
+      """
+      Train on many independent sequences at once. Each Baum-Welch iteration
+      pools the expected counts of all sequences, and pi becomes the average
+      initial state distribution.
+
+      @param sequences (list) Sequences of observations. They can have
+                       different lengths, but none can be empty.
+      """
+      self._filteredState = None
+      self._train(sequences)
+
+    def _filterStep(self, state, observation):
+      """
+      Fold one more observation into a filtered state distribution.
+
+      @param state (numpy array) P(X_t-1 | Y_1..Y_t-1), or None at t = 0
+      @return (numpy array) P(X_t | Y_1..Y_t)
+      """
+      if state is None:
+        state = self.pi * self.B[:, observation]
+      else:
+        state = self.B[:, observation] * state.dot(self.A)
+      return _divide(state, state.sum())
 
     def predict_next_inputs(self, current_input, threshold=0.3):
+      """
+      Predict the inputs that can follow current_input, given every input seen
+      since the last reset.
+
+      The filtered hidden state distribution is kept between calls, so each
+      call costs O(numStates^2) rather than a forward pass over the whole
+      history. It is recomputed from the history after training or a reset.
+      """
       next_inputs = set()
 
-      self._initializeTrial([x for x in self.observations] + [current_input])
-      t = len(self.observations)-1
+      if self._filteredState is None:
+        self.observations = list(self.observations)
+        if len(self.observations) > 0:
+          observations = np.array([self.observations], dtype="int64")
+          alpha, _ = self._forward(observations,
+                                   np.array([len(self.observations)]))
+          self._filteredState = alpha[0, -1]
+      self.observations.append(current_input)
 
       # P(X_t = i | Y, theta)
-      # Update alpha
-      self._forward()
-      denom = 0.0
-      for i in range(self.numStates):
-        denom += self.alpha[i,t]
-
-      curHiddenStateProbs = np.zeros(self.numStates, dtype="float")
-      for i in range(self.numStates):
-        curHiddenStateProbs[i] = divide(self.alpha[i,t], denom)
+      curHiddenStateProbs = self._filterStep(self._filteredState,
+                                             current_input)
+      self._filteredState = curHiddenStateProbs
 
       # P(X_t+1 | X_t) P(X_t) = A[i,j]
       # P(Y_t+1 | X_t+1) = B[i,j]
-
-      nextObservationProbs = np.zeros(self.numCats, dtype="float")
-      for k in range(self.numCats):
-        for j in range(self.numStates):
-          for i in range(self.numStates):
-            nextObservationProbs[k] += self.B[j,k]*self.A[j,i]*curHiddenStateProbs[i]
+      nextObservationProbs = self.B.T.dot(self.A.dot(curHiddenStateProbs))
 
       for v,p in enumerate(nextObservationProbs):
         if self.verbosity > 0:
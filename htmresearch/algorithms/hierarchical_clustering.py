@@ -20,6 +20,9 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
+from multiprocessing import Pool
+from multiprocessing.sharedctypes import RawArray
+
 import matplotlib.pyplot as plt
 import numpy
 import scipy.cluster.hierarchy
@@ -33,6 +36,23 @@ class LinkageNotComputedException(Exception):
   pass
 
 
+# Typecodes of the shared output array for each overlap dtype. Other dtypes
+# are computed in a single process.
+_TYPECODES = {
+  numpy.dtype("int8"): "b",
+  numpy.dtype("int16"): "h",
+  numpy.dtype("int32"): "i",
+  numpy.dtype("int64"): "l",
+  numpy.dtype("float32"): "f",
+  numpy.dtype("float64"): "d",
+}
+
+# State shared with the worker processes of _computeOverlaps. The workers are
+# forked, so they inherit the data matrix and the shared output array instead
+# of receiving pickled copies.
+_workerState = {}
+
+
 class HierarchicalClustering(object):
   """
   Implements hierarchical agglomerative clustering on the output of a
@@ -63,14 +83,18 @@ class HierarchicalClustering(object):
   """
 
 
-  def __init__(self, knn):
+  def __init__(self, knn, numWorkers=1):
     """
     Initialization for HierarchicalClustering object.
     
     @param knn (nupic.algorithms.KNNClassifier) Populated instance of KNN
         classifer from which to draw training vectors.
+
+    @param numWorkers (int) Number of processes used to compute the pairwise
+        overlaps. Optional, defaults to 1.
     """
     self._knn = knn
+    self._numWorkers = numWorkers
     self._overlaps = None
     self._linkage = None
 
@@ -257,34 +281,45 @@ class HierarchicalClustering(object):
 
   def _populateOverlaps(self):
     sparseDataMatrix = HierarchicalClustering._extractVectorsFromKNN(self._knn)
-    self._overlaps = HierarchicalClustering._computeOverlaps(sparseDataMatrix)
+    self._overlaps = HierarchicalClustering._computeOverlaps(
+      sparseDataMatrix, numWorkers=self._numWorkers)
 
 
   @staticmethod
   def _extractVectorsFromKNN(knn):
+    """
+    Builds a CSR matrix with one row per KNN training pattern. The matrix is
+    assembled in a single pass from the patterns' active bits.
+    """
+    numPatterns = knn._numPatterns
     dim = len(knn.getPattern(0, sparseBinaryForm=False))
-    sparseRowList = []
-
-    for i in xrange(knn._numPatterns):
-      nzIndices = knn.getPattern(i, sparseBinaryForm=True)
-      sparseRow = scipy.sparse.csr_matrix(
-        (numpy.ones(len(nzIndices), dtype=bool),
-        (numpy.zeros(len(nzIndices)), nzIndices)),
-        shape=(1,dim))
-      sparseRowList.append(sparseRow)
-    
-    sparseDataMatrix = scipy.sparse.vstack(sparseRowList)
+    patterns = [numpy.asarray(knn.getPattern(i, sparseBinaryForm=True),
+                              dtype="int32")
+                for i in xrange(numPatterns)]
+
+    indptr = numpy.zeros(numPatterns + 1, dtype="int64")
+    indptr[1:] = numpy.cumsum([len(pattern) for pattern in patterns])
+    indices = (numpy.concatenate(patterns) if numPatterns > 0
+               else numpy.zeros(0, dtype="int32"))
 
-    return sparseDataMatrix
+    return scipy.sparse.csr_matrix(
+      (numpy.ones(len(indices), dtype=bool), indices, indptr),
+      shape=(numPatterns, dim))
 
 
   @staticmethod
-  def _computeOverlaps(data, selfOverlaps=False, dtype="int16"):
+  def _computeOverlaps(data, selfOverlaps=False, dtype=None, blockSize=2**22,
+                       numWorkers=1):
     """
     Calculates all pairwise overlaps between the rows of the input. Returns an
     array of all n(n-1)/2 values in the upper triangular portion of the
     pairwise overlap matrix. Values are returned in row-major order.
 
+    The overlaps are computed as the sparse product of the data with its
+    transpose, one block of rows at a time. Each block's upper triangular part
+    is written straight into its range of the returned array, so no more than
+    about blockSize overlaps are held in dense form per process at once.
+
     @param data (scipy.sparse.csr_matrix) A CSR sparse matrix with one vector
         per row. Any non-zero value is considered an active bit.
 
@@ -293,24 +328,88 @@ class HierarchicalClustering(object):
         n(n+1)/2 elements. Optional, defaults to False.
     
     @param dtype (string) Data type of returned array in numpy dtype format.
-        Optional, defaults to 'int16'.
+        Optional, defaults to the smallest signed integer type that can hold
+        the largest number of active bits in a row.
+
+    @param blockSize (int) Approximate number of overlaps computed per block.
+        Optional, defaults to 2**22.
+
+    @param numWorkers (int) Number of processes that compute blocks. The
+        processes write into a shared output array, so this is only used for
+        the int8, int16, int32, int64, float32 and float64 dtypes. Other dtypes
+        are computed in one process. Optional, defaults to 1.
     
     @returns (numpy.ndarray) A vector of pairwise overlaps as described above.
     """
+    data = scipy.sparse.csr_matrix(data, dtype="int32", copy=True)
+    data.eliminate_zeros()
+    data.data[:] = 1
+
     nVectors = data.shape[0]
-    nDims = data.shape[1]
     nPairs = (nVectors+1)*nVectors/2 if selfOverlaps else (
       nVectors*(nVectors-1)/2)
-    overlaps = numpy.ndarray(nPairs, dtype=dtype)
-    pos = 0
-
-    for i in xrange(nVectors):
-      start = i if selfOverlaps else i+1
-      a = data[i]
-      b = data[start:]
-      newOverlaps = a.multiply(b).getnnz(1)
-      run = newOverlaps.shape[0]
-      overlaps[pos:pos+run] = newOverlaps
-      pos += run
+
+    if dtype is None:
+      maxOverlap = data.getnnz(1).max() if nVectors > 0 else 0
+      dtype = numpy.min_scalar_type(-max(maxOverlap, 1))
+    dtype = numpy.dtype(dtype)
+
+    # Each block covers a range of rows with about blockSize pairs
+    rowStarts = numpy.arange(nVectors, dtype="int64")
+    if not selfOverlaps:
+      rowStarts += 1
+    rowPositions = numpy.zeros(nVectors + 1, dtype="int64")
+    rowPositions[1:] = numpy.cumsum(nVectors - rowStarts)
+    boundaries = numpy.searchsorted(
+      rowPositions, numpy.arange(0, nPairs, max(int(blockSize), 1)))
+    boundaries = numpy.unique(numpy.append(boundaries, nVectors))
+    blocks = [(boundaries[i], boundaries[i+1], rowPositions[boundaries[i]])
+              for i in xrange(len(boundaries) - 1)]
+
+    if numWorkers > 1 and len(blocks) > 1 and dtype in _TYPECODES:
+      sharedOverlaps = RawArray(_TYPECODES[dtype], nPairs)
+      overlaps = numpy.frombuffer(sharedOverlaps, dtype=dtype)
+      pool = Pool(processes=numWorkers, initializer=_initOverlapWorker,
+                  initargs=(data, sharedOverlaps, dtype, selfOverlaps))
+      try:
+        pool.map(_computeOverlapBlock, blocks, chunksize=1)
+      finally:
+        pool.terminate()
+        pool.join()
+    else:
+      overlaps = numpy.ndarray(nPairs, dtype=dtype)
+      _writeOverlapBlocks(data, overlaps, selfOverlaps, blocks)
+
     return overlaps
 
+
+
+def _writeOverlapBlocks(data, overlaps, selfOverlaps, blocks):
+  """
+  Computes the overlaps of each block of rows with every later row and writes
+  them into the condensed overlap array.
+
+  @param blocks (list) (startRow, endRow, position) for each block, where
+      position is the index in overlaps of the block's first overlap
+  """
+  for startRow, endRow, position in blocks:
+    product = data[startRow:endRow].dot(data[startRow:].T).toarray()
+    rows = numpy.arange(endRow - startRow).reshape((-1, 1))
+    columns = numpy.arange(product.shape[1])
+    upper = (columns >= rows) if selfOverlaps else (columns > rows)
+    blockOverlaps = product[upper]
+    overlaps[position:position + len(blockOverlaps)] = blockOverlaps
+
+
+
+def _initOverlapWorker(data, sharedOverlaps, dtype, selfOverlaps):
+  _workerState["data"] = data
+  _workerState["overlaps"] = numpy.frombuffer(sharedOverlaps, dtype=dtype)
+  _workerState["selfOverlaps"] = selfOverlaps
+
+
+
+def _computeOverlapBlock(block):
+  _writeOverlapBlocks(_workerState["data"], _workerState["overlaps"],
+                      _workerState["selfOverlaps"], [block])
+
@@ -19,6 +19,7 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 import numpy as np
+import scipy.sparse
 from htmresearch.support.lateral_pooler.utils import random_mini_batches
 
 
@@ -136,16 +137,40 @@ class LateralPooler(object):
 
     score             = boost * np.dot(W_prime, X)
     sorted_score_args = np.argsort(score, axis=0)[::-1, :]
-    inh_signal = np.zeros((n, d))
 
-    for t in range(d):
-      for i in sorted_score_args[:, t]:
-
-        too_strong = ( inh_signal[i,t] >= s )
-
-        if not too_strong:
-          Y[i, t] = 1.
-          inh_signal[:, t] += H[i,:]
+    # All samples are processed at once. The inhibition signal only grows,
+    # so a unit that is too strongly inhibited stays so, and each round can
+    # jump straight to every sample's next uninhibited unit in descending
+    # score order. Each round looks at a window of the next `block` units of
+    # every sample that hasn't reached the end of its units yet. The
+    # inhibition signal is stored per sample (rows), so that adding a unit's
+    # inhibitory row is a contiguous update.
+    block      = min(n, 128)
+    order      = sorted_score_args.T
+    inh_signal = np.zeros((d, n))
+    position   = np.zeros(d, dtype=int)
+    samples    = np.arange(d)
+    window     = np.arange(block)
+
+    while len(samples) > 0:
+      ranks = position[samples, np.newaxis] + window
+      valid = ranks < n
+      ranks[~valid] = n - 1
+      units = order[samples[:, np.newaxis], ranks]
+
+      not_too_strong = valid & ~( inh_signal[samples[:, np.newaxis], units] >= s )
+
+      found = not_too_strong.any(axis=1)
+      nxt   = not_too_strong.argmax(axis=1)[found]
+      t     = samples[found]
+      i     = units[found, nxt]
+
+      Y[i, t] = 1.
+      inh_signal[t] += H[i]
+
+      position[t] = ranks[found, nxt] + 1
+      position[samples[~found]] += block
+      samples = samples[position[samples] < n]
 
     return Y
 
@@ -158,8 +183,10 @@ class LateralPooler(object):
     n, m, d = Y.shape[0], X.shape[0], X.shape[1]
     r       = self.inc_dec_ratio
 
-    Pos = np.mean(np.expand_dims(Y , axis=1) * np.expand_dims(    X, axis=0), axis=2)
-    Neg = np.mean(np.expand_dims(Y , axis=1) * np.expand_dims(1 - X, axis=0), axis=2)
+    # Averages of the outer products over the batch, computed as matrix
+    # products so that no n x m x d tensor is built. Y may be sparse.
+    Pos = _dense(Y.dot(     X.T)) / float(d)
+    Neg = _dense(Y.dot((1 - X).T)) / float(d)
     dW  = Pos  -  1/r * Neg
 
     return dW
@@ -253,18 +280,23 @@ class LateralPooler(object):
       P_pairs = self.avg_activity_pairs 
       P_units = self.avg_activity_units
 
-      A = np.expand_dims(Y, axis=1) * np.expand_dims(Y, axis=0)        
-      Q = np.mean(A, axis=2)
+      # Average of the outer products over the batch, computed as a
+      # matrix product so that no n x n x d tensor is built. Y may be sparse.
+      Q  = _dense(Y.dot(Y.T)) / float(Y.shape[1])
       # Q[np.where(Q == 0.)] = 0.000001
 
-      P_pairs[:,:] = beta*P_pairs + (1-beta)*Q
+      # Update in place to avoid n x n temporaries.
+      P_pairs *= beta
+      Q       *= (1-beta)
+      P_pairs += Q
       P_units[:]   = P_pairs.diagonal()
 
 
 
-
-
-
-
-
-
+def _dense(A):
+  """
+  Returns the product of a sparse and a dense or sparse matrix as a dense array.
+  """
+  if scipy.sparse.issparse(A):
+    return A.toarray()
+  return np.asarray(A)
@@ -28,7 +28,9 @@ import numpy as np
 
 from htmresearch.support import numpy_helpers as np2
 from htmresearch.algorithms.multiconnections import Multiconnections
-from nupic.bindings.math import SparseMatrixConnections, Random
+from htmresearch.algorithms.metric_connections import MetricConnections2D
+from htmresearch.algorithms.csr_connections import (createConnections,
+                                                     createRandom)
 
 
 
@@ -108,7 +110,8 @@ class SuperficialLocationModule2D(object):
                permanenceIncrement=0.1,
                permanenceDecrement=0.0,
                maxSynapsesPerSegment=-1,
-               seed=42):
+               seed=42,
+               connectionsImplementation="cpp"):
     """
     @param cellDimensions (tuple(int, int))
     Determines the number of cells. Determines how space is divided between the
@@ -132,6 +135,9 @@ class SuperficialLocationModule2D(object):
     parameter allows you to control where the point is placed and whether multiple
     are placed. For example, With value [0.2, 0.8], it will place 4 points:
     [0.2, 0.2], [0.2, 0.8], [0.8, 0.2], [0.8, 0.8]
+
+    @param connectionsImplementation (str)
+    "cpp" for nupic's SparseMatrixConnections, "numpy" for CSRConnections
     """
 
     self.cellDimensions = np.asarray(cellDimensions, dtype="int")
@@ -152,8 +158,9 @@ class SuperficialLocationModule2D(object):
     self.activeCells = np.empty(0, dtype="int")
     self.activeSegments = np.empty(0, dtype="uint32")
 
-    self.connections = SparseMatrixConnections(np.prod(cellDimensions),
-                                               anchorInputSize)
+    self.connections = createConnections(np.prod(cellDimensions),
+                                         anchorInputSize,
+                                         connectionsImplementation)
 
     self.initialPermanence = initialPermanence
     self.connectedPermanence = connectedPermanence
@@ -164,7 +171,7 @@ class SuperficialLocationModule2D(object):
     self.activationThreshold = activationThreshold
     self.maxSynapsesPerSegment = maxSynapsesPerSegment
 
-    self.rng = Random(seed)
+    self.rng = createRandom(seed, connectionsImplementation)
 
 
   def reset(self):
@@ -362,6 +369,205 @@ class SuperficialLocationModule2D(object):
 
 
 
+class LocationModuleArray(object):
+  """
+  Steps an array of SuperficialLocationModule2D instances together.
+
+  The active points of every module are stored in one stacked array, sorted by
+  module, along with each module's rotation matrix and scale. Shifting,
+  wrapping and anchoring are done for all modules in a few vectorized calls.
+  Cells are numbered globally: the cells of module i are offset by the total
+  number of cells in modules 0 to i-1.
+
+  After every call, each module's activePoints, cellsForActivePoints and
+  activeCells are updated, so the modules can still be inspected and can still
+  learn individually. Don't shift, anchor, or reset the modules directly while
+  they're in an array, or the array's copy of their points will be stale.
+  """
+
+  def __init__(self, modules):
+    """
+    @param modules (sequence of SuperficialLocationModule2D)
+    The array starts with these modules' current active points.
+    """
+    self.modules = list(modules)
+    numModules = len(self.modules)
+
+    self.cellDimensions = np.array(
+      [module.cellDimensions for module in self.modules],
+      dtype="int").reshape((numModules, 2))
+    self.rotationMatrices = np.array(
+      [module.rotationMatrix for module in self.modules],
+      dtype="float").reshape((numModules, 2, 2))
+    self.cellFieldsPerUnitDistance = np.array(
+      [module.cellFieldsPerUnitDistance for module in self.modules],
+      dtype="float").reshape((numModules, 2))
+
+    self.cellOffsets = np.append(
+      0, np.cumsum(np.prod(self.cellDimensions, axis=1)))
+
+    # The points that are added for each anchored cell, for every module.
+    pointOffsetsByModule = [
+      np.array([[iOffset, jOffset]
+                for iOffset in module.pointOffsets
+                for jOffset in module.pointOffsets],
+               dtype="float").reshape((-1, 2))
+      for module in self.modules]
+    self.pointsPerCell = np.array([len(pointOffsets)
+                                   for pointOffsets in pointOffsetsByModule],
+                                  dtype="int")
+    self.pointOffsetStart = np.append(0, np.cumsum(self.pointsPerCell)[:-1])
+    self.pointOffsets = np.concatenate(pointOffsetsByModule + [
+      np.empty((0, 2), dtype="float")])
+
+    self.activePoints = np.concatenate(
+      [module.activePoints for module in self.modules] +
+      [np.empty((0, 2), dtype="float")])
+    self.moduleForPoint = np.repeat(
+      np.arange(numModules),
+      [len(module.activePoints) for module in self.modules])
+    self._computeActiveCells()
+
+
+  def reset(self):
+    """
+    Clear the active cells of every module.
+    """
+    self.activePoints = np.empty((0, 2), dtype="float")
+    self.moduleForPoint = np.empty(0, dtype="int")
+    self._computeActiveCells()
+
+
+  def _computeActiveCells(self):
+    # Round each coordinate to the nearest cell, then convert coordinates to
+    # global cell numbers.
+    flooredActivePoints = np.floor(self.activePoints).astype("int")
+    self.cellsForActivePoints = (
+      flooredActivePoints[:, 0] * self.cellDimensions[self.moduleForPoint, 1] +
+      flooredActivePoints[:, 1] + self.cellOffsets[self.moduleForPoint])
+    self.activeCells = np.unique(self.cellsForActivePoints)
+
+    # Give each module its slice of the results.
+    moduleIndices = np.arange(len(self.modules) + 1)
+    pointBounds = np.searchsorted(self.moduleForPoint, moduleIndices)
+    cellBounds = np.searchsorted(self.activeCells, self.cellOffsets)
+    for i, module in enumerate(self.modules):
+      offset = self.cellOffsets[i]
+      module.activePoints = self.activePoints[pointBounds[i]:pointBounds[i+1]]
+      module.cellsForActivePoints = (
+        self.cellsForActivePoints[pointBounds[i]:pointBounds[i+1]] - offset)
+      module.activeCells = (
+        self.activeCells[cellBounds[i]:cellBounds[i+1]] - offset)
+
+
+  def activateRandomLocation(self):
+    """
+    Set each module's location to a random point.
+    """
+    numModules = len(self.modules)
+    self.activePoints = (np.random.random((numModules, 2)) *
+                         self.cellDimensions)
+    self.moduleForPoint = np.arange(numModules)
+    self._computeActiveCells()
+
+
+  def shift(self, deltaLocation):
+    """
+    Shift the active cells of every module by a vector.
+
+    @param deltaLocation (pair of floats)
+    A translation vector [di, dj].
+    """
+    # Calculate delta in each module's coordinates.
+    deltaLocationInCellFields = (
+      np.matmul(self.rotationMatrices, deltaLocation) *
+      self.cellFieldsPerUnitDistance)
+
+    # Shift the active coordinates.
+    np.add(self.activePoints, deltaLocationInCellFields[self.moduleForPoint],
+           out=self.activePoints)
+    np.mod(self.activePoints, self.cellDimensions[self.moduleForPoint],
+           out=self.activePoints)
+
+    self._computeActiveCells()
+
+
+  def anchor(self, anchorInput):
+    """
+    Infer the location of every module from sensory input. Activate any cells
+    with enough active synapses to this sensory input. Deactivate all other
+    cells.
+
+    @param anchorInput (numpy array)
+    A sensory input. This will often come from a feature-location pair layer.
+    """
+    if len(anchorInput) == 0:
+      return
+
+    # Each module has its own connections.
+    sensorySupportedCells = []
+    for i, module in enumerate(self.modules):
+      overlaps = module.connections.computeActivity(anchorInput,
+                                                    module.connectedPermanence)
+      module.activeSegments = np.where(
+        overlaps >= module.activationThreshold)[0]
+      sensorySupportedCells.append(
+        np.unique(module.connections.mapSegmentsToCells(
+          module.activeSegments)) + self.cellOffsets[i])
+    sensorySupportedCells = np.concatenate(sensorySupportedCells +
+                                           [np.empty(0, dtype="int")])
+
+    # Remove the points on cells that lost sensory support.
+    keep = np.in1d(self.cellsForActivePoints, sensorySupportedCells)
+    activePoints = self.activePoints[keep]
+    moduleForPoint = self.moduleForPoint[keep]
+
+    # Add points for newly activated cells. Within each module, order them
+    # by point offset, then by cell.
+    activated = np.setdiff1d(sensorySupportedCells, self.activeCells)
+    moduleForActivated = np.searchsorted(self.cellOffsets, activated,
+                                         side="right") - 1
+    pointsPerCell = self.pointsPerCell[moduleForActivated]
+    moduleForNewPoint = np.repeat(moduleForActivated, pointsPerCell)
+    cellForNewPoint = np.repeat(activated -
+                                self.cellOffsets[moduleForActivated],
+                                pointsPerCell)
+    offsetForNewPoint = (np.arange(pointsPerCell.sum()) -
+                         np.repeat(np.cumsum(pointsPerCell) - pointsPerCell,
+                                   pointsPerCell))
+    order = np.lexsort((cellForNewPoint, offsetForNewPoint, moduleForNewPoint))
+    moduleForNewPoint = moduleForNewPoint[order]
+    cellForNewPoint = cellForNewPoint[order]
+    offsetForNewPoint = offsetForNewPoint[order]
+
+    newPoints = np.transpose(np.divmod(
+      cellForNewPoint,
+      self.cellDimensions[moduleForNewPoint, 1])).astype("float")
+    newPoints += self.pointOffsets[self.pointOffsetStart[moduleForNewPoint] +
+                                   offsetForNewPoint]
+
+    # Keep the points sorted by module, with new points after existing ones.
+    moduleForPoint = np.append(moduleForPoint, moduleForNewPoint)
+    order = np.argsort(moduleForPoint, kind="mergesort")
+    self.activePoints = np.append(activePoints, newPoints, axis=0)[order]
+    self.moduleForPoint = moduleForPoint[order]
+
+    self._computeActiveCells()
+
+
+  def getActiveCells(self):
+    """
+    @return (numpy array)
+    The active cells of every module, numbered globally
+    """
+    return self.activeCells
+
+
+  def numberOfCells(self):
+    return self.cellOffsets[-1]
+
+
+
 class BodyToSpecificObjectModule2D(object):
   """
   Represents the body's location relative to a specific object. Typically
@@ -369,15 +575,24 @@ class BodyToSpecificObjectModule2D(object):
   SensorToSpecificObjectModules.
   """
 
-  def __init__(self, cellDimensions):
+  def __init__(self, cellDimensions, connectionsImplementation="cpp",
+               proceduralMetricConnections=True):
     """
     Initialize this instance, and form all reciprocal connections between this
     instance and an array of SensorToSpecificObjectModules.
 
     @param cellDimensions (sequence of ints)
     @param sensorToSpecificObjectByColumn (sequence of SensorToSpecificObjectModules)
+    @param connectionsImplementation (str)
+
+    @param proceduralMetricConnections (bool)
+    If true, the metric connections are computed from the cell coordinates
+    rather than stored as 4*cellCount**2 segments per cortical column. The
+    results are identical.
     """
     self.cellCount = np.prod(cellDimensions)
+    self.connectionsImplementation = connectionsImplementation
+    self.proceduralMetricConnections = proceduralMetricConnections
     self.cellDimensions = np.asarray(cellDimensions)
     self.connectedPermanence = 0.5
 
@@ -390,12 +605,32 @@ class BodyToSpecificObjectModule2D(object):
 
 
   def formReciprocalSynapses(self, sensorToSpecificObjectByColumn):
+    if self.proceduralMetricConnections:
+      # The connections are the same for every column, and they don't store
+      # any state, so every column can share them.
+      connections = MetricConnections2D(self.cellDimensions, "bodyLocation", {
+        "sensorToBody": "sensorOffset",
+        "sensorToSpecificObject": "sensorLocation",
+      })
+      self.connectionsByColumn = [connections] * len(
+        sensorToSpecificObjectByColumn)
+
+      sensorConnections = MetricConnections2D(
+        self.cellDimensions, "sensorLocation", {
+          "sensorToBody": "sensorOffset",
+          "bodyToSpecificObject": "bodyLocation",
+        })
+      for sensorToSpecificObject in sensorToSpecificObjectByColumn:
+        sensorToSpecificObject.metricConnections = sensorConnections
+      return
+
     cellCountBySource = {
       "sensorToSpecificObject": self.cellCount,
       "sensorToBody": self.cellCount,
     }
     self.connectionsByColumn = [
-      Multiconnections(self.cellCount, cellCountBySource)
+      Multiconnections(self.cellCount, cellCountBySource,
+                       self.connectionsImplementation)
       for _ in xrange(len(sensorToSpecificObjectByColumn))]
 
     # Create a list of location-location-offset triples as 3 numpy arrays.
@@ -519,11 +754,10 @@ class BodyToSpecificObjectModule2D(object):
          activeSensorToSpecificObjectCells) in zip(self.connectionsByColumn,
                                                    sensorToBodyByColumn,
                                                    sensorToSpecificObjectByColumn):
-      overlaps = connections.computeActivity({
+      activeSegments = connections.computeActiveSegments({
         "sensorToBody": activeSensorToBodyCells,
         "sensorToSpecificObject": activeSensorToSpecificObjectCells,
-      })
-      activeSegments = np.where(overlaps >= 2)[0]
+      }, 2)
       votes = connections.mapSegmentsToCells(activeSegments)
       votes = np.unique(votes)  # Only allow a column to vote for a cell once.
       votesByCell[votes] += 1
@@ -585,11 +819,13 @@ class SensorToSpecificObjectModule(object):
                permanenceIncrement=0.1,
                permanenceDecrement=0.0,
                maxSynapsesPerSegment=-1,
-               seed=42):
+               seed=42,
+               connectionsImplementation="cpp"):
     """
     @param cellDimensions (sequence of ints)
     @param anchorInputSize (int)
     @param activationThreshold (int)
+    @param connectionsImplementation (str)
     """
     self.activationThreshold = activationThreshold
     self.initialPermanence = initialPermanence
@@ -601,7 +837,7 @@ class SensorToSpecificObjectModule(object):
     self.activationThreshold = activationThreshold
     self.maxSynapsesPerSegment = maxSynapsesPerSegment
 
-    self.rng = Random(seed)
+    self.rng = createRandom(seed, connectionsImplementation)
 
     self.cellCount = np.prod(cellDimensions)
     cellCountBySource = {
@@ -609,9 +845,11 @@ class SensorToSpecificObjectModule(object):
       "sensorToBody": self.cellCount,
     }
     self.metricConnections = Multiconnections(self.cellCount,
-                                              cellCountBySource)
-    self.anchorConnections = SparseMatrixConnections(self.cellCount,
-                                                     anchorInputSize)
+                                              cellCountBySource,
+                                              connectionsImplementation)
+    self.anchorConnections = createConnections(self.cellCount,
+                                               anchorInputSize,
+                                               connectionsImplementation)
 
 
   def reset(self):
@@ -635,12 +873,10 @@ class SensorToSpecificObjectModule(object):
     Active cells of a single module that represents the body's location relative
     to a specific object
     """
-    overlaps = self.metricConnections.computeActivity({
+    self.activeMetricSegments = self.metricConnections.computeActiveSegments({
       "bodyToSpecificObject": bodyToSpecificObject,
       "sensorToBody": sensorToBody,
-    })
-
-    self.activeMetricSegments = np.where(overlaps >= 2)[0]
+    }, 2)
     self.activeCells = np.unique(
       self.metricConnections.mapSegmentsToCells(
         self.activeMetricSegments))
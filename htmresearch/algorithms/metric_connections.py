@@ -0,0 +1,269 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Procedural version of the fixed metric connections between location modules
+"""
+
+import numpy as np
+
+
+# The offset adjustment for each of the 4 segments of a
+# bodyLocation-sensorOffset pair. An offset covers a 1x1 range of offsets.
+_OFFSET_ADJUSTMENT_I = np.array([0, -1, 0, -1])
+_OFFSET_ADJUSTMENT_J = np.array([0, 0, -1, -1])
+
+_ROLES = ("bodyLocation", "sensorOffset", "sensorLocation")
+
+
+class MetricConnections2D(object):
+  """
+  Computes the activity of the metric connections formed by
+  BodyToSpecificObjectModule2D without storing any synapses.
+
+  The materialized connections contain one segment for each
+  bodyLocation-sensorOffset-k triple, where k selects one of 4 adjustments to
+  the offset, and each segment connects three cells:
+
+    sensorLocation = bodyLocation + sensorOffset (mod cellDimensions)
+
+  One of the three cells is the postsynaptic cell, the other two are the
+  presynaptic cells. Segments are numbered in the same order in which
+  BodyToSpecificObjectModule2D creates them:
+
+    segment = (bodyLocation * cellCount + sensorOffset) * 4 + k
+
+  so segment numbers are interchangeable with those of a Multiconnections
+  instance that has these segments grown. Only O(cellCount) memory is used.
+  """
+
+  def __init__(self, cellDimensions, postsynapticRole, roleBySource):
+    """
+    @param cellDimensions (sequence of ints)
+
+    @param postsynapticRole (str)
+    One of "bodyLocation", "sensorOffset", "sensorLocation"
+
+    @param roleBySource (dict)
+    The role of the cells in each presynaptic source. Example:
+      {"sensorToBody": "sensorOffset",
+       "sensorToSpecificObject": "sensorLocation"}
+    """
+    assert postsynapticRole in _ROLES
+    assert len(roleBySource) == 2
+    assert set(roleBySource.values()) | set([postsynapticRole]) == set(_ROLES)
+
+    self.cellDimensions = np.asarray(cellDimensions)
+    self.cellCount = np.prod(self.cellDimensions)
+    self.postsynapticRole = postsynapticRole
+    self.roleBySource = dict(roleBySource)
+    self.segmentCount = 4 * self.cellCount * self.cellCount
+
+    # The offset vector for each sensorOffset-k pair, cellCount x 4
+    offset_i, offset_j = np.unravel_index(np.arange(self.cellCount),
+                                          self.cellDimensions)
+    self.d_i = ((offset_i - (self.cellDimensions[0] // 2)).reshape((-1, 1)) +
+                _OFFSET_ADJUSTMENT_I)
+    self.d_j = ((offset_j - (self.cellDimensions[1] // 2)).reshape((-1, 1)) +
+                _OFFSET_ADJUSTMENT_J)
+
+
+  def _decompose(self, segments):
+    segments = np.asarray(segments, dtype="int64")
+    k = segments % 4
+    pairs = segments // 4
+    return pairs // self.cellCount, pairs % self.cellCount, k
+
+
+  def _compose(self, bodyLocationCells, sensorOffsetCells, k):
+    return (bodyLocationCells.astype("int64") * self.cellCount +
+            sensorOffsetCells) * 4 + k
+
+
+  def _addOffset(self, cells, sensorOffsetCells, k, sign):
+    cell_i, cell_j = np.unravel_index(cells, self.cellDimensions)
+    result_i = np.mod(cell_i + sign * self.d_i[sensorOffsetCells, k],
+                      self.cellDimensions[0])
+    result_j = np.mod(cell_j + sign * self.d_j[sensorOffsetCells, k],
+                      self.cellDimensions[1])
+    return np.ravel_multi_index((result_i, result_j), self.cellDimensions)
+
+
+  def _getCellsForRole(self, segments, role):
+    bodyLocationCells, sensorOffsetCells, k = self._decompose(segments)
+    if role == "bodyLocation":
+      return bodyLocationCells
+    elif role == "sensorOffset":
+      return sensorOffsetCells
+    else:
+      return self._addOffset(bodyLocationCells, sensorOffsetCells, k, 1)
+
+
+  def _getSegmentsForCells(self, cells, role):
+    """
+    Get every segment that has a synapse to (or is on) any of the cells.
+    """
+    cells = np.unique(np.asarray(cells, dtype="int64"))
+    everyCell = np.arange(self.cellCount)
+
+    if role == "bodyLocation":
+      bodyLocationCells = np.repeat(cells, 4 * self.cellCount)
+      sensorOffsetCells = np.tile(np.repeat(everyCell, 4), cells.size)
+      k = np.tile(np.arange(4), cells.size * self.cellCount)
+    elif role == "sensorOffset":
+      bodyLocationCells = np.repeat(everyCell, 4 * cells.size)
+      sensorOffsetCells = np.tile(np.repeat(cells, 4), self.cellCount)
+      k = np.tile(np.arange(4), cells.size * self.cellCount)
+    else:
+      sensorLocationCells = np.repeat(cells, 4 * self.cellCount)
+      sensorOffsetCells = np.tile(np.repeat(everyCell, 4), cells.size)
+      k = np.tile(np.arange(4), cells.size * self.cellCount)
+      bodyLocationCells = self._addOffset(sensorLocationCells,
+                                          sensorOffsetCells, k, -1)
+
+    return self._compose(bodyLocationCells, sensorOffsetCells, k)
+
+
+  def _getSegmentsForCellPairs(self, cellsByRole):
+    """
+    Get every segment that has synapses to (or is on) a cell from each of the
+    two specified roles.
+
+    @param cellsByRole (dict)
+    Active cells for exactly two roles
+    """
+    k = np.arange(4)
+
+    if "bodyLocation" in cellsByRole and "sensorOffset" in cellsByRole:
+      bodyLocationCells, sensorOffsetCells, k = np.meshgrid(
+        cellsByRole["bodyLocation"], cellsByRole["sensorOffset"], k,
+        indexing="ij")
+    elif "sensorOffset" in cellsByRole:
+      sensorOffsetCells, sensorLocationCells, k = np.meshgrid(
+        cellsByRole["sensorOffset"], cellsByRole["sensorLocation"], k,
+        indexing="ij")
+      bodyLocationCells = self._addOffset(sensorLocationCells,
+                                          sensorOffsetCells, k, -1)
+    else:
+      # Find the sensorOffset that moves the body location onto the sensor
+      # location, once for each of the 4 offset adjustments.
+      bodyLocationCells, sensorLocationCells, k = np.meshgrid(
+        cellsByRole["bodyLocation"], cellsByRole["sensorLocation"], k,
+        indexing="ij")
+      body_i, body_j = np.unravel_index(bodyLocationCells, self.cellDimensions)
+      sensor_i, sensor_j = np.unravel_index(sensorLocationCells,
+                                            self.cellDimensions)
+      offset_i = np.mod(sensor_i - body_i + (self.cellDimensions[0] // 2) -
+                        _OFFSET_ADJUSTMENT_I[k], self.cellDimensions[0])
+      offset_j = np.mod(sensor_j - body_j + (self.cellDimensions[1] // 2) -
+                        _OFFSET_ADJUSTMENT_J[k], self.cellDimensions[1])
+      sensorOffsetCells = np.ravel_multi_index((offset_i, offset_j),
+                                               self.cellDimensions)
+
+    return self._compose(bodyLocationCells.ravel(), sensorOffsetCells.ravel(),
+                         k.ravel())
+
+
+  def computeActivity(self, activeInputsBySource, permanenceThreshold=None):
+    """
+    Calculate the number of active synapses per segment.
+
+    This returns a dense vector with one entry per segment, so it uses
+    O(cellCount**2) memory. Use computeActiveSegments to avoid this.
+
+    @param activeInputsBySource (dict)
+    The active cells in each source. Example:
+      {"customInputName1": np.array([42, 69])}
+    """
+    overlaps = np.zeros(self.segmentCount, dtype="int32")
+
+    # Every synapse has permanence 1.0.
+    if permanenceThreshold is not None and permanenceThreshold > 1.0:
+      return overlaps
+
+    for source, activeCells in activeInputsBySource.iteritems():
+      overlaps[self._getSegmentsForCells(activeCells,
+                                         self.roleBySource[source])] += 1
+
+    return overlaps
+
+
+  def computeActiveSegments(self, activeInputsBySource, activationThreshold):
+    """
+    Get the segments with at least activationThreshold active synapses, sorted.
+
+    When every source must be active, only the segments that connect pairs of
+    active cells are enumerated.
+
+    @param activeInputsBySource (dict)
+    The active cells in each source
+
+    @param activationThreshold (int)
+    """
+    if (activationThreshold == 2 and
+        set(activeInputsBySource.iterkeys()) == set(self.roleBySource)):
+      cellsByRole = dict(
+        (self.roleBySource[source], np.unique(np.asarray(cells,
+                                                         dtype="int64")))
+        for source, cells in activeInputsBySource.iteritems())
+      return np.unique(self._getSegmentsForCellPairs(cellsByRole))
+
+    overlaps = self.computeActivity(activeInputsBySource)
+    return np.where(overlaps >= activationThreshold)[0]
+
+
+  def mapSegmentsToCells(self, segments):
+    """
+    @param segments (numpy array)
+    """
+    return self._getCellsForRole(segments, self.postsynapticRole)
+
+
+  def filterSegmentsByCell(self, segments, cells):
+    """
+    @param segments (numpy array)
+    @param cells (numpy array)
+
+    @return (numpy array)
+    The segments that are on one of the specified cells, sorted by cell
+    """
+    segments = np.asarray(segments)
+    cellForSegment = self.mapSegmentsToCells(segments)
+    include = np.in1d(cellForSegment, cells)
+    segments = segments[include]
+    return segments[np.argsort(cellForSegment[include], kind="mergesort")]
+
+
+  def getPermanences(self, segment, source):
+    """
+    Get the permanences from a segment to every cell in a source.
+
+    @param segment (int)
+    @param source (str)
+
+    @return (numpy array)
+    A dense vector with one permanence per cell in the source
+    """
+    permanences = np.zeros(self.cellCount, dtype="float32")
+    cell = self._getCellsForRole(np.array([segment]),
+                                 self.roleBySource[source])
+    permanences[cell] = 1.0
+    return permanences
@@ -23,7 +23,7 @@
 
 import numpy as np
 
-from nupic.bindings.math import SparseMatrixConnections
+from htmresearch.algorithms.csr_connections import createConnections
 
 
 class Multiconnections(object):
@@ -31,20 +31,60 @@ class Multiconnections(object):
   A Connections class that organizes its connections by presynaptic layer.
   Every segment can form synapses to multiple presynaptic layers.
 
-  We could port this class to C++ and reduce a lot of redundant segment
-  bookkeeping.
+  All sources share a single underlying connections object. Each source is
+  assigned a contiguous range of presynaptic cell ids, so a segment's synapses
+  to every source live in one row and the activity of all sources is computed
+  in a single pass.
   """
-  def __init__(self, cellCount, cellCountBySource):
+  def __init__(self, cellCount, cellCountBySource,
+               connectionsImplementation="cpp"):
     """
     @param cellCountBySource (dict)
     The number of cells in each source. Example:
       {"customInputName1": 16,
        "customInputName2": 42}
+
+    @param connectionsImplementation (str)
+    "cpp" for nupic's SparseMatrixConnections, "numpy" for CSRConnections
+    """
+    self.cellCountBySource = dict(cellCountBySource)
+
+    self.offsetBySource = {}
+    totalInputCount = 0
+    for source in sorted(cellCountBySource.iterkeys()):
+      self.offsetBySource[source] = totalInputCount
+      totalInputCount += cellCountBySource[source]
+
+    self.connections = createConnections(cellCount, totalInputCount,
+                                         connectionsImplementation)
+
+    # Reused by _toInputIds to avoid allocating a new input vector per call.
+    self._inputBuffer = np.empty(totalInputCount, dtype="uint32")
+
+
+  def _toInputIds(self, cellsBySource):
+    """
+    Translate per-source cell ids into ids in the shared presynaptic space.
+
+    @param cellsBySource (dict)
+    The cells in each source. Sources that aren't present are skipped.
+
+    @return (numpy array)
+    A view into a reused buffer. It is only valid until the next call.
     """
+    totalCount = sum(len(cells) for cells in cellsBySource.itervalues())
+    if totalCount > self._inputBuffer.size:
+      self._inputBuffer = np.empty(totalCount, dtype="uint32")
 
-    self.connectionsBySource = dict(
-      (source, SparseMatrixConnections(cellCount, presynapticCellCount))
-      for source, presynapticCellCount in cellCountBySource.iteritems())
+    end = 0
+    for source, cells in cellsBySource.iteritems():
+      offset = self.offsetBySource[source]
+      count = len(cells)
+      np.add(cells, offset, out=self._inputBuffer[end:end + count],
+             casting="unsafe")
+      end += count
+
+    return self._inputBuffer[:end]
 
 
   def computeActivity(self, activeInputsBySource, permanenceThreshold=None):
@@ -55,17 +95,21 @@ class Multiconnections(object):
     The active cells in each source. Example:
       {"customInputName1": np.array([42, 69])}
     """
-    overlaps = None
+    return self.connections.computeActivity(
+      self._toInputIds(activeInputsBySource), permanenceThreshold)
+
+
+  def computeActiveSegments(self, activeInputsBySource, activationThreshold):
+    """
+    Get the segments with at least activationThreshold active synapses, sorted.
 
-    for source, connections in self.connectionsBySource.iteritems():
-      o = connections.computeActivity(activeInputsBySource[source],
-                                      permanenceThreshold)
-      if overlaps is None:
-        overlaps = o
-      else:
-        overlaps += o
+    @param activeInputsBySource (dict)
+    The active cells in each source
 
-    return overlaps
+    @param activationThreshold (int)
+    """
+    overlaps = self.computeActivity(activeInputsBySource)
+    return np.where(overlaps >= activationThreshold)[0]
 
 
   def createSegments(self, cells):
@@ -74,18 +118,7 @@ class Multiconnections(object):
 
     @param cells (numpy array)
     """
-    segments = None
-
-    for connections in self.connectionsBySource.itervalues():
-      created = connections.createSegments(cells)
-
-      if segments is None:
-        segments = created
-      else:
-        # Sanity-check that the segment numbers are the same.
-        np.testing.assert_equal(segments, created)
-
-    return segments
+    return self.connections.createSegments(cells)
 
 
   def growSynapses(self, segments, activeInputsBySource, initialPermanence):
@@ -101,9 +134,9 @@ class Multiconnections(object):
 
     @param initialPermanence (float)
     """
-    for source, connections in self.connectionsBySource.iteritems():
-      connections.growSynapses(segments, activeInputsBySource[source],
-                               initialPermanence)
+    self.connections.growSynapses(segments,
+                                  self._toInputIds(activeInputsBySource),
+                                  initialPermanence)
 
 
   def setPermanences(self, segments, presynapticCellsBySource, permanence):
@@ -129,17 +162,39 @@ class Multiconnections(object):
     @param permanence (float)
     The permanence to assign the synapse
     """
-    permanences = np.repeat(np.float32(permanence), len(segments))
+    presynapticCells = self._toInputIds(presynapticCellsBySource)
+    permanences = np.repeat(np.float32(permanence), len(presynapticCells))
 
-    for source, connections in self.connectionsBySource.iteritems():
-      if source in presynapticCellsBySource:
-        connections.matrix.setElements(segments, presynapticCellsBySource[source],
-                                       permanences)
+    self.connections.matrix.setElements(
+      np.tile(segments, len(presynapticCellsBySource)), presynapticCells,
+      permanences)
 
 
   def mapSegmentsToCells(self, segments):
     """
     @param segments (numpy array)
     """
-    connections = next(self.connectionsBySource.itervalues())
-    return connections.mapSegmentsToCells(segments)
+    return self.connections.mapSegmentsToCells(segments)
+
+
+  def filterSegmentsByCell(self, segments, cells):
+    """
+    @param segments (numpy array)
+    @param cells (numpy array)
+    """
+    return self.connections.filterSegmentsByCell(segments, cells)
+
+
+  def getPermanences(self, segment, source):
+    """
+    Get the permanences from a segment to every cell in a source.
+
+    @param segment (int)
+    @param source (str)
+
+    @return (numpy array)
+    A dense vector with one permanence per cell in the source
+    """
+    offset = self.offsetBySource[source]
+    row = self.connections.matrix.getRow(segment)
+    return row[offset:offset + self.cellCountBySource[source]]
@@ -26,7 +26,8 @@ A single-layer approach to computing a location
 import numpy as np
 
 from htmresearch.support import numpy_helpers as np2
-from nupic.bindings.math import SparseMatrixConnections, Random
+from htmresearch.algorithms.csr_connections import (createConnections,
+                                                     createRandom)
 
 
 
@@ -68,19 +69,20 @@ class SingleLayerLocationMemory(object):
                permanenceIncrement=0.1,
                permanenceDecrement=0.1,
                maxSynapsesPerSegment=-1,
-               seed=42):
+               seed=42,
+               connectionsImplementation="cpp"):
 
     # For transition learning, every segment is split into two parts.
     # For the segment to be active, both parts must be active.
-    self.internalConnections = SparseMatrixConnections(
-      cellCount, cellCount)
-    self.deltaConnections = SparseMatrixConnections(
-      cellCount, deltaLocationInputSize)
+    self.internalConnections = createConnections(
+      cellCount, cellCount, connectionsImplementation)
+    self.deltaConnections = createConnections(
+      cellCount, deltaLocationInputSize, connectionsImplementation)
 
     # Distal segments that receive input from the layer that represents
     # feature-locations.
-    self.featureLocationConnections = SparseMatrixConnections(
-      cellCount, featureLocationInputSize)
+    self.featureLocationConnections = createConnections(
+      cellCount, featureLocationInputSize, connectionsImplementation)
 
     self.activeCells = np.empty(0, dtype="uint32")
     self.activeDeltaSegments = np.empty(0, dtype="uint32")
@@ -95,7 +97,7 @@ class SingleLayerLocationMemory(object):
     self.activationThreshold = activationThreshold
     self.maxSynapsesPerSegment = maxSynapsesPerSegment
 
-    self.rng = Random(seed)
+    self.rng = createRandom(seed, connectionsImplementation)
 
 
   def reset(self):
@@ -282,6 +282,12 @@ class TemporalPooler(SpatialPooler):
     self._potentialPools = SparseBinaryMatrix(numInputs)
     self._potentialPools.resize(numColumns, numInputs)
 
+    # Input-major copy of the potential pools, used by
+    # _calculatePotentialOverlapSparse. It's built on first use, and discarded
+    # whenever the potential pools change.
+    self._potentialColumnsByInput = None
+    self._potentialInputStarts = None
+
     # Initialize the permanences for each column. Similar to the
     # 'self._potentialPools', the permanences are stored in a matrix whose rows
     # represent the cortical columns, and whose columns represent the input
@@ -362,6 +368,29 @@ class TemporalPooler(SpatialPooler):
     #   self._updatePermanencesForColumn(perm, i, raisePerm=True)
 
 
+  def setPotential(self, columnIndex, potential):
+    """
+    Sets the potential mapping for a given column. The potential pools are
+    stored in a SparseBinaryMatrix here, so this replaces the column's row of
+    it, and discards the input-major copy.
+
+    Parameters:
+    ----------------------------
+    columnIndex:  the index of the column
+    potential:    a numInputs array, nonzero at the column's potential inputs
+    """
+    assert(columnIndex < self._numColumns)
+
+    potentialSparse = numpy.where(potential > 0)[0]
+    if len(potentialSparse) < self._stimulusThreshold:
+      raise Exception("This is likely due to a " +
+      "value of stimulusThreshold that is too large relative " +
+      "to the input size.")
+
+    self._potentialPools.replaceSparseRow(columnIndex, potentialSparse)
+    self._potentialColumnsByInput = None
+
+
   def reset(self):
     """
     Reset the state of the temporal pooler
@@ -383,6 +412,8 @@ class TemporalPooler(SpatialPooler):
     This is the primary public method of the class. This function takes an input
     vector and outputs the indices of the active columns.
 
+    The dense inputs are converted to indices and passed to computeSparse.
+
     New parameters defined here:
     ----------------------------
     @param inputVector:         The active cells from a Temporal Memory
@@ -402,14 +433,47 @@ class TemporalPooler(SpatialPooler):
     assert (numpy.size(inputVector) == self._numInputs)
     assert (numpy.size(predictedCells) == self._numInputs)
 
+    return self.computeSparse(numpy.flatnonzero(inputVector), learn,
+                              activeArray, burstingColumns,
+                              numpy.flatnonzero(predictedCells))
+
+
+  def computeSparse(self, activeInputs, learn, activeArray, burstingColumns,
+                    predictedInputs):
+    """
+    Same as compute, but the active and correctly predicted input cells are
+    given as indices. Gives the same results as compute.
+
+    The indices are used directly for the pooling overlap. The overlaps with
+    connected synapses still build a dense indicator vector for each of the
+    two passes, since the bindings have no sparse-input kernel, and learning
+    builds dense permanence changes and an active columns x inputs matrix of
+    permanences, written back one column at a time.
+
+    Parameters:
+    ----------------------------
+    @param activeInputs:        The indices of the active cells from a Temporal
+                                Memory
+    @param learn:               A Boolean specifying whether learning will be
+                                performed
+    @param activeArray:         An array representing the active columns
+                                produced by this method
+    @param burstingColumns:     A numpy array with numColumns elements having
+                                binary values with 1 representing a
+                                currently bursting column in Temporal Memory.
+    @param predictedInputs:     The indices of the cells that switched from
+                                predicted state in the previous time step to
+                                active state in the current timestep
+    """
+    activeInputs = numpy.unique(numpy.asarray(activeInputs, dtype=uintType))
+    predictedInputs = numpy.unique(numpy.asarray(predictedInputs,
+                                                 dtype=uintType))
+
     self._updateBookeepingVars(learn)
-    inputVector = numpy.array(inputVector, dtype=realDType)
-    predictedCells = numpy.array(predictedCells, dtype=realDType)
-    inputVector.reshape(-1)
 
     if self._spVerbosity > 3:
-      print " Input bits: ", inputVector.nonzero()[0]
-      print " predictedCells: ", predictedCells.nonzero()[0]
+      print " Input bits: ", activeInputs
+      print " predictedCells: ", predictedInputs
 
     # Phase 1: Calculate overlap scores
     # The overlap score has 4 components:
@@ -419,9 +483,20 @@ class TemporalPooler(SpatialPooler):
     # (3) Overlap between correctly predicted input cells and all TP cells
     # (4) Overlap from bursting columns in TM and all TP cells
 
+    # 3) overlap with predicted inputs
+    # NEW: Isn't this redundant with 1 and 2)? This looks at connected synapses
+    # only.
+    # If 1) is called with learning=False connected synapses are used and
+    # it is somewhat redundant although there is a boosting factor in 1) which
+    # makes 1's effect stronger. If 1) is called with learning=True it's less
+    # redundant
+    overlapsPredicted = self._calculateOverlapSparse(self._connectedSynapses,
+                                                     predictedInputs)
+
     # 1) Calculate pooling overlap
     if self.usePoolingRule:
-      overlapsPooling = self._calculatePoolingActivity(predictedCells, learn)
+      overlapsPooling = self._calculatePoolingActivity(predictedInputs, learn,
+                                                       overlapsPredicted)
 
       if self._spVerbosity > 4:
         print "usePoolingRule: Overlaps after step 1:"
@@ -431,20 +506,12 @@ class TemporalPooler(SpatialPooler):
       overlapsPooling = 0
 
     # 2) Calculate overlap between active input cells and connected synapses
-    overlapsAllInput = self._calculateOverlap(inputVector)
-
-    # 3) overlap with predicted inputs
-    # NEW: Isn't this redundant with 1 and 2)? This looks at connected synapses
-    # only.
-    # If 1) is called with learning=False connected synapses are used and
-    # it is somewhat redundant although there is a boosting factor in 1) which
-    # makes 1's effect stronger. If 1) is called with learning=True it's less
-    # redundant
-    overlapsPredicted = self._calculateOverlap(predictedCells)
+    overlapsAllInput = self._calculateOverlapSparse(self._connectedSynapses,
+                                                    activeInputs)
 
     if self._spVerbosity > 4:
       print "Overlaps with all inputs:"
-      print " Number of On Bits: ", inputVector.sum()
+      print " Number of On Bits: ", len(activeInputs)
       print "   ", overlapsAllInput
 
       print "Overlaps with predicted inputs:"
@@ -478,7 +545,7 @@ class TemporalPooler(SpatialPooler):
     activeColumns = self._inhibitColumns(boostedOverlaps)
 
     if learn:
-      self._adaptSynapses(inputVector, activeColumns, predictedCells)
+      self._adaptSynapses(activeInputs, activeColumns, predictedInputs)
       self._updateDutyCycles(overlaps, activeColumns)
       self._bumpUpWeakColumns()
       self._updateBoostFactors()
@@ -494,8 +561,10 @@ class TemporalPooler(SpatialPooler):
     activeColumnIndices = numpy.where(overlapsPredicted[activeColumns] > 0)[0]
     activeColWithPredictedInput = activeColumns[activeColumnIndices]
 
+    # The number of predicted inputs has always been counted as the size of
+    # the dense predictedCells vector, i.e. numInputs.
     numUnPredictedInput = float(len(burstingColumns.nonzero()[0]))
-    numPredictedInput = float(len(predictedCells))
+    numPredictedInput = float(self._numInputs)
     fracUnPredicted = numUnPredictedInput / (numUnPredictedInput +
                                              numPredictedInput)
 
@@ -513,6 +582,60 @@ class TemporalPooler(SpatialPooler):
     return activeColumns
 
 
+  def _calculateOverlapSparse(self, matrix, inputIndices):
+    """
+    Count, for each column, the nonzeros of its row of matrix at the given
+    inputs.
+
+    Parameters:
+    ----------------------------
+    matrix:       a numColumns x numInputs SparseBinaryMatrix, e.g.
+                  self._connectedSynapses
+    inputIndices: the indices of the active inputs
+    returns:      an array of overlap values
+    """
+    overlaps = numpy.zeros(self._numColumns, dtype=realDType)
+    if len(inputIndices) > 0:
+      inputVector = numpy.zeros(self._numInputs, dtype=realDType)
+      inputVector[inputIndices] = 1
+      matrix.rightVecSumAtNZ_fast(inputVector, overlaps)
+    return overlaps
+
+
+  def _calculatePotentialOverlapSparse(self, inputIndices):
+    """
+    Same as _calculateOverlapSparse(self._potentialPools, inputIndices), but
+    only visits the columns whose potential pools contain the given inputs.
+    It uses an input-major copy of the potential pools, which is built on
+    first use and rebuilt after setPotential.
+
+    Parameters:
+    ----------------------------
+    inputIndices: the unique indices of the active inputs
+    returns:      an array of overlap values
+    """
+    if self._potentialColumnsByInput is None:
+      columns = []
+      inputs = []
+      for i in xrange(self._numColumns):
+        potential = numpy.flatnonzero(self._potentialPools.getRow(i))
+        columns.append(numpy.repeat(numpy.int32(i), len(potential)))
+        inputs.append(potential)
+      inputs = numpy.concatenate(inputs)
+      order = numpy.argsort(inputs, kind="mergesort")
+      self._potentialColumnsByInput = numpy.concatenate(columns)[order]
+      self._potentialInputStarts = numpy.concatenate(
+        ([0], numpy.cumsum(numpy.bincount(inputs, minlength=self._numInputs))))
+
+    starts = self._potentialInputStarts[inputIndices]
+    lengths = self._potentialInputStarts[inputIndices + 1] - starts
+    ends = numpy.cumsum(lengths)
+    positions = (numpy.arange(lengths.sum()) +
+                 numpy.repeat(starts - (ends - lengths), lengths))
+    return numpy.bincount(self._potentialColumnsByInput[positions],
+                          minlength=self._numColumns).astype(realDType)
+
+
   def _updatePoolingState(self, activeColWithPredictedInput, fractionUnpredicted):
     """
     This function updates the pooling state of TP cells. A cell will stop
@@ -538,7 +661,8 @@ class TemporalPooler(SpatialPooler):
     self._poolingColumns = self._poolingActivation.nonzero()[0]
 
 
-  def _calculatePoolingActivity(self, predictedActiveCells, learn):
+  def _calculatePoolingActivity(self, predictedInputs, learn,
+                                overlapsPredicted):
     """
     Determines each column's overlap with predicted active cell input.
     If learning, overlap is calculated between predicted active input cells and
@@ -557,45 +681,41 @@ class TemporalPooler(SpatialPooler):
 
     Parameters:
     ----------------------------
-    predictedActiveCells: a numpy array with numInputs elements. A 1 indicates
-                          that this cell switched from a predicted state in
-                          the previous time step to active state in the current
-                          timestep
+    predictedInputs:      the indices of the cells that switched from a
+                          predicted state in the previous time step to active
+                          state in the current timestep
+    overlapsPredicted:    the overlap of every column's connected synapses
+                          with predictedInputs, reused at inference
     returns:              an array of overlap values due to predicted
                           active TM cells
     """
-
-
-    overlaps = numpy.zeros(self._numColumns).astype(realDType)
+    overlaps = numpy.zeros(self._numColumns, dtype=realDType)
 
     # If no pooling columns or no predicted active inputs, return all zeros
-    if (sum(self._poolingActivation) == 0 or
-       len(predictedActiveCells.nonzero()[0]) == 0):
+    poolingColumns = self._poolingColumns
+    if len(poolingColumns) == 0 or len(predictedInputs) == 0:
       return overlaps
 
     if learn:
       # During learning, overlap is calculated based on potential synapses.
-      self._potentialPools.rightVecSumAtNZ_fast(predictedActiveCells, overlaps)
+      predictedOverlaps = self._calculatePotentialOverlapSparse(
+        predictedInputs)
     else:
       # At inference stage, overlap is calculated based on connected synapses.
-      self._connectedSynapses.rightVecSumAtNZ_fast(predictedActiveCells, overlaps)
+      predictedOverlaps = overlapsPredicted
 
-    poolingColumns = self._poolingColumns
-
-    # Only consider columns that are in pooling state
-    mask = numpy.zeros(self._numColumns).astype(realDType)
-    mask[poolingColumns] = 1
-    overlaps = overlaps * mask
+    # Only consider columns that are in pooling state.
     # Pooling TP cells that receive predicted input
     # will have their overlap boosted by a large factor so that they are likely
     # to win the inhibition competition
     boostFactorPooling = self._boostStrength * self._numInputs
-    overlaps = boostFactorPooling * overlaps
+    overlaps[poolingColumns] = (boostFactorPooling *
+                                predictedOverlaps[poolingColumns])
 
     if self._spVerbosity > 3:
       print "\n============== In _calculatePoolingActivity ======"
       print "Received predicted cell inputs from following indices:"
-      print "   ", predictedActiveCells.nonzero()[0]
+      print "   ", predictedInputs
       print "The following column indices are in pooling state:"
       print "   ", poolingColumns
       print "Overlap score of pooling columns:"
@@ -621,11 +741,13 @@ class TemporalPooler(SpatialPooler):
     return overlaps
 
 
-  def _adaptSynapses(self, inputVector, activeColumns, predictedActiveCells):
+  def _adaptSynapses(self, activeInputs, activeColumns, predictedInputs):
     """
     This is the primary learning method. It updates synapses' permanence based
     on the bottom-up input to the TP and the TP's active cells.
-    For each active cell, its synapses' permanences are updated as follows:
+    The permanences of all active cells are updated at once, and each cell is
+    written back once. For each active cell, its synapses' permanences are
+    updated as follows:
 
     1. if pre-synaptic input is ON due to a correctly predicted cell,
        increase permanence by _synPredictedInc
@@ -635,42 +757,48 @@ class TemporalPooler(SpatialPooler):
 
     Parameters:
     ----------------------------
-    inputVector:    a numpy array whose ON bits represent the active cells from
-                    temporal memory
+    activeInputs:   the indices of the active cells from temporal memory
     activeColumns:  an array containing the indices of the columns that
                     survived the inhibition step
-    predictedActiveCells: a numpy array with numInputs elements. A 1 indicates
-                          that this cell switched from predicted state in
-                          the previous time step to active state in the current
-                          timestep
+    predictedInputs: the indices of the cells that switched from predicted
+                     state in the previous time step to active state in the
+                     current timestep
     """
-    inputIndices = numpy.where(inputVector > 0)[0]
-    predictedIndices = numpy.where(predictedActiveCells > 0)[0]
     permChanges = numpy.zeros(self._numInputs)
 
     # Decrement inactive TM cell -> active TP cell connections
     permChanges.fill(-1 * self._synPermInactiveDec)
 
     # Increment active TM cell -> active TP cell connections
-    permChanges[inputIndices] = self._synPermActiveInc
+    permChanges[activeInputs] = self._synPermActiveInc
 
     # Increment correctly predicted TM cell -> active TP cell connections
-    permChanges[predictedIndices] = self._synPredictedInc
+    permChanges[predictedInputs] = self._synPredictedInc
 
     if self._spVerbosity > 4:
       print "\n============== _adaptSynapses ======"
-      print "Active input indices:",inputIndices
-      print "predicted input indices:",predictedIndices
+      print "Active input indices:",activeInputs
+      print "predicted input indices:",predictedInputs
       print "\n============== _adaptSynapses ======\n"
 
-    for i in activeColumns:
-      # Get the permanences of the synapses of TP cell i
-      perm = self._permanences.getRow(i)
+    if len(activeColumns) == 0:
+      return
+
+    # Get the permanences of the synapses of the active TP cells, and their
+    # potential pools (receptive fields)
+    permanences = numpy.empty((len(activeColumns), self._numInputs),
+                              dtype=realDType)
+    potential = numpy.empty((len(activeColumns), self._numInputs),
+                            dtype=bool)
+    for row, i in enumerate(activeColumns):
+      permanences[row] = self._permanences.getRow(i)
+      potential[row] = self._potentialPools.getRow(i) > 0
+
+    # Only consider connections in each column's potential pool
+    permanences += permChanges * potential
 
-      # Only consider connections in column's potential pool (receptive field)
-      maskPotential = numpy.where(self._potentialPools.getRow(i) > 0)[0]
-      perm[maskPotential] += permChanges[maskPotential]
-      self._updatePermanencesForColumn(perm, i, raisePerm=False)
+    for row, i in enumerate(activeColumns):
+      self._updatePermanencesForColumn(permanences[row], i, raisePerm=False)
 
 
 
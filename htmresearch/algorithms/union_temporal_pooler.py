@@ -36,6 +36,9 @@ from htmresearch.frameworks.union_temporal_pooling.activation.decay_functions.de
 REAL_DTYPE = GetNTAReal()
 UINT_DTYPE = "uint32"
 _TIE_BREAKER_FACTOR = 0.000001
+# Relative margin on the bound of the activation of cells outside the
+# incremental union candidates
+_OUTSIDE_BOUND_TOLERANCE = 1e-4
 
 
 
@@ -61,6 +64,7 @@ class UnionTemporalPooler(SpatialPooler):
                synPermPreviousPredActiveInc=0.0,
                historyLength=0,
                minHistory=0,
+               incrementalUnion=False,
                **kwargs):
     """
     Please see spatial_pooler.py in NuPIC for super class parameter
@@ -93,6 +97,15 @@ class UnionTemporalPooler(SpatialPooler):
 
     @param minHistory don't perform union (output all zeros) until buffer
     length >= minHistory
+
+    @param incrementalUnion If True, maintain the union SDR incrementally.
+        Pooling timers are tracked with a global step counter, and each step
+        only the previous union and the newly active cells compete for the
+        union, so selection usually costs O(active cells + union size)
+        instead of a sort of every column. The union is the same as with the
+        full sort: when a cell outside these could still outrank the union,
+        e.g. once activations have decayed to the scale of the tie-breaker,
+        that step falls back to the full sort.
     """
 
     super(UnionTemporalPooler, self).__init__(**kwargs)
@@ -108,6 +121,7 @@ class UnionTemporalPooler(SpatialPooler):
 
     self._historyLength = historyLength
     self._minHistory = minHistory
+    self._incrementalUnion = incrementalUnion
 
     # initialize excite/decay functions
     if exciteFunctionType == 'Fixed':
@@ -143,6 +157,8 @@ class UnionTemporalPooler(SpatialPooler):
     # pooling activation level after the latest update, used for sigmoid decay function
     self._poolingActivationInitLevel = numpy.zeros(self.getNumColumns(), dtype=REAL_DTYPE)
 
+    self._resetIncrementalUnion()
+
     # Current union SDR; the output of the union pooler algorithm
     self._unionSDR = numpy.array([], dtype=UINT_DTYPE)
 
@@ -169,6 +185,7 @@ class UnionTemporalPooler(SpatialPooler):
     self._poolingActivationInitLevel = numpy.zeros(self.getNumColumns(), dtype=REAL_DTYPE)
     self._preActiveInput = numpy.zeros(self.getNumInputs(), dtype=REAL_DTYPE)
     self._prePredictedActiveInput = numpy.zeros((self.getNumInputs(), self._historyLength), dtype=REAL_DTYPE)
+    self._resetIncrementalUnion()
 
     # Reset Spatial Pooler fields
     self.setOverlapDutyCycles(numpy.zeros(self.getNumColumns(), dtype=REAL_DTYPE))
@@ -178,6 +195,36 @@ class UnionTemporalPooler(SpatialPooler):
     self.setBoostFactors(numpy.ones(self.getNumColumns(), dtype=REAL_DTYPE))
 
 
+  def _resetIncrementalUnion(self):
+    """
+    Reset the state used by the incremental union selection.
+    """
+    # Number of pooling activation updates so far. A cell's pooling timer is
+    # the number of updates since the update that last activated it.
+    self._poolingStep = 0
+    self._lastPoolingStep = numpy.empty(self.getNumColumns(), dtype="int64")
+    self._lastPoolingStep.fill(-1000)
+
+    # The least recent activation step of any cell, and how many cells share it.
+    # Together these give the maximum pooling timer.
+    self._oldestPoolingStep = -1000
+    self._numOldestCells = self.getNumColumns()
+
+    # The most active cells after the latest update, regardless of minHistory
+    self._unionCandidates = numpy.array([], dtype=UINT_DTYPE)
+
+    # Cells activated in the latest update. Their pooling activation doesn't
+    # start to decay until the next update, so they can overtake other cells.
+    self._previousActiveCells = numpy.array([], dtype=UINT_DTYPE)
+
+    # An upper bound on the pooling activation of every cell that isn't a
+    # candidate, measured at _outsideBoundStep. These cells only decay, so the
+    # bound can be decayed along with them.
+    self._outsideActivationBound = 0.0
+    self._outsideBoundStep = 0
+    self._maxTieBreaker = self._poolingActivation_tieBreaker.max()
+
+
   def compute(self, activeInput, predictedActiveInput, learn):
     """
     Computes one cycle of the Union Temporal Pooler algorithm.
@@ -216,19 +263,27 @@ class UnionTemporalPooler(SpatialPooler):
     self._getMostActiveCells()
 
     if learn:
-      # adapt permanence of connections from predicted active inputs to newly active cell
-      # This step is the spatial pooler learning rule, applied only to the predictedActiveInput
-      # Todo: should we also include unpredicted active input in this step?
-      self._adaptSynapses(predictedActiveInput, activeCells, self.getSynPermActiveInc(), self.getSynPermInactiveDec())
-
-      # Increase permanence of connections from predicted active inputs to cells in the union SDR
-      # This is Hebbian learning applied to the current time step
-      self._adaptSynapses(predictedActiveInput, self._unionSDR, self._synPermPredActiveInc, 0.0)
+      predictedActiveIndices = numpy.where(predictedActiveInput > 0)[0]
+      updates = [
+        # adapt permanence of connections from predicted active inputs to newly active cell
+        # This step is the spatial pooler learning rule, applied only to the predictedActiveInput
+        # Todo: should we also include unpredicted active input in this step?
+        (predictedActiveIndices, activeCells, self.getSynPermActiveInc(),
+         self.getSynPermInactiveDec()),
+
+        # Increase permanence of connections from predicted active inputs to cells in the union SDR
+        # This is Hebbian learning applied to the current time step
+        (predictedActiveIndices, self._unionSDR, self._synPermPredActiveInc,
+         0.0)]
 
       # adapt permenence of connections from previously predicted inputs to newly active cells
       # This is a reinforcement learning rule that considers previous input to the current cell
       for i in xrange(self._historyLength):
-        self._adaptSynapses(self._prePredictedActiveInput[:,i], activeCells, self._synPermPreviousPredActiveInc, 0.0)
+        updates.append(
+          (numpy.where(self._prePredictedActiveInput[:,i] > 0)[0], activeCells,
+           self._synPermPreviousPredActiveInc, 0.0))
+
+      self._adaptSynapsesSparse(updates)
 
       # Homeostasis learning inherited from the spatial pooler
       self._updateDutyCycles(totalOverlap.astype(UINT_DTYPE), activeCells)
@@ -254,8 +309,13 @@ class UnionTemporalPooler(SpatialPooler):
     if self._decayFunctionType == 'NoDecay':
       self._poolingActivation = self._decayFunction.decay(self._poolingActivation)
     elif self._decayFunctionType == 'Exponential':
+      if self._incrementalUnion:
+        poolingTimer = (self._poolingStep -
+                        self._lastPoolingStep).astype(REAL_DTYPE)
+      else:
+        poolingTimer = self._poolingTimer
       self._poolingActivation = self._decayFunction.decay(\
-                                self._poolingActivationInitLevel, self._poolingTimer)
+                                self._poolingActivationInitLevel, poolingTimer)
 
     return self._poolingActivation
 
@@ -271,11 +331,25 @@ class UnionTemporalPooler(SpatialPooler):
     self._poolingActivation[activeCells] = self._exciteFunction.excite(
       self._poolingActivation[activeCells], overlaps[activeCells])
 
-    # increase pooling timers for all cells
-    self._poolingTimer[self._poolingTimer >= 0] += 1
+    if self._incrementalUnion:
+      # advance the global step instead of every cell's timer
+      previousSteps = self._lastPoolingStep[activeCells]
+      self._poolingStep += 1
+      self._lastPoolingStep[activeCells] = self._poolingStep
+
+      self._numOldestCells -= numpy.count_nonzero(
+        previousSteps == self._oldestPoolingStep)
+      if self._numOldestCells == 0:
+        self._oldestPoolingStep = self._lastPoolingStep.min()
+        self._numOldestCells = numpy.count_nonzero(
+          self._lastPoolingStep == self._oldestPoolingStep)
+    else:
+      # increase pooling timers for all cells
+      self._poolingTimer[self._poolingTimer >= 0] += 1
+
+      # reset pooling timer for active cells
+      self._poolingTimer[activeCells] = 0
 
-    # reset pooling timer for active cells
-    self._poolingTimer[activeCells] = 0
     self._poolingActivationInitLevel[activeCells] = self._poolingActivation[activeCells]
 
     return self._poolingActivation
@@ -288,16 +362,34 @@ class UnionTemporalPooler(SpatialPooler):
     @return: a list of cell indices
     """
     poolingActivation = self._poolingActivation
-    nonZeroCells = numpy.argwhere(poolingActivation > 0)[:,0]
+
+    if self._incrementalUnion:
+      # Every other cell has decayed by the same factor since the previous
+      # update, so only cells in the previous union and recently active cells
+      # can be among the most active cells.
+      nonZeroCells = numpy.union1d(
+        numpy.union1d(self._unionCandidates, self._previousActiveCells),
+        self._activeCells)
+      nonZeroCells = nonZeroCells[poolingActivation[nonZeroCells] > 0]
+      self._previousActiveCells = self._activeCells
+    else:
+      nonZeroCells = numpy.argwhere(poolingActivation > 0)[:,0]
 
     # include a tie-breaker before sorting
     poolingActivationSubset = poolingActivation[nonZeroCells] + \
                               self._poolingActivation_tieBreaker[nonZeroCells]
-    potentialUnionSDR = nonZeroCells[numpy.argsort(poolingActivationSubset)[::-1]]
 
-    topCells = potentialUnionSDR[0: self._maxUnionCells]
+    if self._incrementalUnion:
+      topCells = self._selectIncrementalUnion(nonZeroCells,
+                                              poolingActivationSubset)
+      self._unionCandidates = topCells.astype(UINT_DTYPE)
+      maxPoolingTimer = self._poolingStep - self._oldestPoolingStep
+    else:
+      potentialUnionSDR = nonZeroCells[numpy.argsort(poolingActivationSubset)[::-1]]
+      topCells = potentialUnionSDR[0: self._maxUnionCells]
+      maxPoolingTimer = self._poolingTimer.max()
 
-    if max(self._poolingTimer) > self._minHistory:
+    if maxPoolingTimer > self._minHistory:
       self._unionSDR = numpy.sort(topCells).astype(UINT_DTYPE)
     else:
       self._unionSDR = []
@@ -305,6 +397,57 @@ class UnionTemporalPooler(SpatialPooler):
     return self._unionSDR
 
 
+  def _selectIncrementalUnion(self, candidates, candidateScores):
+    """
+    Picks the most active cells from the candidates, or from every cell if a
+    cell outside the candidates could outrank them.
+
+    The tie-breaker is added to the pooling activation rather than scaled
+    with it, so the order of the cells outside the candidates can change as
+    they decay. Instead, the most active of them is bounded and compared with
+    the weakest selected candidate.
+
+    @param candidates (numpy array) Candidate cells with non-zero activation
+    @param candidateScores (numpy array) Their activation plus tie-breaker
+    @return (numpy array) The selected cells
+    """
+    poolingActivation = self._poolingActivation
+
+    outsideBound = self._decayFunction.decay(
+      self._outsideActivationBound,
+      self._poolingStep - self._outsideBoundStep)
+    # Allow for rounding in the decay of the actual activations
+    outsideBound *= 1.0 + _OUTSIDE_BOUND_TOLERANCE
+
+    if len(candidates) > self._maxUnionCells:
+      order = numpy.argpartition(-candidateScores, self._maxUnionCells)
+      topCells = candidates[order[:self._maxUnionCells]]
+      weakestScore = candidateScores[order[:self._maxUnionCells]].min()
+      evicted = candidates[order[self._maxUnionCells:]]
+      if len(evicted) > 0:
+        outsideBound = max(outsideBound, poolingActivation[evicted].max())
+    else:
+      topCells = candidates
+      weakestScore = -numpy.inf
+
+    if (outsideBound > 0 and
+        weakestScore <= outsideBound + self._maxTieBreaker):
+      nonZeroCells = numpy.flatnonzero(poolingActivation > 0)
+      scores = (poolingActivation[nonZeroCells] +
+                self._poolingActivation_tieBreaker[nonZeroCells])
+      order = numpy.argsort(scores)[::-1]
+      topCells = nonZeroCells[order[:self._maxUnionCells]]
+      outsideCells = nonZeroCells[order[self._maxUnionCells:]]
+      if len(outsideCells) > 0:
+        outsideBound = poolingActivation[outsideCells].max()
+      else:
+        outsideBound = 0.0
+
+    self._outsideActivationBound = outsideBound
+    self._outsideBoundStep = self._poolingStep
+    return topCells
+
+
   # overide
   def _adaptSynapses(self, inputVector, activeColumns, synPermActiveInc, synPermInactiveDec):
     """
@@ -330,17 +473,69 @@ class UnionTemporalPooler(SpatialPooler):
                     Permanence decrement for inactive inputs
     """
     inputIndices = numpy.where(inputVector > 0)[0]
-    permChanges = numpy.zeros(self.getNumInputs(), dtype=REAL_DTYPE)
-    permChanges.fill(-1 * synPermInactiveDec)
-    permChanges[inputIndices] = synPermActiveInc
-    perm = numpy.zeros(self.getNumInputs(), dtype=REAL_DTYPE)
-    potential = numpy.zeros(self.getNumInputs(), dtype=REAL_DTYPE)
-    for i in activeColumns:
-      self.getPermanence(i, perm)
-      self.getPotential(i, potential)
-      maskPotential = numpy.where(potential > 0)[0]
-      perm[maskPotential] += permChanges[maskPotential]
-      self._updatePermanencesForColumn(perm, i, raisePerm=False)
+    self._adaptSynapsesSparse([(inputIndices, activeColumns, synPermActiveInc,
+                                synPermInactiveDec)])
+
+
+  def _adaptSynapsesSparse(self, updates):
+    """
+    Apply a sequence of learning updates to the permanences of many columns at
+    once. The permanences of every affected column are read into a
+    column x input matrix, each update is applied to the whole matrix, and each
+    column is written back once. The result is the same as applying the
+    updates one at a time with _adaptSynapses.
+
+    Parameters:
+    ----------------------------
+    @param updates:
+                    A list of (inputIndices, activeColumns, synPermActiveInc,
+                    synPermInactiveDec) tuples, applied in order. inputIndices
+                    are the indices of the active input bits. activeColumns
+                    are the columns that learn.
+    """
+    columns = numpy.unique(numpy.concatenate(
+      [numpy.asarray(activeColumns, dtype="int64")
+       for _, activeColumns, _, _ in updates]))
+    if len(columns) == 0:
+      return
+
+    numInputs = self.getNumInputs()
+    permanences = numpy.empty((len(columns), numInputs), dtype=REAL_DTYPE)
+    potential = numpy.empty((len(columns), numInputs), dtype=UINT_DTYPE)
+    for row, column in enumerate(columns):
+      self.getPermanence(column, permanences[row])
+      self.getPotential(column, potential[row])
+    potential = potential > 0
+
+    trimThreshold = self.getSynPermTrimThreshold()
+    synPermMax = self.getSynPermMax()
+
+    for (inputIndices, activeColumns, synPermActiveInc,
+         synPermInactiveDec) in updates:
+      rows = numpy.searchsorted(columns, activeColumns)
+
+      if synPermInactiveDec != 0:
+        permChanges = numpy.empty(numInputs, dtype=REAL_DTYPE)
+        permChanges.fill(-1 * synPermInactiveDec)
+        permChanges[inputIndices] = synPermActiveInc
+        updated = permanences[rows] + permChanges * potential[rows]
+      else:
+        # Only the active inputs change.
+        rows = rows[:, numpy.newaxis]
+        inputIndices = numpy.asarray(inputIndices, dtype="int64")
+        updated = (permanences[rows, inputIndices] +
+                   REAL_DTYPE(synPermActiveInc) *
+                   potential[rows, inputIndices])
+        rows = (rows, inputIndices)
+
+      # Trim and clip the same way _updatePermanencesForColumn does.
+      updated[updated < trimThreshold] = 0
+      numpy.clip(updated, 0, synPermMax, out=updated)
+      permanences[rows] = updated
+
+    for row, column in enumerate(columns):
+      self._updatePermanencesForColumn(permanences[row], column,
+                                       raisePerm=False)
 
 
   def getUnionSDR(self):
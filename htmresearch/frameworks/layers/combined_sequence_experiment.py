@@ -137,7 +137,12 @@ class L4TMExperiment(L4L2Experiment):
       SparseMatrix(0, self.config["L2Params"]["cellCount"])
       for _ in xrange(self.numColumns)]
     self.objectNameToIndex = {}
-    self.statistics = []
+    self._objectMatrixSources = {}
+    self._objectMatrixSignature = None
+    self._statisticsKeys = self._createStatisticsKeys()
+    self.statisticsMetrics = None
+    self.statisticsPath = None
+    self.resetStatistics()
 
 
   def getTMRepresentations(self):
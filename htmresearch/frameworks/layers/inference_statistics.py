@@ -0,0 +1,532 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Columnar storage for the inference statistics recorded by the layer
+experiments.
+
+Each call to infer() produces one episode: a dict that maps keys such as
+"L2 Representation C3" to one value per sensation, plus "numSteps" and
+"object". Storing thousands of these dicts of Python lists takes a lot of
+memory and makes pickling slow. InferenceStatistics instead packs the values of
+each key into NumPy arrays, and packs SDR-valued keys such as
+"Full L2 SDR C0" into one flat index array with per-step sizes. Episodes are
+grouped into chunks. If a path is given, each full chunk is written to an
+.npz file and dropped from memory.
+
+Indexing and iterating still give mappings that behave like the original
+episode dicts, so code that reads experiment.statistics doesn't need to change.
+Each key of an episode is only decoded when it's read.
+"""
+
+import collections
+import os
+import re
+
+import numpy as np
+
+
+_EPISODE_KEYS = ("numSteps", "object")
+_COLUMN_SUFFIX = re.compile(r" C\d+$")
+
+
+
+def _compact(array):
+  """
+  Store integers in the smallest type that holds them, for pickles and files.
+  """
+  if array.dtype.kind not in "iu" or array.size == 0:
+    return array
+  for dtype in ("uint8", "int8", "uint16", "int16", "uint32", "int32"):
+    info = np.iinfo(dtype)
+    if info.min <= array.min() and array.max() <= info.max:
+      return array.astype(dtype)
+  return array
+
+
+
+def metricName(key):
+  """
+  Get the name of the metric that a statistics key records, e.g.
+  "L2 Representation" for "L2 Representation C3".
+
+  @param key (str)
+  @return (str)
+  """
+  return _COLUMN_SUFFIX.sub("", key)
+
+
+
+class _Buffer(object):
+  """
+  A 1D NumPy array with amortized O(1) appends.
+  """
+
+  def __init__(self, data=None):
+    self.data = data
+    self.size = 0 if data is None else data.size
+
+
+  def extend(self, values):
+    values = np.asarray(values)
+    if self.data is None:
+      self.data = np.empty(max(values.size, 64), dtype=values.dtype)
+    elif not np.can_cast(values.dtype, self.data.dtype):
+      self.data = self.data.astype(np.result_type(self.data.dtype,
+                                                  values.dtype))
+
+    end = self.size + values.size
+    if end > self.data.size:
+      data = np.empty(max(end, 2 * self.data.size), dtype=self.data.dtype)
+      data[:self.size] = self.data[:self.size]
+      self.data = data
+
+    self.data[self.size:end] = values
+    self.size = end
+
+
+  def array(self):
+    if self.data is None:
+      return np.empty(0)
+    return self.data[:self.size]
+
+
+  def __getstate__(self):
+    # Don't pickle the unused capacity.
+    return {"data": None if self.data is None else _compact(self.array())}
+
+
+  def __setstate__(self, state):
+    self.__init__(state["data"])
+
+
+
+class _Column(object):
+  """
+  The values of one key. Episode e holds values[starts[e]:starts[e] +
+  lengths[e]], or doesn't have the key if lengths[e] is -1.
+
+  For SDR keys each value is the size of one step's SDR, and the step's
+  indices are stored consecutively in indices, starting at indexStarts[e] for
+  episode e.
+  """
+
+  def __init__(self, isSdr, numEpisodes=0):
+    self.isSdr = isSdr
+    self.values = _Buffer()
+    self.starts = _Buffer()
+    self.lengths = _Buffer()
+    if isSdr:
+      self.indices = _Buffer()
+      self.indexStarts = _Buffer()
+
+    # Episodes recorded before this key first appeared
+    self.starts.extend(np.zeros(numEpisodes, dtype="int64"))
+    self.lengths.extend(np.full(numEpisodes, -1, dtype="int64"))
+    if isSdr:
+      self.indexStarts.extend(np.zeros(numEpisodes, dtype="int64"))
+
+
+  def append(self, values):
+    self.starts.extend([self.values.size])
+    self.lengths.extend([len(values)])
+
+    if self.isSdr:
+      self.indexStarts.extend([self.indices.size])
+      self.values.extend(np.array([len(sdr) for sdr in values],
+                                  dtype="int64"))
+      for sdr in values:
+        self.indices.extend(np.array(sorted(sdr), dtype="uint32"))
+    elif len(values) > 0:
+      self.values.extend(values)
+
+
+  def appendMissing(self):
+    self.starts.extend([self.values.size])
+    self.lengths.extend([-1])
+    if self.isSdr:
+      self.indexStarts.extend([self.indices.size])
+
+
+  def has(self, episode):
+    return self.lengths.data[episode] != -1
+
+
+  def get(self, episode):
+    start = int(self.starts.data[episode])
+    end = start + int(self.lengths.data[episode])
+
+    if not self.isSdr:
+      return self.values.array()[start:end].tolist()
+
+    sdrs = []
+    indexStart = int(self.indexStarts.data[episode])
+    indices = self.indices.array()
+    for size in self.values.array()[start:end].tolist():
+      sdrs.append(set(indices[indexStart:indexStart + size].tolist()))
+      indexStart += size
+    return sdrs
+
+
+  def toArrays(self, prefix):
+    arrays = {
+      prefix + "values": _compact(self.values.array()),
+      prefix + "starts": _compact(self.starts.array()),
+      prefix + "lengths": _compact(self.lengths.array()),
+    }
+    if self.isSdr:
+      arrays[prefix + "indices"] = _compact(self.indices.array())
+      arrays[prefix + "indexStarts"] = _compact(self.indexStarts.array())
+    return arrays
+
+
+  @classmethod
+  def fromArrays(cls, arrays, prefix):
+    isSdr = (prefix + "indices") in arrays
+    column = cls(isSdr)
+    column.values = _Buffer(arrays[prefix + "values"])
+    column.starts = _Buffer(arrays[prefix + "starts"])
+    column.lengths = _Buffer(arrays[prefix + "lengths"])
+    if isSdr:
+      column.indices = _Buffer(arrays[prefix + "indices"])
+      column.indexStarts = _Buffer(arrays[prefix + "indexStarts"])
+    return column
+
+
+
+class _Episode(collections.MutableMapping):
+  """
+  One episode's statistics. Behaves like the defaultdict(list) that was
+  recorded, but each key is decoded from the chunk the first time it's read.
+  """
+
+  def __init__(self, chunk, episode):
+    self._chunk = chunk
+    self._episode = episode
+    self._values = {"numSteps": chunk.numSteps[episode],
+                    "object": chunk.objects[episode]}
+    # Keys that the episode has, but that haven't been decoded yet
+    self._pending = set(key for key, column in chunk.columns.iteritems()
+                        if column.has(episode))
+
+
+  def __getitem__(self, key):
+    try:
+      return self._values[key]
+    except KeyError:
+      pass
+
+    if key in self._pending:
+      self._pending.remove(key)
+      value = self._chunk.columns[key].get(self._episode)
+    else:
+      # Like a defaultdict(list)
+      value = []
+    self._values[key] = value
+    return value
+
+
+  def __setitem__(self, key, value):
+    self._pending.discard(key)
+    self._values[key] = value
+
+
+  def __delitem__(self, key):
+    if key in self._pending:
+      self._pending.remove(key)
+    else:
+      del self._values[key]
+
+
+  def __contains__(self, key):
+    return key in self._values or key in self._pending
+
+
+  def __iter__(self):
+    return iter(self._values.keys() + list(self._pending))
+
+
+  def __len__(self):
+    return len(self._values) + len(self._pending)
+
+
+  def get(self, key, default=None):
+    if key in self:
+      return self[key]
+    return default
+
+
+  def pop(self, key, *default):
+    if key in self:
+      value = self[key]
+      del self[key]
+      return value
+    if default:
+      return default[0]
+    raise KeyError(key)
+
+
+  def setdefault(self, key, default=None):
+    if key not in self:
+      self[key] = default
+    return self[key]
+
+
+  def toDict(self):
+    """
+    @return (defaultdict) The whole episode, in the original format
+    """
+    statistics = collections.defaultdict(list)
+    statistics.update(self.iteritems())
+    return statistics
+
+
+  def __repr__(self):
+    return repr(dict(self.iteritems()))
+
+
+  def __reduce__(self):
+    return (collections.defaultdict, (list,), None, None,
+            iter(self.items()))
+
+
+
+class _Chunk(object):
+  """
+  A group of consecutive episodes, stored column by column.
+  """
+
+  def __init__(self):
+    self.objects = []
+    self.numSteps = []
+    self.columns = {}
+
+
+  def __len__(self):
+    return len(self.objects)
+
+
+  def append(self, statistics, keys):
+    for key in keys:
+      values = statistics[key]
+      # A key's type is only known once it has a value. Until then, episodes
+      # without values read back as missing, which gives the same empty list.
+      if key not in self.columns and len(values) > 0:
+        isSdr = isinstance(values[0], (set, frozenset))
+        self.columns[key] = _Column(isSdr, len(self))
+
+    for key, column in self.columns.iteritems():
+      if key in statistics:
+        column.append(statistics[key])
+      else:
+        column.appendMissing()
+
+    self.objects.append(statistics.get("object", "Unknown"))
+    self.numSteps.append(statistics.get("numSteps", 0))
+
+
+  def getEpisode(self, episode):
+    return _Episode(self, episode)
+
+
+  def save(self, filename):
+    keys = sorted(self.columns.iterkeys())
+    arrays = {
+      "objects": np.array(self.objects, dtype=object),
+      "numSteps": np.array(self.numSteps, dtype="int64"),
+      "keys": np.array(keys, dtype=object),
+    }
+    for i, key in enumerate(keys):
+      arrays.update(self.columns[key].toArrays("column{}_".format(i)))
+    np.savez(filename, **arrays)
+
+
+  @classmethod
+  def load(cls, filename):
+    data = np.load(filename, allow_pickle=True)
+    try:
+      arrays = dict(data.items())
+    finally:
+      data.close()
+    chunk = cls()
+    chunk.objects = arrays["objects"].tolist()
+    chunk.numSteps = arrays["numSteps"].tolist()
+    for i, key in enumerate(arrays["keys"].tolist()):
+      chunk.columns[key] = _Column.fromArrays(arrays,
+                                              "column{}_".format(i))
+    return chunk
+
+
+
+class InferenceStatistics(object):
+  """
+  A list of inference episodes with columnar storage.
+
+  Behaves like the list of dicts that the experiments used to keep: append()
+  takes one episode's statistics dict, and indexing or iterating returns
+  episode mappings that behave like the original defaultdicts of lists.
+  """
+
+  def __init__(self, metrics=None, chunkSize=1000, path=None,
+               numCachedChunks=4):
+    """
+    @param metrics (iterable of str)
+    The metrics to keep, e.g. ["L2 Representation", "Correct classification"].
+    A key is kept if its name without the " C<column>" suffix is listed.
+    "numSteps" and "object" are always kept. If None, every metric is kept.
+
+    @param chunkSize (int)
+    The number of episodes per chunk
+
+    @param path (str)
+    A directory for the full chunks, one .npz file per chunk. If None,
+    every chunk stays in memory.
+
+    @param numCachedChunks (int)
+    With a path, the number of chunks read back from disk that are kept in
+    memory, most recently used first
+    """
+    self.metrics = None if metrics is None else frozenset(metrics)
+    self.chunkSize = chunkSize
+    self.path = path
+
+    self._numEpisodes = 0
+    self._numSavedChunks = 0
+    self._chunks = []
+    self._current = _Chunk()
+    self.numCachedChunks = numCachedChunks
+    self._cachedChunks = collections.OrderedDict()
+
+    if path is not None and not os.path.exists(path):
+      os.makedirs(path)
+
+
+  def tracks(self, key):
+    """
+    @param key (str) A statistics key, e.g. "L2 Representation C3"
+    @return (bool) True if the key's metric is kept
+    """
+    return (self.metrics is None or key in _EPISODE_KEYS or
+            metricName(key) in self.metrics)
+
+
+  def append(self, statistics):
+    """
+    Record one episode.
+
+    @param statistics (dict)
+    Maps each key to the list of its values, one per step, plus "numSteps" and
+    "object". Values are numbers, or sets of indices for SDRs.
+    """
+    keys = [key for key in statistics
+            if key not in _EPISODE_KEYS and self.tracks(key)]
+    self._current.append(statistics, keys)
+    self._numEpisodes += 1
+
+    if len(self._current) >= self.chunkSize:
+      self._finishChunk()
+
+
+  def _finishChunk(self):
+    if self.path is not None:
+      self._current.save(self._chunkFilename(self._numSavedChunks))
+      self._numSavedChunks += 1
+    else:
+      self._chunks.append(self._current)
+    self._current = _Chunk()
+
+
+  def _chunkFilename(self, chunkIndex):
+    return os.path.join(self.path, "chunk_{:06d}.npz".format(chunkIndex))
+
+
+  def _getChunk(self, chunkIndex):
+    if self.path is None:
+      if chunkIndex < len(self._chunks):
+        return self._chunks[chunkIndex]
+      return self._current
+
+    if chunkIndex == self._numSavedChunks:
+      return self._current
+
+    try:
+      chunk = self._cachedChunks.pop(chunkIndex)
+    except KeyError:
+      chunk = _Chunk.load(self._chunkFilename(chunkIndex))
+      while len(self._cachedChunks) >= max(self.numCachedChunks, 1):
+        self._cachedChunks.popitem(last=False)
+    self._cachedChunks[chunkIndex] = chunk
+    return chunk
+
+
+  def __getstate__(self):
+    # The cached chunks can be read back from disk.
+    state = self.__dict__.copy()
+    del state["_cachedChunks"]
+    return state
+
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._cachedChunks = collections.OrderedDict()
+
+
+  def __len__(self):
+    return self._numEpisodes
+
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return [self[i] for i in xrange(*index.indices(self._numEpisodes))]
+
+    if index < 0:
+      index += self._numEpisodes
+    if not 0 <= index < self._numEpisodes:
+      raise IndexError("Episode index out of range")
+
+    chunkIndex, episode = divmod(index, self.chunkSize)
+    return self._getChunk(chunkIndex).getEpisode(episode)
+
+
+  def __iter__(self):
+    for i in xrange(self._numEpisodes):
+      yield self[i]
+
+
+  def __eq__(self, other):
+    if isinstance(other, (InferenceStatistics, list)):
+      return self.toList() == list(other)
+    return NotImplemented
+
+
+  def __ne__(self, other):
+    result = self.__eq__(other)
+    if result is NotImplemented:
+      return result
+    return not result
+
+
+  def toList(self):
+    """
+    @return (list of dicts) Every episode, in the original format
+    """
+    return [episode.toDict() for episode in self]
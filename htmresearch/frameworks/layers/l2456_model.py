@@ -62,6 +62,8 @@ from tabulate import tabulate
 
 from htmresearch.support.logging_decorator import LoggingDecorator
 from htmresearch.support.register_regions import registerAllResearchRegions
+from htmresearch.frameworks.layers.inference_statistics import (
+  InferenceStatistics)
 from htmresearch.frameworks.layers.laminar_network import createNetwork
 
 
@@ -174,7 +176,7 @@ class L2456Model(object):
     # will be populated during training
     self.objectRepresentationsL2 = {}
     self.objectRepresentationsL5 = {}
-    self.statistics = []
+    self.statistics = InferenceStatistics()
 
 
   @LoggingDecorator()
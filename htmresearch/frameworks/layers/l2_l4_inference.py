@@ -82,8 +82,11 @@ projects/layers/multi_column.py
 # pylint: disable=C0103
 
 import collections
+import copy
+import itertools
 import os
 import random
+import time
 import matplotlib.pyplot as plt
 import numpy as np
 from math import ceil
@@ -93,7 +96,12 @@ from nupic.bindings.math import SparseMatrix
 
 from htmresearch.support.logging_decorator import LoggingDecorator
 from htmresearch.support.register_regions import registerAllResearchRegions
+from htmresearch.frameworks.layers.inference_statistics import (
+  InferenceStatistics)
 from htmresearch.frameworks.layers.laminar_network import createNetwork
+from htmresearch.regions.ApicalTMPairRegion import ApicalTMPairRegion
+from htmresearch.regions.ColumnPoolerRegion import ColumnPoolerRegion
+from htmresearch.support.sparse_links import readSparseBuffer
 
 
 
@@ -151,7 +159,11 @@ class L4L2Experiment(object):
                enableFeedForwardSP=False,
                feedForwardSPOverrides=None,
                objectNamesAreIndices=False,
-               enableFeedback=True
+               enableFeedback=True,
+               backend="network",
+               sparseLinks=False,
+               statisticsMetrics=None,
+               statisticsPath=None
                ):
     """
     Creates the network.
@@ -228,6 +240,28 @@ class L4L2Experiment(object):
     @param   enableFeedback (bool)
              If True, enable feedback between L2 and L4
 
+    @param   backend (str)
+             "network" runs the regions with the NuPIC network engine.
+             "direct" calls the L4 and L2 algorithms directly with sparse
+             index arrays, wired the same way as the network. It gives the
+             same results and avoids converting every link to dense arrays.
+             It supports the "L4L2Column" and "MultipleL4L2Columns" network
+             types with "py.ApicalTMPairRegion" L4 regions and no spatial
+             poolers.
+
+    @param   sparseLinks (bool)
+             If True, the network's regions send each other sparse buffers of
+             active indices instead of dense binary vectors. Only used by the
+             "network" backend. Can't be combined with spatial poolers.
+
+    @param   statisticsMetrics (list(str))
+             The inference statistics to keep, e.g. ["L2 Representation",
+             "Correct classification"]. If None, all of them are kept.
+
+    @param   statisticsPath (str)
+             If set, inference statistics are written to this directory in
+             chunks instead of being kept in memory. See InferenceStatistics.
+
     """
     # Handle logging - this has to be done first
     self.logCalls = logCalls
@@ -241,6 +275,8 @@ class L4L2Experiment(object):
     self.externalInputSize = externalInputSize
     self.numInputBits = numInputBits
     self.objectNamesAreIndices = objectNamesAreIndices
+    self.statisticsMetrics = statisticsMetrics
+    self.statisticsPath = statisticsPath
 
     # seed
     self.seed = seed
@@ -251,6 +287,7 @@ class L4L2Experiment(object):
       "networkType": networkType,
       "longDistanceConnections": longDistanceConnections,
       "enableFeedback": enableFeedback,
+      "sparseLinks": sparseLinks,
       "numCorticalColumns": numCorticalColumns,
       "externalInputSize": externalInputSize,
       "sensorInputSize": inputSize,
@@ -290,7 +327,33 @@ class L4L2Experiment(object):
     if L4Overrides is not None:
       self.config["L4Params"].update(L4Overrides)
 
-    # create network
+    self.backend = backend
+    if backend == "direct":
+      self._createDirectColumns()
+    elif backend == "network":
+      self._createNetworkColumns()
+    else:
+      raise ValueError("Unknown backend: " + str(backend))
+
+    # will be populated during training
+    self.objectL2Representations = {}
+    self.objectL2RepresentationsMatrices = [
+      SparseMatrix(0, self.config["L2Params"]["cellCount"])
+      for _ in xrange(self.numColumns)]
+    self.objectNameToIndex = {}
+    # The representation and column sizes that each object's matrix rows were
+    # built from, and a signature of objectL2Representations when they were
+    # last in sync. See _syncObjectMatrices.
+    self._objectMatrixSources = {}
+    self._objectMatrixSignature = None
+    self._statisticsKeys = self._createStatisticsKeys()
+    self.resetStatistics()
+
+
+  def _createNetworkColumns(self):
+    """
+    Creates the network and gets its L4 and L2 regions.
+    """
     self.network = createNetwork(self.config)
     self.sensorInputs = []
     self.externalInputs = []
@@ -314,13 +377,107 @@ class L4L2Experiment(object):
     self.L4Columns = [region.getSelf() for region in self.L4Regions]
     self.L2Columns = [region.getSelf() for region in self.L2Regions]
 
-    # will be populated during training
-    self.objectL2Representations = {}
-    self.objectL2RepresentationsMatrices = [
-      SparseMatrix(0, self.config["L2Params"]["cellCount"])
-      for _ in xrange(self.numColumns)]
-    self.objectNameToIndex = {}
-    self.resetStatistics()
+
+  def _createDirectColumns(self):
+    """
+    Creates the L4 and L2 regions without a network. The regions are configured
+    exactly as createL4L2Column and createMultipleL4L2Columns configure them,
+    but they are never run by a network. Instead, _computeDirect calls their
+    algorithms.
+    """
+    networkType = self.config["networkType"]
+    if (networkType not in ("L4L2Column", "MultipleL4L2Columns") or
+        self.config["L4RegionType"] != "py.ApicalTMPairRegion" or
+        "lateralSPParams" in self.config or
+        "feedForwardSPParams" in self.config):
+      raise ValueError("The direct backend only supports L4L2Column and "
+                       "MultipleL4L2Columns networks of ApicalTMPairRegions "
+                       "without spatial poolers")
+
+    self.network = None
+    self.sensorInputs = []
+    self.externalInputs = []
+    self.L4Regions = []
+    self.L2Regions = []
+    self.L4Columns = []
+    self.L2Columns = []
+
+    for i in xrange(self.numColumns):
+      L4Params = copy.deepcopy(self.config["L4Params"])
+      L4Params["basalInputWidth"] = self.config["externalInputSize"]
+      L4Params["apicalInputWidth"] = self.config["L2Params"]["cellCount"]
+      L4Column = ApicalTMPairRegion(**L4Params)
+      L4Column.initialize()
+      self.L4Columns.append(L4Column)
+
+      L2Params = copy.deepcopy(self.config["L2Params"])
+      if networkType == "MultipleL4L2Columns":
+        L2Params["seed"] = L2Params.get("seed", 42) + i
+        L2Params["numOtherCorticalColumns"] = self.numColumns - 1
+      L2Column = ColumnPoolerRegion(**L2Params)
+      L2Column.initialize()
+      self.L2Columns.append(L2Column)
+
+    # The L2 -> L4 and L2 -> L2 links have a propagation delay of 1, so each
+    # timestep uses the L2 output of the previous timestep.
+    self._previousL2Outputs = [np.empty(0, dtype="uint32")
+                               for _ in xrange(self.numColumns)]
+    self._directComputeTimes = {"L4": 0.0, "L2": 0.0}
+    self._directComputeCount = 0
+
+
+  def _computeDirect(self, sensations):
+    """
+    Runs one timestep of the direct backend, equivalent to one network.run(1)
+    with the sensations queued in the sensors.
+
+    @param  sensations (dict)
+            Maps each cortical column to a (location, feature) pair of SDRs
+    """
+    feedback = self.config["enableFeedback"]
+    lateral = self.config["networkType"] == "MultipleL4L2Columns"
+    emptyInput = np.empty(0, dtype="uint32")
+
+    startTime = time.time()
+    for col in xrange(self.numColumns):
+      location, feature = sensations[col]
+      activeColumns = np.unique(np.asarray(list(feature), dtype="uint32"))
+      if self.config["externalInputSize"] > 0:
+        basalInput = np.unique(np.asarray(list(location), dtype="uint32"))
+      else:
+        basalInput = emptyInput
+      apicalInput = self._previousL2Outputs[col] if feedback else emptyInput
+
+      L4Column = self.L4Columns[col]
+      L4Column._tm.compute(activeColumns, basalInput, apicalInput,
+                           basalInput, apicalInput, L4Column.learn)
+    L2StartTime = time.time()
+
+    for col in xrange(self.numColumns):
+      tm = self.L4Columns[col]._tm
+      feedforwardInput = np.unique(tm.getActiveCells()).astype("uint32")
+      feedforwardGrowthCandidates = np.intersect1d(
+        feedforwardInput, tm.getPredictedCells()).astype("uint32")
+      if lateral:
+        lateralInputs = tuple(self._previousL2Outputs[other]
+                              for other in xrange(self.numColumns)
+                              if other != col)
+      else:
+        lateralInputs = ()
+
+      L2Column = self.L2Columns[col]
+      L2Column._pooler.compute(feedforwardInput, lateralInputs,
+                               feedforwardGrowthCandidates,
+                               learn=L2Column.learningMode)
+
+    self._previousL2Outputs = [
+      np.unique(column._pooler.getActiveCells()).astype("uint32")
+      for column in self.L2Columns]
+
+    endTime = time.time()
+    self._directComputeTimes["L4"] += L2StartTime - startTime
+    self._directComputeTimes["L2"] += endTime - L2StartTime
+    self._directComputeCount += 1
 
 
   @LoggingDecorator()
@@ -380,6 +537,10 @@ class L4L2Experiment(object):
         # learn each pattern multiple times
         for _ in xrange(self.numLearningPoints):
 
+          if self.network is None:
+            self._computeDirect(sensations)
+            continue
+
           for col in xrange(self.numColumns):
             location, feature = sensations[col]
             self.sensorInputs[col].addDataToQueue(list(feature), 0, 0)
@@ -447,11 +608,14 @@ class L4L2Experiment(object):
     for sensations in sensationList:
 
       # feed all columns with sensations
-      for col in xrange(self.numColumns):
-        location, feature = sensations[col]
-        self.sensorInputs[col].addDataToQueue(list(feature), 0, 0)
-        self.externalInputs[col].addDataToQueue(list(location), 0, 0)
-      self.network.run(1)
+      if self.network is None:
+        self._computeDirect(sensations)
+      else:
+        for col in xrange(self.numColumns):
+          location, feature = sensations[col]
+          self.sensorInputs[col].addDataToQueue(list(feature), 0, 0)
+          self.externalInputs[col].addDataToQueue(list(location), 0, 0)
+        self.network.run(1)
       self._updateInferenceStats(statistics, objectName)
 
     if reset:
@@ -469,7 +633,18 @@ class L4L2Experiment(object):
     """
     Record the current active L2 cells as the representation for 'objectName'.
     """
-    self.objectL2Representations[objectName] = self.getL2Representations()
+    self._addObjectRepresentation(objectName, self.getL2Representations())
+
+
+  def _addObjectRepresentation(self, objectName, representation):
+    """
+    Store an object's L2 representation in objectL2Representations and in
+    objectL2RepresentationsMatrices.
+
+    @param objectName
+    @param representation (list of sets) The object's L2 cells in each column
+    """
+    self.objectL2Representations[objectName] = representation
 
     try:
       objectIndex = self.objectNameToIndex[objectName]
@@ -488,15 +663,98 @@ class L4L2Experiment(object):
       self.objectNameToIndex[objectName] = objectIndex
 
     for colIdx, matrix in enumerate(self.objectL2RepresentationsMatrices):
-      activeCells = self.L2Columns[colIdx]._pooler.getActiveCells()
+      activeCells = np.array(sorted(representation[colIdx]), dtype="uint32")
       matrix.setRowFromSparse(objectIndex, activeCells,
                               np.ones(len(activeCells), dtype="float32"))
 
+    self._objectMatrixSources[objectName] = (representation,
+                                             map(len, representation))
+
+
+  def _syncObjectMatrices(self):
+    """
+    Bring objectL2RepresentationsMatrices and objectNameToIndex up to date with
+    objectL2Representations. Callers sometimes replace that dict, or add,
+    replace or remove objects in it directly, e.g. to restore saved
+    representations. A stored representation counts as changed if it is a
+    different object, or if the number of cells in one of its columns differs.
+    """
+    representations = self.objectL2Representations
+
+    # Usually nothing changed since the last call. The lists compare their
+    # items by identity first, so this check is cheap.
+    names = representations.keys()
+    values = representations.values()
+    signature = (names, values,
+                 map(len, itertools.chain.from_iterable(values)))
+    if signature == self._objectMatrixSignature:
+      return
+
+    changed = []
+    numNew = 0
+    for objectName, representation in representations.iteritems():
+      try:
+        source, sizes = self._objectMatrixSources[objectName]
+      except KeyError:
+        changed.append(objectName)
+        numNew += 1
+        continue
+
+      if (source is not representation or
+          sizes != map(len, representation)):
+        changed.append(objectName)
+
+    if len(self.objectNameToIndex) + numNew != len(representations):
+      # Objects were removed, so rebuild the matrices.
+      self.objectNameToIndex = {}
+      self._objectMatrixSources = {}
+      for matrix in self.objectL2RepresentationsMatrices:
+        matrix.resize(0, matrix.nCols())
+      changed = representations.keys()
+
+    for objectName in changed:
+      self._addObjectRepresentation(objectName, representations[objectName])
+
+    self._objectMatrixSignature = signature
+
+
+  def _getObjectOverlaps(self, L2Representation):
+    """
+    Compute the overlap of each column's L2 cells with every learned object,
+    with one sparse matrix-vector product per column.
+
+    @param L2Representation (list) The L2 cells of each column
+
+    @return (numpy array)
+    numColumns x numObjects overlaps. Objects are ordered by their index in
+    objectNameToIndex.
+    """
+    self._syncObjectMatrices()
+    overlaps = np.zeros((self.numColumns,
+                         self.objectL2RepresentationsMatrices[0].nRows()),
+                        dtype="uint32")
+
+    for i, representations in enumerate(self.objectL2RepresentationsMatrices):
+      cells = L2Representation[i]
+      if len(cells) > 0:
+        overlaps[i, :] = representations.rightVecSumAtNZSparse(
+          np.fromiter(cells, dtype="uint32", count=len(cells)))
+
+    return overlaps
+
 
   def _sendReset(self, sequenceId=0):
     """
     Sends a reset signal to the network.
     """
+    if self.network is None:
+      for col in xrange(self.numColumns):
+        self.L4Columns[col]._tm.reset()
+        self.L2Columns[col].reset()
+      self._previousL2Outputs = [np.empty(0, dtype="uint32")
+                                 for _ in xrange(self.numColumns)]
+      return
+
     for col in xrange(self.numColumns):
       self.sensorInputs[col].addResetToQueue(sequenceId)
       self.externalInputs[col].addResetToQueue(sequenceId)
@@ -512,7 +770,8 @@ class L4L2Experiment(object):
 
 
   def resetStatistics(self):
-    self.statistics = []
+    self.statistics = InferenceStatistics(metrics=self.statisticsMetrics,
+                                          path=self.statisticsPath)
 
 
   def plotInferenceStats(self,
@@ -649,6 +908,20 @@ class L4L2Experiment(object):
 
     """
     print "Profiling information for {}".format(type(self).__name__)
+
+    if self.network is None:
+      L2Time = self._directComputeTimes["L2"]
+      L4Time = self._directComputeTimes["L4"]
+      count = max(self._directComputeCount, 1)
+      print "Direct backend, {} iterations, {:6.3f} secs/iteration".format(
+        self._directComputeCount, (L2Time + L4Time) / count)
+      print "Total time in L2 =", L2Time
+      print "Total time in L4 =", L4Time
+
+      if reset:
+        self.resetProfile()
+      return
+
     totalTime = 0.000001
     for region in self.network.regions.values():
       timer = region.getComputeTimer()
@@ -694,14 +967,30 @@ class L4L2Experiment(object):
     """
     Resets the network profiling.
     """
-    self.network.resetProfiling()
+    if self.network is None:
+      self._directComputeTimes = {"L4": 0.0, "L2": 0.0}
+      self._directComputeCount = 0
+    else:
+      self.network.resetProfiling()
+
+
+  def _getOutputCells(self, region, outputName):
+    """
+    Returns the active indices of a region's output.
+    """
+    if self.config.get("sparseLinks", False):
+      return readSparseBuffer(region.getOutputData(outputName))
+    return region.getOutputData(outputName).nonzero()[0]
 
 
   def getL4Representations(self):
     """
     Returns the active representation in L4.
     """
-    return [set(column.getOutputData("activeCells").nonzero()[0])
+    if self.network is None:
+      return [set(column._tm.getActiveCells()) for column in self.L4Columns]
+
+    return [set(self._getOutputCells(column, "activeCells"))
             for column in self.L4Regions]
 
 
@@ -709,7 +998,11 @@ class L4L2Experiment(object):
     """
     Returns the cells in L4 that were predicted by the location input.
     """
-    return [set(column.getOutputData("predictedCells").nonzero()[0])
+    if self.network is None:
+      return [set(column._tm.getPredictedCells())
+              for column in self.L4Columns]
+
+    return [set(self._getOutputCells(column, "predictedCells"))
             for column in self.L4Regions]
 
 
@@ -718,7 +1011,12 @@ class L4L2Experiment(object):
     Returns the cells in L4 that were predicted by the location signal
     and are currently active.  Does not consider apical input.
     """
-    return [set(column.getOutputData("predictedActiveCells").nonzero()[0])
+    if self.network is None:
+      return [set(column._tm.getActiveCells()) &
+              set(column._tm.getPredictedCells())
+              for column in self.L4Columns]
+
+    return [set(self._getOutputCells(column, "predictedActiveCells"))
             for column in self.L4Regions]
 
 
@@ -756,15 +1054,8 @@ class L4L2Experiment(object):
     Each value represents the cortical column's current L2 overlap with the
     specified object.
     """
-    overlaps = np.zeros((self.numColumns,
-                         len(self.objectL2Representations)),
-                        dtype="uint32")
-
-    for i, representations in enumerate(self.objectL2RepresentationsMatrices):
-      activeCells = self.L2Columns[i]._pooler.getActiveCells()
-      overlaps[i, :] = representations.rightVecSumAtNZSparse(activeCells)
-
-    return overlaps
+    return self._getObjectOverlaps([column._pooler.getActiveCells()
+                                    for column in self.L2Columns])
 
 
   def getCurrentClassification(self, minOverlap=None, includeZeros=True):
@@ -787,25 +1078,24 @@ class L4L2Experiment(object):
     if minOverlap is None:
       minOverlap = sdrSize / 2
 
-    for objectName, objectSdr in self.objectL2Representations.iteritems():
-      count = 0
-      score = 0.0
-      for col in xrange(self.numColumns):
-        # Ignore inactive column
-        if len(l2sdr[col]) == 0:
-          continue
-
-        count += 1
-        overlap = len(l2sdr[col] & objectSdr[col])
-        if overlap >= minOverlap:
-          score += 1
-
-      if count == 0:
-        if includeZeros:
-          results[objectName] = 0
-      else:
-        if includeZeros or score>0.0:
-          results[objectName] = score / count
+    # Ignore inactive columns
+    activeColumns = np.array([len(cells) > 0 for cells in l2sdr], dtype="bool")
+    count = activeColumns.sum()
+
+    if count == 0:
+      if includeZeros:
+        results = dict((objectName, 0)
+                       for objectName in self.objectL2Representations)
+      return results
+
+    overlaps = self._getObjectOverlaps(l2sdr)
+    scores = ((overlaps[activeColumns] >= minOverlap).sum(axis=0) /
+              float(count))
+
+    for objectName in self.objectL2Representations:
+      score = float(scores[self.objectNameToIndex[objectName]])
+      if includeZeros or score > 0.0:
+        results[objectName] = score
 
     return results
 
@@ -827,21 +1117,32 @@ class L4L2Experiment(object):
     """
     L2Representation = self.getL2Representations()
     objectRepresentation = self.objectL2Representations[objectName]
+    overlaps = [len(objectRepresentation[col] & L2Representation[col])
+                for col in xrange(self.numColumns)]
+    return self._isClassified(overlaps, L2Representation, minOverlap,
+                              maxL2Size)
+
+
+  def _isClassified(self, overlaps, L2Representation, minOverlap=None,
+                    maxL2Size=None):
+    """
+    See isObjectClassified.
+
+    @param overlaps (list) Each column's L2 overlap with the object
+    @param L2Representation (list) The L2 cells of each column
+    """
     sdrSize = self.config["L2Params"]["sdrSize"]
     if minOverlap is None:
       minOverlap = sdrSize / 2
     if maxL2Size is None:
       maxL2Size = 1.5*sdrSize
 
-    numCorrectClassifications = 0
     for col in xrange(self.numColumns):
-      overlapWithObject = len(objectRepresentation[col] & L2Representation[col])
+      if ( overlaps[col] < minOverlap or
+           len(L2Representation[col]) > maxL2Size ):
+        return False
 
-      if ( overlapWithObject >= minOverlap  and
-           len(L2Representation[col]) <= maxL2Size ):
-        numCorrectClassifications += 1
-
-    return numCorrectClassifications == self.numColumns
+    return True
 
 
   def getDefaultL4Params(self, inputSize, numInputBits):
@@ -967,6 +1268,12 @@ class L4L2Experiment(object):
     """
     Unsets the learning mode, to start inference.
     """
+    if self.network is None:
+      for column in self.L4Columns:
+        column.learn = False
+      for column in self.L2Columns:
+        column.learningMode = False
+      return
 
     for region in self.L4Regions:
       region.setParameter("learn", False)
@@ -978,12 +1285,30 @@ class L4L2Experiment(object):
     """
     Sets the learning mode.
     """
+    if self.network is None:
+      for column in self.L4Columns:
+        column.learn = True
+      for column in self.L2Columns:
+        column.learningMode = True
+      return
+
     for region in self.L4Regions:
       region.setParameter("learn", True)
     for region in self.L2Regions:
       region.setParameter("learningMode", True)
 
 
+  def _createStatisticsKeys(self):
+    """
+    Returns the statistics keys for each column, e.g. "L2 Representation C0".
+    """
+    return [dict((name, name + " C" + str(i))
+                 for name in ("L4 Representation", "L4 Predicted",
+                              "L2 Representation", "Full L2 SDR",
+                              "L4 Apical Segments", "Overlap L2 with object"))
+            for i in xrange(self.numColumns)]
+
+
   def _updateInferenceStats(self, statistics, objectName=None):
     """
     Updates the inference statistics.
@@ -1000,33 +1325,34 @@ class L4L2Experiment(object):
     L4Representations = self.getL4Representations()
     L4PredictedCells = self.getL4PredictedCells()
     L2Representation = self.getL2Representations()
+    objectRepresentation = self.objectL2Representations.get(objectName)
+    overlaps = []
 
-    for i in xrange(self.numColumns):
-      statistics["L4 Representation C" + str(i)].append(
+    for i, keys in enumerate(self._statisticsKeys):
+      statistics[keys["L4 Representation"]].append(
         len(L4Representations[i])
       )
-      statistics["L4 Predicted C" + str(i)].append(
+      statistics[keys["L4 Predicted"]].append(
         len(L4PredictedCells[i])
       )
-      statistics["L2 Representation C" + str(i)].append(
+      statistics[keys["L2 Representation"]].append(
         len(L2Representation[i])
       )
-      statistics["Full L2 SDR C" + str(i)].append(
+      statistics[keys["Full L2 SDR"]].append(
         L2Representation[i]
         # random.sample(L2Representation[i], min(len(L2Representation[i]), 500))
       )
-      statistics["L4 Apical Segments C" + str(i)].append(
+      statistics[keys["L4 Apical Segments"]].append(
         len(self.L4Columns[i]._tm.getActiveApicalSegments())
       )
 
       # add true overlap and classification result if objectName was learned
-      if objectName in self.objectL2Representations:
-        objectRepresentation = self.objectL2Representations[objectName]
-        statistics["Overlap L2 with object C" + str(i)].append(
-          len(objectRepresentation[i] & L2Representation[i]) )
+      if objectRepresentation is not None:
+        overlaps.append(len(objectRepresentation[i] & L2Representation[i]))
+        statistics[keys["Overlap L2 with object"]].append(overlaps[i])
 
-    if objectName in self.objectL2Representations:
-      if self.isObjectClassified(objectName):
+    if objectRepresentation is not None:
+      if self._isClassified(overlaps, L2Representation):
         statistics["Correct classification"].append(1.0)
       else:
         statistics["Correct classification"].append(0.0)
@@ -95,15 +95,38 @@ Also, how do you like my ascii art?
 
 """
 import copy
+import importlib
 import json
 import numpy
 
+from nupic.engine import pyRegions
+
 def enableProfiling(network):
   """Enable profiling for all regions in the network."""
   for region in network.regions.values():
     region.enableProfiling()
 
 
+def _regionDeclaresParameter(regionType, parameterName):
+  """
+  Returns True if the spec of a Python region type, e.g.
+  "py.ApicalTMPairRegion", declares the given parameter. The region is looked
+  up among NuPIC's regions and then in htmresearch.regions.
+  """
+  if not regionType.startswith("py."):
+    return False
+  className = regionType[len("py."):]
+
+  moduleName = dict((name, module) for module, name in pyRegions).get(
+    className, "htmresearch.regions." + className)
+  try:
+    regionClass = getattr(importlib.import_module(moduleName), className)
+  except (ImportError, AttributeError):
+    return False
+
+  return parameterName in regionClass.getSpec()["parameters"]
+
+
 def _addLateralSPRegion(network, networkConfig, suffix=""):
   spParams = networkConfig.get("lateralSPParams", {})
 
@@ -205,7 +228,8 @@ def createL4L2Column(network, networkConfig, suffix=""):
       },
       "feedForwardSPParams": {
         <constructor parameters for optional SPRegion>
-      }
+      },
+      "sparseLinks": False
     }
 
   Region names are externalInput, sensorInput, L4Column, and ColumnPoolerRegion.
@@ -219,6 +243,12 @@ def createL4L2Column(network, networkConfig, suffix=""):
     If externalInputSize is 0, the externalInput sensor (and SP if appropriate)
     will NOT be created. In this case it is expected that L4 is a sequence
     memory region (e.g. ApicalTMSequenceRegion)
+
+    If "sparseLinks" is True, the sensors, L4 and L2 send each other sparse
+    buffers of active indices instead of dense binary vectors (see
+    htmresearch.support.sparse_links). It can't be combined with spatial
+    poolers, which only accept dense vectors, and the L4 region type must
+    declare a "sparseLinks" parameter. Default: False
   """
 
   externalInputName = "externalInput" + suffix
@@ -229,14 +259,29 @@ def createL4L2Column(network, networkConfig, suffix=""):
   L4Params = copy.deepcopy(networkConfig["L4Params"])
   L4Params["basalInputWidth"] = networkConfig["externalInputSize"]
   L4Params["apicalInputWidth"] = networkConfig["L2Params"]["cellCount"]
+  L2Params = copy.deepcopy(networkConfig["L2Params"])
+
+  sparseLinks = networkConfig.get("sparseLinks", False)
+  if sparseLinks:
+    if (networkConfig.get("lateralSPParams") or
+        networkConfig.get("feedForwardSPParams")):
+      raise ValueError("sparseLinks can't be used with spatial poolers")
+    if not _regionDeclaresParameter(networkConfig["L4RegionType"],
+                                    "sparseLinks"):
+      raise ValueError("sparseLinks isn't supported by L4 regions of type " +
+                       networkConfig["L4RegionType"])
+    L4Params["sparseLinks"] = True
+    L2Params["sparseLinks"] = True
 
   if networkConfig["externalInputSize"] > 0:
     network.addRegion(
       externalInputName, "py.RawSensor",
-      json.dumps({"outputWidth": networkConfig["externalInputSize"]}))
+      json.dumps({"outputWidth": networkConfig["externalInputSize"],
+                  "sparseLinks": sparseLinks}))
   network.addRegion(
     sensorInputName, "py.RawSensor",
-    json.dumps({"outputWidth": networkConfig["sensorInputSize"]}))
+    json.dumps({"outputWidth": networkConfig["sensorInputSize"],
+                "sparseLinks": sparseLinks}))
 
   # Fixup network to include SP, if defined in networkConfig
   if networkConfig["externalInputSize"] > 0:
@@ -248,7 +293,7 @@ def createL4L2Column(network, networkConfig, suffix=""):
     json.dumps(L4Params))
   network.addRegion(
     L2ColumnName, "py.ColumnPoolerRegion",
-    json.dumps(networkConfig["L2Params"]))
+    json.dumps(L2Params))
 
   # Set phases appropriately so regions are executed in the proper sequence
   # This is required when we create multiple columns - the order of execution
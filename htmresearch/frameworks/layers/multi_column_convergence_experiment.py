@@ -25,15 +25,14 @@ scenarios.
 """
 
 import cPickle
-from multiprocessing import Pool
 import random
-import time
 import numpy
 
 from htmresearch.frameworks.layers.l2_l4_inference import L4L2Experiment
 from htmresearch.frameworks.layers.object_machine_factory import (
   createObjectMachine
 )
+from htmresearch.frameworks.utils.sweep_runner import runSweep
 
 
 def runExperiment(args):
@@ -76,6 +75,8 @@ def runExperiment(args):
   @param numAmbiguousLocations (int) number of ambiguous locations. Ambiguous
                              locations will present during inference if this
                              parameter is set to be a positive number
+  @param backend (string)    "network" or "direct", see L4L2Experiment.
+                             Default: "network"
 
   The method returns the args dict updated with multiple additional keys
   representing accuracy metrics.
@@ -98,6 +99,7 @@ def runExperiment(args):
   numInferenceRpts = args.get("numInferenceRpts", 1)
   l2Params = args.get("l2Params", None)
   l4Params = args.get("l4Params", None)
+  backend = args.get("backend", "network")
 
   # Create the objects
   objects = createObjectMachine(
@@ -142,6 +144,7 @@ def runExperiment(args):
     numInputBits=20,
     seed=trialNum,
     enableFeedback=enableFeedback,
+    backend=backend,
   )
 
   exp.learnObjects(objects.provideObjectsToLearn())
@@ -256,7 +259,9 @@ def runExperimentPool(numObjects,
                       settlingTime=3,
                       l2Params=None,
                       l4Params=None,
-                      resultsName="convergence_results.pkl"):
+                      resultsName="convergence_results.pkl",
+                      ledgerName=None,
+                      backend="network"):
   """
   Allows you to run a number of experiments using multiple processes.
   For each parameter except numWorkers, pass in a list containing valid values
@@ -266,6 +271,11 @@ def runExperimentPool(numObjects,
   Returns a list of dict containing detailed results from each experiment.
   Also pickles and saves the results in resultsName for later analysis.
 
+  Each result is also appended to a ledger file as soon as it finishes. If the
+  sweep is interrupted, rerunning it skips the experiments in the ledger.
+  Delete the ledger to start over. By default the ledger is resultsName with
+  ".ledger" appended.
+
   Example:
     results = runExperimentPool(
                           numObjects=[10],
@@ -305,26 +315,16 @@ def runExperimentPool(numObjects,
                          "l2Params": l2Params,
                          "l4Params": l4Params,
                          "settlingTime": settlingTime,
+                         "backend": backend,
                          }
               )
-  numExperiments = len(args)
-  print "{} experiments to run, {} workers".format(numExperiments, numWorkers)
-  # Run the pool
-  if numWorkers > 1:
-    pool = Pool(processes=numWorkers)
-    rs = pool.map_async(runExperiment, args, chunksize=1)
-    while not rs.ready():
-      remaining = rs._number_left
-      pctDone = 100.0 - (100.0*remaining) / numExperiments
-      print "    =>", remaining, "experiments remaining, percent complete=",pctDone
-      time.sleep(5)
-    pool.close()  # No more work
-    pool.join()
-    result = rs.get()
-  else:
-    result = []
-    for arg in args:
-      result.append(runExperiment(arg))
+  if ledgerName is None:
+    ledgerName = resultsName + ".ledger"
+
+  # Run the largest networks on the most objects first.
+  result = runSweep(runExperiment, args, ledgerName,
+                    numWorkers=numWorkers,
+                    costFunction=lambda a: a["numColumns"] * a["numObjects"])
 
   # print "Full results:"
   # pprint.pprint(result, width=150)
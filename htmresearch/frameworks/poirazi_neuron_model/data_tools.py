@@ -205,11 +205,15 @@ def generate_evenly_distributed_data_sparse(dim = 2000,
   """
   indices = [numpy.random.choice(dim, size = num_active, replace = False)
       for i in range(num_samples)]
+
+  # Set every entry at once, in row-major order
+  cols = numpy.sort(numpy.reshape(indices, (num_samples, num_active)), axis = 1)
+  rows = numpy.repeat(numpy.arange(num_samples), num_active)
   data = SM32()
   data.reshape(num_samples, dim)
-  for sample, datapoint in enumerate(indices):
-    for index in datapoint:
-      data[sample, index] = 1.
+  data.setAllNonZeros(num_samples, dim, rows.astype("uint32"),
+                      cols.ravel().astype("uint32"),
+                      numpy.ones(rows.size, dtype = "float32"))
 
   return data
 
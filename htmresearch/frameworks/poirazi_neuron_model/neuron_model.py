@@ -19,17 +19,15 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
-import random
 import numpy
-import copy
+import scipy.sparse
 from sklearn.cluster import KMeans
-from collections import Counter
 from nupic.bindings.math import *
 numpy.set_printoptions(threshold=numpy.inf)
 
 def power_nonlinearity(power):
   def l(activations):
-    original_activations = copy.deepcopy(activations)
+    original_activations = SM32(activations)
     for i in range(power - 1):
       activations.elementNZMultiply(original_activations)
     return activations
@@ -51,6 +49,21 @@ def sigmoid_nonlinearity(center, scale):
     return SM32(f(dense))
   return l
 
+def sample_from_rows(mask, counts):
+  """
+  Choose counts[i] random True entries from row i of a boolean matrix, or all
+  of them if the row has fewer. Every row is sampled at once.
+
+  @param mask (2D numpy bool array)
+  @param counts (int or 1D numpy array) The number of entries to choose per row
+
+  @return (2D numpy bool array) The chosen entries
+  """
+  keys = numpy.random.rand(*mask.shape)
+  keys[~mask] = 2.
+  ranks = numpy.argsort(numpy.argsort(keys, axis = 1), axis = 1)
+  return mask & (ranks < numpy.reshape(counts, (-1, 1)))
+
 class Matrix_Neuron(object):
   def __init__(self,
          size = 10000,
@@ -79,17 +92,29 @@ class Matrix_Neuron(object):
     Initialize all the dendrites of the neuron to a set of random connections
     """
     # Wipe any preexisting connections by creating a new connection matrix
+    synapses = sample_from_rows(
+      numpy.ones((self.num_dendrites, self.dim), dtype = bool),
+      self.dendrite_length)
+    self.set_dendrites(*numpy.nonzero(synapses.T))
+
+  def set_dendrites(self, synapses, dendrites):
+    """
+    Replace every connection with the given ones, in bulk.
+
+    @param synapses (numpy array) The input bit of each connection
+    @param dendrites (numpy array) The dendrite of each connection
+    """
+    order = numpy.lexsort((dendrites, synapses))
     self.dendrites = SM32()
     self.dendrites.reshape(self.dim, self.num_dendrites)
-
-    for row in range(self.num_dendrites):
-      synapses = numpy.random.choice(self.dim, self.dendrite_length, replace = False)
-      for synapse in synapses:
-        self.dendrites[synapse, row] = 1
+    self.dendrites.setAllNonZeros(self.dim, self.num_dendrites,
+                                  numpy.asarray(synapses, dtype = "uint32")[order],
+                                  numpy.asarray(dendrites, dtype = "uint32")[order],
+                                  numpy.ones(len(order), dtype = "float32"))
 
 
   def initialize_permanences(self):
-    self.permanences = copy.deepcopy(self.dendrites)
+    self.permanences = SM32(self.dendrites)
     self.permanences = self.permanences*self.initial_permanence
 
   def calculate_activation(self, datapoint):
@@ -117,12 +142,8 @@ class Matrix_Neuron(object):
     allocate enough dendrites to have one per datapoint, but this method at least allows initialization
     to work on larger amounts of data.
     """
-    current_dendrite = 0
-    self.dendrites = SM32()
-    self.dendrites.reshape(self.dim, self.num_dendrites)
-
     # We want to avoid training on any negative examples
-    data = copy.deepcopy(data)
+    data = SM32(data)
     data.deleteRows([i for i, v in enumerate(labels) if v != 1])
 
     if data.nRows() > self.num_dendrites:
@@ -130,94 +151,187 @@ class Matrix_Neuron(object):
       data = (data.toDense())
       model = KMeans(n_clusters = self.num_dendrites, n_jobs=1)
       clusters = model.fit_predict(data)
-      multisets = [[Counter(), []] for i in range(self.num_dendrites)]
-      sparse_data = [[i for i, d in enumerate(datapoint) if d == 1] for datapoint in data]
-
-      for datapoint, cluster in zip(sparse_data, clusters):
-        multisets[cluster][0] = multisets[cluster][0] + Counter(datapoint)
-        multisets[cluster][1].append(set(datapoint))
+      data = (data == 1)
+
+      # How often each bit is active in each cluster
+      membership = scipy.sparse.csr_matrix(
+        (numpy.ones(len(clusters), dtype = "float32"),
+         (clusters, numpy.arange(len(clusters)))),
+        shape = (self.num_dendrites, len(clusters)))
+      counts = membership.dot(data.astype("float32"))
+      most_common = numpy.argsort(-counts, axis = 1, kind = "mergesort")[:, :self.dendrite_length]
+
+      points_by_cluster = numpy.split(numpy.argsort(clusters, kind = "mergesort"),
+                                      numpy.cumsum(numpy.bincount(clusters, minlength = self.num_dendrites))[:-1])
+
+      synapses, dendrites = [], []
+      for i, points in enumerate(points_by_cluster):
+        points = data[points]
+        shared_elements = most_common[i][counts[i, most_common[i]] > 1]
+        connected = numpy.zeros(self.dim, dtype = bool)
+        connected[shared_elements] = True
+        num_connected = len(shared_elements)
+        while num_connected < self.dendrite_length and len(points) > 0:
+          most_distant_point = points[numpy.argmin(points[:, connected].sum(axis = 1))]
+          candidates = numpy.flatnonzero(most_distant_point & ~connected)
+          if len(candidates) == 0:
+            break
+          connected[numpy.random.choice(candidates)] = True
+          num_connected += 1
+
+        synapses.append(numpy.flatnonzero(connected))
+        dendrites.append(numpy.full(num_connected, i, dtype = "uint32"))
+
+      self.set_dendrites(numpy.concatenate(synapses), numpy.concatenate(dendrites))
 
-      for i, multiset in enumerate(multisets):
-        shared_elements = set(map(lambda x: x[0], filter(lambda x: x[1] > 1, multiset[0].most_common(self.dendrite_length))))
-        dendrite_connections = shared_elements
-        while len(shared_elements) < self.dendrite_length:
-          most_distant_point = multiset[1][numpy.argmin([len(dendrite_connections.intersection(point)) for point in multiset[1]])]
-          new_connection = random.sample(most_distant_point - dendrite_connections, 1)[0]
-          dendrite_connections.add(new_connection)
+    else:
+      synapses = sample_from_rows(data.toDense() > 0, self.dendrite_length)
+      dendrites, synapses = numpy.nonzero(synapses)
+      self.set_dendrites(synapses, dendrites)
 
-        for synapse in dendrite_connections:
-          self.dendrites[synapse, current_dendrite] = 1.
-        current_dendrite += 1
+    self.initialize_permanences()
 
-    else:
+  def HTM_style_train_on_data(self, data, labels, batch_size = 1):
+    """
+    Train on every datapoint in order.
+
+    With batch_size > 1, datapoints are processed in minibatches. The
+    activations of a whole minibatch are computed with one matrix product, the
+    strongest (or weakest) branch for each datapoint is chosen at once, and all
+    of the minibatch's permanence updates and synapse replacements are applied
+    together with NumPy. Datapoints in a minibatch don't see each other's
+    updates, so the result differs slightly from training one at a time.
+    """
+    if batch_size <= 1:
       for i in range(data.nRows()):
-        ones = data.rowNonZeros(i)[0]
-        dendrite_connections = numpy.random.choice(ones, size = self.dendrite_length, replace = False)
-        for synapse in dendrite_connections:
-          self.dendrites[synapse, current_dendrite] = 1.
+        self.HTM_style_train_on_datapoint(data.getSlice(i, i+1, 0, data.nCols()), labels[i])
+      return
 
-        current_dendrite += 1
+    labels = numpy.asarray(labels)
+    dendrites = self.dendrites.toDense()
+    permanences = self.permanences.toDense()
+    for start in range(0, data.nRows(), batch_size):
+      end = min(start + batch_size, data.nRows())
+      self.HTM_style_train_on_batch(data.getSlice(start, end, 0, data.nCols()).toDense(),
+                                    labels[start:end], dendrites, permanences)
 
-    self.initialize_permanences()
+    self.dendrites = SM32(dendrites)
+    self.permanences = SM32(permanences)
 
-  def HTM_style_train_on_data(self, data, labels):
-    for i in range(data.nRows()):
-      self.HTM_style_train_on_datapoint(data.getSlice(i, i+1, 0, data.nCols()), labels[i])
+  def HTM_style_train_on_batch(self, batch, labels, dendrites, permanences):
+    """
+    Minibatch version of HTM_style_train_on_datapoint.  Updates dendrites and
+    permanences, which are dense dim x num_dendrites arrays, in place.
+    """
+    activations = self.nonlinearity(SM32(batch.dot(dendrites))).toDense()
+    active = activations.sum(axis = 1) > 0
+    strongest_branch = activations.argmax(axis = 1)
+    positive = labels >= 1
+    batch = batch > 0
+
+    # Correctly detected positives strengthen synapses to their active bits
+    # and weaken the others, on the strongest branch
+    # False positives weaken synapses to their active bits on it
+    updates = numpy.zeros(batch.shape, dtype = "float32")
+    rows = numpy.flatnonzero(positive & active)
+    updates[rows] = (self.permanence_increment * batch[rows] -
+                     self.permanence_decrement * ~batch[rows])
+    updates[~positive & active] = -self.permanence_decrement * batch[~positive & active]
+    branch_of_row = scipy.sparse.csr_matrix(
+      (active.astype("float32"), (numpy.arange(len(batch)), strongest_branch)),
+      shape = (len(batch), self.num_dendrites))
+    permanences += dendrites * branch_of_row.T.dot(updates).T
+
+    # Replace weak synapses on the strengthened branches with synapses to
+    # the most recent datapoint's active bits
+    if len(rows) > 0:
+      branches, last = numpy.unique(strongest_branch[rows][::-1], return_index = True)
+      datapoints = batch[rows[len(rows) - 1 - last]]
+      branch_dendrites = dendrites[:, branches].T
+      branch_permanences = permanences[:, branches].T
+      weak = (branch_dendrites > 0) & (branch_permanences < self.permanence_threshold)
+      branch_dendrites[weak] = 0
+      branch_permanences[weak] = 0
+      new_synapses = sample_from_rows(datapoints & (branch_dendrites == 0), weak.sum(axis = 1))
+      branch_dendrites[new_synapses] = 1.
+      branch_permanences[new_synapses] = self.initial_permanence
+      dendrites[:, branches] = branch_dendrites.T
+      permanences[:, branches] = branch_permanences.T
+
+    # Missed positives take over the weakest branches
+    rows = numpy.flatnonzero(positive & ~active)
+    if len(rows) > 0:
+      weakest_branches = numpy.argsort(permanences.sum(axis = 0), kind = "mergesort")[:len(rows)]
+      reset = numpy.median(permanences[:, weakest_branches], axis = 0) < self.permanence_threshold
+      branches = weakest_branches[reset]
+      new_synapses = sample_from_rows(batch[rows[:len(weakest_branches)][reset]], self.dendrite_length)
+      dendrites[:, branches] = new_synapses.T
+      permanences[:, branches] = new_synapses.T * self.initial_permanence
 
   def HTM_style_train_on_datapoint(self, datapoint, label):
     """
     Run a version of permanence-based training on a datapoint.  Due to the fixed dendrite count and dendrite length,
     we are forced to more efficiently use each synapse, deleting synapses and resetting them if they are not found useful.
+
+    Only the column of the branch being changed is copied out and updated with
+    NumPy, and only the synapses that changed are written back.
     """
     activations = datapoint * self.dendrites
     self.nonlinearity(activations)
 
     #activations will quite likely still be sparse if using a threshold nonlinearity, so want to keep it sparse
     activation = numpy.sign(activations.sum())
+    active_bits = datapoint.toDense()[0] > 0
 
 
-    if label >= 1 and activation >= 0.5:
+    if activation >= 0.5:
       strongest_branch = activations.rowMax(0)[0]
-      datapoint.transpose()
-      inc_vector = self.dendrites.getSlice(0, self.dim, strongest_branch, strongest_branch + 1) * self.permanence_increment
-      inc_vector.elementNZMultiply(datapoint)
-      dec_vector = self.dendrites.getSlice(0, self.dim, strongest_branch, strongest_branch + 1) * self.permanence_decrement
-      dec_vector.elementNZMultiply(1 - datapoint)
+      previously_connected = self.dendrites.getCol(strongest_branch) > 0
+      connected = previously_connected.copy()
+      permanences = self.permanences.getCol(strongest_branch)
 
+      if label >= 1:
+        permanences[connected & active_bits] += self.permanence_increment
+        permanences[connected & ~active_bits] -= self.permanence_decrement
 
+        # Replace weak synapses with synapses to the datapoint's active bits
+        weak = connected & (permanences < self.permanence_threshold)
+        connected[weak] = False
+        permanences[weak] = 0
+        new_synapses = sample_from_rows((active_bits & ~connected)[numpy.newaxis],
+                                        weak.sum())[0]
+        connected[new_synapses] = True
+        permanences[new_synapses] = self.initial_permanence
 
-      self.permanences.setSlice(0, strongest_branch, self.permanences.getSlice(0, self.dim, strongest_branch, strongest_branch + 1) + inc_vector - dec_vector)
+      else:
+        # Need to weaken some connections
+        permanences[connected & active_bits] -= self.permanence_decrement
 
-      positions, scores = self.permanences.colNonZeros(strongest_branch)[0], self.permanences.colNonZeros(strongest_branch)[1]
+      self.set_branch(strongest_branch, previously_connected | connected,
+                      connected, permanences)
 
-      for position, score in zip(positions, scores):
-        if score < self.permanence_threshold:
-          self.dendrites[position, strongest_branch] = 0
-          self.permanences[position, strongest_branch] = 0
-          new_connection = random.sample(set(datapoint.colNonZeros(0)[0]) - set(self.dendrites.colNonZeros(strongest_branch)[0]), 1)[0]
-          self.dendrites[new_connection, strongest_branch] = 1.
-          self.permanences[new_connection, strongest_branch] = self.initial_permanence
 
-
-    elif label < 1 and activation >= 0.5:
-      # Need to weaken some connections
-      strongest_branch = activations.rowMax(0)[0]
-
-      dec_vector = self.dendrites.getSlice(0, self.dim, strongest_branch, strongest_branch + 1) * self.permanence_decrement
-      datapoint.transpose()
-      dec_vector.elementNZMultiply(datapoint)
-      self.permanences.setSlice(0, strongest_branch, self.permanences.getSlice(0, self.dim, strongest_branch, strongest_branch + 1) - dec_vector)
-
-
-    elif label >= 1 and activation < 0.5:
+    elif label >= 1:
       # Need to create some new connections
       weakest_branch = numpy.argmin(self.permanences.colSums())
       if numpy.median(self.permanences.getCol(weakest_branch)) < self.permanence_threshold:
-        self.permanences.setColToZero(weakest_branch)
-        self.dendrites.setColToZero(weakest_branch)
-
-        ones = datapoint.rowNonZeros(0)[0]
-        dendrite_connections = numpy.random.choice(ones, size = self.dendrite_length, replace = False)
-        for synapse in dendrite_connections:
-          self.dendrites[synapse, weakest_branch] = 1.
-          self.permanences[synapse, weakest_branch] = self.initial_permanence
+        connected = sample_from_rows(active_bits[numpy.newaxis],
+                                     self.dendrite_length)[0]
+        self.set_branch(weakest_branch,
+                        connected | (self.dendrites.getCol(weakest_branch) > 0),
+                        connected, connected * self.initial_permanence)
+
+  def set_branch(self, branch, changed, connected, permanences):
+    """
+    Write part of a branch's column back to dendrites and permanences.
+    Setting an entry to zero removes it from the sparse matrices.
+
+    @param branch (int) The branch
+    @param changed (numpy bool array) The input bits to write
+    @param connected (numpy bool array) The branch's synapses, for every input bit
+    @param permanences (numpy array) The branch's permanences, for every input bit
+    """
+    rows = numpy.flatnonzero(changed).astype("uint32")
+    cols = numpy.full(len(rows), branch, dtype = "uint32")
+    self.dendrites.setElements(rows, cols, connected[rows].astype("float32"))
+    self.permanences.setElements(rows, cols, permanences[rows].astype("float32"))
@@ -759,14 +759,19 @@ def calculateEntropy(activeColumns, type='binary'):
 
 
 def calculateInputOverlapMat(inputVectors, sp):
-  numColumns = np.product(sp.getColumnDimensions())
-  numInputVector, inputSize = inputVectors.shape
-  overlapMat = np.zeros((numColumns, numInputVector))
-  for c in range(numColumns):
-    connectedSynapses = np.zeros((inputSize, ), dtype=uintType)
-    sp.getConnectedSynapses(c, connectedSynapses)
-    for i in range(numInputVector):
-      overlapMat[c, i] = percentOverlap(connectedSynapses, inputVectors[i, :])
+  """
+  Computes the percentOverlap of every column's connected synapses with every
+  input vector, using one matrix product.
+  @param inputVectors (array) 2D numpy array of input vectors
+  @return overlapMat (array) numColumns x numInputVectors percent overlaps
+  """
+  connectedSyns = getConnectedSyns(sp)
+  overlaps = np.dot(connectedSyns, inputVectors.T).astype("float64")
+  minNonZeros = np.minimum(
+    np.count_nonzero(connectedSyns, axis=1).reshape((-1, 1)),
+    np.count_nonzero(inputVectors, axis=1).reshape((1, -1)))
+  overlapMat = np.zeros(overlaps.shape)
+  np.divide(overlaps, minNonZeros, out=overlapMat, where=minNonZeros > 0)
   return overlapMat
 
 
@@ -780,14 +785,7 @@ def calculateStability(activeColumnsCurrentEpoch, activeColumnsPreviousEpoch):
 
 
 def calculateInputSpaceCoverage(sp):
-  numInputs = np.prod(sp.getInputDimensions())
-  numColumns = np.prod(sp.getColumnDimensions())
-  inputSpaceCoverage = np.zeros(numInputs)
-
-  connectedSynapses = np.zeros((numInputs), dtype=uintType)
-  for columnIndex in range(numColumns):
-    sp.getConnectedSynapses(columnIndex, connectedSynapses)
-    inputSpaceCoverage += connectedSynapses
+  inputSpaceCoverage = np.sum(getConnectedSyns(sp), axis=0, dtype="float64")
   inputSpaceCoverage = np.reshape(inputSpaceCoverage, sp.getInputDimensions())
   return inputSpaceCoverage
 
@@ -861,24 +859,28 @@ def witnessError(sp, inputVectors, activeColumnsCurrentEpoch):
   \[
       Witness Error = Reconstruction Error.
   \]
-  It can be shown that the error is optimized by the Hebbian-like update rule 
-  of the spatial pooler. 
+  It can be shown that the error is optimized by the Hebbian-like update rule
+  of the spatial pooler.
+
+  If an input has no active columns, its term is undefined and the error is
+  nan (rather than raising a ZeroDivisionError).
   """
   connectionMatrix = getConnectedSyns(sp)
   batchSize        = inputVectors.shape[0]
+  inputVectors     = inputVectors.astype("float64")
+  activeColumns    = (activeColumnsCurrentEpoch > 0.).astype("float64")
+  numActiveColumns = np.sum(activeColumns, 1)
 
-  # 1st sum... over each input in batch
-  Err = 0.
-  for i in range(batchSize):
-    activeColumns    = np.where(activeColumnsCurrentEpoch[i] > 0.)[0]
-    numActiveColumns = activeColumns.shape[0]
-    # 2nd sum... over each active colum
-    err = 0.
-    for j in activeColumns:
-      # Compute hamming distance and accumulate
-      err += np.sum(np.absolute(connectionMatrix[j] - inputVectors[i]))
+  # Since connectionMatrix is binary, the hamming distance of syn(j) and x is
+  #   \sum_k |x_k| + \sum_k syn(j)_k (|1 - x_k| - |x_k|)
+  # so the distances to every column come from one matrix product.
+  inputNorms = np.sum(np.absolute(inputVectors), 1)
+  distances  = inputNorms.reshape((-1, 1)) + np.dot(
+    np.absolute(1. - inputVectors) - np.absolute(inputVectors),
+    connectionMatrix.T)
 
-    Err += err/numActiveColumns
+  # 1st sum... over each input in batch, 2nd sum... over each active column
+  Err = np.sum(np.sum(activeColumns * distances, 1) / numActiveColumns)
 
   return Err/batchSize
 
@@ -894,47 +896,70 @@ def mutualInformation(sp, activeColumnsCurrentEpoch, column_1, column_2):
   \]
   (https://en.wikipedia.org/wiki/Mutual_information)
   """
-  i, j        = column_1, column_2
-  batchSize   = activeColumnsCurrentEpoch.shape[0]
-
-  # Activity Counts
-  ci, cj, cij = 0., 0., dict([((0,0),0.), ((1,0),0.), ((0,1),0.), ((1,1),0.)])
-  for t in range(batchSize):
-    ai = activeColumnsCurrentEpoch[t, i]
-    aj = activeColumnsCurrentEpoch[t, j]
-    cij[(ai, aj)] += 1.
-    ci += ai
-    cj += aj
-
-  # Mutual information calculation 
-  Iij = 0
-  for a,b in [(0,0), (1,0), (0,1), (1,1)]:
+  activity = activeColumnsCurrentEpoch[:, [column_1, column_2]].astype("float64")
+  return float(_mutualInformationFromCounts(
+    np.dot(activity[:, 0], activity[:, 1]), np.sum(activity[:, 0]),
+    np.sum(activity[:, 1]), activity.shape[0]))
+
+
+
+def _mutualInformationFromCounts(c11, ci, cj, batchSize):
+  """
+  Computes the mutual information of pairs of binary columns, elementwise,
+  from the number of time steps in which each column is active (ci, cj) and in
+  which both are active (c11).
+  """
+  Iij = 0.
+  for cij, ca, cb in [(batchSize - ci - cj + c11, batchSize - ci, batchSize - cj),
+                      (ci - c11, ci, batchSize - cj),
+                      (cj - c11, batchSize - ci, cj),
+                      (c11, ci, cj)]:
     # Compute probabilities
-    pij = cij[(a,b)]/batchSize
-    pi  = ci/batchSize if a == 1 else 1. - ci/batchSize
-    pj  = cj/batchSize if b == 1 else 1. - cj/batchSize
-    # Add current term of mutual information 
-    Iij += pij * np.log2(pij/(pi*pj)) if pij > 0 else 0
+    pij = np.asarray(cij, dtype="float64")/batchSize
+    pi  = np.asarray(ca, dtype="float64")/batchSize
+    pj  = np.asarray(cb, dtype="float64")/batchSize
+    # Add current term of mutual information. pi and pj are positive
+    # wherever pij is.
+    with np.errstate(divide="ignore", invalid="ignore"):
+      Iij = Iij + np.where(pij > 0, pij * np.log2(pij/(pi*pj)), 0.)
 
   return Iij
 
 
 
-def meanMutualInformation(sp, activeColumnsCurrentEpoch, columnsUnderInvestigation = []):
+def meanMutualInformation(sp, activeColumnsCurrentEpoch, columnsUnderInvestigation = [],
+                          numSampledPairs = None):
   """
   Computes the mean of the mutual information 
   of pairs taken from a list of columns. 
+
+  The joint activity counts of all pairs come from one product of the
+  activity matrix with its transpose. For very large numbers of columns, pass
+  numSampledPairs to estimate the mean from that many random pairs instead.
   """
   if len(columnsUnderInvestigation) == 0:
     columns = range(np.prod(sp.getColumnDimensions()))
   else:
     columns = columnsUnderInvestigation
   numCols = len(columns)
-  sumMutualInfo = 0
+  batchSize = activeColumnsCurrentEpoch.shape[0]
+  activity = activeColumnsCurrentEpoch[:, columns].astype("float64")
+  counts = np.sum(activity, 0)
+
+  if numSampledPairs is not None:
+    # Random pairs of distinct columns
+    i = np.random.randint(numCols, size=numSampledPairs)
+    j = np.random.randint(numCols - 1, size=numSampledPairs)
+    j[j >= i] += 1
+    c11 = np.sum(activity[:, i] * activity[:, j], 0)
+    return np.mean(_mutualInformationFromCounts(c11, counts[i], counts[j],
+                                                batchSize))
+
+  c11 = np.dot(activity.T, activity)
+  mutualInfo = _mutualInformationFromCounts(
+    c11, counts.reshape((-1, 1)), counts.reshape((1, -1)), batchSize)
+  sumMutualInfo = np.sum(np.triu(mutualInfo, 1))
   normalizingConst = numCols*(numCols - 1)/2
-  for i in range(numCols):
-    for j in range(i+1, numCols):
-      sumMutualInfo += mutualInformation(sp, activeColumnsCurrentEpoch, columns[i], columns[j])
 
   return sumMutualInfo/normalizingConst
 
@@ -0,0 +1,222 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Runs a parameter sweep in parallel, recording each result in an append-only
+ledger file as soon as it finishes. Rerunning the same sweep with the same
+ledger skips every task that already finished, so a crash only loses the tasks
+that were running.
+"""
+
+import cPickle
+import cStringIO
+import hashlib
+from multiprocessing import Pool
+import os
+import time
+
+import numpy as np
+
+
+
+def taskKey(args):
+  """
+  Compute a key that identifies a task by its arguments: the SHA-1 of their
+  full serialization. It doesn't depend on dict ordering, so the same
+  arguments always produce the same key.
+
+  @param args (object) The task's arguments, built from dicts, lists, tuples,
+                       NumPy arrays and plain values
+  @return (str)
+  """
+  f = cStringIO.StringIO()
+  pickler = cPickle.Pickler(f, 2)
+  # Without the memo, equal values always pickle to the same bytes, whether or
+  # not they are the same object.
+  pickler.fast = 1
+  pickler.dump(_canonical(args))
+  return hashlib.sha1(f.getvalue()).hexdigest()
+
+
+
+def _canonical(value):
+  if isinstance(value, dict):
+    return ("dict", tuple(sorted((_canonical(k), _canonical(v))
+                                 for k, v in value.iteritems())))
+  elif isinstance(value, (list, tuple)):
+    return (type(value).__name__, tuple(_canonical(v) for v in value))
+  elif isinstance(value, np.ndarray):
+    if value.dtype.hasobject:
+      contents = tuple(_canonical(v) for v in value.ravel().tolist())
+    else:
+      contents = np.ascontiguousarray(value).tobytes()
+    return ("ndarray", value.dtype.str, value.shape, contents)
+  else:
+    return value
+
+
+
+def readLedger(ledgerName):
+  """
+  Read the results recorded in a ledger.
+
+  A record that was only partly written, e.g. because the process was killed,
+  is ignored.
+
+  @param ledgerName (str) Path of the ledger file
+  @return (dict) Maps each finished task's key to its result
+  """
+  return _readLedger(ledgerName)[0]
+
+
+
+def _readLedger(ledgerName):
+  """
+  @return (tuple) The results by key, and the length in bytes of the complete
+                  records at the start of the file
+  """
+  resultsByKey = {}
+  validLength = 0
+  if not os.path.exists(ledgerName):
+    return resultsByKey, validLength
+
+  with open(ledgerName, "rb") as f:
+    while True:
+      try:
+        key, result = cPickle.load(f)
+      except (EOFError, cPickle.UnpicklingError, ValueError, IndexError,
+              KeyError):
+        break
+      resultsByKey[key] = result
+      validLength = f.tell()
+
+  return resultsByKey, validLength
+
+
+
+def _runTask(task):
+  """
+  Run one task in a worker. Module level so that it can be pickled.
+  """
+  function, index, args = task
+  return index, function(args)
+
+
+
+def _formatDuration(seconds):
+  minutes, seconds = divmod(int(seconds), 60)
+  hours, minutes = divmod(minutes, 60)
+  return "{}:{:02d}:{:02d}".format(hours, minutes, seconds)
+
+
+
+def runSweep(function, args, ledgerName, numWorkers=1, costFunction=None,
+             maxTasksPerChild=None, reportInterval=5.0, verbose=True):
+  """
+  Call function(a) for each a in args, skipping the tasks already recorded in
+  the ledger.
+
+  Pending tasks are run in order of decreasing expected cost, so the longest
+  tasks don't end up running alone at the end of the sweep. Progress,
+  throughput and the estimated time remaining are printed at most every
+  reportInterval seconds.
+
+  @param function (callable) Module level function that runs one task. It must
+                             be picklable when numWorkers > 1.
+  @param args (list) The arguments of each task
+  @param ledgerName (str) Path of the ledger file. Created if needed.
+  @param numWorkers (int) Number of processes. With 1, tasks run in this
+                          process.
+  @param costFunction (callable) Maps a task's arguments to its expected
+                                 relative run time. Default: every task costs 1.
+  @param maxTasksPerChild (int) Passed to multiprocessing.Pool
+  @param reportInterval (float) Minimum number of seconds between reports
+  @param verbose (bool) If false, nothing is printed
+  @return (list) The result of each task, in the same order as args
+  """
+  keys = [taskKey(a) for a in args]
+  finished, validLength = _readLedger(ledgerName)
+
+  results = [None] * len(args)
+  pending = []
+  for i, key in enumerate(keys):
+    if key in finished:
+      results[i] = finished[key]
+    else:
+      pending.append(i)
+
+  costs = [1.0] * len(args)
+  if costFunction is not None:
+    costs = [float(costFunction(a)) for a in args]
+  pending.sort(key=lambda i: costs[i], reverse=True)
+
+  if verbose:
+    print "{} tasks, {} already finished, {} to run, {} workers".format(
+      len(args), len(args) - len(pending), len(pending), numWorkers)
+
+  if len(pending) == 0:
+    return results
+
+  tasks = [(function, i, args[i]) for i in pending]
+  totalCost = sum(costs[i] for i in pending)
+  finishedCost = 0.0
+  numFinished = 0
+  startTime = time.time()
+  lastReport = startTime
+
+  pool = None
+  if numWorkers > 1:
+    pool = Pool(processes=numWorkers, maxtasksperchild=maxTasksPerChild)
+    completed = pool.imap_unordered(_runTask, tasks, chunksize=1)
+  else:
+    completed = (_runTask(task) for task in tasks)
+
+  try:
+    with open(ledgerName, "ab") as ledger:
+      # Drop a partly written record so new records can be read back.
+      ledger.truncate(validLength)
+
+      for index, result in completed:
+        cPickle.dump((keys[index], result), ledger,
+                     cPickle.HIGHEST_PROTOCOL)
+        ledger.flush()
+        results[index] = result
+
+        numFinished += 1
+        finishedCost += costs[index]
+        now = time.time()
+        if verbose and (now - lastReport >= reportInterval or
+                        numFinished == len(pending)):
+          lastReport = now
+          elapsed = max(now - startTime, 1e-6)
+          eta = elapsed * (totalCost - finishedCost) / max(finishedCost,
+                                                           1e-12)
+          print ("    => {}/{} tasks finished, {:.2f} tasks/minute, "
+                 "elapsed {}, ETA {}").format(
+                   numFinished, len(pending), 60.0 * numFinished / elapsed,
+                   _formatDuration(elapsed), _formatDuration(eta))
+  finally:
+    # Every result is in, or something failed and the sweep is abandoned.
+    if pool is not None:
+      pool.terminate()
+      pool.join()
+
+  return results
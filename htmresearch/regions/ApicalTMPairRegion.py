@@ -26,6 +26,8 @@ Region for Temporal Memory with various apical implementations.
 import numpy as np
 
 from nupic.bindings.regions.PyRegion import PyRegion
+from htmresearch.support.sparse_links import (
+  sparseBufferSize, writeSparseBuffer, readSparseBuffer)
 
 
 
@@ -303,6 +305,16 @@ class ApicalTMPairRegion(PyRegion):
           "constraints": ("enum: ApicalTiebreak, ApicalTiebreakCPP, ApicalDependent"),
           "defaultValue": "ApicalTiebreakCPP"
         },
+        "sparseLinks": {
+          "description": ("If true, every input and output is a sparse "
+                          "buffer: the number of active bits followed by "
+                          "their indices. See "
+                          "htmresearch.support.sparse_links."),
+          "accessMode": "Read",
+          "dataType": "Bool",
+          "count": 1,
+          "defaultValue": "false"
+        },
       },
     }
 
@@ -336,6 +348,7 @@ class ApicalTMPairRegion(PyRegion):
                # Region params
                implementation="ApicalTiebreak",
                learn=True,
+               sparseLinks=False,
                **kwargs):
 
     # Input sizes (the network API doesn't provide these during initialize)
@@ -363,6 +376,7 @@ class ApicalTMPairRegion(PyRegion):
     # Region params
     self.implementation = implementation
     self.learn = learn
+    self.sparseLinks = sparseLinks
 
     PyRegion.__init__(self, **kwargs)
 
@@ -430,11 +444,20 @@ class ApicalTMPairRegion(PyRegion):
       if inputs["resetIn"][0] != 0:
         # send empty output
         self._tm.reset()
-        outputs["activeCells"][:] = 0
-        outputs["predictedActiveCells"][:] = 0
-        outputs["winnerCells"][:] = 0
+        if self.sparseLinks:
+          outputs["activeCells"][0] = 0
+          outputs["predictedActiveCells"][0] = 0
+          outputs["winnerCells"][0] = 0
+        else:
+          outputs["activeCells"][:] = 0
+          outputs["predictedActiveCells"][:] = 0
+          outputs["winnerCells"][:] = 0
         return
 
+    if self.sparseLinks:
+      self._computeSparse(inputs, outputs)
+      return
+
     activeColumns = inputs["activeColumns"].nonzero()[0]
 
     if "basalInput" in inputs:
@@ -472,6 +495,45 @@ class ApicalTMPairRegion(PyRegion):
     outputs["winnerCells"][self._tm.getWinnerCells()] = 1
 
 
+  def _computeSparse(self, inputs, outputs):
+    """
+    Run one iteration of TM's compute with sparse buffers on every link.
+    """
+    activeColumns = readSparseBuffer(inputs["activeColumns"])
+
+    if "basalInput" in inputs:
+      basalInput = readSparseBuffer(inputs["basalInput"])
+    else:
+      basalInput = np.empty(0, dtype="uint32")
+
+    if "apicalInput" in inputs:
+      apicalInput = readSparseBuffer(inputs["apicalInput"])
+    else:
+      apicalInput = np.empty(0, dtype="uint32")
+
+    if "basalGrowthCandidates" in inputs:
+      basalGrowthCandidates = readSparseBuffer(inputs["basalGrowthCandidates"])
+    else:
+      basalGrowthCandidates = basalInput
+
+    if "apicalGrowthCandidates" in inputs:
+      apicalGrowthCandidates = readSparseBuffer(
+        inputs["apicalGrowthCandidates"])
+    else:
+      apicalGrowthCandidates = apicalInput
+
+    self._tm.compute(activeColumns, basalInput, apicalInput,
+                     basalGrowthCandidates, apicalGrowthCandidates, self.learn)
+
+    activeCells = self._tm.getActiveCells()
+    predictedCells = self._tm.getPredictedCells()
+    writeSparseBuffer(outputs["activeCells"], activeCells)
+    writeSparseBuffer(outputs["predictedCells"], predictedCells)
+    writeSparseBuffer(outputs["predictedActiveCells"],
+                      np.intersect1d(activeCells, predictedCells))
+    writeSparseBuffer(outputs["winnerCells"], self._tm.getWinnerCells())
+
+
   def getParameter(self, parameterName, index=-1):
     """
       Get the value of a NodeSpec parameter. Most parameters are handled
@@ -499,6 +561,8 @@ class ApicalTMPairRegion(PyRegion):
     """
     if name in ["activeCells", "predictedCells", "predictedActiveCells",
                 "winnerCells"]:
+      if self.sparseLinks:
+        return sparseBufferSize(self.cellsPerColumn * self.columnCount)
       return self.cellsPerColumn * self.columnCount
     else:
       raise Exception("Invalid output name specified: %s" % name)
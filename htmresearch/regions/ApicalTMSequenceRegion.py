@@ -26,6 +26,8 @@ Region for Temporal Memory with various apical implementations.
 import numpy as np
 
 from nupic.bindings.regions.PyRegion import PyRegion
+from htmresearch.support.sparse_links import (
+  sparseBufferSize, writeSparseBuffer, readSparseBuffer)
 
 
 
@@ -273,6 +275,16 @@ class ApicalTMSequenceRegion(PyRegion):
           "constraints": ("enum: ApicalTiebreak, ApicalTiebreakCPP, ApicalDependent"),
           "defaultValue": "ApicalTiebreakCPP"
         },
+        "sparseLinks": {
+          "description": ("If true, every input and output is a sparse "
+                          "buffer: the number of active bits followed by "
+                          "their indices. See "
+                          "htmresearch.support.sparse_links."),
+          "accessMode": "Read",
+          "dataType": "Bool",
+          "count": 1,
+          "defaultValue": "false"
+        },
       },
     }
 
@@ -305,6 +317,7 @@ class ApicalTMSequenceRegion(PyRegion):
                # Region params
                implementation="ApicalTiebreakCPP",
                learn=True,
+               sparseLinks=False,
                **kwargs):
 
     # Input sizes (the network API doesn't provide these during initialize)
@@ -331,6 +344,7 @@ class ApicalTMSequenceRegion(PyRegion):
     # Region params
     self.implementation = implementation
     self.learn = learn
+    self.sparseLinks = sparseLinks
 
     PyRegion.__init__(self, **kwargs)
 
@@ -397,12 +411,22 @@ class ApicalTMSequenceRegion(PyRegion):
       if inputs["resetIn"][0] != 0:
         # send empty output
         self._tm.reset()
-        outputs["activeCells"][:] = 0
-        outputs["nextPredictedCells"][:] = 0
-        outputs["predictedActiveCells"][:] = 0
-        outputs["winnerCells"][:] = 0
+        if self.sparseLinks:
+          outputs["activeCells"][0] = 0
+          outputs["nextPredictedCells"][0] = 0
+          outputs["predictedActiveCells"][0] = 0
+          outputs["winnerCells"][0] = 0
+        else:
+          outputs["activeCells"][:] = 0
+          outputs["nextPredictedCells"][:] = 0
+          outputs["predictedActiveCells"][:] = 0
+          outputs["winnerCells"][:] = 0
         return
 
+    if self.sparseLinks:
+      self._computeSparse(inputs, outputs)
+      return
+
     activeColumns = inputs["activeColumns"].nonzero()[0]
 
     if "apicalInput" in inputs:
@@ -431,6 +455,34 @@ class ApicalTMSequenceRegion(PyRegion):
     outputs["winnerCells"][self._tm.getWinnerCells()] = 1
 
 
+  def _computeSparse(self, inputs, outputs):
+    """
+    Run one iteration of TM's compute with sparse buffers on every link.
+    """
+    activeColumns = readSparseBuffer(inputs["activeColumns"])
+
+    if "apicalInput" in inputs:
+      apicalInput = readSparseBuffer(inputs["apicalInput"])
+    else:
+      apicalInput = np.empty(0, dtype="uint32")
+
+    if "apicalGrowthCandidates" in inputs:
+      apicalGrowthCandidates = readSparseBuffer(
+        inputs["apicalGrowthCandidates"])
+    else:
+      apicalGrowthCandidates = apicalInput
+
+    self._tm.compute(activeColumns, apicalInput, apicalGrowthCandidates,
+                     self.learn)
+
+    writeSparseBuffer(outputs["activeCells"], self._tm.getActiveCells())
+    writeSparseBuffer(outputs["nextPredictedCells"],
+                      self._tm.getNextPredictedCells())
+    writeSparseBuffer(outputs["predictedActiveCells"],
+                      self._tm.getPredictedActiveCells())
+    writeSparseBuffer(outputs["winnerCells"], self._tm.getWinnerCells())
+
+
   def reset(self):
     """
     Reset the TM.
@@ -465,6 +517,8 @@ class ApicalTMSequenceRegion(PyRegion):
     """
     if name in ["activeCells", "nextPredictedCells", "predictedActiveCells",
                 "winnerCells"]:
+      if self.sparseLinks:
+        return sparseBufferSize(self.cellsPerColumn * self.columnCount)
       return self.cellsPerColumn * self.columnCount
     else:
       raise Exception("Invalid output name specified: %s" % name)
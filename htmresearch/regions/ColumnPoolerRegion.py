@@ -25,6 +25,9 @@ import inspect
 
 from nupic.bindings.regions.PyRegion import PyRegion
 from htmresearch.algorithms.column_pooler import ColumnPooler
+from htmresearch.support.sparse_links import (
+  sparseBufferSize, writeSparseBuffer, readSparseBuffer,
+  readConcatenatedSparseBuffers)
 
 
 def getConstructorArguments():
@@ -311,6 +314,14 @@ class ColumnPoolerRegion(PyRegion):
           count=0,
           constraints="enum: active,predicted,predictedActiveCells",
           defaultValue="active"),
+        sparseLinks=dict(
+          description="If true, every input and output is a sparse buffer: "
+                      "the number of active cells followed by their indices. "
+                      "See htmresearch.support.sparse_links.",
+          accessMode="Read",
+          dataType="Bool",
+          count=1,
+          defaultValue="false"),
       ),
       commands=dict(
         reset=dict(description="Explicitly reset TM states now."),
@@ -349,6 +360,7 @@ class ColumnPoolerRegion(PyRegion):
 
                seed=42,
                defaultOutputType = "active",
+               sparseLinks=False,
                **kwargs):
 
     # Used to derive Column Pooler params
@@ -380,6 +392,7 @@ class ColumnPoolerRegion(PyRegion):
     # Region params
     self.learningMode = True
     self.defaultOutputType = defaultOutputType
+    self.sparseLinks = sparseLinks
 
     self._pooler = None
 
@@ -433,10 +446,18 @@ class ColumnPoolerRegion(PyRegion):
       if inputs["resetIn"][0] != 0:
         # send empty output
         self.reset()
-        outputs["feedForwardOutput"][:] = 0
-        outputs["activeCells"][:] = 0
+        if self.sparseLinks:
+          outputs["feedForwardOutput"][0] = 0
+          outputs["activeCells"][0] = 0
+        else:
+          outputs["feedForwardOutput"][:] = 0
+          outputs["activeCells"][:] = 0
         return
 
+    if self.sparseLinks:
+      self._computeSparse(inputs, outputs)
+      return
+
     feedforwardInput = numpy.asarray(inputs["feedforwardInput"].nonzero()[0],
                                      dtype="uint32")
 
@@ -477,6 +498,42 @@ class ColumnPoolerRegion(PyRegion):
       raise Exception("Unknown outputType: " + self.defaultOutputType)
 
 
+  def _computeSparse(self, inputs, outputs):
+    """
+    Run one iteration of compute with sparse buffers on every link.
+    """
+    feedforwardInput = readSparseBuffer(inputs["feedforwardInput"])
+
+    if "feedforwardGrowthCandidates" in inputs:
+      feedforwardGrowthCandidates = readSparseBuffer(
+        inputs["feedforwardGrowthCandidates"])
+    else:
+      feedforwardGrowthCandidates = feedforwardInput
+
+    if "lateralInput" in inputs:
+      lateralInputs = readConcatenatedSparseBuffers(
+        inputs["lateralInput"], self.numOtherCorticalColumns)
+    else:
+      lateralInputs = ()
+
+    if "predictedInput" in inputs:
+      predictedInput = readSparseBuffer(inputs["predictedInput"])
+    else:
+      predictedInput = None
+
+    self._pooler.compute(feedforwardInput, lateralInputs,
+                         feedforwardGrowthCandidates, learn=self.learningMode,
+                         predictedInput = predictedInput)
+
+    activeCells = self._pooler.getActiveCells()
+    writeSparseBuffer(outputs["activeCells"], activeCells)
+
+    if self.defaultOutputType == "active":
+      writeSparseBuffer(outputs["feedForwardOutput"], activeCells)
+    else:
+      raise Exception("Unknown outputType: " + self.defaultOutputType)
+
+
   def reset(self):
     """ Reset the state of the layer"""
     if self._pooler is not None:
@@ -507,6 +564,8 @@ class ColumnPoolerRegion(PyRegion):
     Return the number of elements for the given output.
     """
     if name in ["feedForwardOutput", "activeCells"]:
+      if self.sparseLinks:
+        return sparseBufferSize(self.cellCount)
       return self.cellCount
     else:
       raise Exception("Invalid output name specified: " + name)
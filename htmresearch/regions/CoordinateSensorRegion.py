@@ -24,6 +24,8 @@ import numpy
 from collections import deque
 from nupic.bindings.regions.PyRegion import PyRegion
 from nupic.encoders.coordinate import CoordinateEncoder
+from htmresearch.support.sparse_links import (
+  sparseBufferSize, writeSparseBuffer)
 
 
 class CoordinateSensorRegion(PyRegion):
@@ -43,8 +45,10 @@ class CoordinateSensorRegion(PyRegion):
                activeBits=21,
                outputWidth=1000,
                radius=2,
-               verbosity=0):
+               verbosity=0,
+               sparseLinks=False):
     self.verbosity = verbosity
+    self.sparseLinks = sparseLinks
     self.activeBits = activeBits
     self.outputWidth = outputWidth
     self.radius = radius
@@ -111,6 +115,15 @@ class CoordinateSensorRegion(PyRegion):
           "accessMode": "ReadWrite",
           "count": 1
         },
+        "sparseLinks": {
+          "description": "If true, dataOut is a sparse buffer: the number of "
+                         "active bits followed by their indices. See "
+                         "htmresearch.support.sparse_links.",
+          "dataType": "Bool",
+          "accessMode": "Read",
+          "count": 1,
+          "defaultValue": "false"
+        },
       },
       "commands": {
         "addDataToQueue": {
@@ -139,14 +152,17 @@ class CoordinateSensorRegion(PyRegion):
     outputs["resetOut"][0] = data["reset"]
     outputs["sequenceIdOut"][0] = data["sequenceId"]
     sdr = self.encoder.encode((numpy.array(data["coordinate"]), self.radius))
-    outputs["dataOut"][:] = sdr
+    if self.sparseLinks:
+      writeSparseBuffer(outputs["dataOut"], sdr.nonzero()[0])
+    else:
+      outputs["dataOut"][:] = sdr
 
     if self.verbosity > 1:
       print "CoordinateSensor outputs:"
       print "Coordinate = ", data["coordinate"]
       print "sequenceIdOut: ", outputs["sequenceIdOut"]
       print "resetOut: ", outputs["resetOut"]
-      print "dataOut: ", outputs["dataOut"].nonzero()[0]
+      print "dataOut: ", sdr.nonzero()[0]
 
   def addDataToQueue(self, coordinate, reset, sequenceId):
     """
@@ -198,6 +214,8 @@ class CoordinateSensorRegion(PyRegion):
       return 1
 
     elif name == "dataOut":
+      if self.sparseLinks:
+        return sparseBufferSize(self.outputWidth)
       return self.outputWidth
 
     else:
@@ -21,6 +21,8 @@
 
 from collections import deque
 from nupic.bindings.regions.PyRegion import PyRegion
+from htmresearch.support.sparse_links import (
+  sparseBufferSize, writeSparseBuffer, readSparseBuffer)
 
 
 class RawSensor(PyRegion):
@@ -37,10 +39,12 @@ class RawSensor(PyRegion):
 
   def __init__(self,
                outputWidth=2048,
-               verbosity=0):
+               verbosity=0,
+               sparseLinks=False):
     """Create an instance with the appropriate output size."""
     self.verbosity = verbosity
     self.outputWidth = outputWidth
+    self.sparseLinks = sparseLinks
     self.queue = deque()
 
 
@@ -90,6 +94,16 @@ class RawSensor(PyRegion):
           "defaultValue": 2048,
           "constraints":"",
         },
+        "sparseLinks":{
+          "description":"If true, dataOut is a sparse buffer: the number of "
+                        "active bits followed by their indices. See "
+                        "htmresearch.support.sparse_links.",
+          "dataType":"Bool",
+          "accessMode":"Read",
+          "count":1,
+          "defaultValue":"false",
+          "constraints":"",
+        },
       },
       "commands":{
         "addDataToQueue": {
@@ -116,14 +130,20 @@ class RawSensor(PyRegion):
     # Copy data into output vectors
     outputs["resetOut"][0] = data["reset"]
     outputs["sequenceIdOut"][0] = data["sequenceId"]
-    outputs["dataOut"][:] = 0
-    outputs["dataOut"][data["nonZeros"]] = 1
+    if self.sparseLinks:
+      writeSparseBuffer(outputs["dataOut"], data["nonZeros"])
+    else:
+      outputs["dataOut"][:] = 0
+      outputs["dataOut"][data["nonZeros"]] = 1
 
     if self.verbosity > 1:
       print "RawSensor outputs:"
       print "sequenceIdOut: ", outputs["sequenceIdOut"]
       print "resetOut: ", outputs["resetOut"]
-      print "dataOut: ", outputs["dataOut"].nonzero()[0]
+      if self.sparseLinks:
+        print "dataOut: ", readSparseBuffer(outputs["dataOut"])
+      else:
+        print "dataOut: ", outputs["dataOut"].nonzero()[0]
 
 
   def addDataToQueue(self, nonZeros, reset, sequenceId):
@@ -177,6 +197,8 @@ class RawSensor(PyRegion):
       return 1
 
     elif name == "dataOut":
+      if self.sparseLinks:
+        return sparseBufferSize(self.outputWidth)
       return self.outputWidth
 
     else:
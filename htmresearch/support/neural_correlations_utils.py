@@ -25,6 +25,7 @@ Common functions used in the neural_correlations project
 
 import random
 import numpy as np
+import scipy.sparse
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
@@ -140,30 +141,110 @@ def generateRandomSequence(numSymbols, numColumns, sparsity):
   return sequence
 
 
-def computePWCorrelations(spikeTrains, removeAutoCorr):
+def _spikeTrainMoments(spikeTrains):
+  """
+  Computes the per-cell sums needed to turn dot products of spike trains into
+  Pearson correlation coefficients.
+
+  @param spikeTrains (array or scipy.sparse matrix) numCells x timeSteps
+  @return sums (array) sum of each cell's spike train
+  @return sumSquares (array) sum of squares of each cell's spike train
+  """
+  if scipy.sparse.issparse(spikeTrains):
+    sums = np.asarray(spikeTrains.sum(axis=1), dtype="float64").ravel()
+    sumSquares = np.asarray(spikeTrains.multiply(spikeTrains).sum(axis=1),
+                            dtype="float64").ravel()
+  else:
+    spikeTrains = np.asarray(spikeTrains, dtype="float64")
+    sums = spikeTrains.sum(axis=1)
+    sumSquares = np.einsum("ij,ij->i", spikeTrains, spikeTrains)
+  return sums, sumSquares
+
+
+def _denseFloat(spikeTrains):
+  if scipy.sparse.issparse(spikeTrains):
+    spikeTrains = spikeTrains.toarray()
+  return np.asarray(spikeTrains, dtype="float64")
+
+
+def _pearsonFromCrossProducts(crossProducts, rowMoments, colMoments,
+                              numTimeSteps):
+  """
+  Converts dot products of spike trains into Pearson correlation coefficients,
+  matching np.corrcoef on every pair: pairs involving a silent cell are 0, and
+  pairs involving a constant (zero variance) non-silent cell are NaN.
+
+  @param crossProducts (array) dot products of the row and column spike trains
+  @param rowMoments (tuple) (sums, sumSquares) of the row cells, shaped to
+         broadcast against crossProducts
+  @param colMoments (tuple) (sums, sumSquares) of the column cells, shaped to
+         broadcast against crossProducts
+  @param numTimeSteps (int) length of the spike trains
+  @return (array) correlation coefficients, same shape as crossProducts
+  """
+  rowSums, rowSumSquares = rowMoments
+  colSums, colSumSquares = colMoments
+  rowVariances = rowSumSquares - rowSums**2 / numTimeSteps
+  colVariances = colSumSquares - colSums**2 / numTimeSteps
+
+  with np.errstate(divide="ignore", invalid="ignore"):
+    corr = ((crossProducts - rowSums * colSums / numTimeSteps) /
+            np.sqrt(rowVariances * colVariances))
+    corr = np.clip(corr, -1.0, 1.0)
+
+  # Guard against rounding leaving a tiny variance on constant spike trains.
+  constant = ((rowVariances <= 1e-10 * rowSumSquares) |
+              (colVariances <= 1e-10 * colSumSquares))
+  silent = (rowSumSquares == 0) | (colSumSquares == 0)
+  corr = np.where(constant, np.nan, corr)
+  return np.where(silent, 0.0, corr)
+
+
+def _countNegative(corrMatrix):
+  with np.errstate(invalid="ignore"):
+    return int(np.count_nonzero(corrMatrix < 0))
+
+
+def computePWCorrelations(spikeTrains, removeAutoCorr, blockSize=None):
   """
   Computes pairwise correlations from spikeTrains
   
-  @param spikeTrains (array) spike trains obtained from the activation of cells in the TM
+  @param spikeTrains (array or scipy.sparse matrix) spike trains obtained from
+         the activation of cells in the TM
          the array dimensions are: numCells x timeSteps
   @param removeAutoCorr (boolean) if true, auto-correlations are removed by substracting
          the diagonal of the correlation matrix         
+  @param blockSize (int) if set, the correlation matrix is computed this many rows
+         at a time, which bounds the temporary memory for large numbers of cells
   @return corrMatrix (array) numCells x numCells matrix containing the Pearson correlation
           coefficient of spike trains of cell i and cell j
   @return numNegPCC (int) number of negative pairwise correlations (PCC(i,j) < 0)
   """
-  numCells = np.shape(spikeTrains)[0]
+  if scipy.sparse.issparse(spikeTrains):
+    spikeTrains = scipy.sparse.csr_matrix(spikeTrains, dtype="float64")
+  else:
+    spikeTrains = np.asarray(spikeTrains, dtype="float64")
+
+  numCells, numTimeSteps = spikeTrains.shape
+  sums, sumSquares = _spikeTrainMoments(spikeTrains)
+  if blockSize is None:
+    blockSize = max(numCells, 1)
+
   corrMatrix = np.zeros((numCells, numCells))
-  numNegPCC = 0
-  for i in range(numCells):
-    for j in range(numCells):
-      if i == j and removeAutoCorr == True:
-        continue
-      if not all(spikeTrains[i,:] == 0) and not all(spikeTrains[j,:] == 0):
-        corrMatrix[i,j] = np.corrcoef(spikeTrains[i,:], spikeTrains[j,:])[0,1]    
-        if corrMatrix[i,j] < 0:
-          numNegPCC += 1
-  return (corrMatrix, numNegPCC)
+  transposed = spikeTrains.T
+  for start in xrange(0, numCells, blockSize):
+    stop = min(start + blockSize, numCells)
+    crossProducts = _denseFloat(spikeTrains[start:stop].dot(transposed))
+    corrMatrix[start:stop] = _pearsonFromCrossProducts(
+      crossProducts,
+      (sums[start:stop, np.newaxis], sumSquares[start:stop, np.newaxis]),
+      (sums, sumSquares),
+      numTimeSteps)
+
+  if removeAutoCorr:
+    np.fill_diagonal(corrMatrix, 0.0)
+
+  return (corrMatrix, _countNegative(corrMatrix))
 
   
 def accuracy(current, predicted):
@@ -541,35 +622,58 @@ def inputAnalysis(allSequences, model, numColumns):
   return overlapMatrix  
   
 
-def computePWCorrelationsWithinCol(spikeTrains, removeAutoCorr, cellsPerColumn):
+def computePWCorrelationsWithinCol(spikeTrains, removeAutoCorr, cellsPerColumn,
+                                   blockSize=None):
   """
   Computes pairwise correlations from spikeTrains
   
-  @param spikeTrains (array) spike trains obtained from the activation of cells in the TM
+  @param spikeTrains (array or scipy.sparse matrix) spike trains obtained from
+     the activation of cells in the TM
      the array dimensions are: numCells x timeSteps
   @param removeAutoCorr (boolean) if true, auto-correlations are removed by substracting
      the diagonal of the correlation matrix
   @param cellsPerColumn (int) number of cells per column in thr TM
+  @param blockSize (int) if set, approximately this many cells (whole columns) are
+     processed at a time, which bounds the temporary memory for large numbers of cells
   @return corrMatrix (array) numCells x numCells matrix containing the Pearson correlation
       coefficient of spike trains of cell i and cell j
   @return numNegPCC (int) number of negative pairwise correlations (PCC(i,j) < 0)
   """
-  numCells = np.shape(spikeTrains)[0]
+  if scipy.sparse.issparse(spikeTrains):
+    spikeTrains = scipy.sparse.csr_matrix(spikeTrains, dtype="float64")
+
+  numCells, numTimeSteps = spikeTrains.shape
   numCols = numCells / cellsPerColumn
   corrMatrix = np.zeros((numCells, numCells))
-  numNegPCC = 0
-  indices = np.zeros(cellsPerColumn, dtype="uint32")
-  
-  for col in range(numCols):
-    for k in range(cellsPerColumn):
-      indices[k] = (cellsPerColumn * col) + k
-    for i in indices:
-      for j in indices:
-        if i == j and removeAutoCorr == True:
-          continue
-        if not all(spikeTrains[i,:] == 0) and not all(spikeTrains[j,:] == 0):          
-          corrMatrix[i,j] = np.corrcoef(spikeTrains[i,:], spikeTrains[j,:])[0,1]  
-          if corrMatrix[i,j] < 0:
-            numNegPCC += 1
-          
-  return (corrMatrix, numNegPCC)
+  sums, sumSquares = _spikeTrainMoments(spikeTrains)
+  if blockSize is None:
+    colsPerBlock = max(numCols, 1)
+  else:
+    colsPerBlock = max(blockSize / cellsPerColumn, 1)
+
+  for startCol in xrange(0, numCols, colsPerBlock):
+    stopCol = min(startCol + colsPerBlock, numCols)
+    blockCols = stopCol - startCol
+    cells = np.arange(startCol * cellsPerColumn, stopCol * cellsPerColumn)
+
+    # Spike trains grouped by column: blockCols x cellsPerColumn x timeSteps
+    trains = _denseFloat(spikeTrains[cells[0]:cells[-1] + 1]).reshape(
+      blockCols, cellsPerColumn, numTimeSteps)
+    crossProducts = np.matmul(trains, trains.transpose(0, 2, 1))
+
+    blockSums = sums[cells].reshape(blockCols, cellsPerColumn)
+    blockSumSquares = sumSquares[cells].reshape(blockCols, cellsPerColumn)
+    corrBlocks = _pearsonFromCrossProducts(
+      crossProducts,
+      (blockSums[:, :, np.newaxis], blockSumSquares[:, :, np.newaxis]),
+      (blockSums[:, np.newaxis, :], blockSumSquares[:, np.newaxis, :]),
+      numTimeSteps)
+
+    cellsByCol = cells.reshape(blockCols, cellsPerColumn)
+    corrMatrix[cellsByCol[:, :, np.newaxis],
+               cellsByCol[:, np.newaxis, :]] = corrBlocks
+
+  if removeAutoCorr:
+    np.fill_diagonal(corrMatrix, 0.0)
+
+  return (corrMatrix, _countNegative(corrMatrix))
@@ -0,0 +1,104 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Sparse encoding of the binary vectors sent over region links.
+
+A link normally carries a dense array of 0s and 1s, so the sender has to clear
+the whole array and the receiver has to scan it with nonzero(). A sparse link
+instead carries the number of active bits followed by their sorted indices:
+
+  [count, index_0, index_1, ..., index_(count-1), <unused>...]
+
+A sparse buffer for a vector of width N has N + 1 elements, so it can hold
+any vector, but only the first count + 1 elements are ever read or written.
+Indices are stored in the link's element type. Real32 represents every integer
+up to 2**24 exactly, which is far more than any layer uses.
+"""
+
+import numpy as np
+
+
+
+def sparseBufferSize(width):
+  """
+  Get the number of elements of a sparse buffer for a vector.
+
+  @param width (int)
+  The width of the dense vector
+
+  @return (int)
+  """
+  return width + 1
+
+
+
+def writeSparseBuffer(buffer, indices):
+  """
+  Store the active indices in a sparse buffer.
+
+  @param buffer (numpy array)
+  The output buffer
+
+  @param indices (sequence of ints)
+  The active indices, in any order. Duplicates are ignored, like they are when
+  ones are scattered into a dense vector.
+  """
+  indices = np.unique(indices)
+  count = indices.size
+  buffer[0] = count
+  buffer[1:count + 1] = indices
+
+
+
+def readSparseBuffer(buffer):
+  """
+  Get the active indices stored in a sparse buffer.
+
+  @param buffer (numpy array)
+  The input buffer
+
+  @return (numpy array)
+  The sorted active indices, as uint32
+  """
+  count = int(buffer[0])
+  return buffer[1:count + 1].astype("uint32")
+
+
+
+def readConcatenatedSparseBuffers(buffer, numBuffers):
+  """
+  Get the active indices of each sparse buffer in an input that receives
+  several equally sized links, e.g. the lateral input of a ColumnPoolerRegion.
+
+  @param buffer (numpy array)
+  The concatenated input buffers
+
+  @param numBuffers (int)
+  The number of buffers in the input
+
+  @return (tuple of numpy arrays)
+  """
+  if numBuffers == 0:
+    return ()
+  return tuple(readSparseBuffer(singleBuffer)
+               for singleBuffer in np.split(buffer, numBuffers))
@@ -0,0 +1,103 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Compare the speed of the ApicalTiebreakSequenceMemory with nupic's C++
+SparseMatrixConnections and with the pure NumPy CSRConnections, on a
+2048-column, 32-cells-per-column sequence learning workload.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakSequenceMemory)
+
+
+
+def generateSequences(numSequences, sequenceLength, columnCount, w, seed):
+  rng = np.random.RandomState(seed)
+  return [[np.sort(rng.choice(columnCount, w, replace=False)).astype("uint32")
+           for _ in xrange(sequenceLength)]
+          for _ in xrange(numSequences)]
+
+
+
+def runBenchmark(implementation, sequences, numPasses, columnCount,
+                 cellsPerColumn):
+  """
+  @return (tuple)
+  - seconds per learning timestep
+  - seconds per inference timestep
+  - number of segments
+  """
+  tm = ApicalTiebreakSequenceMemory(
+    columnCount=columnCount,
+    cellsPerColumn=cellsPerColumn,
+    connectionsImplementation=implementation)
+
+  numSteps = sum(len(sequence) for sequence in sequences)
+
+  start = time.time()
+  for _ in xrange(numPasses):
+    for sequence in sequences:
+      for activeColumns in sequence:
+        tm.compute(activeColumns, learn=True)
+      tm.reset()
+  learnTime = (time.time() - start) / (numPasses * numSteps)
+
+  start = time.time()
+  for sequence in sequences:
+    for activeColumns in sequence:
+      tm.compute(activeColumns, learn=False)
+    tm.reset()
+  inferTime = (time.time() - start) / numSteps
+
+  return learnTime, inferTime, tm.basalConnections.nSegments()
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--columnCount", default=2048, type=int)
+  parser.add_argument("--cellsPerColumn", default=32, type=int)
+  parser.add_argument("--numSequences", default=50, type=int)
+  parser.add_argument("--sequenceLength", default=20, type=int)
+  parser.add_argument("--numPasses", default=5, type=int)
+  parser.add_argument("--seed", default=42, type=int)
+  args = parser.parse_args()
+
+  sequences = generateSequences(args.numSequences, args.sequenceLength,
+                                args.columnCount, 40, args.seed)
+
+  print "{:<8}{:>16}{:>16}{:>12}".format("impl", "learn ms/step",
+                                         "infer ms/step", "segments")
+  for implementation in ("cpp", "numpy"):
+    learnTime, inferTime, numSegments = runBenchmark(
+      implementation, sequences, args.numPasses, args.columnCount,
+      args.cellsPerColumn)
+    print "{:<8}{:>16.3f}{:>16.3f}{:>12}".format(implementation,
+                                                  learnTime * 1000,
+                                                  inferTime * 1000,
+                                                  numSegments)
@@ -0,0 +1,79 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Compare the speed of the L4L2Experiment "network" and "direct" backends on the
+projects/l2_pooling multi-column convergence experiment, and check that both
+produce the same convergence results.
+"""
+
+import argparse
+import time
+
+from htmresearch.frameworks.layers.multi_column_convergence_experiment import (
+  runExperiment)
+
+
+
+def timeExperiment(backend, numObjects, numColumns, numPoints, trialNum):
+  args = {
+    "numObjects": numObjects,
+    "numLocations": 10,
+    "numFeatures": 10,
+    "numColumns": numColumns,
+    "numPoints": numPoints,
+    "trialNum": trialNum,
+    "plotInferenceStats": False,
+    "backend": backend,
+  }
+  start = time.time()
+  result = runExperiment(args)
+  return time.time() - start, result
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--numObjects", default=[10, 50], type=int, nargs="+")
+  parser.add_argument("--numColumns", default=[1, 3, 5], type=int, nargs="+")
+  parser.add_argument("--numPoints", default=10, type=int)
+  parser.add_argument("--trialNum", default=42, type=int)
+  args = parser.parse_args()
+
+  rows = []
+  for numObjects in args.numObjects:
+    for numColumns in args.numColumns:
+      networkTime, expected = timeExperiment("network", numObjects, numColumns,
+                                             args.numPoints, args.trialNum)
+      directTime, actual = timeExperiment("direct", numObjects, numColumns,
+                                          args.numPoints, args.trialNum)
+      same = all(expected[key] == actual[key]
+                 for key in ("convergencePoint", "classificationAccuracy",
+                             "classificationPerSensation"))
+      rows.append((numObjects, numColumns, networkTime, directTime, same))
+
+  print "{:<10}{:<10}{:>14}{:>14}{:>10}{:>10}".format(
+    "objects", "columns", "network s", "direct s", "speedup", "same")
+  for numObjects, numColumns, networkTime, directTime, same in rows:
+    print "{:<10}{:<10}{:>14.2f}{:>14.2f}{:>10.2f}{:>10}".format(
+      numObjects, numColumns, networkTime, directTime,
+      networkTime / directTime, same)
@@ -0,0 +1,114 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Compare the speed of the batched LateralPooler.encode with the original
+sample-by-sample, unit-by-unit inhibition loop, at output sizes of 1024 to
+4096 units, and check that both produce the same codes.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from htmresearch.algorithms.lateral_pooler import LateralPooler
+
+
+
+def sequentialEncode(pooler, X):
+  """
+  The original LateralPooler.encode, which visits every unit of every sample
+  in a Python loop.
+  """
+  W, boost, H = pooler.get_connections()
+  n = W.shape[0]
+  d = X.shape[1]
+  Y = np.zeros((n, d))
+  s = pooler.sparsity
+
+  score = boost * np.dot(W, X)
+  sortedScoreArgs = np.argsort(score, axis=0)[::-1, :]
+  inhSignal = np.zeros((n, d))
+
+  for t in range(d):
+    for i in sortedScoreArgs[:, t]:
+      if not inhSignal[i, t] >= s:
+        Y[i, t] = 1.
+        inhSignal[:, t] += H[i, :]
+
+  return Y
+
+
+
+def createPooler(inputSize, outputSize, codeWeight, batchSize, seed):
+  """
+  Create a pooler with random, non-uniform lateral inhibition, and a random
+  batch of inputs.
+  """
+  rng = np.random.RandomState(seed)
+  pooler = LateralPooler(input_size=inputSize, output_size=outputSize,
+                         code_weight=codeWeight, seed=seed)
+
+  H = rng.rand(outputSize, outputSize)**4
+  np.fill_diagonal(H, 0.)
+  H /= np.sum(H, axis=1, keepdims=True)
+  b = np.exp(-rng.rand(outputSize, 1))
+  pooler.set_connections(pooler.feedforward, b, H)
+
+  return pooler, (rng.rand(inputSize, batchSize) < 0.1).astype(float)
+
+
+
+def timeEncode(encode, pooler, X, numRepeats):
+  start = time.time()
+  for _ in xrange(numRepeats):
+    Y = encode(pooler, X)
+  return (time.time() - start) / numRepeats, Y
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--inputSize", default=784, type=int)
+  parser.add_argument("--outputSizes", default=[1024, 2048, 4096], type=int,
+                      nargs="+")
+  parser.add_argument("--sparsity", default=0.02, type=float)
+  parser.add_argument("--batchSize", default=32, type=int)
+  parser.add_argument("--numRepeats", default=3, type=int)
+  parser.add_argument("--seed", default=42, type=int)
+  args = parser.parse_args()
+
+  print "{:<8}{:>16}{:>16}{:>10}{:>10}".format("units", "sequential ms",
+                                              "batched ms", "speedup",
+                                              "same")
+  for outputSize in args.outputSizes:
+    pooler, X = createPooler(args.inputSize, outputSize,
+                             int(outputSize * args.sparsity), args.batchSize,
+                             args.seed)
+    sequentialTime, expected = timeEncode(sequentialEncode, pooler, X,
+                                          args.numRepeats)
+    batchedTime, actual = timeEncode(LateralPooler.encode, pooler, X,
+                                     args.numRepeats)
+    print "{:<8}{:>16.1f}{:>16.1f}{:>10.1f}{:>10}".format(
+      outputSize, sequentialTime * 1000, batchedTime * 1000,
+      sequentialTime / batchedTime, np.array_equal(expected, actual))
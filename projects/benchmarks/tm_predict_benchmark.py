@@ -0,0 +1,140 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+
+"""
+Compare the speed of TM.predict with the previous implementation, which saved
+the TM's dynamic state, ran the lookahead on the live state and restored it,
+and check that both return the same predictions.
+"""
+
+import argparse
+import time
+
+import numpy
+
+from htmresearch.algorithms.TM import TM, ArrayTM
+
+
+
+def snapshotPredict(tm, nSteps):
+  """
+  The previous TM.predict: the lookahead runs on the live state, which is
+  saved before and restored after.
+  """
+  pristineTPDynamicState = tm._getTPDynamicState()
+
+  multiStepColumnPredictions = numpy.zeros((nSteps, tm.numberOfCols),
+                                           dtype="float32")
+  step = 0
+  while True:
+    multiStepColumnPredictions[step,:] = tm.topDownCompute()
+    if step == nSteps-1:
+      break
+    step += 1
+
+    tm.activeState['t-1'][:,:] = tm.activeState['t'][:,:]
+    tm.predictedState['t-1'][:,:] = tm.predictedState['t'][:,:]
+    tm.confidence['t-1'][:,:] = tm.confidence['t'][:,:]
+    tm.activeState['t'][:,:] = tm.predictedState['t-1'][:,:]
+    tm.predictedState['t'].fill(0)
+    tm.confidence['t'].fill(0.0)
+    tm.computePhase2(doLearn=False)
+
+  tm._setTPDynamicState(pristineTPDynamicState)
+
+  return multiStepColumnPredictions
+
+
+
+def createTrainedTM(tmClass, numColumns, cellsPerColumn, sequences,
+                    numRepetitions):
+  tm = tmClass(numberOfCols=numColumns, cellsPerColumn=cellsPerColumn,
+               activationThreshold=12, minThreshold=10, newSynapseCount=20,
+               initialPerm=0.21, connectedPerm=0.5, permanenceInc=0.1,
+               permanenceDec=0.01, globalDecay=0.0, seed=42)
+  for _ in xrange(numRepetitions):
+    for sequence in sequences:
+      tm.reset()
+      for pattern in sequence:
+        tm.learn(pattern)
+  return tm
+
+
+
+def timePredict(tm, predictFunction, sequences, nSteps):
+  """
+  Infer every sequence and call predictFunction after each record, as a
+  forecasting service would.
+
+  @return (tuple) The time spent in predictFunction and its results
+  """
+  elapsed = 0.0
+  results = []
+  for sequence in sequences:
+    tm.reset()
+    for pattern in sequence:
+      tm.infer(pattern)
+      start = time.time()
+      results.append(predictFunction(tm, nSteps))
+      elapsed += time.time() - start
+  return elapsed, results
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--numColumns", default=512, type=int)
+  parser.add_argument("--cellsPerColumn", default=16, type=int)
+  parser.add_argument("--nSteps", default=[5, 10, 20], type=int, nargs="+")
+  parser.add_argument("--numSequences", default=5, type=int)
+  parser.add_argument("--seed", default=42, type=int)
+  args = parser.parse_args()
+
+  numpy.random.seed(args.seed)
+  patterns = []
+  for _ in xrange(30):
+    pattern = numpy.zeros(args.numColumns, dtype="float32")
+    pattern[numpy.random.choice(args.numColumns, 20, replace=False)] = 1
+    patterns.append(pattern)
+  sequences = [[patterns[i] for i in numpy.random.randint(len(patterns),
+                                                          size=10)]
+               for _ in xrange(args.numSequences)]
+
+  rows = []
+  for tmClass in (TM, ArrayTM):
+    tm = createTrainedTM(tmClass, args.numColumns, args.cellsPerColumn,
+                         sequences, 5)
+    for nSteps in args.nSteps:
+      snapshotTime, expected = timePredict(tm, snapshotPredict, sequences,
+                                           nSteps)
+      predictTime, actual = timePredict(tm, lambda tm, n: tm.predict(n),
+                                        sequences, nSteps)
+      same = all(numpy.array_equal(e, a) for e, a in zip(expected, actual))
+      rows.append((tmClass.__name__, nSteps, snapshotTime, predictTime, same))
+
+  print "{:<10}{:<8}{:>14}{:>14}{:>10}{:>8}".format(
+    "class", "nSteps", "snapshot s", "predict s", "speedup", "same")
+  for name, nSteps, snapshotTime, predictTime, same in rows:
+    print "{:<10}{:<8}{:>14.3f}{:>14.3f}{:>10.2f}{:>8}".format(
+      name, nSteps, snapshotTime, predictTime, snapshotTime / predictTime,
+      same)
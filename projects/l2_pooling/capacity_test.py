@@ -44,6 +44,7 @@ from htmresearch.frameworks.layers.object_machine_factory import (
   createObjectMachine
 )
 from htmresearch.frameworks.layers.l2_l4_inference import L4L2Experiment
+from htmresearch.frameworks.utils.sweep_runner import runSweep
 
 import matplotlib as mpl
 
@@ -528,7 +529,6 @@ def runCapacityTestVaryingObjectSize(
   result = None
 
   cpuCount = cpuCount or multiprocessing.cpu_count()
-  pool = multiprocessing.Pool(cpuCount, maxtasksperchild=1)
 
   l4Params = l4Params or getL4Params()
   l2Params = l2Params or getL2Params()
@@ -539,20 +539,26 @@ def runCapacityTestVaryingObjectSize(
              l2Params,
              l4Params,
              objectParams,
+             "MultipleL4L2Columns",
              0)
             for numPointsPerObject in np.arange(10, 160, 20)]
 
-  for testResult in pool.map(invokeRunCapacityTest, params):
-    result = (
-      pd.concat([result, testResult])
-      if result is not None else testResult
-    )
-
   resultFileName = _prepareResultsDir(
     "{}.csv".format(expName),
     resultDirName=resultDirName
   )
 
+  testResults = runSweep(invokeRunCapacityTest, params,
+                         resultFileName + ".ledger",
+                         numWorkers=cpuCount,
+                         costFunction=_capacityTestCost,
+                         maxTasksPerChild=1)
+  for testResult in testResults:
+    result = (
+      pd.concat([result, testResult])
+      if result is not None else testResult
+    )
+
   pd.DataFrame.to_csv(result, resultFileName)
 
 
@@ -565,6 +571,14 @@ def invokeRunCapacityTest(params):
 
 
 
+def _capacityTestCost(params):
+  """ Expected relative run time of a runCapacityTest call, used to schedule
+  the longest tests first: numObjects x numCorticalColumns
+  """
+  return params[0] * params[2]
+
+
+
 def runCapacityTestVaryingObjectNum(numPointsPerObject=10,
                                     numCorticalColumns=DEFAULT_NUM_CORTICAL_COLUMNS,
                                     resultDirName=DEFAULT_RESULT_DIR_NAME,
@@ -583,7 +597,6 @@ def runCapacityTestVaryingObjectNum(numPointsPerObject=10,
   l2Params = l2Params or getL2Params()
 
   cpuCount = cpuCount or multiprocessing.cpu_count()
-  pool = multiprocessing.Pool(cpuCount, maxtasksperchild=1)
 
   numObjectsList = np.arange(50, 1300, 100)
   params = []
@@ -597,15 +610,22 @@ def runCapacityTestVaryingObjectNum(numPointsPerObject=10,
                      objectParams,
                      networkType,
                      rpt))
+
+  resultFileName = _prepareResultsDir("{}.csv".format(expName),
+                                      resultDirName=resultDirName)
+
   result = None
-  for testResult in pool.map(invokeRunCapacityTest, params):
+  testResults = runSweep(invokeRunCapacityTest, params,
+                         resultFileName + ".ledger",
+                         numWorkers=cpuCount,
+                         costFunction=_capacityTestCost,
+                         maxTasksPerChild=1)
+  for testResult in testResults:
     result = (
       pd.concat([result, testResult])
       if result is not None else testResult
     )
 
-  resultFileName = _prepareResultsDir("{}.csv".format(expName),
-                                      resultDirName=resultDirName)
   pd.DataFrame.to_csv(result, resultFileName)
 
 
@@ -31,7 +31,8 @@ import numpy as np
 from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
   ApicalTiebreakPairMemory)
 from htmresearch.algorithms.column_pooler import ColumnPooler
-from htmresearch.algorithms.location_modules import SuperficialLocationModule2D
+from htmresearch.algorithms.location_modules import (
+  LocationModuleArray, SuperficialLocationModule2D)
 
 
 class Grid2DLocationExperiment(object):
@@ -53,6 +54,7 @@ class Grid2DLocationExperiment(object):
     self.locationModules = [SuperficialLocationModule2D(anchorInputSize=150*32,
                                                         **config)
                             for config in locationConfigs]
+    self.locationModuleArray = LocationModuleArray(self.locationModules)
 
     self.inputLayer = ApicalTiebreakPairMemory(**{
       "columnCount": 150,
@@ -118,15 +120,7 @@ class Grid2DLocationExperiment(object):
 
 
   def getActiveLocationCells(self):
-    activeCells = np.array([], dtype="uint32")
-
-    totalPrevCells = 0
-    for i, module in enumerate(self.locationModules):
-      activeCells = np.append(activeCells,
-                              module.getActiveCells() + totalPrevCells)
-      totalPrevCells += module.numberOfCells()
-
-    return activeCells
+    return self.locationModuleArray.getActiveCells()
 
 
   def move(self, objectName, locationOnObject):
@@ -144,8 +138,7 @@ class Grid2DLocationExperiment(object):
       params = {
         "deltaLocation": deltaLocation
       }
-      for module in self.locationModules:
-        module.shift(**params)
+      self.locationModuleArray.shift(**params)
 
       for monitor in self.monitors.values():
         monitor.afterLocationShift(**params)
@@ -176,8 +169,7 @@ class Grid2DLocationExperiment(object):
       locationParams = {
         "anchorInput": self.inputLayer.getActiveCells()
       }
-      for module in self.locationModules:
-        module.anchor(**locationParams)
+      self.locationModuleArray.anchor(**locationParams)
 
       cellActivity = (set(self.objectLayer.getActiveCells()),
                       set(self.inputLayer.getActiveCells()),
@@ -247,8 +239,7 @@ class Grid2DLocationExperiment(object):
     for objectName, objectFeatures in self.objects.iteritems():
       self.reset()
 
-      for module in self.locationModules:
-        module.activateRandomLocation()
+      self.locationModuleArray.activateRandomLocation()
 
       for feature in objectFeatures:
         locationOnObject = (feature["top"] + feature["height"]/2,
@@ -321,8 +312,7 @@ class Grid2DLocationExperiment(object):
 
 
   def reset(self):
-    for module in self.locationModules:
-      module.reset()
+    self.locationModuleArray.reset()
     self.objectLayer.reset()
     self.inputLayer.reset()
 
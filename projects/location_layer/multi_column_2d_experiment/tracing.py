@@ -143,8 +143,7 @@ class MultiColumn2DExperimentVisualizer(MultiColumn2DExperimentMonitor):
              {
                "{} sensorToBody".format(iCol):
                _getActiveSynapsesOnActiveSegments(
-                 module.metricConnections.connectionsBySource[
-                   "sensorToBody"],
+                 module.metricConnections, "sensorToBody",
                  activeCells,
                  module.activeMetricSegments,
                  params["sensorToBody"],
@@ -153,8 +152,7 @@ class MultiColumn2DExperimentVisualizer(MultiColumn2DExperimentMonitor):
 
                "bodyToSpecificObject":
                _getActiveSynapsesOnActiveSegments(
-                 module.metricConnections.connectionsBySource[
-                   "bodyToSpecificObject"],
+                 module.metricConnections, "bodyToSpecificObject",
                  activeCells,
                  module.activeMetricSegments,
                  params["bodyToSpecificObject"],
@@ -244,7 +242,7 @@ class MultiColumn2DExperimentVisualizer(MultiColumn2DExperimentMonitor):
           synapsesForActiveCellsBySourceLayer[
             "{} sensorToBody".format(iPresynapticCol)] = (
               _getActiveSynapsesOnActiveSegments(
-                metricConnections.connectionsBySource["sensorToBody"],
+                metricConnections, "sensorToBody",
                 activeCells,
                 module.activeSegmentsByColumn[iPresynapticCol],
                 params["sensorToBodyByColumn"][iPresynapticCol],
@@ -254,7 +252,7 @@ class MultiColumn2DExperimentVisualizer(MultiColumn2DExperimentMonitor):
           synapsesForActiveCellsBySourceLayer[
             "{} sensorToSpecificObject".format(iPresynapticCol)] = (
               _getActiveSynapsesOnActiveSegments(
-                metricConnections.connectionsBySource["sensorToSpecificObject"],
+                metricConnections, "sensorToSpecificObject",
                 activeCells,
                 module.activeSegmentsByColumn[iPresynapticCol],
                 params["sensorToSpecificObjectByColumn"][iPresynapticCol],
@@ -394,8 +392,9 @@ class MultiColumn2DExperimentVisualizer(MultiColumn2DExperimentMonitor):
 
 
 
-def _getActiveSynapsesOnActiveSegments(connections, cells, activeSegments,
-                                       activeInput, connectedPermanence, offset=0):
+def _getActiveSynapsesOnActiveSegments(connections, source, cells,
+                                       activeSegments, activeInput,
+                                       connectedPermanence, offset=0):
   synapsesForCellDict = defaultdict(list)
 
   segments = connections.filterSegmentsByCell(activeSegments, cells)
@@ -403,7 +402,7 @@ def _getActiveSynapsesOnActiveSegments(connections, cells, activeSegments,
 
   for i, segment in enumerate(segments):
     connectedSynapses = np.where(
-      connections.matrix.getRow(segment) >= connectedPermanence)[0]
+      connections.getPermanences(segment, source) >= connectedPermanence)[0]
 
     activeSynapses = np.intersect1d(connectedSynapses, activeInput,
                                     assume_unique=True)
@@ -35,13 +35,22 @@ def run_false_positive_experiment_dim(num_neurons = 1,
                     num_dendrites = 500,
                     dendrite_length = 24,
                     num_trials = 10000,
-                    nonlinearity = sigmoid_nonlinearity(11.5, 5)):
+                    nonlinearity = sigmoid_nonlinearity(11.5, 5),
+                    num_training_passes = 0,
+                    batch_size = 1000,
+                    num_initialization_samples = None):
   """
   Run an experiment to test the false positive rate based on number of
   synapses per dendrite, dimension and sparsity.  Uses two competing neurons,
   along the P&M model.
 
-  Based on figure 5B in the original SDR paper.
+  Based on figure 5B in the original SDR paper, which uses HTM-style
+  initialization only.  With num_training_passes > 0, both neurons are then
+  trained on the data with HTM-style learning, batch_size datapoints at a
+  time.  Minibatches make it practical to train on 100k+ samples.  With that
+  much data, set num_initialization_samples to initialize the neurons on only
+  that many datapoints, half positive and half negative, since clustering
+  every datapoint is slow.
   """
   for dim in test_dims:
 
@@ -56,8 +65,21 @@ def run_false_positive_experiment_dim(num_neurons = 1,
       labels = numpy.asarray([1 for i in range(num_samples/2)] + [-1 for i in range(num_samples/2)])
       flipped_labels = labels * -1
 
-      neuron.HTM_style_initialize_on_data(data, labels)
-      neg_neuron.HTM_style_initialize_on_data(data, flipped_labels)
+      if num_initialization_samples is None:
+        neuron.HTM_style_initialize_on_data(data, labels)
+        neg_neuron.HTM_style_initialize_on_data(data, flipped_labels)
+      else:
+        # The positives come first in data, then the negatives
+        half = num_initialization_samples/2
+        init_data = data.getSlice(0, half, 0, dim)
+        init_data.append(data.getSlice(num_samples/2, num_samples/2 + half, 0, dim))
+        init_labels = numpy.asarray([1 for i in range(half)] + [-1 for i in range(half)])
+        neuron.HTM_style_initialize_on_data(init_data, init_labels)
+        neg_neuron.HTM_style_initialize_on_data(init_data, init_labels * -1)
+
+      for training_pass in range(num_training_passes):
+        neuron.HTM_style_train_on_data(data, labels, batch_size = batch_size)
+        neg_neuron.HTM_style_train_on_data(data, flipped_labels, batch_size = batch_size)
 
       error, fp, fn, uc = get_error(data, labels, [neuron], [neg_neuron], add_noise = True)
 
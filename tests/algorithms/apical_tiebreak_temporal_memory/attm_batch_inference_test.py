@@ -0,0 +1,172 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Test that the batched inference methods of the ApicalTiebreakTemporalMemory
+match running each stream separately.
+"""
+
+import unittest
+
+import numpy as np
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakPairMemory)
+
+
+class ApicalTiebreakTM_BatchInferenceTests(unittest.TestCase):
+
+  def setUp(self):
+    self.rng = np.random.RandomState(42)
+
+    self.tm = ApicalTiebreakPairMemory(
+      columnCount=256,
+      basalInputSize=300,
+      apicalInputSize=200,
+      cellsPerColumn=8,
+      activationThreshold=8,
+      reducedBasalThreshold=5,
+      minThreshold=5,
+      sampleSize=12,
+      seed=42)
+
+    self.pairs = [(self.randomPattern(256, 10),
+                   self.randomPattern(300, 12),
+                   self.randomPattern(200, 12))
+                  for _ in xrange(20)]
+
+    for _ in xrange(4):
+      for activeColumns, basalInput, apicalInput in self.pairs:
+        self.tm.compute(activeColumns, basalInput, apicalInput, learn=True)
+
+
+  def randomPattern(self, n, w):
+    return np.sort(self.rng.choice(n, w, replace=False)).astype("uint32")
+
+
+  def getStreams(self):
+    """
+    Mix learned inputs, basal unions, missing apical input, and unexpected
+    columns.
+    """
+    streams = []
+    for i in xrange(40):
+      activeColumns, basalInput, apicalInput = self.pairs[i % len(self.pairs)]
+
+      if i % 3 == 0:
+        other = self.pairs[(i + 1) % len(self.pairs)][1]
+        basalInput = np.union1d(basalInput, other).astype("uint32")
+      if i % 5 == 0:
+        apicalInput = np.empty(0, dtype="uint32")
+      if i % 7 == 0:
+        activeColumns = self.randomPattern(256, 10)
+
+      streams.append((activeColumns, basalInput, apicalInput))
+
+    return streams
+
+
+  def checkBatchMatchesSequential(self):
+    streams = self.getStreams()
+
+    activeCells, predictedCells = self.tm.computeBatch(
+      [activeColumns for activeColumns, _, _ in streams],
+      [basalInput for _, basalInput, _ in streams],
+      [apicalInput for _, _, apicalInput in streams])
+
+    self.assertEqual(len(streams), len(activeCells))
+    self.assertEqual(len(streams), len(predictedCells))
+
+    for i, (activeColumns, basalInput, apicalInput) in enumerate(streams):
+      self.tm.reset()
+      self.tm.compute(activeColumns, basalInput, apicalInput, learn=False)
+
+      np.testing.assert_equal(np.unique(self.tm.getPredictedCells()),
+                              predictedCells[i])
+      np.testing.assert_equal(self.tm.getActiveCells(), activeCells[i])
+
+
+  def testBatchMatchesSequential(self):
+    self.checkBatchMatchesSequential()
+
+
+  def testBatchMatchesSequentialWithoutReducedThreshold(self):
+    self.tm.setReducedBasalThreshold(8)
+    self.checkBatchMatchesSequential()
+
+
+  def testBatchMatchesSequentialWithoutTiebreak(self):
+    self.tm.setUseApicalTiebreak(False)
+    self.checkBatchMatchesSequential()
+
+
+  def testBatchAfterLearning(self):
+    """
+    The cached snapshot of the connections must be discarded after learning.
+    """
+    self.checkBatchMatchesSequential()
+
+    for activeColumns, basalInput, apicalInput in self.pairs:
+      self.tm.compute(activeColumns, basalInput, apicalInput, learn=True)
+
+    self.checkBatchMatchesSequential()
+
+
+  def testBatchAfterChangingConnectedPermanence(self):
+    """
+    The cached snapshot of the connections must be discarded when the
+    connected permanence changes.
+    """
+    self.checkBatchMatchesSequential()
+
+    self.tm.setConnectedPermanence(0.6)
+    self.checkBatchMatchesSequential()
+
+    self.tm.setConnectedPermanence(0.2)
+    self.checkBatchMatchesSequential()
+
+
+  def testBatchDoesNotModifyState(self):
+    activeColumns, basalInput, apicalInput = self.pairs[0]
+    self.tm.compute(activeColumns, basalInput, apicalInput, learn=False)
+    expectedActiveCells = self.tm.getActiveCells().copy()
+    expectedPredictedCells = self.tm.getPredictedCells().copy()
+
+    streams = self.getStreams()
+    self.tm.computeBatch([s[0] for s in streams],
+                         [s[1] for s in streams],
+                         [s[2] for s in streams])
+
+    np.testing.assert_equal(expectedActiveCells, self.tm.getActiveCells())
+    np.testing.assert_equal(expectedPredictedCells,
+                            self.tm.getPredictedCells())
+
+
+  def testEmptyBatch(self):
+    activeCells, predictedCells = self.tm.computeBatch([], [], [])
+    self.assertEqual([], activeCells)
+    self.assertEqual([], predictedCells)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
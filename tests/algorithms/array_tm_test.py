@@ -0,0 +1,207 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Tests that ArrayTM learns, infers and predicts exactly like the legacy TM.
+"""
+
+import cPickle as pickle
+import unittest
+
+import numpy
+
+try:
+  from htmresearch.algorithms.TM import TM, ArrayTM
+except ImportError:
+  # TM.py needs nupic.support.consoleprinter, which newer NuPIC versions
+  # don't have
+  TM = ArrayTM = None
+
+
+
+def getSegments(tm):
+  """Return the state of every segment, cell by cell."""
+  segments = []
+  for c in xrange(tm.numberOfCols):
+    for i in xrange(tm.cellsPerColumn):
+      for j in xrange(tm.getNumSegmentsInCell(c, i)):
+        s = tm.getSegmentOnCell(c, i, j)
+        segments.append((c, i, s.segID, s.isSequenceSeg,
+                         s.lastActiveIteration, s.positiveActivations,
+                         s.totalActivations, s._lastPosDutyCycle,
+                         s._lastPosDutyCycleIteration,
+                         [tuple(syn) for syn in s.syns]))
+  return segments
+
+
+
+@unittest.skipIf(TM is None, "TM can't import its NuPIC dependencies")
+class ArrayTMTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = numpy.random.RandomState(42)
+    self.numberOfCols = 60
+    alphabet = [rng.choice(self.numberOfCols, 6, replace=False)
+                for _ in xrange(10)]
+    self.sequences = [[alphabet[j] for j in rng.randint(0, 10, 5)]
+                      for _ in xrange(4)]
+
+
+  def _createTM(self, tmClass, **kwargs):
+    params = dict(numberOfCols=self.numberOfCols, cellsPerColumn=4,
+                  activationThreshold=4, minThreshold=3, newSynapseCount=8,
+                  initialPerm=0.3, connectedPerm=0.5, seed=3, verbosity=0)
+    params.update(kwargs)
+    return tmClass(**params)
+
+
+  def _run(self, tm, numSteps, learnSteps=None, pickleAt=None, seed=0):
+    """
+    Feed the sequences to tm, with some noise, and return the TM and a trace
+    of its state after every step. The TM is pickled and unpickled after
+    step pickleAt.
+    """
+    if learnSteps is None:
+      learnSteps = numSteps
+    rng = numpy.random.RandomState(seed)
+    trace = []
+    for t in xrange(numSteps):
+      if t % 5 == 0:
+        tm.reset()
+      x = numpy.zeros(self.numberOfCols, dtype="float32")
+      x[self.sequences[(t // 5) % len(self.sequences)][t % 5]] = 1
+      if rng.rand() < 0.1:
+        x[rng.choice(self.numberOfCols, 3)] = 1
+
+      tm.compute(x, enableLearn=t < learnSteps, computeInfOutput=True)
+      trace.append((tm.activeState["t"].copy(), tm.predictedState["t"].copy(),
+                    tm.confidence["t"].copy(), tm.getNumSegments(),
+                    tm.getNumSynapses()))
+
+      if t == pickleAt:
+        tm = pickle.loads(pickle.dumps(tm, pickle.HIGHEST_PROTOCOL))
+    return tm, trace
+
+
+  def _checkSameTrace(self, expected, actual):
+    self.assertEqual(len(expected), len(actual))
+    for t, (e, a) in enumerate(zip(expected, actual)):
+      for name, x, y in zip(("activeState", "predictedState", "confidence",
+                             "numSegments", "numSynapses"), e, a):
+        numpy.testing.assert_array_equal(
+          x, y, "%s differs at step %d" % (name, t))
+
+
+  def _checkSameAsTM(self, numSteps=400, **kwargs):
+    tm, expected = self._run(self._createTM(TM, **kwargs), numSteps,
+                             learnSteps=numSteps * 3 // 4,
+                             pickleAt=numSteps // 2)
+    arrayTM, actual = self._run(self._createTM(ArrayTM, **kwargs), numSteps,
+                                learnSteps=numSteps * 3 // 4,
+                                pickleAt=numSteps // 2)
+
+    self._checkSameTrace(expected, actual)
+    self.assertGreater(tm.getNumSegments(), 0)
+    self.assertEqual(getSegments(tm), getSegments(arrayTM))
+    self.assertEqual(tm.getSegmentInfo(collectActiveData=True),
+                     arrayTM.getSegmentInfo(collectActiveData=True))
+    numpy.testing.assert_array_equal(tm.predict(3), arrayTM.predict(3))
+    return tm, arrayTM
+
+
+  def testSameAsTM(self):
+    """No global decay"""
+    self._checkSameAsTM(globalDecay=0.0)
+
+
+  def testSameAsTMWithGlobalDecay(self):
+    """Default global decay, applied every iteration"""
+    self._checkSameAsTM()
+
+
+  def testSameAsTMWithSlowGlobalDecay(self):
+    self._checkSameAsTM(globalDecay=0.02, maxAge=20)
+
+
+  def testTrimSegments(self):
+    tm, arrayTM = self._checkSameAsTM(globalDecay=0.0)
+    numSynapses = arrayTM.getNumSynapses()
+
+    for minPermanence, minNumSyns in ((0.25, 2), (None, None)):
+      removed = tm.trimSegments(minPermanence, minNumSyns)
+      self.assertEqual(arrayTM.trimSegments(minPermanence, minNumSyns),
+                       removed)
+      self.assertEqual(getSegments(tm), getSegments(arrayTM))
+    self.assertLess(arrayTM.getNumSynapses(), numSynapses)
+
+    # Both keep learning the same way afterwards
+    _, expected = self._run(tm, 100, seed=1)
+    _, actual = self._run(arrayTM, 100, seed=1)
+    self._checkSameTrace(expected, actual)
+    self.assertEqual(getSegments(tm), getSegments(arrayTM))
+
+
+  def testSynapseStorageGrowthAndCompaction(self):
+    arrayTM, _ = self._run(self._createTM(ArrayTM, globalDecay=0.0), 400)
+    numSynapses = arrayTM.getNumSynapses()
+    segments = getSegments(arrayTM)
+
+    # Segments that outgrew their capacity moved, leaving unused slots
+    self.assertGreater(arrayTM._synEnd, numSynapses)
+    self.assertLessEqual(arrayTM._synEnd, len(arrayTM._synPerm))
+    self.assertEqual((arrayTM._synSegment[:arrayTM._synEnd] >= 0).sum(),
+                     numSynapses)
+
+    arrayTM._compactSynapses()
+
+    self.assertEqual(arrayTM._synEnd, numSynapses)
+    self.assertTrue((arrayTM._synSegment[:numSynapses] >= 0).all())
+    self.assertTrue((arrayTM._synSegment[numSynapses:] == -1).all())
+    self.assertEqual(getSegments(arrayTM), segments)
+
+    # Every synapse is owned by the segment whose range holds it
+    for segment in numpy.flatnonzero(arrayTM._segCell[:arrayTM._numSegments]
+                                     >= 0):
+      start, end = arrayTM._getSynapseRange(segment)
+      self.assertTrue((arrayTM._synSegment[start:end] == segment).all())
+
+
+  def testPickle(self):
+    arrayTM, _ = self._run(self._createTM(ArrayTM), 300)
+    self.assertGreater(len(arrayTM._synPerm), arrayTM.getNumSynapses())
+
+    restored = pickle.loads(pickle.dumps(arrayTM, pickle.HIGHEST_PROTOCOL))
+
+    # Only the used part of the arrays is stored
+    self.assertEqual(len(restored._synPerm), arrayTM.getNumSynapses())
+    self.assertEqual(len(restored._segCell), arrayTM._numSegments)
+    self.assertEqual(getSegments(restored), getSegments(arrayTM))
+
+    # The restored TM keeps learning exactly like the original
+    _, expected = self._run(arrayTM, 150, seed=1)
+    _, actual = self._run(restored, 150, seed=1)
+    self._checkSameTrace(expected, actual)
+    self.assertEqual(getSegments(restored), getSegments(arrayTM))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
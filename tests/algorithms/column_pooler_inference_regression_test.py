@@ -0,0 +1,245 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Checks that the vectorized cell selection in ColumnPooler inference produces
+exactly the same activity as the original loop-based selection.
+"""
+
+import random
+import unittest
+
+import numpy
+
+from htmresearch.algorithms.column_pooler import ColumnPooler, _sample
+
+
+
+class LegacyInferenceColumnPooler(ColumnPooler):
+  """
+  ColumnPooler with the original, loop-based inference mode.
+  """
+
+  def _computeInferenceMode(self, feedforwardInput, lateralInputs):
+    """
+    Inference mode: if there is some feedforward activity, perform
+    spatial pooling on it to recognize previously known objects, then use
+    lateral activity to activate a subset of the cells with feedforward
+    support. If there is no feedforward activity, use lateral activity to
+    activate a subset of the previous active cells.
+
+    Parameters:
+    ----------------------------
+    @param  feedforwardInput (sequence)
+            Sorted indices of active feedforward input bits
+
+    @param  lateralInputs (list of sequences)
+            For each lateral layer, a list of sorted indices of active lateral
+            input bits
+    """
+
+    prevActiveCells = self.activeCells
+
+    # Calculate the feedforward supported cells
+    overlaps = self.proximalPermanences.rightVecSumAtNZGteThresholdSparse(
+      feedforwardInput, self.connectedPermanenceProximal)
+    feedforwardSupportedCells = numpy.where(
+      overlaps >= self.minThresholdProximal)[0]
+
+    # Calculate the number of active segments on each cell
+    numActiveSegmentsByCell = numpy.zeros(self.cellCount, dtype="int")
+    overlaps = self.internalDistalPermanences.rightVecSumAtNZGteThresholdSparse(
+      prevActiveCells, self.connectedPermanenceDistal)
+    numActiveSegmentsByCell[overlaps >= self.activationThresholdDistal] += 1
+    for i, lateralInput in enumerate(lateralInputs):
+      overlaps = self.distalPermanences[i].rightVecSumAtNZGteThresholdSparse(
+        lateralInput, self.connectedPermanenceDistal)
+      numActiveSegmentsByCell[overlaps >= self.activationThresholdDistal] += 1
+
+    chosenCells = []
+
+    # First, activate the FF-supported cells that have the highest number of
+    # lateral active segments (as long as it's not 0)
+    if len(feedforwardSupportedCells) == 0:
+      pass
+    else:
+      numActiveSegsForFFSuppCells = numActiveSegmentsByCell[
+        feedforwardSupportedCells]
+
+      # This loop will select the FF-supported AND laterally-active cells, in
+      # order of descending lateral activation, until we exceed the sdrSize
+      # quorum - but will exclude cells with 0 lateral active segments.
+      ttop = numpy.max(numActiveSegsForFFSuppCells)
+      while ttop > 0 and len(chosenCells) < self.sdrSize:
+        chosenCells = numpy.union1d(chosenCells,
+                    feedforwardSupportedCells[numActiveSegsForFFSuppCells >= ttop])
+        ttop -= 1
+
+    # If we haven't filled the sdrSize quorum, add in inertial cells.
+    if len(chosenCells) < self.sdrSize:
+      if self.useInertia:
+        prevCells = numpy.setdiff1d(prevActiveCells, chosenCells)
+        inertialCap = int(len(prevCells) * self.inertiaFactor)
+        if inertialCap > 0:
+          numActiveSegsForPrevCells = numActiveSegmentsByCell[prevCells]
+          # We sort the previously-active cells by number of active lateral
+          # segments (this really helps).  We then activate them in order of
+          # descending lateral activation.
+          sortIndices = numpy.argsort(numActiveSegsForPrevCells)[::-1]
+          prevCells = prevCells[sortIndices]
+          numActiveSegsForPrevCells = numActiveSegsForPrevCells[sortIndices]
+
+          # We use inertiaFactor to limit the number of previously-active cells
+          # which can become active, forcing decay even if we are below quota.
+          prevCells = prevCells[:inertialCap]
+          numActiveSegsForPrevCells = numActiveSegsForPrevCells[:inertialCap]
+
+          # Activate groups of previously active cells by order of their lateral
+          # support until we either meet quota or run out of cells.
+          ttop = numpy.max(numActiveSegsForPrevCells)
+          while ttop >= 0 and len(chosenCells) < self.sdrSize:
+            chosenCells = numpy.union1d(chosenCells,
+                        prevCells[numActiveSegsForPrevCells >= ttop])
+            ttop -= 1
+
+    # If we haven't filled the sdrSize quorum, add cells that have feedforward
+    # support and no lateral support.
+    discrepancy = self.sdrSize - len(chosenCells)
+    if discrepancy > 0:
+      remFFcells = numpy.setdiff1d(feedforwardSupportedCells, chosenCells)
+
+      # Inhibit cells proportionally to the number of cells that have already
+      # been chosen. If ~0 have been chosen activate ~all of the feedforward
+      # supported cells. If ~sdrSize have been chosen, activate very few of
+      # the feedforward supported cells.
+
+      # Use the discrepancy:sdrSize ratio to determine the number of cells to
+      # activate.
+      n = (len(remFFcells) * discrepancy) // self.sdrSize
+      # Activate at least 'discrepancy' cells.
+      n = max(n, discrepancy)
+      # If there aren't 'n' available, activate all of the available cells.
+      n = min(n, len(remFFcells))
+
+      if len(remFFcells) > n:
+        selected = _sample(self._random, remFFcells, n)
+        chosenCells = numpy.append(chosenCells, selected)
+      else:
+        chosenCells = numpy.append(chosenCells, remFFcells)
+
+    chosenCells.sort()
+    self.activeCells = numpy.asarray(chosenCells, dtype="uint32")
+
+
+
+class ColumnPoolerInferenceRegressionTest(unittest.TestCase):
+
+  def _runScenario(self, seed, useInertia=True, **kwargs):
+    """
+    Train a pooler and a legacy pooler on the same objects, then run the same
+    noisy, ambiguous inference sequences on both and compare the activity at
+    every time step.
+    """
+    params = {
+      "inputWidth": 1024,
+      "lateralInputWidths": [512, 512],
+      "cellCount": 512,
+      "sdrSize": 20,
+      "minThresholdProximal": 6,
+      "sampleSizeProximal": 12,
+      "sampleSizeDistal": 12,
+      "activationThresholdDistal": 6,
+      "seed": seed,
+    }
+    params.update(kwargs)
+
+    pooler = ColumnPooler(**params)
+    legacyPooler = LegacyInferenceColumnPooler(**params)
+    pooler.setUseInertia(useInertia)
+    legacyPooler.setUseInertia(useInertia)
+
+    rng = random.Random(seed)
+    features = [sorted(rng.sample(xrange(1024), 15)) for _ in xrange(8)]
+    objects = [[rng.choice(features) for _ in xrange(4)] for _ in xrange(12)]
+    lateralSDRs = [[sorted(rng.sample(xrange(512), 20)) for _ in xrange(2)]
+                   for _ in objects]
+
+    for obj, lateral in zip(objects, lateralSDRs):
+      for _ in xrange(3):
+        for feature in obj:
+          for p in (pooler, legacyPooler):
+            p.compute(feature, lateral, learn=True)
+      for p in (pooler, legacyPooler):
+        p.reset()
+
+    numSteps = 0
+    for _ in xrange(20):
+      for p in (pooler, legacyPooler):
+        p.reset()
+
+      for _ in xrange(6):
+        feature = rng.choice(features)
+        if rng.random() < 0.5:
+          feature = sorted(set(feature) | set(rng.sample(xrange(1024), 5)))
+
+        lateralInputs = []
+        for iLateral in xrange(2):
+          candidates = rng.sample(xrange(len(objects)), rng.randint(0, 3))
+          lateralInput = set()
+          for iObject in candidates:
+            lateralInput.update(lateralSDRs[iObject][iLateral])
+          lateralInputs.append(sorted(lateralInput))
+
+        for p in (pooler, legacyPooler):
+          p.compute(feature, lateralInputs, learn=False)
+
+        numpy.testing.assert_equal(pooler.getActiveCells(),
+                                   legacyPooler.getActiveCells())
+        self.assertEqual(pooler.getActiveCells().dtype,
+                         legacyPooler.getActiveCells().dtype)
+        numSteps += 1
+
+    self.assertEqual(numSteps, 120)
+
+
+  def testSameActivityAsLegacy(self):
+    for seed in (42, 43, 44):
+      self._runScenario(seed)
+
+
+  def testSameActivityAsLegacyPartialInertia(self):
+    for seed in (42, 43, 44):
+      self._runScenario(seed, inertiaFactor=0.5)
+
+
+  def testSameActivityAsLegacyLargeSdr(self):
+    for seed in (42, 43):
+      self._runScenario(seed, sdrSize=40, cellCount=256)
+
+
+  def testSameActivityAsLegacyWithoutInertia(self):
+    for seed in (42, 43):
+      self._runScenario(seed, useInertia=False)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
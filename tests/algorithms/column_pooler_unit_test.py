@@ -788,6 +788,68 @@ class ColumnPoolerTest(unittest.TestCase):
            "Incorrect object representations - expecting single object")
 
 
+  def testLearnBatchMatchesSequentialLearning(self):
+    """
+    Learning objects with learnBatch should give bit-identical permanences and
+    SDRs to learning them one sensation at a time with compute().
+    """
+    sequentialPooler = self._initializeDefaultPooler(
+      lateralInputWidths=[512, 512], seed=17)
+    batchPooler = self._initializeDefaultPooler(
+      lateralInputWidths=[512, 512], seed=17)
+
+    rng = numpy.random.RandomState(42)
+    features = [numpy.sort(rng.choice(2048 * 8, 40, replace=False))
+                for _ in xrange(10)]
+
+    objects = []
+    for _ in xrange(8):
+      lateralInputs = [numpy.sort(rng.choice(512, 40, replace=False))
+                       for _ in xrange(2)]
+      sensations = []
+      # Revisit features so that some cells have no room for new synapses.
+      for iFeature in rng.choice(len(features), 6):
+        feedforwardInput = features[iFeature]
+        growthCandidates = (None if rng.rand() < 0.5
+                            else feedforwardInput[:30])
+        sensations.append((feedforwardInput.tolist(),
+                           [lateralInput.tolist()
+                            for lateralInput in lateralInputs],
+                           growthCandidates))
+      objects.append(sensations)
+
+    sequentialSDRs = []
+    for sensations in objects:
+      for feedforwardInput, lateralInputs, growthCandidates in sensations:
+        sequentialPooler.compute(feedforwardInput, lateralInputs,
+                                 feedforwardGrowthCandidates=growthCandidates,
+                                 learn=True)
+      sequentialSDRs.append(sequentialPooler.getActiveCells())
+      sequentialPooler.reset()
+
+    batchSDRs = batchPooler.learnBatch(objects)
+
+    self.assertEqual(len(batchSDRs), len(objects))
+    for sequentialSDR, batchSDR in zip(sequentialSDRs, batchSDRs):
+      numpy.testing.assert_equal(batchSDR, sequentialSDR)
+
+    matrixPairs = ([(sequentialPooler.proximalPermanences,
+                     batchPooler.proximalPermanences),
+                    (sequentialPooler.internalDistalPermanences,
+                     batchPooler.internalDistalPermanences)] +
+                   zip(sequentialPooler.distalPermanences,
+                       batchPooler.distalPermanences))
+    for sequentialMatrix, batchMatrix in matrixPairs:
+      numpy.testing.assert_array_equal(batchMatrix.toDense(),
+                                       sequentialMatrix.toDense())
+
+    # Both poolers should continue with the same random sequence.
+    sequentialPooler.compute(features[0], learn=True)
+    batchPooler.compute(features[0], learn=True)
+    numpy.testing.assert_equal(batchPooler.getActiveCells(),
+                               sequentialPooler.getActiveCells())
+
+
 
 if __name__ == "__main__":
   unittest.main()
@@ -0,0 +1,160 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Tests for the pure NumPy CSRConnections. The randomized tests compare it to
+nupic's SparseMatrixConnections.
+"""
+
+import unittest
+
+import numpy as np
+
+from htmresearch.algorithms.csr_connections import (CSRConnections,
+                                                     NumpyRandom)
+from nupic.bindings.math import SparseMatrixConnections
+
+
+class CSRConnectionsTest(unittest.TestCase):
+
+  def testComputeActivity(self):
+    connections = CSRConnections(10, 20)
+    segments = connections.createSegments([3, 1, 3])
+    np.testing.assert_equal([0, 1, 2], segments)
+
+    connections.growSynapses([0, 2], [1, 2, 5], 0.21)
+    connections.growSynapses([0], [2, 7], 0.5)
+
+    np.testing.assert_equal([2, 0, 1], connections.computeActivity([1, 7]))
+    np.testing.assert_equal([1, 0, 0],
+                            connections.computeActivity([1, 7], 0.5))
+    np.testing.assert_equal([4, 0, 3],
+                            connections.mapSegmentsToSynapseCounts(segments))
+
+    # Growing a synapse that already exists doesn't change it.
+    presynapticCells, permanences = connections.matrix.rowNonZeros(0)
+    np.testing.assert_equal([1, 2, 5, 7], presynapticCells)
+    np.testing.assert_allclose([0.21, 0.21, 0.21, 0.5], permanences)
+
+
+  def testAdjustSynapsesDestroysDeadSynapses(self):
+    connections = CSRConnections(10, 20)
+    connections.createSegments([0])
+    connections.growSynapses([0], [1, 2, 5], 0.21)
+
+    connections.adjustSynapses([0], [1], 0.1, -0.21)
+
+    presynapticCells, permanences = connections.matrix.rowNonZeros(0)
+    np.testing.assert_equal([1], presynapticCells)
+    np.testing.assert_allclose([0.31], permanences)
+    np.testing.assert_equal([1], connections.computeActivity([1, 2, 5]))
+
+
+  def testSegmentBookkeeping(self):
+    connections = CSRConnections(10, 20)
+    connections.createSegments([5, 1, 3, 1, 0, 6])
+
+    np.testing.assert_equal([1, 2, 0, 1, 0, 1, 1],
+                            connections.getSegmentCounts(range(7)))
+    np.testing.assert_equal([3, 1, 5],
+                            connections.mapSegmentsToCells([2, 1, 0]))
+    np.testing.assert_equal(
+      [2, 0], connections.filterSegmentsByCell([0, 2, 3], [3, 5]))
+
+
+  def testGrowSynapsesToSample(self):
+    connections = CSRConnections(10, 100)
+    segments = connections.createSegments([0, 1, 2])
+    connections.growSynapses([0], [3, 4], 0.21)
+
+    connections.growSynapsesToSample(segments, np.arange(10),
+                                     np.array([5, 20, -1]), 0.21,
+                                     NumpyRandom(42))
+
+    np.testing.assert_equal([7, 10, 0],
+                            connections.mapSegmentsToSynapseCounts(segments))
+    self.assertTrue(set(connections.matrix.rowNonZeros(0)[0]) <=
+                    set(range(10)))
+
+
+  def testMatchesSparseMatrixConnections(self):
+    """
+    Apply the same random operations to both implementations and compare the
+    results.
+    """
+    rng = np.random.RandomState(42)
+    cellCount = 50
+    inputSize = 80
+
+    expected = SparseMatrixConnections(cellCount, inputSize)
+    actual = CSRConnections(cellCount, inputSize)
+
+    for i in xrange(2000):
+      activeInput = np.sort(rng.choice(inputSize, rng.randint(30),
+                                       replace=False)).astype("uint32")
+      segments = np.unique(
+        rng.randint(max(expected.nSegments(), 1), size=rng.randint(6))
+      ).astype("uint32")
+      if expected.nSegments() == 0:
+        segments = segments[:0]
+
+      operation = rng.randint(6)
+      if operation == 0:
+        cells = rng.randint(cellCount, size=rng.randint(4)).astype("uint32")
+        np.testing.assert_equal(expected.createSegments(cells),
+                                actual.createSegments(cells))
+      elif operation == 1:
+        for connections in (expected, actual):
+          connections.adjustSynapses(segments, activeInput, 0.05, -0.1)
+      elif operation == 2:
+        for connections in (expected, actual):
+          connections.growSynapses(segments, activeInput, 0.21)
+      elif operation == 3:
+        for connections in (expected, actual):
+          connections.adjustActiveSynapses(segments, activeInput, -0.3)
+      elif operation == 4:
+        for connections in (expected, actual):
+          connections.adjustInactiveSynapses(segments, activeInput, 0.2)
+      elif operation == 5:
+        presynapticCells = rng.randint(inputSize,
+                                       size=len(segments)).astype("uint32")
+        permanences = np.repeat(np.float32(0.7), len(segments))
+        for connections in (expected, actual):
+          connections.matrix.setElements(segments, presynapticCells,
+                                         permanences)
+
+      for permanenceThreshold in (None, 0.21, 0.5):
+        np.testing.assert_equal(
+          expected.computeActivity(activeInput, permanenceThreshold),
+          actual.computeActivity(activeInput, permanenceThreshold))
+
+    for segment in xrange(expected.nSegments()):
+      expectedCells, expectedPermanences = expected.matrix.rowNonZeros(segment)
+      actualCells, actualPermanences = actual.matrix.rowNonZeros(segment)
+      np.testing.assert_equal(expectedCells, actualCells)
+      np.testing.assert_allclose(expectedPermanences, actualPermanences,
+                                 atol=0.00001)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,223 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Tests for the scaled, vectorized HMM.
+"""
+
+import unittest
+
+import numpy as np
+
+from htmresearch.algorithms.hidden_markov_model import HMM
+
+
+
+def safeDivide(a, b):
+  """a / b, and 0 wherever a is 0, like hidden_markov_model.divide."""
+  a, b = np.broadcast_arrays(np.asarray(a, dtype="float"), b)
+  result = np.zeros(a.shape)
+  result[a != 0] = a[a != 0] / b[a != 0]
+  return result
+
+
+
+def referenceForward(pi, A, B, observations):
+  """
+  Unscaled forward pass, one step at a time.
+  {alpha_ti} = P(Y_1..Y_t, X_t = i)
+  """
+  alpha = np.zeros((len(observations), len(pi)))
+  alpha[0] = pi * B[:, observations[0]]
+  for t in xrange(1, len(observations)):
+    alpha[t] = B[:, observations[t]] * alpha[t-1].dot(A)
+  return alpha
+
+
+
+def referenceTrain(pi, A, B, sequences, criterion):
+  """
+  Unscaled Baum-Welch that pools the expected counts of the sequences, the
+  way HMM.train and HMM.trainBatch do. B is only updated for the observed
+  values.
+  """
+  numStates = len(pi)
+  seenValues = sorted(set(np.concatenate(sequences)))
+  while True:
+    gamma0 = np.zeros(numStates)
+    epsSum = np.zeros((numStates, numStates))
+    gammaSum = np.zeros(numStates)
+    gammaTotal = np.zeros(numStates)
+    gammaObserved = np.zeros((numStates, B.shape[1]))
+
+    for observations in sequences:
+      T = len(observations)
+      alpha = referenceForward(pi, A, B, observations)
+      beta = np.ones((T, numStates))
+      for t in xrange(T-1, 0, -1):
+        beta[t-1] = A.dot(B[:, observations[t]] * beta[t])
+
+      likelihood = (alpha * beta).sum(axis=1)
+      gamma = safeDivide(alpha * beta, likelihood[:, np.newaxis])
+      gamma0 += gamma[0]
+      gammaSum += gamma[:-1].sum(axis=0)
+      gammaTotal += gamma.sum(axis=0)
+      for t in xrange(T-1):
+        epsSum += safeDivide(
+          np.outer(alpha[t], B[:, observations[t+1]] * beta[t+1]) * A,
+          likelihood[t])
+      for t in xrange(T):
+        gammaObserved[:, observations[t]] += gamma[t]
+
+    newPi = gamma0 / len(sequences)
+    newA = safeDivide(epsSum, gammaSum[:, np.newaxis])
+    newB = B.copy()
+    newB[:, seenValues] = safeDivide(gammaObserved[:, seenValues],
+                                     gammaTotal[:, np.newaxis])
+
+    done = (np.max(abs(pi - newPi)) <= criterion and
+            np.max(abs(A - newA)) <= criterion and
+            np.max(abs(B - newB)) <= criterion)
+    pi, A, B = newPi, newA, newB
+    if done:
+      return pi, A, B
+
+
+
+class HMMTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.RandomState(42)
+    self.numStates = 4
+    self.numCats = 6
+    pi = rng.rand(self.numStates)
+    A = rng.rand(self.numStates, self.numStates)
+    B = rng.rand(self.numStates, self.numCats)
+    self.pi = pi / pi.sum()
+    self.A = A / A.sum(axis=1)[:, np.newaxis]
+    self.B = B / B.sum(axis=1)[:, np.newaxis]
+
+    # The last category is never observed
+    self.sequences = [list(rng.randint(0, self.numCats - 1, size=length))
+                      for length in (12, 5, 20, 9)]
+
+
+  def _createHMM(self):
+    hmm = HMM(numCats=self.numCats, numStates=self.numStates)
+    hmm.pi = self.pi.copy()
+    hmm.A = self.A.copy()
+    hmm.B = self.B.copy()
+    return hmm
+
+
+  def _checkParameters(self, hmm, pi, A, B):
+    np.testing.assert_allclose(hmm.pi, pi, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(hmm.A, A, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(hmm.B, B, rtol=1e-9, atol=1e-12)
+
+
+  def testTrainSameAsReference(self):
+    for sequence in self.sequences:
+      hmm = self._createHMM()
+      hmm.train(sequence)
+      self._checkParameters(hmm, *referenceTrain(self.pi, self.A, self.B,
+                                                 [sequence], hmm.criterion))
+
+      # The unobserved category keeps its emission probabilities
+      np.testing.assert_array_equal(hmm.B[:, -1], self.B[:, -1])
+
+
+  def testTrainBatchSameAsReference(self):
+    hmm = self._createHMM()
+    hmm.trainBatch(self.sequences)
+
+    self._checkParameters(hmm, *referenceTrain(self.pi, self.A, self.B,
+                                               self.sequences, hmm.criterion))
+    np.testing.assert_allclose(hmm.A.sum(axis=1), 1)
+    self.assertAlmostEqual(hmm.pi.sum(), 1)
+
+
+  def testTrainBatchOfOneSameAsTrain(self):
+    for sequence in self.sequences:
+      hmm = self._createHMM()
+      hmm.train(sequence)
+      batchHMM = self._createHMM()
+      batchHMM.trainBatch([sequence])
+      self._checkParameters(batchHMM, hmm.pi, hmm.A, hmm.B)
+
+
+  def testStreamingPredictionsSameAsForwardPass(self):
+    hmm = self._createHMM()
+
+    def checkPrediction(history):
+      """
+      Compare the next prediction with one made from a forward pass over the
+      whole history.
+      """
+      alpha, _ = hmm._forward(np.array([history]), np.array([len(history)]))
+      probs = hmm.B.T.dot(hmm.A.dot(alpha[0, -1]))
+      expected = set(np.flatnonzero(probs >= 0.3)) or set([np.argmax(probs)])
+
+      self.assertEqual(hmm.predict_next_inputs(history[-1]), expected)
+      np.testing.assert_allclose(hmm._filteredState, alpha[0, -1],
+                                 rtol=1e-10, atol=1e-14)
+
+    for sequence in self.sequences:
+      hmm.reset()
+      for t in xrange(len(sequence)):
+        checkPrediction(sequence[:t+1])
+
+    # After training, the history starts with the training sequence
+    hmm.train(self.sequences[0])
+    history = list(self.sequences[0])
+    for observation in self.sequences[2]:
+      history.append(observation)
+      checkPrediction(history)
+
+
+  def testLongSequenceDoesNotUnderflow(self):
+    observations = list(np.random.RandomState(0).randint(0, self.numCats,
+                                                         size=1000))
+
+    # Without scaling, the forward probabilities underflow to 0
+    self.assertFalse(
+      referenceForward(self.pi, self.A, self.B, observations)[-1].any())
+
+    hmm = self._createHMM()
+    hmm.criterion = 0.01
+    hmm.train(observations)
+
+    for parameter in (hmm.pi, hmm.A, hmm.B):
+      self.assertTrue(np.isfinite(parameter).all())
+    np.testing.assert_allclose(hmm.A.sum(axis=1), 1)
+    np.testing.assert_allclose(hmm.B.sum(axis=1), 1)
+
+    hmm.reset()
+    for observation in observations:
+      predictions = hmm.predict_next_inputs(observation)
+    self.assertGreater(len(predictions), 0)
+    self.assertTrue(np.isfinite(hmm._filteredState).all())
+    self.assertAlmostEqual(hmm._filteredState.sum(), 1)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
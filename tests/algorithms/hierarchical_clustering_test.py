@@ -0,0 +1,142 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Tests for the overlap computation of HierarchicalClustering.
+"""
+
+import unittest
+
+import numpy
+import scipy.sparse
+
+try:
+  from htmresearch.algorithms.hierarchical_clustering import (
+    HierarchicalClustering)
+except ImportError:
+  # hierarchical_clustering needs nupic.algorithms.KNNClassifier, which newer
+  # NuPIC versions don't have
+  HierarchicalClustering = None
+
+
+
+def rowLoopOverlaps(data, selfOverlaps=False):
+  """The previous _computeOverlaps: one row at a time."""
+  nVectors = data.shape[0]
+  overlaps = []
+  for i in xrange(nVectors):
+    start = i if selfOverlaps else i+1
+    overlaps.extend(data[i].multiply(data[start:]).getnnz(1))
+  return numpy.array(overlaps, dtype="int64")
+
+
+
+class FakeKNN(object):
+  """The parts of KNNClassifier that _extractVectorsFromKNN uses."""
+
+  def __init__(self, patterns):
+    self._patterns = patterns
+    self._numPatterns = len(patterns)
+
+
+  def getPattern(self, idx, sparseBinaryForm=False):
+    pattern = self._patterns[idx]
+    if sparseBinaryForm:
+      return numpy.flatnonzero(pattern)
+    return pattern
+
+
+
+@unittest.skipIf(HierarchicalClustering is None,
+                 "hierarchical_clustering can't import its NuPIC dependencies")
+class HierarchicalClusteringTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = numpy.random.RandomState(42)
+    self.data = scipy.sparse.csr_matrix(rng.rand(60, 200) < 0.1)
+
+
+  def testComputeOverlapsSameAsRowLoop(self):
+    for selfOverlaps in (False, True):
+      expected = rowLoopOverlaps(self.data, selfOverlaps)
+      for blockSize in (1, 7, 100, 2**22):
+        for numWorkers in (1, 3):
+          overlaps = HierarchicalClustering._computeOverlaps(
+            self.data, selfOverlaps=selfOverlaps, blockSize=blockSize,
+            numWorkers=numWorkers)
+          numpy.testing.assert_array_equal(overlaps, expected)
+
+
+  def testComputeOverlapsSmallInputs(self):
+    for numVectors in (0, 1, 2):
+      data = self.data[:numVectors]
+      for selfOverlaps in (False, True):
+        for numWorkers in (1, 3):
+          numpy.testing.assert_array_equal(
+            HierarchicalClustering._computeOverlaps(
+              data, selfOverlaps=selfOverlaps, blockSize=1,
+              numWorkers=numWorkers),
+            rowLoopOverlaps(data, selfOverlaps))
+
+
+  def testComputeOverlapsDtype(self):
+    # At most 127 active bits fit in int8, and the overlaps must stay signed
+    data = scipy.sparse.csr_matrix(numpy.ones((3, 127)))
+    overlaps = HierarchicalClustering._computeOverlaps(data, selfOverlaps=True)
+    self.assertEqual(overlaps.dtype, numpy.int8)
+    numpy.testing.assert_array_equal(overlaps, 127)
+
+    data = scipy.sparse.csr_matrix(numpy.ones((3, 300)))
+    overlaps = HierarchicalClustering._computeOverlaps(data, numWorkers=3,
+                                                      blockSize=1)
+    self.assertEqual(overlaps.dtype, numpy.int16)
+    numpy.testing.assert_array_equal(overlaps, 300)
+
+    overlaps = HierarchicalClustering._computeOverlaps(self.data,
+                                                      dtype="int32")
+    self.assertEqual(overlaps.dtype, numpy.int32)
+
+
+  def testComputeOverlapsOtherDtypes(self):
+    expected = rowLoopOverlaps(self.data)
+    for dtype in ("float32", "float64", "uint16", "int64"):
+      for numWorkers in (1, 3):
+        overlaps = HierarchicalClustering._computeOverlaps(
+          self.data, dtype=dtype, blockSize=100, numWorkers=numWorkers)
+        self.assertEqual(overlaps.dtype, numpy.dtype(dtype))
+        numpy.testing.assert_array_equal(overlaps, expected)
+
+
+  def testExtractVectorsFromKNN(self):
+    patterns = self.data.toarray().astype("float32")
+    # A pattern without active bits
+    patterns[3] = 0
+
+    data = HierarchicalClustering._extractVectorsFromKNN(FakeKNN(patterns))
+
+    self.assertTrue(scipy.sparse.isspmatrix_csr(data))
+    self.assertEqual(data.shape, patterns.shape)
+    numpy.testing.assert_array_equal(data.toarray(), patterns > 0)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,134 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Tests for LocationModuleArray. They compare it to stepping each
+SuperficialLocationModule2D individually.
+"""
+
+import math
+import unittest
+
+import numpy as np
+
+from htmresearch.algorithms.location_modules import (
+  LocationModuleArray, SuperficialLocationModule2D)
+
+
+MODULE_CONFIGS = [
+  {"cellDimensions": (5, 5), "moduleMapDimensions": (20.0, 20.0),
+   "orientation": 0.0},
+  {"cellDimensions": (6, 4), "moduleMapDimensions": (18.0, 14.0),
+   "orientation": math.radians(20), "pointOffsets": (0.2, 0.8)},
+  {"cellDimensions": (8, 8), "moduleMapDimensions": (30.0, 30.0),
+   "orientation": math.radians(45), "pointOffsets": (0.1, 0.5, 0.9)},
+]
+
+
+
+def createModules():
+  return [SuperficialLocationModule2D(anchorInputSize=100,
+                                      activationThreshold=4,
+                                      learningThreshold=4,
+                                      sampleSize=8,
+                                      initialPermanence=1.0,
+                                      seed=42 + i,
+                                      **config)
+          for i, config in enumerate(MODULE_CONFIGS)]
+
+
+
+class LocationModuleArrayTest(unittest.TestCase):
+
+  def assertModulesEqual(self, expectedModules, actualModules):
+    for expected, actual in zip(expectedModules, actualModules):
+      np.testing.assert_equal(expected.activePoints, actual.activePoints)
+      np.testing.assert_equal(expected.cellsForActivePoints,
+                              actual.cellsForActivePoints)
+      np.testing.assert_equal(expected.activeCells, actual.getActiveCells())
+      np.testing.assert_equal(expected.activeSegments, actual.activeSegments)
+
+
+  def testMatchesIndividualModules(self):
+    expectedModules = createModules()
+    actualModules = createModules()
+    moduleArray = LocationModuleArray(actualModules)
+
+    rng = np.random.RandomState(42)
+    anchorInputs = [np.sort(rng.choice(100, 10, replace=False))
+                    for _ in xrange(5)]
+
+    # Learn an anchor input at a few random locations.
+    for anchorInput in anchorInputs:
+      np.random.seed(7)
+      for module in expectedModules:
+        module.activateRandomLocation()
+      np.random.seed(7)
+      moduleArray.activateRandomLocation()
+      self.assertModulesEqual(expectedModules, actualModules)
+
+      for modules in (expectedModules, actualModules):
+        for module in modules:
+          module.learn(anchorInput)
+
+    for _ in xrange(100):
+      deltaLocation = rng.uniform(-5, 5, size=2)
+      for module in expectedModules:
+        module.shift(deltaLocation)
+      moduleArray.shift(deltaLocation)
+      self.assertModulesEqual(expectedModules, actualModules)
+
+      anchorInput = anchorInputs[rng.randint(len(anchorInputs))]
+      if rng.rand() < 0.5:
+        # Use part of the input so that cells activate and deactivate.
+        anchorInput = anchorInput[:rng.randint(4, 11)]
+      for module in expectedModules:
+        module.anchor(anchorInput)
+      moduleArray.anchor(anchorInput)
+      self.assertModulesEqual(expectedModules, actualModules)
+
+      offset = 0
+      expectedActiveCells = []
+      for module in expectedModules:
+        expectedActiveCells.append(module.getActiveCells() + offset)
+        offset += module.numberOfCells()
+      np.testing.assert_equal(np.concatenate(expectedActiveCells),
+                              moduleArray.getActiveCells())
+
+
+  def testReset(self):
+    modules = createModules()
+    moduleArray = LocationModuleArray(modules)
+    moduleArray.activateRandomLocation()
+    moduleArray.shift([1.5, 2.0])
+
+    moduleArray.reset()
+
+    self.assertEqual(0, moduleArray.getActiveCells().size)
+    for module in modules:
+      self.assertEqual(0, module.getActiveCells().size)
+      self.assertEqual((0, 2), module.activePoints.shape)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
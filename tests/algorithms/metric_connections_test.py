@@ -0,0 +1,159 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Tests for the procedural MetricConnections2D. They compare it to the segments
+that BodyToSpecificObjectModule2D grows when it materializes the connections.
+"""
+
+import unittest
+
+import numpy as np
+
+from htmresearch.algorithms.location_modules import (
+  BodyToSpecificObjectModule2D, SensorToSpecificObjectModule)
+from htmresearch.algorithms.metric_connections import MetricConnections2D
+
+
+
+def createMetricConnections(cellDimensions, proceduralMetricConnections):
+  sensorModule = SensorToSpecificObjectModule(cellDimensions, 10)
+  bodyModule = BodyToSpecificObjectModule2D(
+    cellDimensions,
+    proceduralMetricConnections=proceduralMetricConnections)
+  bodyModule.formReciprocalSynapses([sensorModule])
+  return bodyModule.connectionsByColumn[0], sensorModule.metricConnections
+
+
+
+class MetricConnections2DTest(unittest.TestCase):
+
+  def setUp(self):
+    self.cellDimensions = (6, 4)
+    self.cellCount = 24
+    self.materialized = createMetricConnections(self.cellDimensions, False)
+    self.procedural = createMetricConnections(self.cellDimensions, True)
+    self.sourcesByConnections = [("sensorToBody", "sensorToSpecificObject"),
+                                 ("sensorToBody", "bodyToSpecificObject")]
+
+
+  def _randomInputs(self, rng, sources):
+    return dict((source,
+                 rng.choice(self.cellCount, rng.randint(0, 5), replace=False))
+                for source in sources)
+
+
+  def testMatchesMaterializedConnections(self):
+    rng = np.random.RandomState(42)
+
+    for materialized, procedural, sources in zip(self.materialized,
+                                                 self.procedural,
+                                                 self.sourcesByConnections):
+      for _ in xrange(50):
+        activeInputs = self._randomInputs(rng, sources)
+
+        np.testing.assert_equal(materialized.computeActivity(activeInputs),
+                                procedural.computeActivity(activeInputs))
+
+        activeSegments = materialized.computeActiveSegments(activeInputs, 2)
+        np.testing.assert_equal(
+          activeSegments, procedural.computeActiveSegments(activeInputs, 2))
+        np.testing.assert_equal(
+          materialized.computeActiveSegments(activeInputs, 1),
+          procedural.computeActiveSegments(activeInputs, 1))
+
+        np.testing.assert_equal(
+          materialized.mapSegmentsToCells(activeSegments),
+          procedural.mapSegmentsToCells(activeSegments))
+
+        # nupic doesn't specify the order of segments on the same cell.
+        cells = rng.choice(self.cellCount, 5, replace=False)
+        expected = materialized.filterSegmentsByCell(activeSegments, cells)
+        actual = procedural.filterSegmentsByCell(activeSegments, cells)
+        np.testing.assert_equal(materialized.mapSegmentsToCells(expected),
+                                procedural.mapSegmentsToCells(actual))
+        np.testing.assert_equal(np.sort(expected), np.sort(actual))
+
+        for segment in activeSegments[:5]:
+          for source in sources:
+            np.testing.assert_equal(
+              materialized.getPermanences(segment, source),
+              procedural.getPermanences(segment, source))
+
+
+  def testBodyAndSensorLocationSources(self):
+    connections = MetricConnections2D(self.cellDimensions, "sensorOffset", {
+      "bodyToSpecificObject": "bodyLocation",
+      "sensorToSpecificObject": "sensorLocation",
+    })
+    rng = np.random.RandomState(42)
+
+    for _ in xrange(50):
+      activeInputs = self._randomInputs(
+        rng, ["bodyToSpecificObject", "sensorToSpecificObject"])
+      overlaps = connections.computeActivity(activeInputs)
+      np.testing.assert_equal(np.where(overlaps >= 2)[0],
+                              connections.computeActiveSegments(activeInputs,
+                                                                2))
+
+
+  def testModuleComputeMatchesMaterializedConnections(self):
+    rng = np.random.RandomState(42)
+    modules = []
+    for procedural in (False, True):
+      sensorModules = [SensorToSpecificObjectModule(self.cellDimensions, 10)
+                       for _ in xrange(3)]
+      bodyModule = BodyToSpecificObjectModule2D(
+        self.cellDimensions, proceduralMetricConnections=procedural)
+      bodyModule.formReciprocalSynapses(sensorModules)
+      bodyModule.reset()
+      for sensorModule in sensorModules:
+        sensorModule.reset()
+      modules.append((bodyModule, sensorModules))
+
+    for _ in xrange(20):
+      sensorToBody = [rng.choice(self.cellCount, 2, replace=False)
+                      for _ in xrange(3)]
+      sensorToObject = [rng.choice(self.cellCount, 3, replace=False)
+                        for _ in xrange(3)]
+      for bodyModule, sensorModules in modules:
+        bodyModule.compute(sensorToBody, sensorToObject)
+        for sensorModule, cells in zip(sensorModules, sensorToBody):
+          sensorModule.metricCompute(cells, bodyModule.getActiveCells())
+
+      (materializedBody, materializedSensors), (proceduralBody,
+                                                proceduralSensors) = modules
+      np.testing.assert_equal(materializedBody.getActiveCells(),
+                              proceduralBody.getActiveCells())
+      for expected, actual in zip(materializedBody.activeSegmentsByColumn,
+                                  proceduralBody.activeSegmentsByColumn):
+        np.testing.assert_equal(expected, actual)
+      for expected, actual in zip(materializedSensors, proceduralSensors):
+        np.testing.assert_equal(expected.activeMetricSegments,
+                                actual.activeMetricSegments)
+        np.testing.assert_equal(expected.getActiveCells(),
+                                actual.getActiveCells())
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,214 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Tests that TemporalPooler.computeSparse matches compute.
+"""
+
+import unittest
+
+import numpy
+
+from htmresearch.algorithms.temporal_pooler import TemporalPooler, realDType
+
+
+
+class CompatibleTemporalPooler(TemporalPooler):
+  """
+  TemporalPooler keeps its potential pools and connected synapses in
+  SparseBinaryMatrix objects, as older NuPIC SpatialPoolers did. This
+  restores the older versions of the SpatialPooler methods that touch them.
+  """
+
+  def _mapPotential(self, index, wrapAround=False):
+    return super(CompatibleTemporalPooler, self)._mapPotential(index)
+
+
+  def _updatePermanencesForColumn(self, perm, index, raisePerm=True):
+    maskPotential = numpy.where(self._potentialPools.getRow(index) > 0)[0]
+    if raisePerm:
+      self._raisePermanenceToThreshold(perm, maskPotential)
+    perm[perm < self._synPermTrimThreshold] = 0
+    numpy.clip(perm, self._synPermMin, self._synPermMax, out=perm)
+    newConnected = numpy.where(perm >= self._synPermConnected)[0]
+    self._permanences.setRowFromDense(index, perm)
+    self._connectedSynapses.replaceSparseRow(index, newConnected)
+    self._connectedCounts[index] = newConnected.size
+
+
+  def _bumpUpWeakColumns(self):
+    weakColumns = numpy.where(self._overlapDutyCycles
+                              < self._minOverlapDutyCycles)[0]
+    for i in weakColumns:
+      perm = self._permanences.getRow(i).astype(realDType)
+      maskPotential = numpy.where(self._potentialPools.getRow(i) > 0)[0]
+      perm[maskPotential] += self._synPermBelowStimulusInc
+      self._updatePermanencesForColumn(perm, i, raisePerm=False)
+
+
+
+class TemporalPoolerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.numInputs = 300
+    self.numColumns = 80
+
+
+  def _createTP(self):
+    return CompatibleTemporalPooler(inputDimensions=[self.numInputs],
+                                    columnDimensions=[self.numColumns],
+                                    potentialRadius=self.numInputs,
+                                    potentialPct=0.5,
+                                    numActiveColumnsPerInhArea=8,
+                                    synPermActiveInc=0.05,
+                                    initConnectedPct=0.3,
+                                    poolingLife=5,
+                                    seed=42)
+
+
+  def _generateInputs(self, numSteps):
+    """Return (activeInputs, predictedInputs) index pairs for each step."""
+    rng = numpy.random.RandomState(42)
+    patterns = [rng.choice(self.numInputs, 30, replace=False)
+                for _ in xrange(6)]
+    inputs = []
+    for t in xrange(numSteps):
+      active = patterns[t % len(patterns)]
+      # Some steps are unpredicted, to let pooling run out
+      if rng.rand() < 0.3:
+        predicted = numpy.zeros(0, dtype="int64")
+      else:
+        predicted = rng.choice(active, rng.randint(1, len(active)),
+                               replace=False)
+      inputs.append((active, predicted))
+    return inputs
+
+
+  def _getPermanences(self, tp):
+    return numpy.array([tp._permanences.getRow(i)
+                        for i in xrange(self.numColumns)])
+
+
+  def testComputeSparseSameAsCompute(self):
+    tp = self._createTP()
+    sparseTP = self._createTP()
+    rng = numpy.random.RandomState(0)
+
+    for t, (active, predicted) in enumerate(self._generateInputs(60)):
+      learn = t < 40
+      inputVector = numpy.zeros(self.numInputs, dtype=realDType)
+      inputVector[active] = 1
+      predictedCells = numpy.zeros(self.numInputs, dtype=realDType)
+      predictedCells[predicted] = 1
+      burstingColumns = numpy.zeros(self.numColumns, dtype=realDType)
+
+      activeArray = numpy.zeros(self.numColumns, dtype=realDType)
+      activeColumns = tp.compute(inputVector, learn, activeArray,
+                                 burstingColumns, predictedCells)
+
+      # Indices don't need to be sorted or unique
+      sparseActiveArray = numpy.zeros(self.numColumns, dtype=realDType)
+      sparseActiveColumns = sparseTP.computeSparse(
+        rng.permutation(numpy.concatenate((active, active[:3]))), learn,
+        sparseActiveArray, burstingColumns, rng.permutation(predicted))
+
+      numpy.testing.assert_array_equal(sparseActiveColumns, activeColumns)
+      numpy.testing.assert_array_equal(sparseActiveArray, activeArray)
+      numpy.testing.assert_array_equal(sparseTP._poolingActivation,
+                                       tp._poolingActivation)
+      numpy.testing.assert_array_equal(self._getPermanences(sparseTP),
+                                       self._getPermanences(tp))
+
+    self.assertGreater(tp._poolingActivation.sum(), 0)
+
+
+  def testOverlapsSameAsDense(self):
+    tp = self._createTP()
+    inputs = numpy.random.RandomState(42).choice(self.numInputs, 40,
+                                                 replace=False)
+    inputVector = numpy.zeros(self.numInputs, dtype=realDType)
+    inputVector[inputs] = 1
+
+    expected = numpy.zeros(self.numColumns, dtype=realDType)
+    tp._connectedSynapses.rightVecSumAtNZ_fast(inputVector, expected)
+    numpy.testing.assert_array_equal(
+      tp._calculateOverlapSparse(tp._connectedSynapses, inputs), expected)
+
+    tp._potentialPools.rightVecSumAtNZ_fast(inputVector, expected)
+    numpy.testing.assert_array_equal(
+      tp._calculatePotentialOverlapSparse(numpy.unique(inputs)), expected)
+
+    numpy.testing.assert_array_equal(
+      tp._calculateOverlapSparse(tp._connectedSynapses, []),
+      numpy.zeros(self.numColumns))
+
+
+  def testPotentialOverlapsAfterSetPotential(self):
+    tp = self._createTP()
+    rng = numpy.random.RandomState(42)
+    inputs = numpy.unique(rng.choice(self.numInputs, 40, replace=False))
+    inputVector = numpy.zeros(self.numInputs, dtype=realDType)
+    inputVector[inputs] = 1
+    tp._calculatePotentialOverlapSparse(inputs)
+
+    for column in (0, 7):
+      potential = numpy.zeros(self.numInputs, dtype=realDType)
+      potential[rng.choice(self.numInputs, 30, replace=False)] = 1
+      tp.setPotential(column, potential)
+      numpy.testing.assert_array_equal(tp._potentialPools.getRow(column),
+                                       potential)
+
+    expected = numpy.zeros(self.numColumns, dtype=realDType)
+    tp._potentialPools.rightVecSumAtNZ_fast(inputVector, expected)
+    numpy.testing.assert_array_equal(
+      tp._calculatePotentialOverlapSparse(inputs), expected)
+
+
+  def testAdaptSynapsesSameAsColumnLoop(self):
+    tp = self._createTP()
+    expectedTP = self._createTP()
+    rng = numpy.random.RandomState(42)
+    activeInputs = numpy.sort(rng.choice(self.numInputs, 40, replace=False))
+    predictedInputs = numpy.sort(rng.choice(activeInputs, 15, replace=False))
+    activeColumns = numpy.sort(rng.choice(self.numColumns, 10, replace=False))
+
+    tp._adaptSynapses(activeInputs, activeColumns, predictedInputs)
+
+    # The previous implementation, one column at a time
+    permChanges = numpy.zeros(self.numInputs)
+    permChanges.fill(-1 * expectedTP._synPermInactiveDec)
+    permChanges[activeInputs] = expectedTP._synPermActiveInc
+    permChanges[predictedInputs] = expectedTP._synPredictedInc
+    for i in activeColumns:
+      perm = expectedTP._permanences.getRow(i)
+      maskPotential = numpy.where(expectedTP._potentialPools.getRow(i) > 0)[0]
+      perm[maskPotential] += permChanges[maskPotential]
+      expectedTP._updatePermanencesForColumn(perm, i, raisePerm=False)
+
+    numpy.testing.assert_array_equal(self._getPermanences(tp),
+                                     self._getPermanences(expectedTP))
+    numpy.testing.assert_array_equal(tp._connectedCounts,
+                                     expectedTP._connectedCounts)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
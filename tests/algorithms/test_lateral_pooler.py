@@ -18,12 +18,39 @@
 #
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
+import os
+import subprocess
+import sys
 import unittest
 import numpy as np
+import scipy.sparse
+import htmresearch
 from htmresearch.algorithms.lateral_pooler import LateralPooler
 import itertools
 
 
+
+# Measures the growth of the peak RSS (in kB) of a fresh interpreter while it
+# runs the statistics and weight updates at n=2048, m=1024, batch size 64.
+_PEAK_RSS_SCRIPT = """
+import resource
+import numpy as np
+from htmresearch.algorithms.lateral_pooler import LateralPooler
+
+n, m, d = 2048, 1024, 64
+pooler = LateralPooler(input_size=m, output_size=n, code_weight=40, seed=1)
+rng = np.random.RandomState(1)
+X = (rng.rand(m, d) < 0.1).astype(float)
+Y = (rng.rand(n, d) < 0.02).astype(float)
+
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+pooler.update_statistics(Y)
+pooler.compute_dW(X, Y)
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print after - before
+"""
+
+
 class LateralPoolerTest(unittest.TestCase):
   """
   Simplistic tests of the experimental lateral pooler implementation.
@@ -99,6 +126,86 @@ class LateralPoolerTest(unittest.TestCase):
     assert(np.all(Expected - Result < epsilon))
 
 
+  def test_whether_encoding_matches_sequential_inhibition(self):
+    """
+    The batched encoding has to select exactly the same units as 
+    visiting the units of each sample one by one in descending 
+    score order.
+    """
+    n = 300
+    m = 32
+    d = 50
+
+    pooler = LateralPooler(input_size=m, output_size=n, code_weight=8, seed=3)
+    X = (np.random.RandomState(3).rand(m,d) < 0.2).astype(float)
+    pooler.update_connections(X, pooler.encode(X))
+
+    W, b, H = pooler.get_connections()
+    s = pooler.sparsity
+
+    Expected = np.zeros((n,d))
+    score    = b * np.dot(W, X)
+    for t in range(d):
+      inh_signal = np.zeros(n)
+      for i in np.argsort(score[:,t])[::-1]:
+        if inh_signal[i] < s:
+          Expected[i,t] = 1.
+          inh_signal += H[i,:]
+
+    Result = pooler.encode(X)
+
+    assert(np.all(Expected == Result))
+
+
+  def test_statistics_and_weight_updates_accept_sparse_Y(self):
+    n = 40
+    m = 30
+    d = 20
+
+    rng = np.random.RandomState(5)
+    X = (rng.rand(m,d) < 0.3).astype(float)
+    Y = (rng.rand(n,d) < 0.2).astype(float)
+
+    dense_pooler  = LateralPooler(input_size=m, output_size=n, seed=1)
+    sparse_pooler = LateralPooler(input_size=m, output_size=n, seed=1)
+
+    dense_pooler.update_statistics(Y)
+    sparse_pooler.update_statistics(scipy.sparse.csr_matrix(Y))
+    assert(np.allclose(dense_pooler.avg_activity_pairs, 
+                       sparse_pooler.avg_activity_pairs))
+    assert(np.allclose(dense_pooler.avg_activity_units, 
+                       sparse_pooler.avg_activity_units))
+
+    assert(np.allclose(dense_pooler.compute_dW(X, Y),
+                       sparse_pooler.compute_dW(X, scipy.sparse.csr_matrix(Y))))
+
+    # Same as averaging the outer products over the batch
+    Q = np.mean(np.expand_dims(Y, axis=1) * np.expand_dims(Y, axis=0), axis=2)
+    Expected = 0.9*0.0000001*np.ones((n, n)) + 0.1*Q
+    assert(np.allclose(Expected, dense_pooler.avg_activity_pairs))
+
+
+  def test_peak_memory_of_statistics_and_weight_updates(self):
+    """
+    Memory benchmark: the updates should not build n x n x d or n x m x d 
+    tensors. At n=2048, m=1024, d=64 a single n x n x d tensor of floats 
+    takes 2 GB, while the updates should need only a few n x n matrices.
+    """
+    n, m, d = 2048, 1024, 64
+
+    package_root = os.path.dirname(
+      os.path.dirname(os.path.abspath(htmresearch.__file__)))
+    peak_rss_kb  = int(subprocess.check_output(
+      [sys.executable, "-c", _PEAK_RSS_SCRIPT], cwd=package_root))
+
+    pairwise_tensor_kb = n*n*d*8 / 1024
+    bound_kb           = 4*(n*n + n*m)*8 / 1024
+
+    self.assertLess(peak_rss_kb, bound_kb, 
+      "Peak RSS grew by {} kB (bound {} kB, a single n x n x d tensor "
+      "is {} kB)".format(peak_rss_kb, bound_kb, pairwise_tensor_kb))
+
+
 
 if __name__ == "__main__":
   unittest.main()
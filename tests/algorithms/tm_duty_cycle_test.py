@@ -0,0 +1,164 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Tests that TM and ArrayTM segment duty cycles, which catch up with the tier
+boundaries lazily, match updating every segment on each boundary.
+"""
+
+import unittest
+
+import numpy
+
+try:
+  from htmresearch.algorithms.TM import TM, ArrayTM, Segment
+except ImportError:
+  # TM.py needs nupic.support.consoleprinter, which newer NuPIC versions
+  # don't have
+  TM = ArrayTM = Segment = None
+
+
+
+if TM is not None:
+  class SweepTM(TM):
+    """
+    A TM that updates the duty cycle of every segment on each tier boundary,
+    as learn() used to.
+    """
+
+    def learn(self, bottomUpInput):
+      if self.lrnIterationIdx + 1 in Segment.dutyCycleTiers:
+        self.lrnIterationIdx += 1
+        for c in xrange(self.numberOfCols):
+          for i in xrange(self.cellsPerColumn):
+            for segment in self.cells[c][i]:
+              segment.dutyCycle()
+        self.lrnIterationIdx -= 1
+      return super(SweepTM, self).learn(bottomUpInput)
+
+
+
+def getDutyCycles(tm, segments=None):
+  """
+  Return the current duty cycle of the given segments, or of every segment,
+  without updating them. ArrayTM computes these in _getDutyCycles.
+  """
+  if segments is None:
+    segments = [segment
+                for c in xrange(tm.numberOfCols)
+                for i in xrange(tm.cellsPerColumn)
+                for segment in tm.cells[c][i]]
+  return tm._getReadOnlyDutyCycles(segments)
+
+
+
+@unittest.skipIf(TM is None, "TM can't import its NuPIC dependencies")
+class TMDutyCycleTest(unittest.TestCase):
+
+  def _createTM(self, tmClass):
+    return tmClass(numberOfCols=40, cellsPerColumn=3, activationThreshold=3,
+                   minThreshold=2, newSynapseCount=4, connectedPerm=0.3,
+                   initialPerm=0.31, globalDecay=0.0, seed=1, verbosity=0)
+
+
+  def _learn(self, tm, numSteps, checkpoints):
+    """
+    Learn noisy sequences for numSteps iterations. Return the predicted state
+    and confidence after every step, and every segment's duty cycle at the
+    checkpoints.
+    """
+    rng = numpy.random.RandomState(0)
+    patterns = []
+    for _ in xrange(7):
+      x = numpy.zeros(40, dtype="float32")
+      x[rng.choice(40, 5, replace=False)] = 1
+      patterns.append(x)
+
+    states = []
+    dutyCycles = []
+    for t in xrange(numSteps):
+      if t % 7 == 0:
+        tm.reset()
+      x = patterns[t % 7].copy()
+      if rng.rand() < 0.2:
+        x[rng.randint(40)] = 1
+      tm.learn(x)
+      states.append(numpy.concatenate([tm.predictedState["t"].ravel(),
+                                       tm.confidence["t"].ravel()]))
+      if tm.lrnIterationIdx in checkpoints:
+        dutyCycles.append(getDutyCycles(tm))
+    return states, dutyCycles
+
+
+  def testSameAsSweepAcrossTiers(self):
+    # Just past each of the 100, 320 and 1000 boundaries, and later
+    checkpoints = (99, 100, 101, 319, 321, 330, 1000, 1001, 1100)
+    expectedStates, expectedDutyCycles = self._learn(
+      self._createTM(SweepTM), 1100, checkpoints)
+    self.assertEqual(len(expectedDutyCycles), len(checkpoints))
+    self.assertGreater(len(expectedDutyCycles[-1]), 0)
+
+    for tmClass in (TM, ArrayTM):
+      states, dutyCycles = self._learn(self._createTM(tmClass), 1100,
+                                       checkpoints)
+      for t, (expected, actual) in enumerate(zip(expectedStates, states)):
+        numpy.testing.assert_array_equal(
+          actual, expected, "%s state differs at step %d" % (tmClass, t))
+      for checkpoint, expected, actual in zip(checkpoints,
+                                              expectedDutyCycles, dutyCycles):
+        numpy.testing.assert_array_equal(
+          actual, expected,
+          "%s duty cycles differ at iteration %d" % (tmClass, checkpoint))
+
+
+  def testReinforceSegmentLastUpdatedInFirstTier(self):
+    """
+    A segment last updated in the first tier is brought up to date before its
+    new positive activation is counted.
+    """
+    alpha = Segment.dutyCycleAlphas[1]
+    for tmClass in (TM, ArrayTM):
+      tm = self._createTM(tmClass)
+
+      # Create a segment at iteration 50
+      tm.lrnIterationIdx = 50
+      tm.adaptSegment(TM.SegmentUpdate(0, 0, None, [(1, 0), (2, 0)]), True)
+      segment = tm.cells[0][0][0]
+
+      # Reinforce it at iteration 150, without touching it at 100
+      tm.lrnIterationIdx = 150
+      tm.adaptSegment(TM.SegmentUpdate(0, 0, segment, [0, 1]), True)
+
+      # At 100, the sweep set it to 1 activation / 100 iterations
+      expected = pow(1.0 - alpha, 50) * (1.0 / 100) + alpha
+      self.assertEqual(tm.getSegmentOnCell(0, 0, 0).positiveActivations, 2)
+      self.assertEqual(getDutyCycles(tm, [segment])[0], expected)
+
+      # And later, without a sweep at 320
+      tm.lrnIterationIdx = 400
+      self.assertEqual(getDutyCycles(tm, [segment])[0],
+                       pow(1.0 - Segment.dutyCycleAlphas[2], 80) *
+                       (pow(1.0 - alpha, 170) * expected))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,152 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Tests that TM.predict matches the previous snapshot-and-restore lookahead and
+leaves the TM's state untouched.
+"""
+
+import unittest
+
+import numpy
+
+try:
+  from htmresearch.algorithms.TM import TM, ArrayTM
+except ImportError:
+  # TM.py needs nupic.support.consoleprinter, which newer NuPIC versions
+  # don't have
+  TM = ArrayTM = None
+
+
+
+def snapshotPredict(tm, nSteps):
+  """
+  The previous TM.predict: the lookahead runs on the live state, which is
+  saved before and restored after.
+  """
+  pristineTPDynamicState = tm._getTPDynamicState()
+
+  multiStepColumnPredictions = numpy.zeros((nSteps, tm.numberOfCols),
+                                           dtype="float32")
+  step = 0
+  while True:
+    multiStepColumnPredictions[step,:] = tm.topDownCompute()
+    if step == nSteps-1:
+      break
+    step += 1
+
+    tm.activeState['t-1'][:,:] = tm.activeState['t'][:,:]
+    tm.predictedState['t-1'][:,:] = tm.predictedState['t'][:,:]
+    tm.confidence['t-1'][:,:] = tm.confidence['t'][:,:]
+    tm.activeState['t'][:,:] = tm.predictedState['t-1'][:,:]
+    tm.predictedState['t'].fill(0)
+    tm.confidence['t'].fill(0.0)
+    tm.computePhase2(doLearn=False)
+
+  tm._setTPDynamicState(pristineTPDynamicState)
+
+  return multiStepColumnPredictions
+
+
+
+def getLiveState(tm):
+  return [state[key].copy()
+          for state in (tm.activeState, tm.predictedState, tm.confidence)
+          for key in ("t", "t-1")]
+
+
+
+@unittest.skipIf(TM is None, "TM can't import its NuPIC dependencies")
+class TMPredictTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = numpy.random.RandomState(42)
+    self.numberOfCols = 100
+    patterns = []
+    for _ in xrange(12):
+      pattern = numpy.zeros(self.numberOfCols, dtype="float32")
+      pattern[rng.choice(self.numberOfCols, 8, replace=False)] = 1
+      patterns.append(pattern)
+    self.sequences = [[patterns[i] for i in rng.randint(len(patterns),
+                                                        size=8)]
+                      for _ in xrange(4)]
+
+
+  def _createTrainedTM(self, tmClass):
+    tm = tmClass(numberOfCols=self.numberOfCols, cellsPerColumn=4,
+                 activationThreshold=5, minThreshold=4, newSynapseCount=8,
+                 initialPerm=0.21, connectedPerm=0.5, permanenceInc=0.1,
+                 permanenceDec=0.01, globalDecay=0.0, seed=42, verbosity=0)
+    for _ in xrange(6):
+      for sequence in self.sequences:
+        tm.reset()
+        for pattern in sequence:
+          tm.learn(pattern)
+    return tm
+
+
+  def testPredictSameAsSnapshot(self):
+    for tmClass in (TM, ArrayTM):
+      tm = self._createTrainedTM(tmClass)
+      numPredictions = 0
+
+      for sequence in self.sequences:
+        tm.reset()
+        for pattern in sequence:
+          tm.infer(pattern)
+          for nSteps in (1, 3, 8):
+            liveState = getLiveState(tm)
+
+            predictions = tm.predict(nSteps)
+
+            for expected, actual in zip(liveState, getLiveState(tm)):
+              numpy.testing.assert_array_equal(actual, expected)
+            self.assertEqual(predictions.shape, (nSteps, self.numberOfCols))
+            numpy.testing.assert_array_equal(predictions,
+                                             snapshotPredict(tm, nSteps))
+            numPredictions += (predictions[1:] > 0).any()
+
+      # The lookahead steps predicted something
+      self.assertGreater(numPredictions, 0)
+
+
+  def testPredictDoesNotChangeInference(self):
+    for tmClass in (TM, ArrayTM):
+      tm = self._createTrainedTM(tmClass)
+      predictingTM = self._createTrainedTM(tmClass)
+
+      for sequence in self.sequences:
+        tm.reset()
+        predictingTM.reset()
+        for pattern in sequence:
+          expected = tm.infer(pattern)
+          actual = predictingTM.infer(pattern)
+          numpy.testing.assert_array_equal(actual, expected)
+          for expected, actual in zip(getLiveState(tm),
+                                      getLiveState(predictingTM)):
+            numpy.testing.assert_array_equal(actual, expected)
+
+          predictingTM.predict(5)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
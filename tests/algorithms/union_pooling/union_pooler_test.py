@@ -32,6 +32,29 @@ REAL_DTYPE = numpy.float32
 
 
 
+class LoopedLearningUnionTemporalPooler(UnionTemporalPooler):
+  """
+  Applies learning updates one column at a time, the way _adaptSynapses used
+  to.
+  """
+
+  def _adaptSynapsesSparse(self, updates):
+    for (inputIndices, activeColumns, synPermActiveInc,
+         synPermInactiveDec) in updates:
+      permChanges = numpy.zeros(self.getNumInputs(), dtype=REAL_DTYPE)
+      permChanges.fill(-1 * synPermInactiveDec)
+      permChanges[inputIndices] = synPermActiveInc
+      perm = numpy.zeros(self.getNumInputs(), dtype=REAL_DTYPE)
+      potential = numpy.zeros(self.getNumInputs(), dtype=REAL_DTYPE)
+      for i in activeColumns:
+        self.getPermanence(i, perm)
+        self.getPotential(i, potential)
+        maskPotential = numpy.where(potential > 0)[0]
+        perm[maskPotential] += permChanges[maskPotential]
+        self._updatePermanencesForColumn(perm, i, raisePerm=False)
+
+
+
 class UnionTemporalPoolerTest(unittest.TestCase):
 
 
@@ -123,6 +146,119 @@ class UnionTemporalPoolerTest(unittest.TestCase):
     self.assertEquals(result[0], 3)
     self.assertEquals(result[1], 4)
 
+  def _checkIncrementalUnionMatchesFullSort(self, exciteFunctionType,
+                                            decayFunctionType, minHistory=0,
+                                            numSteps=150, inputOffSteps=0,
+                                            maxUnionActivity=0.2,
+                                            decayTimeConst=20.0):
+    params = {
+      "inputDimensions": (256,),
+      "columnDimensions": (200,),
+      "potentialRadius": 256,
+      "potentialPct": 0.5,
+      "globalInhibition": True,
+      "numActiveColumnsPerInhArea": 8,
+      "stimulusThreshold": 0,
+      "synPermConnected": 0.2,
+      "boostStrength": 0.0,
+      "seed": 42,
+      "activeOverlapWeight": 1.0,
+      "predictedActiveOverlapWeight": 10.0,
+      "maxUnionActivity": maxUnionActivity,
+      "exciteFunctionType": exciteFunctionType,
+      "decayFunctionType": decayFunctionType,
+      "decayTimeConst": decayTimeConst,
+      "synPermPredActiveInc": 0.01,
+      "minHistory": minHistory,
+    }
+    fullSortPooler = UnionTemporalPooler(**params)
+    incrementalPooler = UnionTemporalPooler(incrementalUnion=True, **params)
+
+    rng = numpy.random.RandomState(42)
+    for step in xrange(numSteps):
+      activeInput = (rng.rand(256) < 0.1).astype(REAL_DTYPE)
+      if step % 50 >= 50 - inputOffSteps:
+        activeInput[:] = 0
+      predictedActiveInput = activeInput * (rng.rand(256) < 0.5)
+      learn = step % 3 != 0
+
+      expected = fullSortPooler.compute(activeInput, predictedActiveInput,
+                                        learn)
+      actual = incrementalPooler.compute(activeInput, predictedActiveInput,
+                                         learn)
+      numpy.testing.assert_array_equal(actual, expected,
+                                       "Step {}".format(step))
+
+
+  def testIncrementalUnionNoDecay(self):
+    self._checkIncrementalUnionMatchesFullSort("Fixed", "NoDecay")
+    self._checkIncrementalUnionMatchesFullSort("Logistic", "NoDecay")
+
+
+  def testIncrementalUnionExponentialDecay(self):
+    self._checkIncrementalUnionMatchesFullSort("Fixed", "Exponential")
+    self._checkIncrementalUnionMatchesFullSort("Logistic", "Exponential")
+
+
+  def testIncrementalUnionLongDecay(self):
+    """
+    Stretches without input let the pooling activations decay toward the
+    scale of the tie-breaker, where the order of cells outside the union can
+    change.
+    """
+    for exciteFunctionType in ("Fixed", "Logistic"):
+      for maxUnionActivity in (0.2, 0.1):
+        self._checkIncrementalUnionMatchesFullSort(
+          exciteFunctionType, "Exponential", numSteps=600, inputOffSteps=24,
+          maxUnionActivity=maxUnionActivity, decayTimeConst=5.0)
+
+
+  def testIncrementalUnionMinHistory(self):
+    self._checkIncrementalUnionMatchesFullSort("Fixed", "NoDecay",
+                                               minHistory=1005)
+
+
+  def testSparseLearningMatchesColumnLoop(self):
+    params = {
+      "inputDimensions": (256,),
+      "columnDimensions": (200,),
+      "potentialRadius": 256,
+      "potentialPct": 0.5,
+      "globalInhibition": True,
+      "numActiveColumnsPerInhArea": 8,
+      "stimulusThreshold": 0,
+      "synPermConnected": 0.2,
+      "synPermActiveInc": 0.05,
+      "synPermInactiveDec": 0.02,
+      "boostStrength": 0.0,
+      "seed": 42,
+      "activeOverlapWeight": 1.0,
+      "predictedActiveOverlapWeight": 10.0,
+      "maxUnionActivity": 0.2,
+      "synPermPredActiveInc": 0.03,
+      "synPermPreviousPredActiveInc": 0.02,
+      "historyLength": 4,
+    }
+    sparsePooler = UnionTemporalPooler(**params)
+    loopPooler = LoopedLearningUnionTemporalPooler(**params)
+
+    rng = numpy.random.RandomState(42)
+    for _ in xrange(60):
+      activeInput = (rng.rand(256) < 0.1).astype(REAL_DTYPE)
+      predictedActiveInput = activeInput * (rng.rand(256) < 0.5)
+
+      expected = loopPooler.compute(activeInput, predictedActiveInput, True)
+      actual = sparsePooler.compute(activeInput, predictedActiveInput, True)
+      numpy.testing.assert_array_equal(actual, expected)
+
+    expectedPerm = numpy.zeros(256, dtype=REAL_DTYPE)
+    actualPerm = numpy.zeros(256, dtype=REAL_DTYPE)
+    for column in xrange(200):
+      loopPooler.getPermanence(column, expectedPerm)
+      sparsePooler.getPermanence(column, actualPerm)
+      numpy.testing.assert_array_equal(actualPerm, expectedPerm)
+
+
 
 if __name__ == "__main__":
   unittest.main()
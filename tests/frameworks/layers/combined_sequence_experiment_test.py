@@ -0,0 +1,101 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Tests for the combined_sequence_experiment module."""
+
+import unittest
+
+from htmresearch.frameworks.layers.combined_sequence_experiment import (
+  L4TMExperiment)
+
+
+class L4TMExperimentTest(unittest.TestCase):
+  """
+  L4TMExperiment builds its own config and doesn't call L4L2Experiment's
+  __init__, so these tests make sure the inherited methods still work on it.
+  """
+
+  def setUp(self):
+    self.exp = L4TMExperiment(name="sample", numCorticalColumns=1)
+
+    self.locA = range(0, 20)
+    self.featA = range(0, 20)
+    self.locB = range(40, 60)
+    self.featB = range(40, 60)
+
+    self.exp.learnObjects({"obj1": [{0: (self.locA, self.featA)},
+                                    {0: (self.locB, self.featB)}] * 3})
+
+
+  def testInfer(self):
+    """Inference runs and records the overlap with the learned object."""
+    self.exp.infer([{0: (self.locA, self.featA)},
+                    {0: (self.locB, self.featB)}], objectName="obj1")
+
+    stats = self.exp.getInferenceStats()
+    self.assertEqual(len(stats), 1)
+    self.assertSequenceEqual(stats[0]["Overlap L2 with object C0"], [40, 40])
+    self.assertEqual(len(self.exp.getL4Representations()[0]), 0)
+
+
+  def testClassification(self):
+    """The learned object is classified from the current L2 representation."""
+    self.exp.infer([{0: (self.locA, self.featA)},
+                    {0: (self.locB, self.featB)}], objectName="obj1",
+                   reset=False)
+
+    self.assertEqual(self.exp.getCurrentClassification(), {"obj1": 1.0})
+    self.assertSequenceEqual(
+      self.exp.getCurrentObjectOverlaps().tolist(), [[40]])
+
+    self.exp.objectL2Representations = dict(self.exp.objectL2Representations)
+    self.assertEqual(self.exp.getCurrentClassification(), {"obj1": 1.0})
+
+
+  def testClassificationAfterChangingRepresentations(self):
+    """
+    Objects added, replaced or removed directly in objectL2Representations are
+    classified from their current representations.
+    """
+    self.exp.infer([{0: (self.locA, self.featA)},
+                    {0: (self.locB, self.featB)}], objectName="obj1",
+                   reset=False)
+    representation = self.exp.getL2Representations()
+    otherRepresentation = [set(xrange(4000, 4040))]
+
+    self.exp.objectL2Representations["obj2"] = [set(representation[0])]
+    self.assertEqual(self.exp.getCurrentClassification(),
+                     {"obj1": 1.0, "obj2": 1.0})
+
+    self.exp.objectL2Representations["obj1"] = otherRepresentation
+    self.assertEqual(self.exp.getCurrentClassification(),
+                     {"obj1": 0.0, "obj2": 1.0})
+
+    # A column that changes size in place
+    otherRepresentation[0].update(representation[0])
+    self.assertEqual(self.exp.getCurrentClassification(),
+                     {"obj1": 1.0, "obj2": 1.0})
+
+    del self.exp.objectL2Representations["obj1"]
+    self.assertEqual(self.exp.getCurrentClassification(), {"obj2": 1.0})
+    self.assertSequenceEqual(
+      self.exp.getCurrentObjectOverlaps().tolist(), [[40]])
+
@@ -0,0 +1,176 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""Tests for inference_statistics module."""
+
+import collections
+import cPickle
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from htmresearch.frameworks.layers import inference_statistics
+from htmresearch.frameworks.layers.inference_statistics import (
+  InferenceStatistics, metricName)
+
+
+
+def _episode(i, withObject=True):
+  statistics = collections.defaultdict(list)
+  for step in xrange(3):
+    statistics["L2 Representation C0"].append(40 + i + step)
+    statistics["L2 Representation C1"].append(41 + i + step)
+    statistics["Full L2 SDR C0"].append(set(xrange(i, i + step)))
+    if withObject:
+      statistics["Overlap L2 with object C0"].append(step)
+      statistics["Correct classification"].append(float(step == 2))
+  statistics["numSteps"] = 3
+  statistics["object"] = i if withObject else "Unknown"
+  return statistics
+
+
+
+class InferenceStatisticsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpDir = tempfile.mkdtemp()
+
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpDir)
+
+
+  def testMetricName(self):
+    self.assertEqual(metricName("L2 Representation C12"), "L2 Representation")
+    self.assertEqual(metricName("Correct classification"),
+                     "Correct classification")
+
+
+  def testEpisodesRoundTrip(self):
+    episodes = [_episode(i, withObject=(i % 3 != 1)) for i in xrange(10)]
+
+    for path in (None, self.tmpDir):
+      statistics = InferenceStatistics(chunkSize=4, path=path)
+      for episode in episodes:
+        statistics.append(episode)
+
+      self.assertEqual(len(statistics), 10)
+      self.assertEqual(statistics.toList(), episodes)
+      self.assertEqual(statistics[-1], episodes[-1])
+      self.assertEqual(statistics[2:5], episodes[2:5])
+      self.assertNotIn("Overlap L2 with object C0", statistics[1])
+      self.assertEqual(statistics[1]["Overlap L2 with object C0"], [])
+      self.assertIsInstance(statistics[0]["L2 Representation C0"][0], int)
+      with self.assertRaises(IndexError):
+        statistics[10]
+
+
+  def testChunksAreWrittenToDisk(self):
+    statistics = InferenceStatistics(chunkSize=4, path=self.tmpDir)
+    for i in xrange(9):
+      statistics.append(_episode(i))
+
+    self.assertEqual(len(statistics._chunks), 0)
+    self.assertEqual(statistics._numSavedChunks, 2)
+    self.assertEqual(len(statistics._current), 1)
+
+
+  def testMetricsFilter(self):
+    statistics = InferenceStatistics(metrics=["L2 Representation"])
+    statistics.append(_episode(0))
+
+    self.assertEqual(sorted(statistics[0].keys()),
+                     ["L2 Representation C0", "L2 Representation C1",
+                      "numSteps", "object"])
+
+
+  def testPickle(self):
+    statistics = InferenceStatistics(chunkSize=2)
+    for i in xrange(5):
+      statistics.append(_episode(i))
+
+    restored = cPickle.loads(cPickle.dumps(statistics,
+                                           cPickle.HIGHEST_PROTOCOL))
+    self.assertEqual(restored.toList(), statistics.toList())
+
+    # Appending after a round trip still works.
+    restored.append(_episode(1000))
+    self.assertEqual(restored[-1], _episode(1000))
+
+
+  def testEpisodeKeysAreDecodedOnAccess(self):
+    statistics = InferenceStatistics()
+    statistics.append(_episode(5))
+
+    with patch.object(inference_statistics._Column, "get",
+                      autospec=True,
+                      side_effect=inference_statistics._Column.get) as get:
+      episode = statistics[0]
+      self.assertEqual(get.call_count, 0)
+      self.assertEqual(episode["Full L2 SDR C0"], _episode(5)["Full L2 SDR C0"])
+      self.assertEqual(episode["Full L2 SDR C0"][2], set([5, 6]))
+      self.assertEqual(get.call_count, 1)
+
+    self.assertEqual(dict(episode), dict(_episode(5)))
+    self.assertEqual(episode.get("Missing"), None)
+    self.assertNotIn("Missing", episode)
+    self.assertEqual(episode["Missing"], [])
+    self.assertIn("Missing", episode)
+
+    restored = cPickle.loads(cPickle.dumps(statistics[0],
+                                           cPickle.HIGHEST_PROTOCOL))
+    self.assertIsInstance(restored, collections.defaultdict)
+    self.assertEqual(restored, _episode(5))
+
+
+  def testChunksReadFromDiskAreCached(self):
+    statistics = InferenceStatistics(chunkSize=2, path=self.tmpDir,
+                                     numCachedChunks=2)
+    for i in xrange(7):
+      statistics.append(_episode(i))
+
+    with patch.object(inference_statistics._Chunk, "load",
+                      side_effect=inference_statistics._Chunk.load) as load:
+      # Alternate between two chunks on disk and the current one
+      for _ in xrange(3):
+        for i in (0, 3, 6):
+          self.assertEqual(statistics[i]["object"], i)
+      self.assertEqual(load.call_count, 2)
+
+      # A third chunk on disk evicts the least recently used one
+      statistics[5]
+      statistics[2]
+      statistics[0]
+      self.assertEqual(load.call_count, 4)
+
+    restored = cPickle.loads(cPickle.dumps(statistics,
+                                           cPickle.HIGHEST_PROTOCOL))
+    self.assertNotIn("_cachedChunks", statistics.__getstate__())
+    self.assertEqual(len(restored._cachedChunks), 0)
+    self.assertEqual(restored.toList(), statistics.toList())
+
+
+
+if __name__ == "__main__":
+  unittest.main()
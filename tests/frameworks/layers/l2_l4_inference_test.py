@@ -116,6 +116,97 @@ class L4L2ExperimentTest(unittest.TestCase):
     self.assertEqual(len(exp.getL4Representations()[1]),20)
 
 
+  def testInferenceStatisticsKeys(self):
+    """Inference records every statistic for each column."""
+    exp = l2_l4_inference.L4L2Experiment(
+      name="sample",
+      numCorticalColumns=2,
+      numInputBits=20,
+      numExternalInputBits=20
+    )
+    sensations = [
+      {0: (range(0, 20), range(0, 20)), 1: (range(20, 40), range(20, 40))},
+      {0: (range(40, 60), range(40, 60)), 1: (range(60, 80), range(60, 80))},
+    ]
+    exp.learnObjects({"obj1": sensations * 3})
+    exp.infer(sensations, objectName="obj1")
+
+    stats = exp.getInferenceStats()[0]
+    for name in ("L4 Representation", "L4 Predicted", "L2 Representation",
+                 "Full L2 SDR", "L4 Apical Segments", "Overlap L2 with object"):
+      for column in ("C0", "C1"):
+        self.assertEqual(len(stats[name + " " + column]), 2)
+    self.assertEqual(len(stats["Correct classification"]), 2)
+
+
+  def testDirectBackendMatchesNetwork(self):
+    """The direct backend computes the same representations as the network."""
+    objectsToLearn = {"obj1": [
+      {0: (range(0, 20), range(0, 20)), 1: (range(20, 40), range(20, 40))},
+      {0: (range(40, 60), range(40, 60)), 1: (range(60, 80), range(60, 80))},
+    ] * 3}
+    sensationsToInfer = [
+      {0: (range(0, 20), range(0, 20)), 1: (range(20, 40), range(20, 40))},
+      {0: (range(40, 60), range(40, 60)), 1: ([], [])},
+      {0: ([], []), 1: (range(20, 40), range(20, 40))},
+    ]
+
+    results = {}
+    for backend in ("network", "direct"):
+      exp = l2_l4_inference.L4L2Experiment(
+        name="sample",
+        numCorticalColumns=2,
+        numInputBits=20,
+        numExternalInputBits=20,
+        backend=backend
+      )
+      exp.learnObjects(objectsToLearn, reset=True)
+      exp.infer(sensationsToInfer, objectName="obj1", reset=False)
+      results[backend] = (exp.getInferenceStats(),
+                          [sorted(r) for r in exp.getL2Representations()],
+                          [sorted(r) for r in exp.getL4Representations()])
+
+    self.assertEqual(results["network"], results["direct"])
+
+
+  def testSparseLinksMatchDenseLinks(self):
+    """A network with sparse links computes the same as with dense links."""
+    objectsToLearn = {"obj1": [
+      {0: (range(0, 20), range(0, 20)), 1: (range(20, 40), range(20, 40))},
+      {0: (range(40, 60), range(40, 60)), 1: (range(60, 80), range(60, 80))},
+    ] * 3}
+    sensationsToInfer = [
+      {0: (range(0, 20), range(0, 20)), 1: (range(20, 40), range(20, 40))},
+      {0: (range(40, 60), range(40, 60)), 1: ([], [])},
+      {0: ([], []), 1: (range(20, 40), range(20, 40))},
+    ]
+
+    results = {}
+    for sparseLinks in (False, True):
+      exp = l2_l4_inference.L4L2Experiment(
+        name="sample",
+        numCorticalColumns=2,
+        numInputBits=20,
+        numExternalInputBits=20,
+        sparseLinks=sparseLinks
+      )
+      exp.learnObjects(objectsToLearn, reset=True)
+      exp.infer(sensationsToInfer, objectName="obj1", reset=False)
+      results[sparseLinks] = (
+        exp.getInferenceStats(),
+        [sorted(r) for r in exp.getL2Representations()],
+        [sorted(r) for r in exp.getL4Representations()],
+        [sorted(r) for r in exp.getL4PredictedCells()],
+        [sorted(r) for r in exp.getL4PredictedActiveCells()])
+
+    self.assertEqual(results[False], results[True])
+
+
+  def testInvalidBackend(self):
+    with self.assertRaises(ValueError):
+      l2_l4_inference.L4L2Experiment(name="sample", backend="bogus")
+
+
   def testDelayedLateralandApicalInputs(self):
     """Test whether lateral and apical inputs are synchronized across columns"""
     # Set up experiment
@@ -19,6 +19,7 @@
 # http://numenta.org/licenses/
 # ----------------------------------------------------------------------
 
+import copy
 import unittest
 import random
 
@@ -518,6 +519,29 @@ class LaminarNetworkTest(unittest.TestCase):
     pass
 
 
+  def testSparseLinks(self):
+    """
+    With sparseLinks, every region gets the parameter. L4 region types that
+    don't declare it are rejected.
+    """
+    config = copy.deepcopy(networkConfig1)
+    config["sparseLinks"] = True
+    net = createNetwork(config)
+    for regionName in ("externalInput_0", "sensorInput_0", "L4Column_0",
+                       "L2Column_0"):
+      self.assertTrue(net.regions[regionName].getSelf().sparseLinks,
+                      regionName + " doesn't use sparse links")
+
+    net = createNetwork(networkConfig1)
+    self.assertFalse(net.regions["L4Column_0"].getSelf().sparseLinks)
+
+    config = copy.deepcopy(networkConfig1)
+    config["sparseLinks"] = True
+    config["L4RegionType"] = "py.TemporalPoolerRegion"
+    with self.assertRaises(ValueError):
+      createNetwork(config)
+
+
   def testCustomParameters(self):
     """
     This test creates a network with custom parameters and tests that the
@@ -0,0 +1,154 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Tests for the Poirazi neuron model.
+"""
+
+import unittest
+
+import numpy
+
+from htmresearch.frameworks.poirazi_neuron_model.data_tools import (
+  generate_evenly_distributed_data_sparse)
+from htmresearch.frameworks.poirazi_neuron_model.neuron_model import (
+  Matrix_Neuron, sample_from_rows, threshold_nonlinearity)
+
+
+
+class SampleFromRowsTest(unittest.TestCase):
+
+  def testCounts(self):
+    numpy.random.seed(42)
+    mask = numpy.random.rand(50, 30) < 0.3
+    mask[3] = False
+    counts = numpy.arange(50) % 12
+
+    chosen = sample_from_rows(mask, counts)
+
+    self.assertEqual(chosen.shape, mask.shape)
+    self.assertFalse((chosen & ~mask).any())
+    numpy.testing.assert_array_equal(chosen.sum(axis=1),
+                                     numpy.minimum(counts, mask.sum(axis=1)))
+
+
+  def testScalarCount(self):
+    numpy.random.seed(42)
+    chosen = sample_from_rows(numpy.ones((20, 40), dtype=bool), 7)
+    self.assertTrue((chosen.sum(axis=1) == 7).all())
+
+
+  def testUniform(self):
+    """Every allowed entry is about equally likely to be chosen."""
+    numpy.random.seed(42)
+    mask = numpy.zeros((20000, 10), dtype=bool)
+    mask[:, 2:8] = True
+
+    frequencies = sample_from_rows(mask, 3).mean(axis=0)
+
+    numpy.testing.assert_array_equal(frequencies[[0, 1, 8, 9]], 0)
+    numpy.testing.assert_allclose(frequencies[2:8], 0.5, atol=0.02)
+
+
+
+class MatrixNeuronTrainingTest(unittest.TestCase):
+
+  def setUp(self):
+    numpy.random.seed(42)
+    self.dim = 200
+    self.numDendrites = 30
+    self.dendriteLength = 12
+    self.data = generate_evenly_distributed_data_sparse(
+      dim=self.dim, num_active=20, num_samples=600)
+    self.labels = numpy.array([1, -1] * 300)
+
+
+  def _createNeuron(self):
+    neuron = Matrix_Neuron(size=self.numDendrites * self.dendriteLength,
+                           num_dendrites=self.numDendrites,
+                           dendrite_length=self.dendriteLength,
+                           dim=self.dim,
+                           nonlinearity=threshold_nonlinearity(4))
+    neuron.HTM_style_initialize_on_data(
+      self.data.getSlice(0, self.numDendrites, 0, self.dim),
+      [1] * self.numDendrites)
+    return neuron
+
+
+  def _checkNeuron(self, neuron):
+    dendrites = neuron.dendrites.toDense()
+    permanences = neuron.permanences.toDense()
+
+    self.assertEqual(dendrites.shape, (self.dim, self.numDendrites))
+    self.assertEqual(permanences.shape, (self.dim, self.numDendrites))
+    self.assertTrue(numpy.in1d(dendrites, [0, 1]).all())
+    self.assertTrue((dendrites.sum(axis=0) == self.dendriteLength).all())
+    self.assertTrue(numpy.isfinite(permanences).all())
+    self.assertFalse(permanences[dendrites == 0].any())
+
+
+  def testTrainOnDatapoints(self):
+    neuron = self._createNeuron()
+    initialPermanences = neuron.permanences.toDense()
+
+    neuron.HTM_style_train_on_data(self.data, self.labels)
+
+    self._checkNeuron(neuron)
+    self.assertFalse(numpy.array_equal(neuron.permanences.toDense(),
+                                       initialPermanences))
+
+
+  def testTrainOnBatches(self):
+    for batchSize in (7, 100, 1000):
+      neuron = self._createNeuron()
+      initialPermanences = neuron.permanences.toDense()
+
+      neuron.HTM_style_train_on_data(self.data, self.labels,
+                                     batch_size=batchSize)
+
+      self._checkNeuron(neuron)
+      self.assertFalse(numpy.array_equal(neuron.permanences.toDense(),
+                                         initialPermanences))
+
+
+  def testTrainingLearnsPositives(self):
+    """
+    A few passes of training reduce the error on a dataset with more
+    positives than dendrites.
+    """
+    for batchSize in (1, 50):
+      neuron = self._createNeuron()
+      positive = self.labels > 0
+
+      def error():
+        active = neuron.calculate_on_entire_dataset(self.data) > 0
+        return numpy.mean(active != positive)
+
+      initialError = error()
+      for _ in xrange(3):
+        neuron.HTM_style_train_on_data(self.data, self.labels,
+                                       batch_size=batchSize)
+      self.assertLess(error(), initialError)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,219 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Tests that the vectorized SP metrics match the loops they replaced.
+"""
+
+import unittest
+
+import numpy as np
+
+from nupic.algorithms.spatial_pooler import SpatialPooler
+
+from htmresearch.frameworks.sp_paper import sp_metrics
+
+
+
+def loopInputOverlapMat(inputVectors, sp):
+  numColumns = np.prod(sp.getColumnDimensions())
+  numInputVector, inputSize = inputVectors.shape
+  overlapMat = np.zeros((numColumns, numInputVector))
+  for c in range(numColumns):
+    connectedSynapses = np.zeros((inputSize, ), dtype=sp_metrics.uintType)
+    sp.getConnectedSynapses(c, connectedSynapses)
+    for i in range(numInputVector):
+      overlapMat[c, i] = sp_metrics.percentOverlap(connectedSynapses,
+                                                   inputVectors[i, :])
+  return overlapMat
+
+
+
+def loopInputSpaceCoverage(sp):
+  numInputs = np.prod(sp.getInputDimensions())
+  numColumns = np.prod(sp.getColumnDimensions())
+  inputSpaceCoverage = np.zeros(numInputs)
+  connectedSynapses = np.zeros((numInputs), dtype=sp_metrics.uintType)
+  for columnIndex in range(numColumns):
+    sp.getConnectedSynapses(columnIndex, connectedSynapses)
+    inputSpaceCoverage += connectedSynapses
+  return np.reshape(inputSpaceCoverage, sp.getInputDimensions())
+
+
+
+def loopWitnessError(sp, inputVectors, activeColumnsCurrentEpoch):
+  connectionMatrix = sp_metrics.getConnectedSyns(sp)
+  batchSize = inputVectors.shape[0]
+  Err = 0.
+  for i in range(batchSize):
+    activeColumns = np.where(activeColumnsCurrentEpoch[i] > 0.)[0]
+    err = 0.
+    for j in activeColumns:
+      err += np.sum(np.absolute(connectionMatrix[j] - inputVectors[i]))
+    Err += err/activeColumns.shape[0]
+  return Err/batchSize
+
+
+
+def loopMutualInformation(activeColumnsCurrentEpoch, i, j):
+  batchSize = activeColumnsCurrentEpoch.shape[0]
+  ci, cj, cij = 0., 0., dict([((0,0),0.), ((1,0),0.), ((0,1),0.), ((1,1),0.)])
+  for t in range(batchSize):
+    ai = activeColumnsCurrentEpoch[t, i]
+    aj = activeColumnsCurrentEpoch[t, j]
+    cij[(ai, aj)] += 1.
+    ci += ai
+    cj += aj
+
+  Iij = 0
+  for a,b in [(0,0), (1,0), (0,1), (1,1)]:
+    pij = cij[(a,b)]/batchSize
+    pi  = ci/batchSize if a == 1 else 1. - ci/batchSize
+    pj  = cj/batchSize if b == 1 else 1. - cj/batchSize
+    Iij += pij * np.log2(pij/(pi*pj)) if pij > 0 else 0
+  return Iij
+
+
+
+def loopMeanMutualInformation(activeColumnsCurrentEpoch, columns):
+  numCols = len(columns)
+  sumMutualInfo = 0
+  for i in range(numCols):
+    for j in range(i+1, numCols):
+      sumMutualInfo += loopMutualInformation(activeColumnsCurrentEpoch,
+                                             columns[i], columns[j])
+  return sumMutualInfo/(numCols*(numCols - 1)/2)
+
+
+
+class SPMetricsTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.RandomState(42)
+    self.sp = SpatialPooler(inputDimensions=(8, 10),
+                            columnDimensions=(5, 6),
+                            potentialRadius=80,
+                            potentialPct=0.5,
+                            globalInhibition=True,
+                            numActiveColumnsPerInhArea=5,
+                            synPermConnected=0.2,
+                            seed=42)
+    self.numColumns = 30
+    self.inputVectors = (rng.rand(25, 80) < 0.15).astype(sp_metrics.uintType)
+    # One input without active bits
+    self.inputVectors[3] = 0
+
+    self.activeColumns = np.zeros((25, self.numColumns),
+                                  dtype=sp_metrics.uintType)
+    for i in xrange(25):
+      self.sp.compute(self.inputVectors[i], True, self.activeColumns[i])
+
+    # Activity with a column that never fires and one that always does
+    self.activity = (rng.rand(40, self.numColumns) < 0.3).astype("int64")
+    self.activity[:, 4] = 0
+    self.activity[:, 7] = 1
+
+
+  def testInputOverlapMatSameAsLoop(self):
+    overlapMat = sp_metrics.calculateInputOverlapMat(self.inputVectors, self.sp)
+    self.assertEqual(overlapMat.shape, (self.numColumns, 25))
+    np.testing.assert_allclose(overlapMat,
+                               loopInputOverlapMat(self.inputVectors, self.sp))
+    np.testing.assert_array_equal(overlapMat[:, 3], 0)
+
+
+  def testInputSpaceCoverageSameAsLoop(self):
+    coverage = sp_metrics.calculateInputSpaceCoverage(self.sp)
+    self.assertEqual(coverage.shape, (8, 10))
+    np.testing.assert_array_equal(coverage, loopInputSpaceCoverage(self.sp))
+    self.assertGreater(coverage.sum(), 0)
+
+
+  def testWitnessErrorSameAsLoop(self):
+    for activeColumns in (self.activeColumns,
+                          self.activity[:25].astype(sp_metrics.uintType)):
+      activeColumns = activeColumns.copy()
+      activeColumns[:, 0] = 1
+      self.assertAlmostEqual(
+        sp_metrics.witnessError(self.sp, self.inputVectors, activeColumns),
+        loopWitnessError(self.sp, self.inputVectors, activeColumns))
+
+
+  def testWitnessErrorWithoutActiveColumns(self):
+    # The loop raised a ZeroDivisionError, the vectorized version gives nan
+    activeColumns = self.activeColumns.copy()
+    activeColumns[5] = 0
+    with np.errstate(invalid="ignore"):
+      error = sp_metrics.witnessError(self.sp, self.inputVectors,
+                                      activeColumns)
+    self.assertTrue(np.isnan(error))
+    with self.assertRaises(ZeroDivisionError):
+      loopWitnessError(self.sp, self.inputVectors, activeColumns)
+
+
+  def testMutualInformationSameAsLoop(self):
+    for i, j in [(0, 1), (4, 7), (4, 9), (7, 2), (3, 3)]:
+      self.assertAlmostEqual(
+        sp_metrics.mutualInformation(self.sp, self.activity, i, j),
+        loopMutualInformation(self.activity, i, j))
+
+
+  def testMeanMutualInformationSameAsLoop(self):
+    for activity in (self.activity, self.activeColumns):
+      self.assertAlmostEqual(
+        sp_metrics.meanMutualInformation(self.sp, activity),
+        loopMeanMutualInformation(activity, range(self.numColumns)))
+
+    columns = [7, 2, 4, 11, 29]
+    self.assertAlmostEqual(
+      sp_metrics.meanMutualInformation(self.sp, self.activity, columns),
+      loopMeanMutualInformation(self.activity, columns))
+
+
+  def testMeanMutualInformationSampledPairs(self):
+    columns = [7, 2, 4, 11, 29, 0]
+    for numSampledPairs in (1, 10, 500):
+      np.random.seed(numSampledPairs)
+      sampledMean = sp_metrics.meanMutualInformation(
+        self.sp, self.activity, columns, numSampledPairs=numSampledPairs)
+
+      # The same draws, as pairs of distinct columns
+      np.random.seed(numSampledPairs)
+      i = np.random.randint(len(columns), size=numSampledPairs)
+      j = np.random.randint(len(columns) - 1, size=numSampledPairs)
+      j[j >= i] += 1
+      self.assertTrue((i != j).all())
+      self.assertAlmostEqual(
+        sampledMean,
+        np.mean([loopMutualInformation(self.activity, columns[a], columns[b])
+                 for a, b in zip(i, j)]))
+
+    # Many samples estimate the mean over all pairs
+    np.random.seed(0)
+    self.assertAlmostEqual(
+      sp_metrics.meanMutualInformation(self.sp, self.activity, columns,
+                                       numSampledPairs=20000),
+      loopMeanMutualInformation(self.activity, columns), places=2)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
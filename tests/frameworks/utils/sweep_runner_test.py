@@ -0,0 +1,139 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Tests for the resumable sweep runner.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from htmresearch.frameworks.utils.sweep_runner import (readLedger, runSweep,
+                                                        taskKey)
+
+
+
+def square(args):
+  return {"x": args["x"], "square": args["x"] ** 2}
+
+
+
+def failOnThree(args):
+  if args["x"] == 3:
+    raise RuntimeError("Task failed")
+  return square(args)
+
+
+
+class SweepRunnerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpDir = tempfile.mkdtemp()
+    self.ledgerName = os.path.join(self.tmpDir, "results.ledger")
+    self.args = [{"x": x, "params": {"a": 1, "b": [1, 2]}} for x in xrange(6)]
+
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpDir)
+
+
+  def testTaskKeyIgnoresDictOrder(self):
+    a = {}
+    a["first"] = 1
+    a["second"] = {"c": 3, "d": 4}
+    b = {}
+    b["second"] = {"d": 4, "c": 3}
+    b["first"] = 1
+
+    self.assertEqual(taskKey(a), taskKey(b))
+    self.assertNotEqual(taskKey(a), taskKey({"first": 2,
+                                            "second": {"c": 3, "d": 4}}))
+
+
+  def testTaskKeyUsesWholeArrays(self):
+    a = np.zeros(100000)
+    b = a.copy()
+    b[50000] = 1
+    # With the default print options, the repr of both arrays is the same
+    with np.printoptions(threshold=1000):
+      self.assertEqual(repr(a), repr(b))
+
+    self.assertNotEqual(taskKey({"x": a}), taskKey({"x": b}))
+    self.assertEqual(taskKey({"x": b}), taskKey({"x": b.copy()}))
+    self.assertNotEqual(taskKey({"x": a}), taskKey({"x": a.astype("float32")}))
+    self.assertNotEqual(taskKey({"x": a}), taskKey({"x": a.reshape(100, -1)}))
+
+
+  def testTaskKeyDoesNotDependOnObjectIdentity(self):
+    name = "".join(["sec", "ond"])
+    shared = {"a": "second", "b": "second"}
+    separate = {"a": "second", "b": name}
+    self.assertEqual(taskKey(shared), taskKey(separate))
+
+
+  def testResultsAreInArgumentOrder(self):
+    for numWorkers in (1, 3):
+      ledgerName = self.ledgerName + str(numWorkers)
+      results = runSweep(square, self.args, ledgerName,
+                         numWorkers=numWorkers,
+                         costFunction=lambda a: a["x"], verbose=False)
+
+      self.assertEqual([x ** 2 for x in xrange(6)],
+                       [r["square"] for r in results])
+      self.assertEqual(6, len(readLedger(ledgerName)))
+
+
+  def testResumesAfterFailure(self):
+    with self.assertRaises(RuntimeError):
+      runSweep(failOnThree, self.args, self.ledgerName,
+               costFunction=lambda a: a["x"], verbose=False)
+
+    # The most expensive tasks run first, so 5 and 4 finished.
+    finished = readLedger(self.ledgerName)
+    self.assertEqual(set([taskKey(self.args[5]), taskKey(self.args[4])]),
+                     set(finished.iterkeys()))
+
+    # Simulate a crash in the middle of writing a record.
+    with open(self.ledgerName, "ab") as f:
+      f.write("\x80\x02(garbage")
+
+    ranTasks = []
+    def recordingSquare(args):
+      ranTasks.append(args["x"])
+      return square(args)
+
+    results = runSweep(recordingSquare, self.args, self.ledgerName,
+                       costFunction=lambda a: a["x"], verbose=False)
+
+    self.assertEqual([3, 2, 1, 0], ranTasks)
+    self.assertEqual([x ** 2 for x in xrange(6)],
+                     [r["square"] for r in results])
+    self.assertEqual(6, len(readLedger(self.ledgerName)))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
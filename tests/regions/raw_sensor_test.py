@@ -27,6 +27,7 @@ import unittest
 
 from nupic.engine import Network
 from htmresearch.support.register_regions import registerAllResearchRegions
+from htmresearch.support.sparse_links import readSparseBuffer
 
 
 
@@ -105,6 +106,27 @@ class RawSensorTest(unittest.TestCase):
                       "Value of sequenceIdOut incorrect")
 
 
+  def testSparseLinks(self):
+    """With sparseLinks, dataOut holds the active count and indices."""
+    rawParams = {"outputWidth": 1029, "sparseLinks": True}
+    net = Network()
+    rawSensor = net.addRegion("raw","py.RawSensor", json.dumps(rawParams))
+
+    rawSensorPy = rawSensor.getSelf()
+    rawSensorPy.addDataToQueue([42, 2, 1023, 2], 0, 42)
+    rawSensorPy.addResetToQueue(43)
+
+    net.run(1)
+    dataOut = rawSensor.getOutputData("dataOut")
+    self.assertEqual(len(dataOut), 1030)
+    self.assertEqual(list(readSparseBuffer(dataOut)), [2, 42, 1023])
+
+    net.run(1)
+    self.assertEqual(list(readSparseBuffer(rawSensor.getOutputData("dataOut"))),
+                     [])
+    self.assertEqual(rawSensor.getOutputData("resetOut").sum(), 1)
+
+
 if __name__ == "__main__":
   unittest.main()
 
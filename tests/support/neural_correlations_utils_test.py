@@ -0,0 +1,148 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Tests for the pairwise correlations in neural_correlations_utils.
+"""
+
+import unittest
+import warnings
+
+import numpy as np
+import scipy.sparse
+
+from htmresearch.support.neural_correlations_utils import (
+  computePWCorrelations, computePWCorrelationsWithinCol)
+
+
+
+def pairLoopCorrelations(spikeTrains, removeAutoCorr, cellsPerColumn=None):
+  """
+  Reference implementation: np.corrcoef on each pair of non-silent cells.
+  With cellsPerColumn, only pairs within a column are computed.
+
+  np.corrcoef can return rounding noise such as -4e-17 for uncorrelated
+  pairs, where the vectorized version gives exactly 0, so these aren't
+  counted as negative correlations.
+  """
+  numCells = spikeTrains.shape[0]
+  corrMatrix = np.zeros((numCells, numCells))
+  numNegPCC = 0
+  for i in xrange(numCells):
+    for j in xrange(numCells):
+      if cellsPerColumn is not None and (i / cellsPerColumn !=
+                                         j / cellsPerColumn):
+        continue
+      if i == j and removeAutoCorr:
+        continue
+      if spikeTrains[i].any() and spikeTrains[j].any():
+        with warnings.catch_warnings():
+          warnings.simplefilter("ignore")
+          corrMatrix[i, j] = np.corrcoef(spikeTrains[i], spikeTrains[j])[0, 1]
+        if corrMatrix[i, j] < -1e-12:
+          numNegPCC += 1
+  return corrMatrix, numNegPCC
+
+
+
+class NeuralCorrelationsUtilsTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.RandomState(42)
+    self.cellsPerColumn = 4
+    self.spikeTrains = (rng.rand(24, 60) < 0.2).astype("uint32")
+    # Silent cells, including a whole silent column
+    self.spikeTrains[[1, 8, 9, 10, 11, 17]] = 0
+    # A cell that always fires has zero variance
+    self.spikeTrains[5] = 1
+
+
+  def _checkEqual(self, actual, expected):
+    np.testing.assert_allclose(actual[0], expected[0], rtol=1e-10, atol=1e-12,
+                               equal_nan=True)
+    self.assertEqual(actual[1], expected[1])
+
+
+  def testPWCorrelations(self):
+    for removeAutoCorr in (False, True):
+      expected = pairLoopCorrelations(self.spikeTrains, removeAutoCorr)
+      self._checkEqual(computePWCorrelations(self.spikeTrains, removeAutoCorr),
+                       expected)
+
+
+  def testPWCorrelationsSilentAndConstantCells(self):
+    corrMatrix, _ = computePWCorrelations(self.spikeTrains, False)
+    self.assertTrue((corrMatrix[1] == 0).all())
+    self.assertTrue((corrMatrix[:, 1] == 0).all())
+    self.assertTrue(np.isnan(corrMatrix[5, 0]))
+    self.assertEqual(corrMatrix[5, 1], 0)
+
+
+  def testPWCorrelationsBlocks(self):
+    expected = pairLoopCorrelations(self.spikeTrains, True)
+    for blockSize in (1, 5, 7, 24, 100):
+      self._checkEqual(computePWCorrelations(self.spikeTrains, True,
+                                             blockSize=blockSize),
+                       expected)
+
+
+  def testPWCorrelationsSparseInput(self):
+    expected = pairLoopCorrelations(self.spikeTrains, True)
+    for blockSize in (None, 5):
+      self._checkEqual(
+        computePWCorrelations(scipy.sparse.csr_matrix(self.spikeTrains), True,
+                              blockSize=blockSize),
+        expected)
+    self._checkEqual(
+      computePWCorrelations(scipy.sparse.coo_matrix(self.spikeTrains), True),
+      expected)
+
+
+  def testPWCorrelationsWithinCol(self):
+    for removeAutoCorr in (False, True):
+      expected = pairLoopCorrelations(self.spikeTrains, removeAutoCorr,
+                                      self.cellsPerColumn)
+      self._checkEqual(
+        computePWCorrelationsWithinCol(self.spikeTrains, removeAutoCorr,
+                                       self.cellsPerColumn),
+        expected)
+
+
+  def testPWCorrelationsWithinColBlocksAndSparseInput(self):
+    expected = pairLoopCorrelations(self.spikeTrains, True,
+                                    self.cellsPerColumn)
+    # Blocks are rounded to whole columns, including blocks smaller than one
+    for blockSize in (1, 4, 9, 24):
+      self._checkEqual(
+        computePWCorrelationsWithinCol(self.spikeTrains, True,
+                                       self.cellsPerColumn,
+                                       blockSize=blockSize),
+        expected)
+      self._checkEqual(
+        computePWCorrelationsWithinCol(
+          scipy.sparse.csr_matrix(self.spikeTrains), True,
+          self.cellsPerColumn, blockSize=blockSize),
+        expected)
+
+
+
+if __name__ == "__main__":
+  unittest.main()